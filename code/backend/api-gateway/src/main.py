@@ -1,6 +1,7 @@
 import os
 import sys
 import time
+import uuid
 from datetime import datetime
 
 import requests
@@ -27,7 +28,11 @@ app.config["SECRET_KEY"] = os.environ.get(
     "SECRET_KEY", "nexafi-default-secret-change-in-production"
 )
 auth_manager = init_auth_manager(app.config["SECRET_KEY"])
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization", "X-User-ID"])
+CORS(
+    app,
+    origins="*",
+    allow_headers=["Content-Type", "Authorization", "X-User-ID", "Idempotency-Key"],
+)
 setup_request_logging(app)
 logger = get_logger("api_gateway")
 SERVICES = {
@@ -188,9 +193,18 @@ def forward_request(
     retry_count = service_config.get("retry_count", 3)
     forward_headers: Dict[str, Any] = {}
     if headers:
-        for header_name in ["Authorization", "Content-Type", "X-User-ID"]:
+        for header_name in [
+            "Authorization",
+            "Content-Type",
+            "X-User-ID",
+            "Idempotency-Key",
+        ]:
             if header_name in headers:
                 forward_headers[header_name] = headers[header_name]
+    if method != "GET":
+        # Retries below reuse the key, so a write the service completed
+        # before timing out is replayed rather than executed again
+        forward_headers.setdefault("Idempotency-Key", str(uuid.uuid4()))
     if hasattr(g, "correlation_id"):
         forward_headers["X-Correlation-ID"] = g.correlation_id
     last_exception = None
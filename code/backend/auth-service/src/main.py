@@ -429,6 +429,10 @@ def login() -> object:
         if mfa_required:
             response_data["next_step"] = "mfa_verification"
             response_data["available_methods"] = ["totp", "sms"]
+        else:
+            fraud_engine.record_trusted_login(
+                data["username"], request.remote_addr, data.get("device_fingerprint")
+            )
 
         return jsonify(response_data)
     else:
@@ -541,6 +545,22 @@ def verify_mfa() -> object:
 
     if is_verified:
         session_manager.mark_mfa_verified(session_id)
+        # The login's IP and device only become trusted once MFA has passed
+        user = User.find_by_id(user_id)
+        origin = (
+            db_manager.fetch_one(
+                "SELECT ip_address, device_fingerprint FROM secure_sessions "
+                "WHERE session_id = ?",
+                (session_id,),
+            )
+            or {}
+        )
+        if user:
+            fraud_engine.record_trusted_login(
+                user.email,
+                origin.get("ip_address") or request.remote_addr,
+                origin.get("device_fingerprint"),
+            )
         audit_logger.log_event(
             AuditEventType.USER_LOGIN,
             "mfa_verification_successful",
@@ -0,0 +1 @@
+# Auto-generated __init__.py
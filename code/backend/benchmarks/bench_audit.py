@@ -0,0 +1,116 @@
+"""
+Benchmark for AuditLogger write throughput
+
+Compares sustained events/sec of the batched audit worker against the
+previous per-event path (``os.makedirs`` + ``open`` + one write per event),
+for both the JSONL file sink and the ``audit_log`` table.
+
+Usage: python benchmarks/bench_audit.py [--events 20000] [--batch-size 500]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.audit.audit_logger import (
+    AuditEventType,
+    AuditLogger,
+    DatabaseAuditBackend,
+)
+from shared.database.manager import initialize_database
+
+
+def _log_events(audit_logger: AuditLogger, events: int) -> None:
+    for i in range(events):
+        audit_logger.log_event(
+            AuditEventType.API_ACCESS,
+            f"GET /api/v1/accounts/{i}",
+            user_id=f"user-{i % 100}",
+            details={"status_code": 200, "response_time_ms": 3.2},
+        )
+
+
+def _report(label: str, events: int, elapsed: float) -> None:
+    print(f"{label:28s}{events / elapsed:12.0f} events/s")
+
+
+class _PerEventFileSink:
+    """The previous file path: reopen the daily file for every event"""
+
+    def __init__(self, log_dir: str) -> None:
+        self.log_dir = log_dir
+
+    def store(self, event_data: dict) -> None:
+        os.makedirs(self.log_dir, exist_ok=True)
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        log_file = os.path.join(self.log_dir, f"audit_{date_str}.jsonl")
+        with open(log_file, "a") as f:
+            f.write(json.dumps(event_data) + "\n")
+
+
+class _PerEventDatabaseSink(DatabaseAuditBackend):
+    """One INSERT and commit per event"""
+
+    def store_many(self, events: list) -> None:
+        for event_data in events:
+            self.db_manager.execute_insert(self.INSERT_SQL, self._row(event_data))
+
+
+def _run(label: str, events: int, **kwargs) -> None:
+    audit_logger = AuditLogger(**kwargs)
+    start = time.perf_counter()
+    _log_events(audit_logger, events)
+    audit_logger.flush()
+    _report(label, events, time.perf_counter() - start)
+    audit_logger.stop_worker()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+    print(f"events: {args.events}, batch size: {args.batch_size}, fsync: {args.fsync}")
+    work_dir = tempfile.mkdtemp()
+    try:
+        _run(
+            "file, per event",
+            args.events,
+            storage_backend=_PerEventFileSink(os.path.join(work_dir, "legacy")),
+        )
+        _run(
+            "file, batched",
+            args.events,
+            batch_size=args.batch_size,
+            fsync=args.fsync,
+            log_dir=os.path.join(work_dir, "batched"),
+        )
+        for label, backend_class in (
+            ("audit_log, per event", _PerEventDatabaseSink),
+            ("audit_log, executemany", DatabaseAuditBackend),
+        ):
+            db_path = os.path.join(work_dir, f"{backend_class.__name__}.db")
+            db_manager, _ = initialize_database(db_path)
+            _run(
+                label,
+                args.events,
+                storage_backend=backend_class(db_manager),
+                batch_size=args.batch_size,
+            )
+            db_manager.close_all_connections()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
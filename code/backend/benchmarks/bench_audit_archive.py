@@ -0,0 +1,143 @@
+"""
+Benchmark for the compressed audit archive
+
+Writes a synthetic year of daily audit JSONL files, measures a full-scan
+lookup, compacts the days into indexed zstd block files and repeats typical
+compliance lookups through ``AuditArchive.query``.
+
+Usage: python benchmarks/bench_audit_archive.py [--days 365] [--events-per-day 5000]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.audit.archive import AuditArchive
+
+EVENT_TYPES = ["api_access"] * 8 + ["user_login", "payment_process"]
+
+
+def _write_days(log_dir: str, days: int, per_day: int) -> int:
+    first = date(2025, 1, 1)
+    sequence = 0
+    total_bytes = 0
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        base = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        path = os.path.join(log_dir, f"audit_{day.isoformat()}.jsonl")
+        with open(path, "w") as f:
+            for i in range(per_day):
+                event = {
+                    "event_id": str(uuid.uuid4()),
+                    "event_type": EVENT_TYPES[i % len(EVENT_TYPES)],
+                    "severity": "low",
+                    "timestamp": (
+                        base + timedelta(seconds=i * 86400 // per_day)
+                    ).isoformat(),
+                    "user_id": f"user-{(i * 7919 + offset) % 5000}",
+                    "ip_address": f"10.0.{i % 256}.{offset % 256}",
+                    "user_agent": "Mozilla/5.0",
+                    "action": f"GET /api/v1/accounts/{i % 1000}",
+                    "details": {"status_code": 200, "response_time_ms": i % 97},
+                    "success": True,
+                    "sequence": sequence,
+                    "event_hash": uuid.uuid4().hex * 2,
+                }
+                f.write(json.dumps(event) + "\n")
+                sequence += 1
+        total_bytes += os.path.getsize(path)
+    return total_bytes
+
+
+def _scan(log_dir: str, user_id: str) -> int:
+    found = 0
+    for name in sorted(os.listdir(log_dir)):
+        if name.endswith(".jsonl"):
+            with open(os.path.join(log_dir, name)) as f:
+                for line in f:
+                    if json.loads(line)["user_id"] == user_id:
+                        found += 1
+    return found
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:44s}{time.perf_counter() - start:9.2f} s   results: {result}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--events-per-day", type=int, default=5000)
+    parser.add_argument("--block-size", type=int, default=2000)
+    args = parser.parse_args()
+    log_dir = tempfile.mkdtemp()
+    try:
+        raw_bytes = _write_days(log_dir, args.days, args.events_per_day)
+        print(
+            f"days: {args.days}, events: {args.days * args.events_per_day}, "
+            f"JSONL: {raw_bytes / 1e6:.1f} MB"
+        )
+        _timed("full scan for one user (JSONL)", lambda: _scan(log_dir, "user-42"))
+
+        archive = AuditArchive(log_dir, block_size=args.block_size)
+        _timed(
+            "compact all days",
+            lambda: len(archive.compact_closed_days(today=date(2100, 1, 1))),
+        )
+        archived_bytes = sum(
+            archive.load_index(day)["archive_bytes"] for day in archive.archived_days()
+        )
+        print(
+            f"archive: {archived_bytes / 1e6:.1f} MB "
+            f"({raw_bytes / archived_bytes:.1f}x smaller)"
+        )
+
+        cold = AuditArchive(log_dir)
+        _timed(
+            "one user over the year (cold index)",
+            lambda: sum(1 for _ in cold.query(user_id="user-42")),
+        )
+        _timed(
+            "one user over the year (warm index)",
+            lambda: sum(1 for _ in cold.query(user_id="user-42")),
+        )
+        _timed(
+            "payments in one month",
+            lambda: sum(
+                1
+                for _ in cold.query(
+                    datetime(2025, 6, 1, tzinfo=timezone.utc),
+                    datetime(2025, 6, 30, 23, 59, tzinfo=timezone.utc),
+                    event_type="payment_process",
+                )
+            ),
+        )
+        _timed(
+            "one-hour window",
+            lambda: sum(
+                1
+                for _ in cold.query(
+                    datetime(2025, 9, 15, 14, tzinfo=timezone.utc),
+                    datetime(2025, 9, 15, 15, tzinfo=timezone.utc),
+                )
+            ),
+        )
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
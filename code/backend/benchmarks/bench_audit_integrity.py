@@ -0,0 +1,157 @@
+"""
+Benchmark for audit chain verification
+
+Builds a segmented Merkle chain over millions of synthetic event hashes and
+compares full-history verification of the previous linear sha256 chain with
+serial and parallel segment verification, a narrow ``verify_range`` and
+single-event inclusion proofs. A full Merkle pass hashes each event about
+twice, so it only beats the linear chain when run on several workers.
+
+It then writes ``--logger-events`` events through ``AuditLogger``'s file
+sink and times restarting on that history and ``AuditLogger.verify_range``
+end to end, including reading and re-hashing the stored events.
+
+Usage: python benchmarks/bench_audit_integrity.py [--events 2000000]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.audit.audit_logger import AuditEventType, AuditLogger
+from shared.audit.integrity import SegmentedHashChain, verify_proof
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:38s}{time.perf_counter() - start:10.3f} s")
+    return result
+
+
+def _linear_chain(event_hashes: list) -> str:
+    previous = None
+    for event_hash in event_hashes:
+        if previous:
+            previous = hashlib.sha256((previous + event_hash).encode()).hexdigest()
+        else:
+            previous = event_hash
+    return previous
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--segment-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logger-events", type=int, default=100_000)
+    args = parser.parse_args()
+    print(
+        f"events: {args.events}, segment size: {args.segment_size}, "
+        f"workers: {args.workers}"
+    )
+
+    event_hashes = _timed(
+        "generate event hashes",
+        lambda: [
+            hashlib.sha256(i.to_bytes(8, "big")).hexdigest() for i in range(args.events)
+        ],
+    )
+    chain = SegmentedHashChain(args.segment_size)
+
+    def build():
+        for event_hash in event_hashes:
+            chain.append(event_hash)
+        chain.seal()
+
+    _timed("append + seal segments", build)
+
+    def load(first, last):
+        return event_hashes[first : last + 1]
+
+    last = args.events - 1
+    _timed("linear chain, full history", lambda: _linear_chain(event_hashes))
+    result = _timed(
+        "segments, full history, 1 worker",
+        lambda: chain.verify_range(0, last, load),
+    )
+    assert result["valid"]
+    result = _timed(
+        f"segments, full history, {args.workers} workers",
+        lambda: chain.verify_range(0, last, load, workers=args.workers),
+    )
+    assert result["valid"]
+    middle = args.events // 2
+    result = _timed(
+        "verify_range over 1,000 events",
+        lambda: chain.verify_range(middle, middle + 999, load),
+    )
+    assert result["valid"]
+    print(f"{'  segments touched':38s}{result['verified_segments']:10d}")
+    _timed("segment links only", chain.verify_chain)
+
+    segment = chain.segment_for(middle)
+    proof = _timed(
+        "inclusion proof (build)",
+        lambda: chain.prove(
+            middle, load(segment.first_sequence, segment.last_sequence)
+        ),
+    )
+    ok = _timed(
+        "inclusion proof (verify)",
+        lambda: verify_proof(
+            event_hashes[middle], proof["proof"], proof["merkle_root"]
+        ),
+    )
+    assert ok
+    print(f"{'  proof length':38s}{len(proof['proof']):10d}")
+    bench_logger(args)
+
+
+def bench_logger(args) -> None:
+    print(f"\nAuditLogger file sink, events: {args.logger_events}")
+    log_dir = tempfile.mkdtemp()
+    try:
+        writer = AuditLogger(log_dir=log_dir, segment_size=args.segment_size)
+
+        def write():
+            for i in range(args.logger_events):
+                writer.log_event(
+                    AuditEventType.API_ACCESS, f"GET /api/v1/items/{i}", user_id="u1"
+                )
+            writer.flush()
+            writer.stop_worker()
+
+        _timed("log events", write)
+        audit_logger = _timed(
+            "restart on stored history",
+            lambda: AuditLogger(log_dir=log_dir, segment_size=args.segment_size),
+        )
+        middle = args.logger_events // 2
+        last = args.logger_events - 1
+        for label, start, end in (
+            ("verify_range 100 events (first call)", middle, middle + 99),
+            ("verify_range 100 events", middle, middle + 99),
+            ("verify_range 20,000 events", middle, middle + 19_999),
+            ("verify_range full history", 0, last),
+        ):
+            result = _timed(
+                label,
+                lambda: audit_logger.verify_range(start, min(end, last)),
+            )
+            assert result["valid"]
+        audit_logger.stop_worker()
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark for chart of accounts provisioning
+
+Provisions a fresh ledger from a generated chart template, once through the
+per-account path (look up the code and its parent, save the account) and
+once with the bulk provisioner, then provisions it again to show the
+idempotent no-op cost.
+
+Usage: python benchmarks/bench_chart_provisioning.py [--accounts 500]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from chart import provision_chart
+from database.manager import BaseModel, initialize_database
+from migrations import LEDGER_MIGRATIONS
+from models.user import Account
+
+ACCOUNT_TYPES = ["asset", "liability", "equity", "revenue", "expense"]
+
+
+def _setup(path: str):
+    db, migration_manager = initialize_database(path)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    return db
+
+
+def _template(accounts: int):
+    template = {}
+    for i in range(accounts):
+        code = f"{i:05d}"
+        template[code] = {"name": f"Account {i}", "type": ACCOUNT_TYPES[i % 5]}
+        if i % 10:
+            template[code]["parent"] = f"{i - i % 10:05d}"
+    return template
+
+
+def _per_account(template) -> None:
+    for code, data in template.items():
+        if Account.find_one("account_code = ?", (code,)):
+            continue
+        parent_id = None
+        if "parent" in data:
+            parent = Account.find_one("account_code = ?", (data["parent"],))
+            if parent:
+                parent_id = parent.id
+        Account(
+            account_code=code,
+            name=data["name"],
+            account_type=data["type"],
+            parent_account_id=parent_id,
+            is_system=True,
+        ).save()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=500)
+    args = parser.parse_args()
+    template = _template(args.accounts)
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _setup(os.path.join(workdir, "per_account.db"))
+        BaseModel.set_db_manager(db)
+        start = time.perf_counter()
+        _per_account(template)
+        print(f"{'per-account path':28s}{time.perf_counter() - start:10.3f} s")
+        db.close_all_connections()
+
+        db = _setup(os.path.join(workdir, "bulk.db"))
+        for label in ("bulk provisioning", "bulk again (no-op)"):
+            start = time.perf_counter()
+            created = provision_chart(db, template)
+            print(
+                f"{label:28s}{time.perf_counter() - start:10.3f} s"
+                f"   {len(created)} created"
+            )
+        db.close_all_connections()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
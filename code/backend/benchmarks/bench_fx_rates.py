@@ -0,0 +1,107 @@
+"""
+Benchmark for the in-memory FX rate cache
+
+Loads a few years of daily rates for a handful of currencies into
+exchange_rates, then converts a batch of amounts dated across that range
+with one rate query per amount, as the rate lookups did before, and with
+the cache's vectorized conversion.
+
+Usage: python benchmarks/bench_fx_rates.py [--amounts 200000] [--days 1500]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import initialize_database
+from fx import FxRateCache
+from migrations import LEDGER_MIGRATIONS
+
+CURRENCIES = ["EUR", "GBP", "JPY", "CHF", "CAD"]
+FIRST_DAY = date(2021, 1, 1)
+SAMPLE = 2000
+
+
+def _setup(path: str, days: int):
+    db, migration_manager = initialize_database(path)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    rng = random.Random(3)
+    FxRateCache(db).upload(
+        [
+            {
+                "from_currency": currency,
+                "to_currency": "USD",
+                "rate": rng.uniform(0.5, 1.5),
+                "rate_date": FIRST_DAY + timedelta(days=day),
+            }
+            for currency in CURRENCIES
+            for day in range(days)
+        ]
+    )
+    return db
+
+
+def _per_amount(db, amounts, dates) -> float:
+    """Seconds per amount with one latest-rate query each"""
+    start = time.perf_counter()
+    for amount, day in zip(amounts[:SAMPLE], dates[:SAMPLE]):
+        row = db.fetch_one(
+            "SELECT rate FROM exchange_rates WHERE from_currency = ? "
+            "AND to_currency = ? AND rate_date <= ? AND is_active = 1 "
+            "ORDER BY rate_date DESC LIMIT 1",
+            ("EUR", "USD", day),
+        )
+        round(amount * row["rate"], 2)
+    return (time.perf_counter() - start) / SAMPLE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--amounts", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=1500)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _setup(os.path.join(workdir, "ledger.db"), args.days)
+        rng = random.Random(9)
+        amounts = [rng.uniform(1, 10000) for _ in range(args.amounts)]
+        dates = [
+            (FIRST_DAY + timedelta(days=rng.randrange(args.days))).isoformat()
+            for _ in range(args.amounts)
+        ]
+        print(f"rates: {len(CURRENCIES) * args.days}, amounts: {args.amounts}")
+
+        seconds = _per_amount(db, amounts, dates)
+        print(
+            f"{'query per amount':28s}{seconds * 1e6:10.1f} us/amount"
+            f"   ~{seconds * args.amounts:.1f} s for the batch"
+        )
+        cache = FxRateCache(db)
+        start = time.perf_counter()
+        cache.load()
+        print(f"{'cache load':28s}{time.perf_counter() - start:10.3f} s")
+        for label, source, target in (
+            ("vectorized EUR->USD", "EUR", "USD"),
+            ("vectorized cross GBP->EUR", "GBP", "EUR"),
+        ):
+            start = time.perf_counter()
+            cache.convert(amounts, source, target, dates)
+            print(f"{label:28s}{time.perf_counter() - start:10.3f} s")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark for Idempotency-Key replays
+
+Times a payment retried through the ``create_transaction`` path without a
+key (every retry runs fees, the wallet update and the insert again) against
+retries carrying a key, replayed from the in-process LRU and, with a cold
+cache as in another worker process, from the idempotency table.
+
+Usage: python benchmarks/bench_idempotency.py [--requests 2000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "payment-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import initialize_database
+from flask import Flask, jsonify, request
+from middleware.idempotency import IdempotencyStore, idempotent
+from payments import record_transaction
+
+TABLES = """
+    CREATE TABLE payment_methods (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, type TEXT NOT NULL,
+        provider TEXT NOT NULL, is_active INTEGER DEFAULT 1, last_used_at TEXT
+    );
+    CREATE TABLE transactions (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, payment_method_id TEXT,
+        transaction_type TEXT NOT NULL, amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD', description TEXT, reference TEXT,
+        status TEXT NOT NULL, external_transaction_id TEXT,
+        fees REAL DEFAULT 0.0, net_amount REAL NOT NULL, metadata TEXT,
+        processed_at TEXT, settled_at TEXT, created_at TEXT, updated_at TEXT
+    );
+    CREATE TABLE wallets (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, currency TEXT NOT NULL,
+        balance INTEGER NOT NULL DEFAULT 0,
+        available_balance INTEGER NOT NULL DEFAULT 0,
+        pending_balance INTEGER NOT NULL DEFAULT 0,
+        reserved_balance INTEGER NOT NULL DEFAULT 0,
+        is_active INTEGER DEFAULT 1, created_at TEXT, updated_at TEXT
+    );
+    CREATE UNIQUE INDEX idx_wallets_user_currency ON wallets(user_id, currency);
+    CREATE TABLE wallet_balance_history (
+        id TEXT PRIMARY KEY, wallet_id TEXT NOT NULL, transaction_id TEXT,
+        change_type TEXT NOT NULL, amount INTEGER NOT NULL,
+        balance_before INTEGER NOT NULL, balance_after INTEGER NOT NULL,
+        description TEXT, created_at TEXT
+    )
+"""
+
+
+def _app(db, cache_size: int = 10000) -> Flask:
+    app = Flask(__name__)
+    app.extensions["idempotency_store"] = IdempotencyStore(db, cache_size=cache_size)
+
+    @app.route("/transactions", methods=["POST"])
+    @idempotent()
+    def create_transaction():
+        data = request.get_json()
+        transaction = record_transaction(
+            db,
+            request.headers["X-User-ID"],
+            data["transaction_type"],
+            data["amount"],
+            payment_method_id=data.get("payment_method_id"),
+        )
+        return jsonify({"transaction": transaction}), 201
+
+    return app
+
+
+def _post(client, count: int, key: bool) -> float:
+    body = {"transaction_type": "payment", "amount": "25.00", "payment_method_id": "pm"}
+    headers = {"X-User-ID": "u1"}
+    start = time.perf_counter()
+    for i in range(count):
+        if key:
+            headers["Idempotency-Key"] = f"retry-{i % 20}"
+        response = client.post("/transactions", json=body, headers=headers)
+        assert response.status_code == 201
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    try:
+        db, _ = initialize_database(os.path.join(workdir, "app.db"))
+        for statement in TABLES.split(";"):
+            db.execute_query(statement)
+        db.execute_query(
+            "INSERT INTO payment_methods (id, user_id, type, provider) "
+            "VALUES ('pm', 'u1', 'card', 'visa')"
+        )
+        app = _app(db)
+        client = app.test_client()
+        # Warm the keys: 20 payments, each retried requests / 20 times
+        _post(client, 20, key=True)
+        for label, run in (
+            ("re-executed (no key)", lambda: _post(client, args.requests, False)),
+            ("replayed from LRU", lambda: _post(client, args.requests, True)),
+            (
+                "replayed from table",
+                # Keys cycle through 20, so a one-entry LRU always misses
+                lambda: _post(_app(db, 1).test_client(), args.requests, True),
+            ),
+        ):
+            elapsed = run()
+            print(
+                f"{label:24s}{args.requests / elapsed:10.0f} requests/s"
+                f"{elapsed / args.requests * 1e6:10.0f} us/request"
+            )
+        count = db.fetch_one("SELECT COUNT(*) AS n FROM transactions")["n"]
+        print(f"transactions written: {count} ({args.requests} without a key + 20)")
+        db.close_all_connections()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark for the bulk journal importer
+
+Writes a CSV of balanced two-line journal entries spread over a year and
+imports it with the chunked importer, after timing a sample of entries
+through the per-entry path the HTTP endpoint takes (save the entry, look up
+and save each line, post) to extrapolate its cost for the whole file.
+
+Usage: python benchmarks/bench_journal_import.py [--accounts 2000] [--lines 1000000]
+"""
+
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import BaseModel, initialize_database
+from importer import JournalImporter, read_rows
+from migrations import LEDGER_MIGRATIONS
+from models.user import Account, JournalEntry, JournalEntryLine
+
+ACCOUNT_TYPES = ["asset", "liability", "equity", "revenue", "expense"]
+FIRST_DAY = date(2025, 1, 1)
+SAMPLE_ENTRIES = 500
+
+
+def _setup(path: str, accounts: int):
+    db, migration_manager = initialize_database(path)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    BaseModel.set_db_manager(db)
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO accounts (account_code, name, account_type) VALUES (?, ?, ?)",
+            (
+                (f"{i:06d}", f"Account {i}", ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)])
+                for i in range(accounts)
+            ),
+        )
+    return db
+
+
+def _write_csv(path: str, accounts: int, lines: int) -> None:
+    rng = random.Random(7)
+    entries = lines // 2
+    with open(path, "w", newline="") as stream:
+        writer = csv.writer(stream)
+        writer.writerow(
+            [
+                "entry_number",
+                "entry_date",
+                "description",
+                "account_code",
+                "debit_amount",
+                "credit_amount",
+            ]
+        )
+        for i in range(entries):
+            day = (FIRST_DAY + timedelta(days=i * 365 // entries)).isoformat()
+            amount = f"{rng.uniform(1, 1000):.2f}"
+            debit, credit = rng.sample(range(accounts), 2)
+            writer.writerow([f"IMP-{i}", day, "bench", f"{debit:06d}", amount, ""])
+            writer.writerow([f"IMP-{i}", day, "bench", f"{credit:06d}", "", amount])
+
+
+def _per_entry(accounts: int) -> float:
+    """Seconds per entry through the model path the HTTP endpoint uses"""
+    rng = random.Random(11)
+    codes = {a.account_code: a.id for a in Account.find_all()}
+    start = time.perf_counter()
+    for i in range(SAMPLE_ENTRIES):
+        entry = JournalEntry(
+            entry_number=f"ONE-{i}",
+            description="bench",
+            entry_date=FIRST_DAY.isoformat(),
+            currency="USD",
+        ).save()
+        amount = round(rng.uniform(1, 1000), 2)
+        debit, credit = rng.sample(range(accounts), 2)
+        for number, (code, dr, cr) in enumerate(
+            ((debit, amount, 0.0), (credit, 0.0, amount)), 1
+        ):
+            account = Account.find_by_id(codes[f"{code:06d}"])
+            JournalEntryLine(
+                journal_entry_id=entry.id,
+                account_id=account.id,
+                debit_amount=dr,
+                credit_amount=cr,
+                line_number=number,
+            ).save()
+        entry.total_debit = entry.total_credit = amount
+        entry.save()
+        JournalEntry.find_by_id(entry.id).post_entry("bench")
+    return (time.perf_counter() - start) / SAMPLE_ENTRIES
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=1000000)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, "journal.csv")
+        _write_csv(csv_path, args.accounts, args.lines)
+        print(f"accounts: {args.accounts}, journal lines: {args.lines}")
+
+        db = _setup(os.path.join(tmp_dir, "one.db"), args.accounts)
+        seconds = _per_entry(args.accounts)
+        print(
+            f"{'per-entry path':32s}{seconds * 1000:10.2f} ms/entry"
+            f"   ~{seconds * args.lines / 2 / 60:.1f} min for the file"
+        )
+        db.close_all_connections()
+
+        db = _setup(os.path.join(tmp_dir, "bulk.db"), args.accounts)
+        importer = JournalImporter(db, "bench")
+        start = time.perf_counter()
+        with open(csv_path, newline="") as stream:
+            summary = importer.run(read_rows(stream, "csv"))
+        elapsed = time.perf_counter() - start
+        print(
+            f"{'bulk import':32s}{elapsed:10.1f} s"
+            f"         {summary['entries']} entries, {summary['lines']} lines,"
+            f" {len(summary['errors'])} errors"
+        )
+        db.close_all_connections()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
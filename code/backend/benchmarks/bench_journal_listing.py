@@ -0,0 +1,125 @@
+"""
+Benchmark for journal entry listing
+
+Fills a ledger with two-line journal entries over a few years, then times
+fetching pages at increasing depth with an OFFSET query and per-entry line
+lookups, as the listing did before, against keyset pages with the lines
+batch-loaded.
+
+Usage: python benchmarks/bench_journal_listing.py [--entries 200000] [--page 100]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import BaseModel, initialize_database
+from migrations import LEDGER_MIGRATIONS
+from models.user import JournalEntry, JournalEntryLine
+
+FIRST_DAY = date(2022, 1, 1)
+STATUSES = ["posted"] * 9 + ["draft"]
+
+
+def _setup(path: str, entries: int):
+    db, migration_manager = initialize_database(path)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    BaseModel.set_db_manager(db)
+    rng = random.Random(13)
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO accounts (account_code, name, account_type) VALUES (?, ?, ?)",
+            ((f"{i:04d}", f"Account {i}", "asset") for i in range(100)),
+        )
+        conn.executemany(
+            "INSERT INTO journal_entries (id, entry_number, description, "
+            "entry_date, status, created_by) VALUES (?, ?, 'bench', ?, ?, ?)",
+            (
+                (
+                    i,
+                    f"JE-{i}",
+                    (FIRST_DAY + timedelta(days=rng.randrange(1095))).isoformat(),
+                    rng.choice(STATUSES),
+                    f"user{i % 20}",
+                )
+                for i in range(1, entries + 1)
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO journal_entry_lines (journal_entry_id, account_id, "
+            "debit_amount, credit_amount, line_number) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, rng.randrange(1, 101), amount, credit, number)
+                for i in range(1, entries + 1)
+                for amount, credit, number in ((10.0, 0.0, 1), (0.0, 10.0, 2))
+            ),
+        )
+    return db
+
+
+def _offset_page(db, page: int, offset: int) -> None:
+    rows = db.fetch_all(
+        "SELECT * FROM journal_entries WHERE created_by = ? AND status = ? "
+        "ORDER BY entry_date DESC, entry_number DESC LIMIT ? OFFSET ?",
+        ("user3", "posted", page, offset),
+    )
+    for row in rows:
+        JournalEntryLine.find_all(
+            "journal_entry_id = ? ORDER BY line_number", (row["id"],)
+        )
+
+
+def _keyset_page(page: int, cursor) -> str:
+    result = JournalEntry.list_page(
+        limit=page,
+        cursor=cursor,
+        created_by="user3",
+        status="posted",
+        include_lines=True,
+    )
+    return result["next_cursor"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=100)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _setup(os.path.join(workdir, "ledger.db"), args.entries)
+        # Walk the keyset pages once, keeping the cursors of each depth
+        cursors = [None]
+        while True:
+            cursor = _keyset_page(args.page, cursors[-1])
+            if cursor is None:
+                break
+            cursors.append(cursor)
+        print(f"entries: {args.entries}, pages for one user: {len(cursors)}")
+        print(f"{'page':>8s}{'offset + per-entry':>22s}{'keyset + batch':>18s}")
+        for depth in (0, len(cursors) // 4, len(cursors) // 2, len(cursors) - 1):
+            start = time.perf_counter()
+            _offset_page(db, args.page, depth * args.page)
+            offset_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            _keyset_page(args.page, cursors[depth])
+            keyset_ms = (time.perf_counter() - start) * 1000
+            print(f"{depth:8d}{offset_ms:19.2f} ms{keyset_ms:15.2f} ms")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark for the ledger trial balance and balance sheet reports
+
+Builds a ledger with a large chart of accounts and a year of posted journal
+lines, then compares the per-account balance loop the reports used to run,
+a single aggregation over the raw journal lines and the streamed
+single-query reports over the daily balance checkpoints.
+
+Usage: python benchmarks/bench_ledger_reports.py [--accounts 10000] [--lines 1000000]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import BaseModel, initialize_database
+from migrations import LEDGER_MIGRATIONS
+from models.user import Account
+from reports import stream_balance_sheet, stream_trial_balance
+
+ACCOUNT_TYPES = ["asset", "liability", "equity", "revenue", "expense"]
+FIRST_DAY = date(2025, 1, 1)
+
+# What a one-statement trial balance looks like without checkpoints
+LINE_SCAN_SQL = """
+SELECT a.account_type, a.account_code,
+       SUM(l.debit_amount) AS debits, SUM(l.credit_amount) AS credits
+FROM journal_entry_lines l
+JOIN journal_entries e ON e.id = l.journal_entry_id
+JOIN accounts a ON a.id = l.account_id
+WHERE e.status = 'posted' AND e.entry_date <= ?
+  AND a.is_active = 1 AND a.currency = ?
+GROUP BY a.account_type, a.account_code
+ORDER BY a.account_code
+"""
+
+
+def _build_ledger(db, accounts: int, lines: int) -> None:
+    rng = random.Random(7)
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO accounts (account_code, name, account_type, currency) "
+            "VALUES (?, ?, ?, 'USD')",
+            (
+                (f"{i:06d}", f"Account {i}", ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)])
+                for i in range(accounts)
+            ),
+        )
+        entries = lines // 2
+        conn.executemany(
+            "INSERT INTO journal_entries (id, entry_number, description, "
+            "entry_date, status) VALUES (?, ?, 'bench', ?, 'posted')",
+            (
+                (i + 1, f"JE-{i}", FIRST_DAY + timedelta(days=i * 365 // entries))
+                for i in range(entries)
+            ),
+        )
+
+        def entry_lines():
+            for i in range(entries):
+                amount = round(rng.uniform(1, 1000), 2)
+                debit, credit = rng.sample(range(1, accounts + 1), 2)
+                yield (i + 1, debit, amount, 0.0, 1)
+                yield (i + 1, credit, 0.0, amount, 2)
+
+        conn.executemany(
+            "INSERT INTO journal_entry_lines (journal_entry_id, account_id, "
+            "debit_amount, credit_amount, line_number) VALUES (?, ?, ?, ?, ?)",
+            entry_lines(),
+        )
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:48s}{(time.perf_counter() - start) * 1000:10.1f} ms   {result}")
+    return result
+
+
+def _per_account(as_of: date) -> int:
+    accounts = Account.find_all("is_active = 1 AND currency = 'USD'")
+    return sum(1 for account in accounts if account.get_balance(as_of) != 0)
+
+
+def _line_scan(db, as_of: date) -> int:
+    return len(db.fetch_all(LINE_SCAN_SQL, (as_of.isoformat(), "USD")))
+
+
+def _report(stream, db, as_of: date) -> str:
+    body = "".join(stream(db, as_of, "USD"))
+    report = json.loads(body)
+    if "accounts" in report:
+        rows = len(report["accounts"])
+    else:
+        rows = sum(
+            len(report[key]["accounts"]) for key in ("assets", "liabilities", "equity")
+        )
+    return f"{rows} rows, {len(body)} bytes"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=1000000)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        db, migration_manager = initialize_database(os.path.join(tmp_dir, "app.db"))
+        for version, migration in LEDGER_MIGRATIONS.items():
+            migration_manager.apply_migration(
+                version, migration["description"], migration["sql"]
+            )
+        BaseModel.set_db_manager(db)
+        _timed(
+            "build ledger",
+            lambda: _build_ledger(db, args.accounts, args.lines),
+        )
+        backfill = LEDGER_MIGRATIONS["016_create_account_daily_balances_table"]
+        with db.get_connection() as conn:
+            _timed(
+                "backfill daily checkpoints (migration 016)",
+                lambda: conn.executescript(backfill["sql"]) and None,
+            )
+        print(f"accounts: {args.accounts}, journal lines: {args.lines}")
+
+        for as_of in (date(2025, 6, 30), date(2025, 12, 31)):
+            print(f"\nas of {as_of}")
+            _timed("per-account get_balance loop", lambda: _per_account(as_of))
+            _timed(
+                "single aggregation over journal lines", lambda: _line_scan(db, as_of)
+            )
+            _timed(
+                "trial balance (streamed, checkpoints)",
+                lambda: _report(stream_trial_balance, db, as_of),
+            )
+            _timed(
+                "balance sheet (streamed, checkpoints)",
+                lambda: _report(stream_balance_sheet, db, as_of),
+            )
+        db.close_all_connections()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
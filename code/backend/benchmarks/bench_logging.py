@@ -0,0 +1,119 @@
+"""
+Benchmark for the LoggerManager logging pipeline
+
+Measures the latency a request thread pays per ``logger.info`` call with the
+handlers attached synchronously and behind the async queue. ``--io-delay-ms``
+adds a sleep to every file write to simulate a slow or saturated disk.
+Also reports records per second through ``get_logger(...)`` with no delay.
+
+Usage: python benchmarks/bench_logging.py [--records 5000] [--io-delay-ms 0.2]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.nexafi_logging.logger import LoggerManager
+
+
+def _handlers(manager: LoggerManager) -> list:
+    if manager.async_logging:
+        return [h for _, listener in manager._pipelines for h in listener.handlers]
+    return logging.getLogger().handlers + logging.getLogger("security").handlers
+
+
+def _prepare_handlers(manager: LoggerManager, io_delay: float) -> None:
+    devnull = open(os.devnull, "w")
+    for handler in _handlers(manager):
+        if isinstance(handler, logging.FileHandler):
+            if io_delay:
+                emit = handler.emit
+
+                def slow_emit(record, emit=emit):
+                    time.sleep(io_delay)
+                    emit(record)
+
+                handler.emit = slow_emit
+        elif isinstance(handler, logging.StreamHandler):
+            handler.setStream(devnull)
+
+
+def _manager(async_logging: bool, records: int, io_delay: float) -> LoggerManager:
+    manager = LoggerManager(
+        log_dir=tempfile.mkdtemp(),
+        async_logging=async_logging,
+        queue_size=records * 2,
+    )
+    _prepare_handlers(manager, io_delay)
+    return manager
+
+
+def _label(async_logging: bool) -> str:
+    return f"{'async' if async_logging else 'sync':6s}"
+
+
+def bench_latency(async_logging: bool, records: int, io_delay: float) -> None:
+    manager = _manager(async_logging, records, io_delay)
+    logger = manager.get_logger("bench.logging")
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(records):
+        call_start = time.perf_counter()
+        logger.info("processed transaction %d", i, extra={"user_id": "u-1"})
+        latencies.append(time.perf_counter() - call_start)
+    caller = time.perf_counter() - start
+    manager.shutdown()
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{_label(async_logging)}"
+        f"p50: {statistics.median(latencies) * 1e6:9.1f} us"
+        f"   p99: {p99 * 1e6:9.1f} us"
+        f"   caller: {caller:6.2f} s   incl. drain: {total:6.2f} s"
+        f"   dropped: {manager.dropped_records}"
+    )
+
+
+def bench_throughput(async_logging: bool, records: int) -> None:
+    manager = _manager(async_logging, records, 0)
+    logger = manager.get_logger("bench.logging")
+
+    start = time.perf_counter()
+    for i in range(records):
+        logger.info("processed transaction %d", i, extra={"user_id": "u-1"})
+    caller = time.perf_counter() - start
+    manager.shutdown()
+    total = time.perf_counter() - start
+    print(
+        f"{_label(async_logging)}"
+        f"caller: {records / caller:10.0f} records/s"
+        f"   end-to-end: {records / total:10.0f} records/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--io-delay-ms", type=float, default=0.2)
+    args = parser.parse_args()
+    print(f"records: {args.records}, simulated I/O delay: {args.io_delay_ms} ms/write")
+    for async_logging in (False, True):
+        bench_latency(async_logging, args.records, args.io_delay_ms / 1000)
+    print("throughput through get_logger(...), no I/O delay")
+    for async_logging in (False, True):
+        bench_throughput(async_logging, args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark for MessageQueue publishing
+
+Publishes audit-sized messages one ``publish_message`` call at a time and
+through ``publish_batch``, with and without publisher confirms, then drains
+the queue with a ``QueueConsumer``, and reports messages per second.
+``--transport rabbitmq`` needs a reachable broker (configured through the
+usual RABBITMQ_* environment variables); ``memory`` and ``sqlite`` run the
+whole pipeline in-process.
+
+Usage: python benchmarks/bench_message_queue.py [--transport memory] [--messages 50000] [--batch-size 500]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.utils.memory_broker import MemoryTransport, SqliteBroker
+from shared.utils.message_queue import (
+    MessageQueue,
+    PikaTransport,
+    QueueConsumer,
+    Queues,
+)
+
+QUEUE = "bench." + Queues.AUDIT_LOGGING
+
+
+def _message(i: int) -> dict:
+    return {
+        "event_type": "api_access",
+        "user_id": f"user-{i % 5000}",
+        "action": f"GET /api/v1/accounts/{i % 1000}",
+        "details": {"status_code": 200, "response_time_ms": i % 97},
+    }
+
+
+def _run(label: str, mq: MessageQueue, count: int, batch_size: int) -> None:
+    mq.channel.queue_purge(QUEUE)
+    start = time.perf_counter()
+    if batch_size == 1:
+        for i in range(count):
+            mq.publish_message(QUEUE, _message(i))
+    else:
+        for offset in range(0, count, batch_size):
+            mq.publish_batch(
+                QUEUE,
+                (_message(i) for i in range(offset, min(offset + batch_size, count))),
+            )
+    nacked = mq.wait_for_confirms(timeout=60)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:36s}{count / elapsed:12,.0f} msg/s"
+        + (f"   nacked: {len(nacked)}" if nacked else "")
+    )
+
+
+def _consume(mq: MessageQueue, transport: object, count: int, batch_size: int) -> None:
+    mq.publish_batch(QUEUE, (_message(i) for i in range(count)))
+    consumer = QueueConsumer(
+        MessageQueue(transport=transport),
+        QUEUE,
+        lambda messages: None,
+        batch_size=batch_size,
+        workers=2,
+    )
+    start = time.perf_counter()
+    consumer.start()
+    while consumer.stats["processed"] < count:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    consumer.stop()
+    print(
+        f"{f'QueueConsumer(batch {batch_size})':36s}{count / elapsed:12,.0f} msg/s"
+        f"   acks: {consumer.stats['acks']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--transport", choices=("rabbitmq", "memory", "sqlite"), default="memory"
+    )
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    if args.transport == "rabbitmq":
+        transport = PikaTransport()
+    elif args.transport == "memory":
+        transport = MemoryTransport()
+    else:
+        transport = MemoryTransport(SqliteBroker(os.path.join(tmp_dir, "mq.db")))
+    print(f"transport: {transport.name}, messages: {args.messages}")
+    try:
+        for confirms in (False, True):
+            mq = MessageQueue(publisher_confirms=confirms, transport=transport)
+            try:
+                mq.connect()
+            except Exception as e:
+                print(f"{transport.name} is not reachable, nothing to measure: {e!r}")
+                return
+            mq.declare_queue(QUEUE, durable=args.transport != "memory")
+            suffix = ", confirms" if confirms else ""
+            _run(f"publish_message{suffix}", mq, args.messages, 1)
+            _run(
+                f"publish_batch({args.batch_size}){suffix}",
+                mq,
+                args.messages,
+                args.batch_size,
+            )
+            if not confirms:
+                mq.channel.queue_purge(QUEUE)
+                _consume(mq, transport, args.messages, 1)
+                mq.channel.queue_purge(QUEUE)
+                _consume(mq, transport, args.messages, 100)
+            mq.channel.queue_delete(QUEUE)
+            mq.disconnect()
+    finally:
+        transport_broker = getattr(transport, "broker", None)
+        if transport_broker is not None:
+            transport_broker.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
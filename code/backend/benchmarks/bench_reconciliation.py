@@ -0,0 +1,104 @@
+"""
+Benchmark for the reconciliation matching engine
+
+Generates journal lines for a year and a bank statement that mirrors them
+with exact copies, shifted dates, small amount differences, deposits that
+batch several journal lines and unmatched noise, then times the matching
+engine against a per-line linear scan of the journal (extrapolated from a
+sample).
+
+Usage: python benchmarks/bench_reconciliation.py [--lines 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from reconciliation import Line, match_lines
+
+FIRST_DAY = date(2025, 1, 1).toordinal()
+SAMPLE = 1000
+
+
+def _generate(lines: int):
+    rng = random.Random(5)
+    book = [
+        Line(i, FIRST_DAY + rng.randrange(365), rng.randrange(100, 500000), f"R{i}")
+        for i in range(lines)
+    ]
+    statement = []
+    position = 0
+    while position < lines:
+        line = book[position]
+        kind = rng.random()
+        if kind < 0.80:
+            statement.append(
+                Line(f"s{position}", line.day, line.amount, line.reference)
+            )
+        elif kind < 0.90:
+            statement.append(
+                Line(f"s{position}", line.day + rng.randint(1, 3), line.amount)
+            )
+        elif kind < 0.95:
+            statement.append(
+                Line(f"s{position}", line.day, line.amount + rng.randint(-3, 3))
+            )
+        elif kind < 0.98 and position + 2 < lines:
+            # One deposit for three journal lines booked the same day
+            group = book[position : position + 3]
+            for member in group[1:]:
+                member.day = line.day
+            statement.append(
+                Line(f"s{position}", line.day, sum(member.amount for member in group))
+            )
+            position += 2
+        else:
+            statement.append(Line(f"s{position}", line.day, rng.randrange(100, 500000)))
+        position += 1
+    return statement, book
+
+
+def _linear_scan(statement, book) -> float:
+    """Seconds per statement line when each one scans the whole journal"""
+    start = time.perf_counter()
+    for line in statement[:SAMPLE]:
+        for candidate in book:
+            if candidate.amount == line.amount and abs(candidate.day - line.day) <= 3:
+                break
+    return (time.perf_counter() - start) / SAMPLE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+    statement, book = _generate(args.lines)
+    print(f"statement lines: {len(statement)}, journal lines: {len(book)}")
+
+    seconds = _linear_scan(statement, book)
+    print(
+        f"{'linear scan per line':28s}{seconds * 1000:10.2f} ms/line"
+        f"   ~{seconds * len(statement):.0f} s for the statement"
+    )
+    start = time.perf_counter()
+    result = match_lines(statement, book, amount_tolerance=5)
+    elapsed = time.perf_counter() - start
+    by_type = {}
+    for match in result["matched"] + result["suspect"]:
+        by_type[match["match_type"]] = by_type.get(match["match_type"], 0) + 1
+    print(f"{'matching engine':28s}{elapsed:10.2f} s         {by_type}")
+    print(
+        f"{'':38s}unmatched: {len(result['unmatched_statement_line_ids'])} statement,"
+        f" {len(result['unmatched_journal_line_ids'])} journal"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark for the recurring payment scheduler
+
+Fills the schedule table with active schedules spread over the next 30
+days, plus a set left overdue as after downtime, then times the horizon
+load, a heap of every schedule, recovery of the overdue payments, and how
+late the scheduler thread dispatches payments due over the next seconds.
+
+Usage: python benchmarks/bench_recurring_payments.py [--schedules 1000000]
+       [--overdue 2000] [--upcoming 500]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "payment-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import initialize_database
+from scheduler import RecurringPaymentScheduler, from_epoch_ms, to_epoch_ms
+
+TABLES = """
+    CREATE TABLE payment_methods (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, type TEXT NOT NULL,
+        provider TEXT NOT NULL, is_active INTEGER DEFAULT 1, last_used_at TEXT
+    );
+    CREATE TABLE transactions (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, payment_method_id TEXT,
+        transaction_type TEXT NOT NULL, amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD', description TEXT, reference TEXT,
+        status TEXT NOT NULL, external_transaction_id TEXT,
+        fees REAL DEFAULT 0.0, net_amount REAL NOT NULL, metadata TEXT,
+        processed_at TEXT, settled_at TEXT, created_at TEXT, updated_at TEXT
+    );
+    CREATE TABLE wallets (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, currency TEXT NOT NULL,
+        balance INTEGER NOT NULL DEFAULT 0,
+        available_balance INTEGER NOT NULL DEFAULT 0,
+        pending_balance INTEGER NOT NULL DEFAULT 0,
+        reserved_balance INTEGER NOT NULL DEFAULT 0,
+        is_active INTEGER DEFAULT 1, created_at TEXT, updated_at TEXT
+    );
+    CREATE TABLE wallet_balance_history (
+        id TEXT PRIMARY KEY, wallet_id TEXT NOT NULL, transaction_id TEXT,
+        change_type TEXT NOT NULL, amount INTEGER NOT NULL,
+        balance_before INTEGER NOT NULL, balance_after INTEGER NOT NULL,
+        description TEXT, created_at TEXT
+    );
+    CREATE TABLE recurring_payments (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL,
+        payment_method_id TEXT NOT NULL, amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD', frequency TEXT NOT NULL, description TEXT,
+        start_date TEXT NOT NULL, end_date TEXT, next_payment_date TEXT NOT NULL,
+        total_payments INTEGER, payments_made INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'active', metadata TEXT,
+        created_at TEXT, updated_at TEXT
+    );
+    CREATE INDEX idx_recurring_payments_due
+        ON recurring_payments(status, next_payment_date)
+"""
+USERS = 10_000
+DAY_MS = 86_400_000
+
+
+def _insert(db, prefix: str, due_ms) -> None:
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO recurring_payments (id, user_id, payment_method_id, "
+            "amount, frequency, start_date, next_payment_date) "
+            "VALUES (?, ?, ?, 25.0, 'monthly', ?, ?)",
+            (
+                (f"{prefix}{i}", f"u{i % USERS}", f"pm{i % USERS}", due, due)
+                for i, due in enumerate(map(from_epoch_ms, due_ms))
+            ),
+        )
+
+
+def _timed(label: str, action, unit: str = "") -> object:
+    """Run ``action`` and print its time; ``unit`` formats its result"""
+    start = time.perf_counter()
+    result = action()
+    elapsed = time.perf_counter() - start
+    print(f"{label:34s}{elapsed * 1000:10.1f} ms   {unit.format(result)}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--schedules", type=int, default=1_000_000)
+    parser.add_argument("--overdue", type=int, default=2000)
+    parser.add_argument("--upcoming", type=int, default=500)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    try:
+        db, _ = initialize_database(os.path.join(workdir, "app.db"))
+        for statement in TABLES.split(";"):
+            db.execute_query(statement)
+        with db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO payment_methods (id, user_id, type, provider) "
+                "VALUES (?, ?, 'bank_account', 'ach')",
+                [(f"pm{i}", f"u{i}") for i in range(USERS)],
+            )
+        now_ms = int(time.time() * 1000)
+        rng = random.Random(7)
+        # Future schedules start beyond the upcoming window so the
+        # dispatch test only sees its own payments
+        _timed(
+            f"insert {args.schedules:,} schedules",
+            lambda: _insert(
+                db,
+                "s",
+                (
+                    now_ms + 60_000 + rng.randrange(30 * DAY_MS)
+                    for _ in range(args.schedules)
+                ),
+            ),
+        )
+        _insert(
+            db,
+            "o",
+            (now_ms - rng.randrange(1, 3 * DAY_MS) for _ in range(args.overdue)),
+        )
+
+        _timed(
+            "heap of every schedule",
+            lambda: RecurringPaymentScheduler(db, horizon_seconds=31 * 86_400).load(
+                now_ms
+            ),
+            "{0:,} schedules queued",
+        )
+
+        scheduler = RecurringPaymentScheduler(db)
+        _timed(
+            "load overdue + 5 minute horizon",
+            lambda: scheduler.load(now_ms),
+            "{0:,} schedules queued",
+        )
+        _timed(
+            "recover overdue payments",
+            lambda: scheduler.run_due(now_ms),
+            "{0:,} payments",
+        )
+
+        start_ms = int(time.time() * 1000) + 500
+        upcoming = [start_ms + rng.randrange(2000) for _ in range(args.upcoming)]
+        _insert(db, "n", upcoming)
+        for i, due_ms in enumerate(upcoming):
+            scheduler.add(f"n{i}", from_epoch_ms(due_ms))
+        scheduler.start()
+        time.sleep((max(upcoming) - time.time() * 1000) / 1000 + 1.0)
+        scheduler.stop()
+        lateness = sorted(
+            to_epoch_ms(row["created_at"]) - to_epoch_ms(row["scheduled_for"])
+            for row in db.fetch_all(
+                "SELECT created_at, json_extract(metadata, '$.scheduled_for') "
+                "AS scheduled_for FROM transactions WHERE reference LIKE 'n%'"
+            )
+        )
+        print(
+            f"dispatch {len(lateness)} payments due over 2s: lateness "
+            f"p50 {lateness[len(lateness) // 2]} ms, "
+            f"p99 {lateness[int(len(lateness) * 0.99)]} ms, max {lateness[-1]} ms"
+        )
+        db.close_all_connections()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark for wallet balance updates under contention
+
+Several threads debit one hot wallet at once, first with the previous
+read-modify-write path (read the wallet, subtract in Python, save it, then
+save the history row) and then with the conditional in-SQL update. Reports
+debits per second and how many debits the final balance lost.
+
+Usage: python benchmarks/bench_wallets.py [--threads 8] [--debits 500]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "payment-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import initialize_database
+from wallets import apply_wallet_change, get_or_create_wallet
+
+WALLET_TABLES = """
+    CREATE TABLE wallets (
+        id TEXT PRIMARY KEY, user_id TEXT NOT NULL, currency TEXT NOT NULL,
+        balance INTEGER NOT NULL DEFAULT 0,
+        available_balance INTEGER NOT NULL DEFAULT 0,
+        pending_balance INTEGER NOT NULL DEFAULT 0,
+        reserved_balance INTEGER NOT NULL DEFAULT 0,
+        is_active INTEGER DEFAULT 1, created_at TEXT, updated_at TEXT
+    );
+    CREATE UNIQUE INDEX idx_wallets_user_currency ON wallets(user_id, currency);
+    CREATE TABLE wallet_balance_history (
+        id TEXT PRIMARY KEY, wallet_id TEXT NOT NULL, transaction_id TEXT,
+        change_type TEXT NOT NULL, amount INTEGER NOT NULL,
+        balance_before INTEGER NOT NULL, balance_after INTEGER NOT NULL,
+        description TEXT, created_at TEXT
+    )
+"""
+START_BALANCE = 10**9
+
+
+def _read_modify_write(db, wallet_id: str) -> None:
+    wallet = db.fetch_one("SELECT * FROM wallets WHERE id = ?", (wallet_id,))
+    balance_after = wallet["balance"] - 1
+    db.execute_query(
+        "UPDATE wallets SET balance = ?, available_balance = ?, updated_at = ? "
+        "WHERE id = ?",
+        (balance_after, wallet["available_balance"] - 1, "now", wallet_id),
+    )
+    db.execute_query(
+        "INSERT INTO wallet_balance_history (id, wallet_id, change_type, amount, "
+        "balance_before, balance_after, created_at) VALUES (?, ?, 'debit', 1, ?, ?, ?)",
+        (
+            str(uuid.uuid4()),
+            wallet_id,
+            wallet["balance"],
+            balance_after,
+            datetime.utcnow().isoformat(),
+        ),
+    )
+
+
+def _atomic(db, wallet_id: str) -> None:
+    apply_wallet_change(db, wallet_id, 1, "debit", "bench")
+
+
+def _run(path: str, debit, threads: int, debits: int) -> None:
+    db, _ = initialize_database(path)
+    for statement in WALLET_TABLES.split(";"):
+        db.execute_query(statement)
+    wallet_id = get_or_create_wallet(db, "hot", "USD")["id"]
+    apply_wallet_change(db, wallet_id, START_BALANCE, "credit", "seed")
+    failures = []
+
+    def worker():
+        for _ in range(debits):
+            try:
+                debit(db, wallet_id)
+            except Exception as e:
+                failures.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    balance = db.fetch_one("SELECT balance FROM wallets WHERE id = ?", (wallet_id,))
+    applied = threads * debits - len(failures)
+    lost = applied - (START_BALANCE - balance["balance"])
+    print(
+        f"{debit.__name__.strip('_'):22s}{applied / elapsed:10.0f} debits/s"
+        f"   lost updates: {lost}   errors: {len(failures)}"
+    )
+    db.close_all_connections()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--debits", type=int, default=500)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    try:
+        for debit in (_read_modify_write, _atomic):
+            path = os.path.join(workdir, f"{debit.__name__}.db")
+            _run(path, debit, args.threads, args.debits)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ sys.path.insert(
     0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "..", "shared")
 )  # shared library
 from database.manager import BaseModel, initialize_database
+from database.outbox import OutboxRelay
 from flask import Flask, send_from_directory
 from routes.user import credit_bp
 
@@ -25,6 +26,9 @@ for version, migration in CREDIT_MIGRATIONS.items():
     migration_manager.apply_migration(
         version, migration["description"], migration["sql"]
     )
+outbox_relay = OutboxRelay(db_manager)
+if os.environ.get("OUTBOX_RELAY_ENABLED", "true").lower() == "true":
+    outbox_relay.start()
 
 
 @app.route("/", defaults={"path": ""})
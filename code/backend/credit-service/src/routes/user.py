@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime, timedelta
 from functools import wraps
 
+from database.outbox import add_outbox_event
 from flask import Blueprint, jsonify, request
 from models.user import (
     CreditScore,
@@ -11,6 +12,7 @@ from models.user import (
     LoanApplicationHistory,
     RiskAssessment,
 )
+from utils.message_queue import Queues
 
 credit_bp = Blueprint("credit", __name__)
 
@@ -220,15 +222,30 @@ def update_loan_application_status(application_id: object) -> object:
             application.term_months = application.term_months or 36
             application.monthly_payment = application.calculate_monthly_payment()
             application.total_interest = application.calculate_total_interest()
-        application.save()
-        log_application_history(
-            application_id,
-            "Status Updated",
-            old_status=old_status,
-            new_status=new_status,
-            notes=decision_reason,
-            changed_by=request.user_id,
-        )
+        # The decision, its history row and its event commit together
+        with LoanApplication.db_manager.transaction() as conn:
+            application.save()
+            log_application_history(
+                application_id,
+                "Status Updated",
+                old_status=old_status,
+                new_status=new_status,
+                notes=decision_reason,
+                changed_by=request.user_id,
+            )
+            add_outbox_event(
+                conn,
+                Queues.CREDIT_DECISIONS,
+                {
+                    "event": "loan_application_decided",
+                    "application_id": application.id,
+                    "user_id": application.user_id,
+                    "old_status": old_status,
+                    "new_status": new_status,
+                    "approved_amount": getattr(application, "approved_amount", None),
+                    "decision_date": application.decision_date,
+                },
+            )
         return (jsonify(application.to_dict()), 200)
     except Exception as e:
         return (
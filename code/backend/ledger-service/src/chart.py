@@ -0,0 +1,239 @@
+"""
+Chart of accounts provisioning
+Creates a ledger's accounts from a template keyed by account code, either
+the default chart or one read from another ledger to clone it. Existing
+codes are diffed out with one query and the missing accounts inserted in
+one transaction, so provisioning is idempotent and costs the same few
+statements whatever the size of the chart.
+
+Usage: python ledger-service/src/chart.py [--db ledger.db] [--clone-from source.db]
+"""
+
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+_SERVICE_SRC = os.path.dirname(os.path.abspath(__file__))
+_SHARED_DIR = os.path.abspath(os.path.join(_SERVICE_SRC, "..", "..", "shared"))
+for _p in (_SERVICE_SRC, _SHARED_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+from database.manager import DatabaseManager
+
+DEFAULT_CHART_OF_ACCOUNTS = {
+    "1000": {"name": "Cash and Cash Equivalents", "type": "asset", "subtype": "cash"},
+    "1100": {
+        "name": "Checking Account",
+        "type": "asset",
+        "subtype": "bank",
+        "parent": "1000",
+    },
+    "1200": {
+        "name": "Savings Account",
+        "type": "asset",
+        "subtype": "bank",
+        "parent": "1000",
+    },
+    "1300": {
+        "name": "Accounts Receivable",
+        "type": "asset",
+        "subtype": "accounts_receivable",
+    },
+    "1400": {"name": "Inventory", "type": "asset", "subtype": "inventory"},
+    "1500": {"name": "Fixed Assets", "type": "asset", "subtype": "fixed_assets"},
+    "2000": {"name": "Current Liabilities", "type": "liability"},
+    "2100": {
+        "name": "Accounts Payable",
+        "type": "liability",
+        "subtype": "accounts_payable",
+        "parent": "2000",
+    },
+    "2200": {
+        "name": "Accrued Expenses",
+        "type": "liability",
+        "subtype": "accrued_liabilities",
+        "parent": "2000",
+    },
+    "2300": {
+        "name": "Long-term Debt",
+        "type": "liability",
+        "subtype": "long_term_debt",
+    },
+    "3000": {"name": "Equity", "type": "equity"},
+    "3100": {
+        "name": "Common Stock",
+        "type": "equity",
+        "subtype": "common_stock",
+        "parent": "3000",
+    },
+    "3200": {
+        "name": "Retained Earnings",
+        "type": "equity",
+        "subtype": "retained_earnings",
+        "parent": "3000",
+    },
+    "4000": {"name": "Revenue", "type": "revenue"},
+    "4100": {
+        "name": "Sales Revenue",
+        "type": "revenue",
+        "subtype": "sales_revenue",
+        "parent": "4000",
+    },
+    "4200": {
+        "name": "Service Revenue",
+        "type": "revenue",
+        "subtype": "service_revenue",
+        "parent": "4000",
+    },
+    "5000": {
+        "name": "Cost of Goods Sold",
+        "type": "expense",
+        "subtype": "cost_of_goods_sold",
+    },
+    "6000": {
+        "name": "Operating Expenses",
+        "type": "expense",
+        "subtype": "operating_expenses",
+    },
+    "6100": {
+        "name": "Salaries and Wages",
+        "type": "expense",
+        "subtype": "operating_expenses",
+        "parent": "6000",
+    },
+    "6200": {
+        "name": "Rent Expense",
+        "type": "expense",
+        "subtype": "operating_expenses",
+        "parent": "6000",
+    },
+    "6300": {
+        "name": "Utilities Expense",
+        "type": "expense",
+        "subtype": "operating_expenses",
+        "parent": "6000",
+    },
+    "7000": {
+        "name": "Interest Expense",
+        "type": "expense",
+        "subtype": "interest_expense",
+    },
+}
+
+
+def chart_template(db_manager: DatabaseManager) -> Dict[str, Dict[str, Any]]:
+    """The active accounts of a ledger in the template shape, parents by code"""
+    rows = db_manager.fetch_all(
+        """
+        SELECT a.account_code, a.name, a.account_type, a.account_subtype,
+               a.currency, a.description, a.is_system,
+               p.account_code AS parent_code
+        FROM accounts a
+        LEFT JOIN accounts p ON p.id = a.parent_account_id
+        WHERE a.is_active = 1
+        ORDER BY a.account_code
+        """
+    )
+    template = {}
+    for row in rows:
+        account = {
+            "name": row["name"],
+            "type": row["account_type"],
+            "subtype": row["account_subtype"],
+            "parent": row["parent_code"],
+            "currency": row["currency"],
+            "description": row["description"],
+            "is_system": bool(row["is_system"]),
+        }
+        template[row["account_code"]] = {
+            key: value for key, value in account.items() if value is not None
+        }
+    return template
+
+
+def provision_chart(
+    db_manager: DatabaseManager,
+    template: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[str]:
+    """Create the accounts of ``template`` (default chart if None) that the
+    ledger lacks; existing codes are left untouched. Returns the codes
+    created."""
+    if template is None:
+        template = DEFAULT_CHART_OF_ACCOUNTS
+    with db_manager.transaction() as conn:
+        existing = {
+            row["account_code"]
+            for row in conn.execute(
+                "SELECT account_code FROM accounts "
+                "WHERE account_code IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(template)),),
+            )
+        }
+        missing = [code for code in template if code not in existing]
+        conn.executemany(
+            "INSERT INTO accounts (account_code, name, account_type, "
+            "account_subtype, currency, description, is_system) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    code,
+                    template[code]["name"],
+                    template[code]["type"],
+                    template[code].get("subtype"),
+                    template[code].get("currency", "USD"),
+                    template[code].get("description"),
+                    template[code].get("is_system", True),
+                )
+                for code in missing
+            ],
+        )
+        # Parents resolve once every new account exists, whatever the order
+        conn.executemany(
+            "UPDATE accounts SET parent_account_id = "
+            "(SELECT id FROM accounts WHERE account_code = ?) WHERE account_code = ?",
+            [
+                (template[code]["parent"], code)
+                for code in missing
+                if template[code].get("parent")
+            ],
+        )
+    return missing
+
+
+def main() -> None:
+    """Provision a ledger: ``python ledger-service/src/chart.py``"""
+    import argparse
+
+    from database.manager import initialize_database
+    from migrations import LEDGER_MIGRATIONS
+
+    parser = argparse.ArgumentParser(description="Provision a chart of accounts")
+    parser.add_argument(
+        "--db",
+        default=os.environ.get(
+            "LEDGER_DB_PATH", os.path.join(_SERVICE_SRC, "database", "app.db")
+        ),
+    )
+    parser.add_argument(
+        "--clone-from", help="ledger database whose chart is copied instead"
+    )
+    args = parser.parse_args()
+
+    template = None
+    if args.clone_from:
+        source = DatabaseManager(args.clone_from)
+        template = chart_template(source)
+        source.close_all_connections()
+    db_manager, migration_manager = initialize_database(args.db)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    created = provision_chart(db_manager, template)
+    print(json.dumps({"created": created}))
+    db_manager.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
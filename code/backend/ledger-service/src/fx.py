@@ -0,0 +1,212 @@
+"""
+In-memory FX rate time series
+Each currency pair's active rate history is held as two sorted numpy arrays
+(day ordinals and rates), loaded from ``exchange_rates`` in one query. The
+rate as of a date is a bisection into the pair's days, and whole arrays of
+amounts or dates convert in one vectorized call. Pairs without a direct
+series fall back to the inverse series, then to a cross rate through the
+base currency.
+
+Other worker processes write rates too, so at most every ``check_seconds``
+a lookup compares ``MAX(id)`` of ``exchange_rates`` with the value seen at
+the last full load and reloads everything when it moved. Every rate change
+inserts a row, so the id is enough to notice one.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from database.manager import DatabaseManager
+from models.user import iso_day
+
+DateLike = Union[str, date, datetime]
+
+_Series = Tuple[np.ndarray, np.ndarray]
+
+
+def _ordinal(value: DateLike) -> int:
+    return date.fromisoformat(iso_day(value)).toordinal()
+
+
+class FxRateCache:
+    """Rate histories per currency pair, refreshed on bulk upload"""
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        base_currency: str = "USD",
+        check_seconds: Optional[float] = None,
+    ):
+        self.db_manager = db_manager
+        self.base_currency = base_currency
+        if check_seconds is None:
+            check_seconds = float(os.getenv("FX_RATE_CHECK_SECONDS", "1"))
+        self.check_seconds = check_seconds
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._loaded = False
+        self._max_id: Optional[int] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _latest_id(self) -> Optional[int]:
+        return self.db_manager.fetch_one(
+            "SELECT MAX(id) AS max_id FROM exchange_rates"
+        )["max_id"]
+
+    def _check_fresh(self) -> None:
+        """Reload if another process stored rates since the last full load"""
+        now = time.monotonic()
+        if not self._loaded or now < self._next_check:
+            return
+        self._next_check = now + self.check_seconds
+        if self._latest_id() != self._max_id:
+            self.load()
+
+    def load(self, pairs: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        """(Re)load the rate histories of ``pairs``, or of every pair"""
+        query = (
+            "SELECT from_currency, to_currency, rate_date, rate FROM exchange_rates "
+            "WHERE is_active = 1"
+        )
+        params: Tuple = ()
+        if not self._loaded:
+            pairs = None
+        max_id = self._latest_id() if pairs is None else None
+        if pairs is not None:
+            pairs = list(pairs)
+            query += (
+                " AND from_currency || '/' || to_currency IN "
+                "(SELECT value FROM json_each(?))"
+            )
+            params = (json.dumps([f"{a}/{b}" for a, b in pairs]),)
+        query += " ORDER BY from_currency, to_currency, rate_date, id"
+        grouped: Dict[Tuple[str, str], Dict[int, float]] = {}
+        for row in self.db_manager.fetch_all(query, params):
+            # Later rows for the same day replace earlier ones
+            grouped.setdefault((row["from_currency"], row["to_currency"]), {})[
+                _ordinal(row["rate_date"])
+            ] = float(row["rate"])
+        series = {
+            pair: (
+                np.fromiter(by_day.keys(), dtype=np.int64, count=len(by_day)),
+                np.fromiter(by_day.values(), dtype=np.float64, count=len(by_day)),
+            )
+            for pair, by_day in grouped.items()
+        }
+        with self._lock:
+            if pairs is None:
+                self._series = series
+                self._max_id = max_id
+                self._next_check = time.monotonic() + self.check_seconds
+            else:
+                updated = dict(self._series)
+                for pair in pairs:
+                    updated.pop(pair, None)
+                updated.update(series)
+                self._series = updated
+            self._loaded = True
+
+    def _pair(self, pair: Tuple[str, str]) -> Optional[_Series]:
+        if not self._loaded:
+            self.load()
+        return self._series.get(pair)
+
+    def _direct(
+        self, from_currency: str, to_currency: str, days: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """Rates of a pair from its own or its inverse series; NaN before
+        the first rate"""
+        for pair, invert in (
+            ((from_currency, to_currency), False),
+            ((to_currency, from_currency), True),
+        ):
+            series = self._pair(pair)
+            if series is None:
+                continue
+            series_days, series_rates = series
+            positions = np.searchsorted(series_days, days, side="right") - 1
+            rates = series_rates[np.maximum(positions, 0)]
+            rates = np.where(positions >= 0, rates, np.nan)
+            return 1.0 / rates if invert else rates
+        return None
+
+    def rates(
+        self, from_currency: str, to_currency: str, dates: Iterable[DateLike]
+    ) -> np.ndarray:
+        """Rates as of each date; raises LookupError if any is unknown"""
+        days = np.fromiter((_ordinal(value) for value in dates), dtype=np.int64)
+        self._check_fresh()
+        if from_currency == to_currency:
+            return np.ones(len(days))
+        rates = self._direct(from_currency, to_currency, days)
+        base = self.base_currency
+        if rates is None and base not in (from_currency, to_currency):
+            to_base = self._direct(from_currency, base, days)
+            from_base = self._direct(base, to_currency, days)
+            if to_base is not None and from_base is not None:
+                rates = to_base * from_base
+        if rates is None or np.isnan(rates).any():
+            raise LookupError(
+                f"No {from_currency}/{to_currency} rate for every requested date"
+            )
+        return rates
+
+    def rate(self, from_currency: str, to_currency: str, as_of: DateLike) -> float:
+        """Rate in effect on ``as_of``: the latest rate dated on or before it"""
+        return float(self.rates(from_currency, to_currency, [as_of])[0])
+
+    def convert(
+        self,
+        amounts: Any,
+        from_currency: str,
+        to_currency: str,
+        as_of: Union[DateLike, Iterable[DateLike]],
+    ) -> np.ndarray:
+        """Convert an array of amounts, at one date or at a date per amount,
+        rounded to cents"""
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if isinstance(as_of, (str, date)):
+            rates = self.rate(from_currency, to_currency, as_of)
+        else:
+            rates = self.rates(from_currency, to_currency, as_of)
+        return np.round(amounts * rates, 2)
+
+    def upload(self, rates: List[Dict[str, Any]], source: str = "manual") -> int:
+        """Store many rates in one transaction and refresh their pairs
+
+        Each rate is a dict of from_currency, to_currency, rate and
+        rate_date; earlier active rates for the same pair and day are
+        deactivated. Returns the number of rates stored.
+        """
+        # The last rate given for a pair and day wins
+        latest = {
+            (rate["from_currency"], rate["to_currency"], iso_day(rate["rate_date"])): (
+                float(rate["rate"])
+            )
+            for rate in rates
+        }
+        rows = [(a, b, rate, day, source) for (a, b, day), rate in latest.items()]
+        with self.db_manager.transaction() as conn:
+            conn.executemany(
+                "UPDATE exchange_rates SET is_active = 0 WHERE from_currency = ? "
+                "AND to_currency = ? AND rate_date = ? AND is_active = 1",
+                [(a, b, day) for a, b, _, day, _ in rows],
+            )
+            conn.executemany(
+                "INSERT INTO exchange_rates (from_currency, to_currency, rate, "
+                "rate_date, source) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        self.refresh({(row[0], row[1]) for row in rows})
+        return len(rows)
+
+    def refresh(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        """Reload changed pairs; a cache not loaded yet stays lazy"""
+        if self._loaded:
+            self.load(pairs)
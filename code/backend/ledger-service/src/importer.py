@@ -0,0 +1,385 @@
+"""
+Bulk journal import
+Streams journal lines from CSV or JSONL, one line per row; consecutive rows
+sharing an ``entry_number`` form one entry. Account codes resolve through a
+map loaded once per import, the amounts of each chunk are checked for
+one-sidedness and balance in a single numpy pass, and the valid entries of
+a chunk are posted in one transaction. Rows that fail validation go to a
+per-row error report and their entry is skipped; the rest of the file
+still imports.
+
+Columns: entry_number, entry_date, description, reference_number, currency,
+account_code, debit_amount, credit_amount, line_description
+
+Usage: python ledger-service/src/importer.py journal.csv [--errors errors.csv]
+"""
+
+import csv
+import json
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_SERVICE_SRC = os.path.dirname(os.path.abspath(__file__))
+_SHARED_DIR = os.path.abspath(os.path.join(_SERVICE_SRC, "..", "..", "shared"))
+for _p in (_SERVICE_SRC, _SHARED_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+from database.manager import DatabaseManager
+from database.outbox import add_outbox_event
+from models.user import DEBIT_NORMAL_TYPES, Account, FinancialPeriod, to_cents
+from utils.message_queue import Queues
+
+ERROR_FIELDS = ("row", "entry_number", "error")
+
+# (row number, row) pairs of one entry
+_Rows = List[Tuple[int, Dict[str, Any]]]
+
+
+def read_rows(stream: IO[str], file_format: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV or JSONL text stream, read lazily"""
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+    elif file_format == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+class JournalImporter:
+    """Validate and post journal entries from a stream of rows
+
+    Entries are collected until a chunk holds ``chunk_size`` lines, then
+    validated and posted together. Posting writes the entries, lines,
+    account balances, daily checkpoints, period rollups and one
+    ``ledger_postings`` event per entry in a single transaction per chunk.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        imported_by: str,
+        chunk_size: Optional[int] = None,
+    ) -> None:
+        self.db_manager = db_manager
+        self.imported_by = imported_by
+        self.chunk_size = chunk_size or int(
+            os.getenv("JOURNAL_IMPORT_CHUNK_LINES", "20000")
+        )
+        self.errors: List[Dict[str, Any]] = []
+        self.stats = {"rows": 0, "entries": 0, "lines": 0, "rejected_entries": 0}
+        self._accounts: Dict[str, Tuple[int, str]] = {}
+        self._closed_through: Optional[Tuple[str, str]] = None
+        self._seen: set = set()
+
+    def run(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Import all rows; returns the summary with the error report"""
+        self._accounts = {
+            row["account_code"]: (row["id"], row["account_type"])
+            for row in self.db_manager.fetch_all(
+                "SELECT id, account_code, account_type FROM accounts"
+            )
+        }
+        with self.db_manager.get_connection() as conn:
+            closed = FinancialPeriod.latest_closed(conn)
+        if closed:
+            self._closed_through = (str(closed["end_date"])[:10], closed["name"])
+        chunk: List[_Rows] = []
+        lines = 0
+        for entry in self._entries(rows):
+            chunk.append(entry)
+            lines += len(entry)
+            if lines >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk, lines = [], 0
+        if chunk:
+            self._import_chunk(chunk)
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.stats, "errors": self.errors}
+
+    def write_errors(self, stream: IO[str]) -> None:
+        """Write the per-row error report as CSV"""
+        writer = csv.DictWriter(stream, fieldnames=ERROR_FIELDS)
+        writer.writeheader()
+        writer.writerows(self.errors)
+
+    def _entries(self, rows: Iterable[Dict[str, Any]]) -> Iterator[_Rows]:
+        """Group consecutive rows by entry number; row numbers start at 1"""
+        entry: _Rows = []
+        for number, row in enumerate(rows, 1):
+            self.stats["rows"] += 1
+            if entry and row.get("entry_number") != entry[0][1].get("entry_number"):
+                yield entry
+                entry = []
+            entry.append((number, row))
+        if entry:
+            yield entry
+
+    def _error(self, number: int, row: Dict[str, Any], message: str) -> None:
+        self.errors.append(
+            {"row": number, "entry_number": row.get("entry_number"), "error": message}
+        )
+
+    def _check_entry(self, entry: _Rows, existing: set) -> Optional[str]:
+        """Entry-level error from the entry's first row, if any"""
+        row = entry[0][1]
+        entry_number = row.get("entry_number")
+        if not entry_number:
+            return "entry_number is required"
+        if entry_number in self._seen or entry_number in existing:
+            return f"Duplicate entry_number {entry_number}"
+        self._seen.add(entry_number)
+        if not row.get("description"):
+            return "description is required"
+        try:
+            day = date.fromisoformat(str(row.get("entry_date"))[:10]).isoformat()
+        except ValueError:
+            return f"Invalid entry_date {row.get('entry_date')!r}"
+        if self._closed_through and day <= self._closed_through[0]:
+            return (
+                f"Entry date {day} is on or before the end of closed "
+                f"period {self._closed_through[1]}"
+            )
+        return None
+
+    def _import_chunk(self, chunk: List[_Rows]) -> None:
+        first_error = len(self.errors)
+        self._validate_and_post(chunk)
+        self.errors[first_error:] = sorted(
+            self.errors[first_error:], key=lambda error: error["row"]
+        )
+
+    def _validate_and_post(self, chunk: List[_Rows]) -> None:
+        numbers = [entry[0][1].get("entry_number") for entry in chunk]
+        existing = {
+            row["entry_number"]
+            for row in self.db_manager.fetch_all(
+                "SELECT entry_number FROM journal_entries WHERE entry_number IN "
+                "(SELECT value FROM json_each(?))",
+                (json.dumps(numbers),),
+            )
+        }
+        rejected = np.zeros(len(chunk), dtype=bool)
+        starts, debits, credits, parsed, account_ids = [], [], [], [], []
+        for index, entry in enumerate(chunk):
+            message = self._check_entry(entry, existing)
+            if message:
+                self._error(entry[0][0], entry[0][1], message)
+                rejected[index] = True
+            starts.append(len(debits))
+            for number, row in entry:
+                account = self._accounts.get(row.get("account_code"))
+                try:
+                    if account is None:
+                        raise ValueError(
+                            f"Unknown account_code {row.get('account_code')!r}"
+                        )
+                    debit = to_cents(row.get("debit_amount"))
+                    credit = to_cents(row.get("credit_amount"))
+                    ok = True
+                except ValueError as e:
+                    self._error(number, row, str(e))
+                    account, debit, credit, ok = (None, None), 0, 0, False
+                account_ids.append(account[0])
+                debits.append(debit)
+                credits.append(credit)
+                parsed.append(ok)
+
+        debit = np.array(debits, dtype=np.int64)
+        credit = np.array(credits, dtype=np.int64)
+        parsed_mask = np.array(parsed, dtype=bool)
+        entry_of_line = np.repeat(
+            np.arange(len(chunk)), np.diff(np.append(starts, len(debits)))
+        )
+        one_sided = (debit >= 0) & (credit >= 0) & ((debit > 0) != (credit > 0))
+        for line in np.flatnonzero(parsed_mask & ~one_sided):
+            entry = chunk[entry_of_line[line]]
+            number, row = entry[line - starts[entry_of_line[line]]]
+            self._error(
+                number,
+                row,
+                "exactly one of debit or credit must be a positive amount",
+            )
+        rejected |= np.logical_or.reduceat(~(parsed_mask & one_sided), starts)
+        total_debit = np.add.reduceat(debit, starts)
+        total_credit = np.add.reduceat(credit, starts)
+        for index in np.flatnonzero(~rejected & (total_debit != total_credit)):
+            self._error(
+                chunk[index][0][0],
+                chunk[index][0][1],
+                f"Debits ({Decimal(int(total_debit[index])) / 100}) do not equal "
+                f"credits ({Decimal(int(total_credit[index])) / 100})",
+            )
+            rejected[index] = True
+
+        accepted = np.flatnonzero(~rejected)
+        self.stats["rejected_entries"] += len(chunk) - len(accepted)
+        if len(accepted):
+            self._post(chunk, accepted, starts, account_ids, debit, credit)
+
+    def _post(
+        self,
+        chunk: List[_Rows],
+        accepted: np.ndarray,
+        starts: List[int],
+        account_ids: List[int],
+        debit: np.ndarray,
+        credit: np.ndarray,
+    ) -> None:
+        posted_at = datetime.utcnow().date().isoformat()
+        account_types = dict(self._accounts.values())
+        balances: Dict[int, int] = {}
+        daily: Dict[Tuple[int, str], int] = {}
+        movements: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        line_rows = []
+        with self.db_manager.transaction() as conn:
+            for index in accepted:
+                entry = chunk[index]
+                head = entry[0][1]
+                day = str(head["entry_date"])[:10]
+                first = starts[index]
+                total = int(debit[first : first + len(entry)].sum()) / 100
+                entry_id = conn.execute(
+                    "INSERT INTO journal_entries (entry_number, description, "
+                    "reference_number, entry_date, posting_date, status, "
+                    "total_debit, total_credit, currency, created_by, posted_by) "
+                    "VALUES (?, ?, ?, ?, ?, 'posted', ?, ?, ?, ?, ?)",
+                    (
+                        head["entry_number"],
+                        head["description"],
+                        head.get("reference_number") or None,
+                        day,
+                        posted_at,
+                        total,
+                        total,
+                        head.get("currency") or "USD",
+                        self.imported_by,
+                        self.imported_by,
+                    ),
+                ).lastrowid
+                day_movements = movements.setdefault(day, {})
+                event_lines = []
+                for line, (_, row) in enumerate(entry, first):
+                    account_id = account_ids[line]
+                    line_debit, line_credit = int(debit[line]), int(credit[line])
+                    change = line_debit - line_credit
+                    if account_types[account_id] not in DEBIT_NORMAL_TYPES:
+                        change = -change
+                    balances[account_id] = balances.get(account_id, 0) + change
+                    daily[(account_id, day)] = daily.get((account_id, day), 0) + change
+                    debits, credits = day_movements.get(account_id, (0, 0))
+                    day_movements[account_id] = (
+                        debits + line_debit,
+                        credits + line_credit,
+                    )
+                    line_rows.append(
+                        (
+                            entry_id,
+                            account_id,
+                            row.get("line_description") or None,
+                            line_debit / 100,
+                            line_credit / 100,
+                            line - first + 1,
+                        )
+                    )
+                    event_lines.append(
+                        {
+                            "account_id": account_id,
+                            "debit_amount": str(line_debit / 100),
+                            "credit_amount": str(line_credit / 100),
+                        }
+                    )
+                add_outbox_event(
+                    conn,
+                    Queues.LEDGER_POSTINGS,
+                    {
+                        "event": "journal_entry_posted",
+                        "journal_entry_id": entry_id,
+                        "entry_number": head["entry_number"],
+                        "posting_date": posted_at,
+                        "posted_by": self.imported_by,
+                        "currency": head.get("currency") or "USD",
+                        "lines": event_lines,
+                    },
+                )
+            conn.executemany(
+                "INSERT INTO journal_entry_lines (journal_entry_id, account_id, "
+                "description, debit_amount, credit_amount, line_number) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                line_rows,
+            )
+            conn.executemany(
+                "UPDATE accounts SET "
+                "current_balance = ROUND(current_balance + ?, 2), "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [(change / 100, account_id) for account_id, change in balances.items()],
+            )
+            Account.record_daily_changes(
+                conn,
+                (
+                    (account_id, day, change / 100)
+                    for (account_id, day), change in daily.items()
+                ),
+            )
+            for day, day_movements in movements.items():
+                FinancialPeriod.record_movements(
+                    conn,
+                    day,
+                    {
+                        account_id: (Decimal(debits) / 100, Decimal(credits) / 100)
+                        for account_id, (debits, credits) in day_movements.items()
+                    },
+                )
+        self.stats["entries"] += len(accepted)
+        self.stats["lines"] += len(line_rows)
+
+
+def main() -> None:
+    """Import a journal file: ``python ledger-service/src/importer.py <file>``"""
+    import argparse
+
+    from database.manager import BaseModel, initialize_database
+    from migrations import LEDGER_MIGRATIONS
+
+    parser = argparse.ArgumentParser(description="Bulk import journal entries")
+    parser.add_argument("path", help="CSV or JSONL file of journal lines")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument(
+        "--db",
+        default=os.environ.get(
+            "LEDGER_DB_PATH", os.path.join(_SERVICE_SRC, "database", "app.db")
+        ),
+    )
+    parser.add_argument("--errors", help="write the per-row error report here")
+    parser.add_argument("--imported-by", default="bulk-import")
+    parser.add_argument("--chunk-size", type=int)
+    args = parser.parse_args()
+    file_format = args.format or ("jsonl" if args.path.endswith(".jsonl") else "csv")
+
+    db_manager, migration_manager = initialize_database(args.db)
+    for version, migration in LEDGER_MIGRATIONS.items():
+        migration_manager.apply_migration(
+            version, migration["description"], migration["sql"]
+        )
+    BaseModel.set_db_manager(db_manager)
+    importer = JournalImporter(db_manager, args.imported_by, args.chunk_size)
+    with open(args.path, newline="") as stream:
+        summary = importer.run(read_rows(stream, file_format))
+    if args.errors:
+        with open(args.errors, "w", newline="") as stream:
+            importer.write_errors(stream)
+    summary["errors"] = len(summary["errors"])
+    print(json.dumps(summary))
+    db_manager.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
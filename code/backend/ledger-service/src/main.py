@@ -1,11 +1,13 @@
+import csv
+import io
 import os
 import sys
 import uuid
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Optional, Tuple
 
-from flask import Flask, g, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 
 # Add this service's src directory (local packages like "models"/"routes")
@@ -17,16 +19,33 @@ for _p in (_SERVICE_SRC, _SHARED_DIR):
     if _p not in sys.path:
         sys.path.insert(0, _p)
 from audit.audit_logger import AuditEventType, AuditSeverity, audit_action, audit_logger
+from chart import chart_template, provision_chart
 from database.manager import BaseModel, initialize_database
+from database.outbox import OutboxRelay
+from fx import FxRateCache
+from importer import JournalImporter, read_rows
 from middleware.auth import require_auth, require_permission
+from migrations import LEDGER_MIGRATIONS
 from models.user import (
     Account,
     ExchangeRate,
+    FinancialPeriod,
     JournalEntry,
     JournalEntryLine,
     Reconciliation,
+    iso_day,
+    to_cents,
 )
 from nexafi_logging.logger import get_logger, setup_request_logging
+from reconciliation import load_book_lines, match_lines, save_matches, statement_lines
+from reports import (
+    close_period,
+    closed_period_report,
+    consolidated_trial_balance,
+    income_statement,
+    stream_balance_sheet,
+    stream_trial_balance,
+)
 from routes.user import ledger_bp
 from validation_schemas.schemas import (
     FinancialValidators,
@@ -49,33 +68,15 @@ logger = get_logger("ledger_service")
 db_path = os.path.join(os.path.dirname(__file__), "database", "app.db")
 os.makedirs(os.path.dirname(db_path), exist_ok=True)
 db_manager, migration_manager = initialize_database(db_path)
-LEDGER_MIGRATIONS = {
-    "011_create_accounts_table": {
-        "description": "Create accounts table with multi-currency support",
-        "sql": "\n        CREATE TABLE IF NOT EXISTS accounts (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            account_code TEXT UNIQUE NOT NULL,\n            name TEXT NOT NULL,\n            account_type TEXT NOT NULL,\n            account_subtype TEXT,\n            parent_account_id INTEGER,\n            currency TEXT NOT NULL DEFAULT 'USD',\n            is_active BOOLEAN DEFAULT 1,\n            is_system BOOLEAN DEFAULT 0,\n            description TEXT,\n            opening_balance DECIMAL(15,2) DEFAULT 0.00,\n            current_balance DECIMAL(15,2) DEFAULT 0.00,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (parent_account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_accounts_code ON accounts(account_code);\n        CREATE INDEX IF NOT EXISTS idx_accounts_type ON accounts(account_type);\n        CREATE INDEX IF NOT EXISTS idx_accounts_parent ON accounts(parent_account_id);\n        ",
-    },
-    "012_create_journal_entries_table": {
-        "description": "Create journal entries table",
-        "sql": "\n        CREATE TABLE IF NOT EXISTS journal_entries (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            entry_number TEXT UNIQUE NOT NULL,\n            description TEXT NOT NULL,\n            reference_number TEXT,\n            entry_date DATE NOT NULL,\n            posting_date DATE,\n            status TEXT NOT NULL DEFAULT 'draft',\n            total_debit DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            total_credit DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            currency TEXT NOT NULL DEFAULT 'USD',\n            exchange_rate DECIMAL(10,6) DEFAULT 1.000000,\n            created_by TEXT,\n            approved_by TEXT,\n            posted_by TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_number ON journal_entries(entry_number);\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_date ON journal_entries(entry_date);\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_status ON journal_entries(status);\n        ",
-    },
-    "013_create_journal_entry_lines_table": {
-        "description": "Create journal entry lines table",
-        "sql": "\n        CREATE TABLE IF NOT EXISTS journal_entry_lines (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            journal_entry_id INTEGER NOT NULL,\n            account_id INTEGER NOT NULL,\n            description TEXT,\n            debit_amount DECIMAL(15,2) DEFAULT 0.00,\n            credit_amount DECIMAL(15,2) DEFAULT 0.00,\n            line_number INTEGER NOT NULL,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (journal_entry_id) REFERENCES journal_entries(id) ON DELETE CASCADE,\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_entry_id ON journal_entry_lines(journal_entry_id);\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_account_id ON journal_entry_lines(account_id);\n        ",
-    },
-    "014_create_exchange_rates_table": {
-        "description": "Create exchange rates table",
-        "sql": "\n        CREATE TABLE IF NOT EXISTS exchange_rates (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            from_currency TEXT NOT NULL,\n            to_currency TEXT NOT NULL,\n            rate DECIMAL(10,6) NOT NULL,\n            rate_date DATE NOT NULL,\n            source TEXT DEFAULT 'manual',\n            is_active BOOLEAN DEFAULT 1,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_exchange_rates_currencies ON exchange_rates(from_currency, to_currency);\n        CREATE INDEX IF NOT EXISTS idx_exchange_rates_date ON exchange_rates(rate_date);\n        ",
-    },
-    "015_create_reconciliations_table": {
-        "description": "Create reconciliations table",
-        "sql": "\n        CREATE TABLE IF NOT EXISTS reconciliations (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            account_id INTEGER NOT NULL,\n            reconciliation_date DATE NOT NULL,\n            statement_balance DECIMAL(15,2) NOT NULL,\n            book_balance DECIMAL(15,2) NOT NULL,\n            difference DECIMAL(15,2) NOT NULL,\n            status TEXT NOT NULL DEFAULT 'pending',\n            reconciled_by TEXT,\n            reconciled_at TIMESTAMP,\n            notes TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_reconciliations_account ON reconciliations(account_id);\n        CREATE INDEX IF NOT EXISTS idx_reconciliations_date ON reconciliations(reconciliation_date);\n        ",
-    },
-}
 for version, migration in LEDGER_MIGRATIONS.items():
     migration_manager.apply_migration(
         version, migration["description"], migration["sql"]
     )
 BaseModel.set_db_manager(db_manager)
+fx_rates = FxRateCache(db_manager)
+outbox_relay = OutboxRelay(db_manager)
+if os.environ.get("OUTBOX_RELAY_ENABLED", "true").lower() == "true":
+    outbox_relay.start()
 # Note: Account, JournalEntry, JournalEntryLine, ExchangeRate, and Reconciliation
 # classes are imported from models.user - no redefinition needed
 
@@ -132,6 +133,15 @@ class ExchangeRateSchema(SanitizationMixin, Schema):
     rate_date = fields.Date(required=False)
 
 
+class ExchangeRateBulkSchema(Schema):
+    rates = fields.List(
+        fields.Nested(ExchangeRateSchema),
+        required=True,
+        validate=validate.Length(min=1, max=50000),
+    )
+    source = fields.Str(required=False, validate=validate.Length(max=50))
+
+
 class ReconciliationSchema(SanitizationMixin, Schema):
     account_id = fields.Int(required=True)
     reconciliation_date = fields.Date(required=True)
@@ -141,128 +151,55 @@ class ReconciliationSchema(SanitizationMixin, Schema):
     notes = fields.Str(required=False, validate=validate.Length(max=1000))
 
 
-DEFAULT_CHART_OF_ACCOUNTS = {
-    "1000": {"name": "Cash and Cash Equivalents", "type": "asset", "subtype": "cash"},
-    "1100": {
-        "name": "Checking Account",
-        "type": "asset",
-        "subtype": "bank",
-        "parent": "1000",
-    },
-    "1200": {
-        "name": "Savings Account",
-        "type": "asset",
-        "subtype": "bank",
-        "parent": "1000",
-    },
-    "1300": {
-        "name": "Accounts Receivable",
-        "type": "asset",
-        "subtype": "accounts_receivable",
-    },
-    "1400": {"name": "Inventory", "type": "asset", "subtype": "inventory"},
-    "1500": {"name": "Fixed Assets", "type": "asset", "subtype": "fixed_assets"},
-    "2000": {"name": "Current Liabilities", "type": "liability"},
-    "2100": {
-        "name": "Accounts Payable",
-        "type": "liability",
-        "subtype": "accounts_payable",
-        "parent": "2000",
-    },
-    "2200": {
-        "name": "Accrued Expenses",
-        "type": "liability",
-        "subtype": "accrued_liabilities",
-        "parent": "2000",
-    },
-    "2300": {
-        "name": "Long-term Debt",
-        "type": "liability",
-        "subtype": "long_term_debt",
-    },
-    "3000": {"name": "Equity", "type": "equity"},
-    "3100": {
-        "name": "Common Stock",
-        "type": "equity",
-        "subtype": "common_stock",
-        "parent": "3000",
-    },
-    "3200": {
-        "name": "Retained Earnings",
-        "type": "equity",
-        "subtype": "retained_earnings",
-        "parent": "3000",
-    },
-    "4000": {"name": "Revenue", "type": "revenue"},
-    "4100": {
-        "name": "Sales Revenue",
-        "type": "revenue",
-        "subtype": "sales_revenue",
-        "parent": "4000",
-    },
-    "4200": {
-        "name": "Service Revenue",
-        "type": "revenue",
-        "subtype": "service_revenue",
-        "parent": "4000",
-    },
-    "5000": {
-        "name": "Cost of Goods Sold",
-        "type": "expense",
-        "subtype": "cost_of_goods_sold",
-    },
-    "6000": {
-        "name": "Operating Expenses",
-        "type": "expense",
-        "subtype": "operating_expenses",
-    },
-    "6100": {
-        "name": "Salaries and Wages",
-        "type": "expense",
-        "subtype": "operating_expenses",
-        "parent": "6000",
-    },
-    "6200": {
-        "name": "Rent Expense",
-        "type": "expense",
-        "subtype": "operating_expenses",
-        "parent": "6000",
-    },
-    "6300": {
-        "name": "Utilities Expense",
-        "type": "expense",
-        "subtype": "operating_expenses",
-        "parent": "6000",
-    },
-    "7000": {
-        "name": "Interest Expense",
-        "type": "expense",
-        "subtype": "interest_expense",
-    },
-}
+class ReconciliationMatchSchema(Schema):
+    statement_lines = fields.List(
+        fields.Dict(), required=True, validate=validate.Length(min=1)
+    )
+    since_date = fields.Date(required=False)
+    amount_tolerance = fields.Decimal(
+        required=False, validate=validate.Range(min=0, max=1000)
+    )
+    date_window_days = fields.Int(
+        required=False, validate=validate.Range(min=0, max=31)
+    )
+    max_group_size = fields.Int(required=False, validate=validate.Range(min=1, max=4))
+
+
+class FinancialPeriodSchema(SanitizationMixin, Schema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    period_type = fields.Str(
+        required=False, validate=validate.OneOf(["month", "quarter", "year"])
+    )
+    start_date = fields.Date(required=True)
+    end_date = fields.Date(required=True)
+
+
+class ChartAccountSchema(SanitizationMixin, Schema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=200))
+    type = fields.Str(
+        required=True,
+        validate=validate.OneOf(["asset", "liability", "equity", "revenue", "expense"]),
+    )
+    subtype = fields.Str(required=False)
+    parent = fields.Str(required=False)
+    currency = fields.Str(
+        required=False, validate=FinancialValidators.validate_currency_code
+    )
+    description = fields.Str(required=False)
+    is_system = fields.Bool(required=False)
+
+
+class ChartProvisionSchema(Schema):
+    accounts = fields.Dict(
+        keys=fields.Str(validate=validate.Length(min=3, max=20)),
+        values=fields.Nested(ChartAccountSchema),
+        required=False,
+    )
 
 
 def initialize_chart_of_accounts() -> object:
     """Initialize default chart of accounts"""
-    for account_code, account_data in DEFAULT_CHART_OF_ACCOUNTS.items():
-        existing = Account.find_one("account_code = ?", (account_code,))
-        if not existing:
-            parent_id = None
-            if "parent" in account_data:
-                parent_account = Account.find_one(
-                    "account_code = ?", (account_data["parent"],)
-                )
-                if parent_account:
-                    parent_id = parent_account.id
-            account = Account(
-                account_code=account_code,
-                name=account_data["name"],
-                account_type=account_data["type"],
-                account_subtype=account_data.get("subtype"),
-                parent_account_id=parent_id,
-                is_system=True,
-            )
-            account.save()
+    return provision_chart(db_manager)
 
 
 @app.route("/api/v1/health", methods=["GET"])
@@ -352,6 +289,31 @@ def create_account() -> object:
     )
 
 
+@app.route("/api/v1/accounts/chart", methods=["GET"])
+@require_auth
+@require_permission("account:read")
+def get_chart_of_accounts() -> object:
+    """The chart of accounts as a provisioning template, to clone a ledger"""
+    return jsonify({"accounts": chart_template(db_manager)})
+
+
+@app.route("/api/v1/accounts/provision", methods=["POST"])
+@require_auth
+@require_permission("account:write")
+@validate_json_request(ChartProvisionSchema)
+@audit_action(
+    AuditEventType.ACCOUNT_CREATE, "chart_provisioned", severity=AuditSeverity.MEDIUM
+)
+def provision_chart_of_accounts() -> object:
+    """Create the missing accounts of the default chart, or of a given one"""
+    data = request.validated_data  # type: ignore[attr-defined]
+    created = provision_chart(db_manager, data.get("accounts"))
+    return (
+        jsonify({"created": created, "total": len(created)}),
+        201 if created else 200,
+    )
+
+
 @app.route("/api/v1/accounts/<int:account_id>/balance", methods=["GET"])
 @require_auth
 @require_permission("account:read")
@@ -485,6 +447,43 @@ def create_journal_entry() -> object:
     )
 
 
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+}
+
+
+@app.route("/api/v1/journal-entries/import", methods=["POST"])
+@require_auth
+@require_permission("transaction:write")
+@audit_action(
+    AuditEventType.JOURNAL_ENTRY_CREATE,
+    "journal_entries_imported",
+    severity=AuditSeverity.HIGH,
+)
+def import_journal_entries() -> object:
+    """Bulk import and post journal entries from a CSV or JSONL body
+
+    The body is read as a stream; the response holds the import counts and
+    the per-row error report.
+    """
+    file_format = request.args.get("format") or IMPORT_FORMATS.get(request.mimetype)
+    if file_format not in ("csv", "jsonl"):
+        return (jsonify({"error": "Body must be CSV or JSONL"}), 415)
+    importer = JournalImporter(db_manager, g.current_user["user_id"])
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        summary = importer.run(read_rows(stream, file_format))
+    except (ValueError, csv.Error) as e:
+        return (
+            jsonify({"error": "Unreadable import file", "details": str(e)}),
+            400,
+        )
+    outbox_relay.notify()
+    return (jsonify(summary), 200)
+
+
 @app.route("/api/v1/journal-entries/<int:entry_id>/post", methods=["POST"])
 @require_auth
 @require_permission("transaction:write")
@@ -506,7 +505,7 @@ def post_journal_entry(entry_id: object) -> object:
             {
                 "message": "Journal entry posted successfully",
                 "entry_number": entry.entry_number,
-                "posting_date": entry.posting_date.isoformat(),
+                "posting_date": entry.posting_date,
             }
         )
     except ValueError as e:
@@ -544,6 +543,7 @@ def update_exchange_rate() -> object:
         source="manual",
     )
     exchange_rate.save()
+    fx_rates.refresh([(data["from_currency"], data["to_currency"])])
     audit_logger.log_event(
         AuditEventType.SYSTEM_CONFIG_CHANGE,
         "exchange_rate_updated",
@@ -568,6 +568,28 @@ def update_exchange_rate() -> object:
     )
 
 
+@app.route("/api/v1/exchange-rates/bulk", methods=["POST"])
+@require_auth
+@require_permission("account:write")
+@validate_json_request(ExchangeRateBulkSchema)
+@audit_action(
+    AuditEventType.SYSTEM_CONFIG_CHANGE,
+    "exchange_rates_uploaded",
+    severity=AuditSeverity.MEDIUM,
+)
+def upload_exchange_rates() -> object:
+    """Store many exchange rates in one transaction"""
+    data = request.validated_data  # type: ignore[attr-defined]
+    today = datetime.utcnow().date()
+    for rate in data["rates"]:
+        rate.setdefault("rate_date", today)
+    stored = fx_rates.upload(data["rates"], source=data.get("source", "bulk"))
+    return (
+        jsonify({"message": "Exchange rates uploaded successfully", "count": stored}),
+        201,
+    )
+
+
 @app.route("/api/v1/reconciliations", methods=["POST"])
 @require_auth
 @require_permission("account:write")
@@ -627,64 +649,104 @@ def create_reconciliation() -> object:
     )
 
 
+def _requested_period() -> Tuple[Optional[FinancialPeriod], Optional[object]]:
+    """Financial period named by the ``period_id`` query argument, or an error"""
+    period_id = request.args.get("period_id")
+    if not period_id:
+        return None, None
+    period = FinancialPeriod.find_by_id(period_id)
+    if not period:
+        return None, (jsonify({"error": "Financial period not found"}), 404)
+    return period, None
+
+
+@app.route("/api/v1/reconciliations/<int:reconciliation_id>/match", methods=["POST"])
+@require_auth
+@require_permission("account:write")
+@validate_json_request(ReconciliationMatchSchema)
+@audit_action(
+    AuditEventType.ACCOUNT_UPDATE,
+    "reconciliation_matched",
+    severity=AuditSeverity.MEDIUM,
+)
+def match_reconciliation(reconciliation_id: int) -> object:
+    """Match bank statement lines to the account's journal lines
+
+    Matched groups are recorded against the reconciliation; suspects and
+    unmatched lines are returned for review.
+    """
+    data = request.validated_data  # type: ignore[attr-defined]
+    reconciliation = Reconciliation.find_by_id(reconciliation_id)
+    if not reconciliation:
+        return (jsonify({"error": "Reconciliation not found"}), 404)
+    try:
+        statement = statement_lines(data["statement_lines"])
+        tolerance = to_cents(data.get("amount_tolerance", 0))
+    except ValueError as e:
+        return (jsonify({"error": str(e)}), 400)
+    book = load_book_lines(
+        db_manager,
+        reconciliation.account_id,
+        reconciliation.reconciliation_date,
+        data.get("since_date"),
+    )
+    result = match_lines(
+        statement,
+        book,
+        amount_tolerance=tolerance,
+        date_window_days=data.get("date_window_days", 3),
+        max_group_size=data.get("max_group_size", 3),
+    )
+    save_matches(db_manager, reconciliation_id, result["matched"])
+    result["summary"] = {
+        "statement_lines": len(statement),
+        "journal_lines": len(book),
+        "matched": len(result["matched"]),
+        "suspect": len(result["suspect"]),
+        "unmatched_statement_lines": len(result["unmatched_statement_line_ids"]),
+        "unmatched_journal_lines": len(result["unmatched_journal_line_ids"]),
+    }
+    return (jsonify(result), 200)
+
+
 @app.route("/api/v1/reports/trial-balance", methods=["GET"])
 @require_auth
 @require_permission("report:read")
 def trial_balance() -> object:
     """Generate trial balance report"""
     as_of_date_str = request.args.get("as_of_date")
-    as_of_date: Optional[datetime] = None
     currency = request.args.get("currency", "USD")
-    if as_of_date_str:
+    period, error = _requested_period()
+    if error:
+        return error
+    if period and period.status == "closed":
+        return Response(
+            closed_period_report(
+                db_manager, period.to_dict(), "trial_balance", currency
+            ),
+            mimetype="application/json",
+        )
+    if period:
+        as_of_date = datetime.fromisoformat(iso_day(period.end_date))
+    elif as_of_date_str:
         try:
             as_of_date = datetime.fromisoformat(as_of_date_str)
         except ValueError:
             return (jsonify({"error": "Invalid date format"}), 400)
     else:
         as_of_date = datetime.utcnow()
-    accounts = Account.find_all(
-        "is_active = 1 AND currency = ? ORDER BY account_code", (currency,)
-    )
-    trial_balance_data = []
-    total_debits = Decimal("0")
-    total_credits = Decimal("0")
-    for account in accounts:
-        balance = account.get_balance(as_of_date)
-        if balance != 0:
-            if account.account_type in ["asset", "expense"]:
-                debit_balance = balance if balance > 0 else Decimal("0")
-                credit_balance = abs(balance) if balance < 0 else Decimal("0")
-            else:
-                debit_balance = abs(balance) if balance < 0 else Decimal("0")
-                credit_balance = balance if balance > 0 else Decimal("0")
-            trial_balance_data.append(
-                {
-                    "account_code": account.account_code,
-                    "account_name": account.name,
-                    "account_type": account.account_type,
-                    "debit_balance": str(debit_balance),
-                    "credit_balance": str(credit_balance),
-                }
+    reporting_currency = request.args.get("reporting_currency")
+    if reporting_currency:
+        try:
+            report = consolidated_trial_balance(
+                db_manager, fx_rates, as_of_date, reporting_currency
             )
-            total_debits += debit_balance
-            total_credits += credit_balance
-    return jsonify(
-        {
-            "report_type": "trial_balance",
-            "as_of_date": (
-                as_of_date.isoformat()
-                if isinstance(as_of_date, datetime)
-                else as_of_date
-            ),
-            "currency": currency,
-            "accounts": trial_balance_data,
-            "totals": {
-                "total_debits": str(total_debits),
-                "total_credits": str(total_credits),
-                "difference": str(total_debits - total_credits),
-            },
-            "is_balanced": total_debits == total_credits,
-        }
+        except LookupError as e:
+            return (jsonify({"error": str(e)}), 422)
+        return (jsonify(report), 200)
+    return Response(
+        stream_with_context(stream_trial_balance(db_manager, as_of_date, currency)),
+        mimetype="application/json",
     )
 
 
@@ -694,65 +756,126 @@ def trial_balance() -> object:
 def balance_sheet() -> object:
     """Generate balance sheet report"""
     as_of_date_str = request.args.get("as_of_date")
-    as_of_date: Optional[datetime] = None
     currency = request.args.get("currency", "USD")
-    if as_of_date_str:
+    period, error = _requested_period()
+    if error:
+        return error
+    if period and period.status == "closed":
+        return Response(
+            closed_period_report(
+                db_manager, period.to_dict(), "balance_sheet", currency
+            ),
+            mimetype="application/json",
+        )
+    if period:
+        as_of_date = datetime.fromisoformat(iso_day(period.end_date))
+    elif as_of_date_str:
         try:
             as_of_date = datetime.fromisoformat(as_of_date_str)
         except ValueError:
             return (jsonify({"error": "Invalid date format"}), 400)
     else:
         as_of_date = datetime.utcnow()
-    assets = Account.find_all(
-        "account_type = 'asset' AND is_active = 1 AND currency = ? ORDER BY account_code",
-        (currency,),
-    )
-    liabilities = Account.find_all(
-        "account_type = 'liability' AND is_active = 1 AND currency = ? ORDER BY account_code",
-        (currency,),
-    )
-    equity = Account.find_all(
-        "account_type = 'equity' AND is_active = 1 AND currency = ? ORDER BY account_code",
-        (currency,),
-    )
-
-    def format_accounts(accounts_list):
-        formatted = []
-        total = Decimal("0")
-        for account in accounts_list:
-            balance = account.get_balance(as_of_date)
-            if balance != 0:
-                formatted.append(
-                    {
-                        "account_code": account.account_code,
-                        "account_name": account.name,
-                        "balance": str(balance),
-                    }
-                )
-                total += balance
-        return (formatted, total)
+    return Response(
+        stream_with_context(stream_balance_sheet(db_manager, as_of_date, currency)),
+        mimetype="application/json",
+    )
 
-    assets_data, total_assets = format_accounts(assets)
-    liabilities_data, total_liabilities = format_accounts(liabilities)
-    equity_data, total_equity = format_accounts(equity)
-    return jsonify(
-        {
-            "report_type": "balance_sheet",
-            "as_of_date": (
-                as_of_date.isoformat()
-                if isinstance(as_of_date, datetime)
-                else as_of_date
+
+@app.route("/api/v1/financial-periods", methods=["GET"])
+@require_auth
+@require_permission("report:read")
+def get_financial_periods() -> object:
+    """List financial periods"""
+    periods = FinancialPeriod.find_all("1=1 ORDER BY start_date, id")
+    return (jsonify({"periods": [period.to_dict() for period in periods]}), 200)
+
+
+@app.route("/api/v1/financial-periods", methods=["POST"])
+@require_auth
+@require_permission("account:write")
+@validate_json_request(FinancialPeriodSchema)
+def create_financial_period() -> object:
+    """Create a financial period and build its rollup from posted entries"""
+    data = request.validated_data  # type: ignore[attr-defined]
+    if data["start_date"] > data["end_date"]:
+        return (jsonify({"error": "start_date must not be after end_date"}), 400)
+    period = FinancialPeriod(
+        name=data["name"],
+        period_type=data.get("period_type", "month"),
+        start_date=data["start_date"].isoformat(),
+        end_date=data["end_date"].isoformat(),
+    ).save()
+    period.rebuild_totals()
+    return (
+        jsonify(
+            {
+                "message": "Financial period created successfully",
+                "period": FinancialPeriod.find_by_id(period.id).to_dict(),
+            }
+        ),
+        201,
+    )
+
+
+@app.route("/api/v1/financial-periods/<int:period_id>/close", methods=["POST"])
+@require_auth
+@require_permission("account:write")
+@audit_action(
+    AuditEventType.ACCOUNT_UPDATE,
+    "financial_period_closed",
+    severity=AuditSeverity.HIGH,
+)
+def close_financial_period(period_id: int) -> object:
+    """Close a financial period, snapshotting balances and caching its reports"""
+    period = FinancialPeriod.find_by_id(period_id)
+    if not period:
+        return (jsonify({"error": "Financial period not found"}), 404)
+    try:
+        close_period(db_manager, period, g.current_user["user_id"])
+    except ValueError as e:
+        return (jsonify({"error": str(e)}), 409)
+    return (
+        jsonify(
+            {
+                "message": "Financial period closed successfully",
+                "period": FinancialPeriod.find_by_id(period_id).to_dict(),
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/api/v1/reports/income-statement", methods=["GET"])
+@require_auth
+@require_permission("report:read")
+def get_income_statement() -> object:
+    """Generate income statement for a financial period"""
+    currency = request.args.get("currency", "USD")
+    period, error = _requested_period()
+    if error:
+        return error
+    if not period:
+        return (jsonify({"error": "period_id is required"}), 400)
+    compare_period = None
+    compare_period_id = request.args.get("compare_period_id")
+    if not compare_period_id and period.status == "closed":
+        return Response(
+            closed_period_report(
+                db_manager, period.to_dict(), "income_statement", currency
             ),
-            "currency": currency,
-            "assets": {"accounts": assets_data, "total": str(total_assets)},
-            "liabilities": {
-                "accounts": liabilities_data,
-                "total": str(total_liabilities),
-            },
-            "equity": {"accounts": equity_data, "total": str(total_equity)},
-            "total_liabilities_and_equity": str(total_liabilities + total_equity),
-            "is_balanced": total_assets == total_liabilities + total_equity,
-        }
+            mimetype="application/json",
+        )
+    if compare_period_id:
+        compare_period = FinancialPeriod.find_by_id(compare_period_id)
+        if not compare_period:
+            return (jsonify({"error": "Comparison period not found"}), 404)
+        compare_period = compare_period.to_dict()
+    return (
+        jsonify(
+            income_statement(db_manager, period.to_dict(), compare_period, currency)
+        ),
+        200,
     )
 
 
@@ -0,0 +1,42 @@
+LEDGER_MIGRATIONS = {
+    "011_create_accounts_table": {
+        "description": "Create accounts table with multi-currency support",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS accounts (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            account_code TEXT UNIQUE NOT NULL,\n            name TEXT NOT NULL,\n            account_type TEXT NOT NULL,\n            account_subtype TEXT,\n            parent_account_id INTEGER,\n            currency TEXT NOT NULL DEFAULT 'USD',\n            is_active BOOLEAN DEFAULT 1,\n            is_system BOOLEAN DEFAULT 0,\n            description TEXT,\n            opening_balance DECIMAL(15,2) DEFAULT 0.00,\n            current_balance DECIMAL(15,2) DEFAULT 0.00,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (parent_account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_accounts_code ON accounts(account_code);\n        CREATE INDEX IF NOT EXISTS idx_accounts_type ON accounts(account_type);\n        CREATE INDEX IF NOT EXISTS idx_accounts_parent ON accounts(parent_account_id);\n        ",
+    },
+    "012_create_journal_entries_table": {
+        "description": "Create journal entries table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS journal_entries (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            entry_number TEXT UNIQUE NOT NULL,\n            description TEXT NOT NULL,\n            reference_number TEXT,\n            entry_date DATE NOT NULL,\n            posting_date DATE,\n            status TEXT NOT NULL DEFAULT 'draft',\n            total_debit DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            total_credit DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            currency TEXT NOT NULL DEFAULT 'USD',\n            exchange_rate DECIMAL(10,6) DEFAULT 1.000000,\n            created_by TEXT,\n            approved_by TEXT,\n            posted_by TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_number ON journal_entries(entry_number);\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_date ON journal_entries(entry_date);\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_status ON journal_entries(status);\n        ",
+    },
+    "013_create_journal_entry_lines_table": {
+        "description": "Create journal entry lines table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS journal_entry_lines (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            journal_entry_id INTEGER NOT NULL,\n            account_id INTEGER NOT NULL,\n            description TEXT,\n            debit_amount DECIMAL(15,2) DEFAULT 0.00,\n            credit_amount DECIMAL(15,2) DEFAULT 0.00,\n            line_number INTEGER NOT NULL,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (journal_entry_id) REFERENCES journal_entries(id) ON DELETE CASCADE,\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_entry_id ON journal_entry_lines(journal_entry_id);\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_account_id ON journal_entry_lines(account_id);\n        ",
+    },
+    "014_create_exchange_rates_table": {
+        "description": "Create exchange rates table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS exchange_rates (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            from_currency TEXT NOT NULL,\n            to_currency TEXT NOT NULL,\n            rate DECIMAL(10,6) NOT NULL,\n            rate_date DATE NOT NULL,\n            source TEXT DEFAULT 'manual',\n            is_active BOOLEAN DEFAULT 1,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_exchange_rates_currencies ON exchange_rates(from_currency, to_currency);\n        CREATE INDEX IF NOT EXISTS idx_exchange_rates_date ON exchange_rates(rate_date);\n        ",
+    },
+    "015_create_reconciliations_table": {
+        "description": "Create reconciliations table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS reconciliations (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            account_id INTEGER NOT NULL,\n            reconciliation_date DATE NOT NULL,\n            statement_balance DECIMAL(15,2) NOT NULL,\n            book_balance DECIMAL(15,2) NOT NULL,\n            difference DECIMAL(15,2) NOT NULL,\n            status TEXT NOT NULL DEFAULT 'pending',\n            reconciled_by TEXT,\n            reconciled_at TIMESTAMP,\n            notes TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_reconciliations_account ON reconciliations(account_id);\n        CREATE INDEX IF NOT EXISTS idx_reconciliations_date ON reconciliations(reconciliation_date);\n        ",
+    },
+    "016_create_account_daily_balances_table": {
+        "description": "Create per-account daily balance checkpoints",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS account_daily_balances (\n            account_id INTEGER NOT NULL,\n            balance_date DATE NOT NULL,\n            net_change DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            closing_balance DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            PRIMARY KEY (account_id, balance_date),\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        ) WITHOUT ROWID;\n\n        INSERT OR REPLACE INTO account_daily_balances\n            (account_id, balance_date, net_change, closing_balance)\n        SELECT account_id, balance_date, net_change,\n               ROUND(SUM(net_change) OVER (\n                   PARTITION BY account_id ORDER BY balance_date\n               ), 2)\n        FROM (\n            SELECT l.account_id, DATE(e.entry_date) AS balance_date,\n                   ROUND(SUM(CASE WHEN a.account_type IN ('asset', 'expense')\n                                  THEN l.debit_amount - l.credit_amount\n                                  ELSE l.credit_amount - l.debit_amount END), 2)\n                       AS net_change\n            FROM journal_entry_lines l\n            JOIN journal_entries e ON e.id = l.journal_entry_id\n            JOIN accounts a ON a.id = l.account_id\n            WHERE e.status = 'posted'\n            GROUP BY l.account_id, DATE(e.entry_date)\n        );\n        ",
+    },
+    "017_create_financial_period_tables": {
+        "description": "Create financial periods and per-period account rollups",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS financial_periods (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            name TEXT NOT NULL,\n            period_type TEXT NOT NULL DEFAULT 'month',\n            start_date DATE NOT NULL,\n            end_date DATE NOT NULL,\n            status TEXT NOT NULL DEFAULT 'open',\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_financial_periods_dates ON financial_periods(start_date, end_date);\n\n        CREATE TABLE IF NOT EXISTS account_period_totals (\n            period_id INTEGER NOT NULL,\n            account_id INTEGER NOT NULL,\n            debit_total DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            credit_total DECIMAL(15,2) NOT NULL DEFAULT 0.00,\n            PRIMARY KEY (period_id, account_id),\n            FOREIGN KEY (period_id) REFERENCES financial_periods(id) ON DELETE CASCADE,\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        ) WITHOUT ROWID;\n        ",
+    },
+    "018_create_period_close_tables": {
+        "description": "Add period close snapshots and closed-period report cache",
+        "sql": "\n        ALTER TABLE financial_periods ADD COLUMN closed_at TIMESTAMP;\n\n        ALTER TABLE financial_periods ADD COLUMN closed_by TEXT;\n\n        CREATE TABLE IF NOT EXISTS period_balance_snapshots (\n            period_id INTEGER NOT NULL,\n            account_id INTEGER NOT NULL,\n            closing_balance DECIMAL(15,2) NOT NULL,\n            PRIMARY KEY (period_id, account_id),\n            FOREIGN KEY (period_id) REFERENCES financial_periods(id),\n            FOREIGN KEY (account_id) REFERENCES accounts(id)\n        ) WITHOUT ROWID;\n\n        CREATE TABLE IF NOT EXISTS period_report_cache (\n            period_id INTEGER NOT NULL,\n            report_type TEXT NOT NULL,\n            currency TEXT NOT NULL,\n            payload TEXT NOT NULL,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            PRIMARY KEY (period_id, report_type, currency),\n            FOREIGN KEY (period_id) REFERENCES financial_periods(id)\n        ) WITHOUT ROWID;\n        ",
+    },
+    "019_create_reconciliation_matches_table": {
+        "description": "Create matched statement and journal lines of reconciliations",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS reconciliation_matches (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            reconciliation_id INTEGER NOT NULL,\n            group_id INTEGER NOT NULL,\n            statement_line_id TEXT,\n            journal_entry_line_id INTEGER,\n            match_type TEXT NOT NULL,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n            FOREIGN KEY (reconciliation_id) REFERENCES reconciliations(id),\n            FOREIGN KEY (journal_entry_line_id) REFERENCES journal_entry_lines(id)\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_reconciliation_matches_reconciliation ON reconciliation_matches(reconciliation_id);\n        CREATE UNIQUE INDEX IF NOT EXISTS idx_reconciliation_matches_line ON reconciliation_matches(journal_entry_line_id);\n        ",
+    },
+    "020_create_journal_listing_indexes": {
+        "description": "Index journal entries and lines for keyset-paginated listing",
+        "sql": "\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_status_date ON journal_entries(status, entry_date);\n        CREATE INDEX IF NOT EXISTS idx_journal_entries_creator_date ON journal_entries(created_by, entry_date);\n\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_entry_line ON journal_entry_lines(journal_entry_id, line_number);\n        DROP INDEX IF EXISTS idx_journal_lines_entry_id;\n\n        CREATE INDEX IF NOT EXISTS idx_journal_lines_account_entry ON journal_entry_lines(account_id, journal_entry_id);\n        DROP INDEX IF EXISTS idx_journal_lines_account_id;\n        ",
+    },
+}
@@ -1,13 +1,67 @@
 # The concrete models below use the real shared BaseModel, which resolves
 # table_name on the calling subclass and shares the configured db_manager.
+import base64
+import json
 import os
+import sqlite3
 import sys
-from datetime import datetime
-from decimal import Decimal
-from typing import Optional
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "shared"))
 from database.manager import BaseModel
+from database.outbox import add_outbox_event
+from utils.message_queue import Queues
+
+# Account types whose balance grows with debits; the others grow with credits
+DEBIT_NORMAL_TYPES = ("asset", "expense")
+
+# Balance of account ``a`` at the end of the day bound to the ``?``: the
+# opening balance plus the latest daily checkpoint on or before that day
+BALANCE_AS_OF_SQL = """ROUND(COALESCE(a.opening_balance, 0) + COALESCE((
+    SELECT d.closing_balance FROM account_daily_balances d
+    WHERE d.account_id = a.id AND d.balance_date <= ?
+    ORDER BY d.balance_date DESC LIMIT 1
+), 0), 2)"""
+
+
+def iso_day(value: Union[str, date, datetime]) -> str:
+    """ISO day (YYYY-MM-DD) of a date, datetime or ISO string"""
+    if isinstance(value, date):
+        return value.isoformat()[:10]
+    return str(value)[:10]
+
+
+def to_cents(value: Any) -> int:
+    """Amount in integer cents; raises ValueError for anything else"""
+    if value in (None, ""):
+        return 0
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {value!r}")
+    if not amount.is_finite() or amount.as_tuple().exponent < -2:
+        raise ValueError(f"Invalid amount {value!r}")
+    return int(amount * 100)
+
+
+def encode_cursor(entry_date: Any, entry_id: int) -> str:
+    """Opaque page cursor for the (entry_date, id) keyset"""
+    raw = json.dumps([str(entry_date), entry_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(entry_date, id) of a cursor; raises ValueError if it is not one"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        entry_date, entry_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(entry_date, str) or not isinstance(entry_id, int):
+        raise ValueError("Invalid cursor")
+    return entry_date, entry_id
 
 
 class Account(BaseModel):
@@ -17,7 +71,122 @@ class Account(BaseModel):
         """Calculate account balance as of a specific date"""
         if as_of_date is None:
             return Decimal(str(self.current_balance))
-        return Decimal(str(self.current_balance))
+        return Account.balances_as_of(as_of_date, "id = ?", (self.id,)).get(
+            self.id, Decimal("0")
+        )
+
+    @classmethod
+    def balances_as_of(
+        cls,
+        as_of_date: Union[date, datetime],
+        where_clause: str = "",
+        params: Tuple = (),
+    ) -> Dict[int, Decimal]:
+        """Balances at the end of ``as_of_date`` for the matching accounts
+
+        Each account's balance is its opening balance plus the closing
+        balance of its latest ``account_daily_balances`` checkpoint on or
+        before the date, one index seek per account however long the
+        journal is.
+        """
+        query = f"SELECT a.id, {BALANCE_AS_OF_SQL} AS balance FROM accounts a"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        rows = cls.db_manager.execute_query(
+            query, (iso_day(as_of_date),) + tuple(params)
+        )
+        return {row["id"]: Decimal(str(row["balance"])) for row in rows}
+
+    @staticmethod
+    def record_daily_change(
+        conn: sqlite3.Connection, account_id: int, day: str, change: Decimal
+    ) -> None:
+        """Fold a posting into the account's daily checkpoints
+
+        Runs inside the posting transaction. The day's row is created from
+        the previous checkpoint if needed; back-dated postings also carry
+        forward into the later checkpoints of the account.
+        """
+        change = float(change)
+        updated = conn.execute(
+            "UPDATE account_daily_balances SET "
+            "net_change = ROUND(net_change + ?, 2), "
+            "closing_balance = ROUND(closing_balance + ?, 2) "
+            "WHERE account_id = ? AND balance_date = ?",
+            (change, change, account_id, day),
+        ).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO account_daily_balances "
+                "(account_id, balance_date, net_change, closing_balance) "
+                "SELECT ?, ?, ?, ROUND(COALESCE(("
+                "  SELECT closing_balance FROM account_daily_balances "
+                "  WHERE account_id = ? AND balance_date < ? "
+                "  ORDER BY balance_date DESC LIMIT 1"
+                "), 0) + ?, 2)",
+                (account_id, day, change, account_id, day, change),
+            )
+        conn.execute(
+            "UPDATE account_daily_balances SET "
+            "closing_balance = ROUND(closing_balance + ?, 2) "
+            "WHERE account_id = ? AND balance_date > ?",
+            (change, account_id, day),
+        )
+
+    @staticmethod
+    def record_daily_changes(
+        conn: sqlite3.Connection, changes: Iterable[Tuple[int, str, float]]
+    ) -> None:
+        """Fold many (account_id, day, change) postings into the checkpoints
+
+        Set-based form of ``record_daily_change`` for bulk posting: the
+        changes are staged in a temp table, added to the days' net changes,
+        and the closing balances of each account are recomputed with one
+        running sum from its earliest changed day.
+        """
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS staged_daily_changes "
+            "(account_id INTEGER, balance_date DATE, change REAL)"
+        )
+        conn.executemany("INSERT INTO staged_daily_changes VALUES (?, ?, ?)", changes)
+        conn.execute(
+            """
+            INSERT INTO account_daily_balances
+                (account_id, balance_date, net_change, closing_balance)
+            SELECT account_id, balance_date, ROUND(SUM(change), 2), 0
+            FROM staged_daily_changes WHERE true
+            GROUP BY account_id, balance_date
+            ON CONFLICT (account_id, balance_date) DO UPDATE SET
+                net_change = ROUND(net_change + excluded.net_change, 2)
+            """
+        )
+        conn.execute(
+            """
+            WITH changed AS MATERIALIZED (
+                SELECT account_id, MIN(balance_date) AS first_day
+                FROM staged_daily_changes GROUP BY account_id
+            ),
+            running AS (
+                SELECT d.account_id, d.balance_date,
+                       ROUND(COALESCE((
+                           SELECT p.closing_balance FROM account_daily_balances p
+                           WHERE p.account_id = c.account_id
+                             AND p.balance_date < c.first_day
+                           ORDER BY p.balance_date DESC LIMIT 1
+                       ), 0) + SUM(d.net_change) OVER (
+                           PARTITION BY d.account_id ORDER BY d.balance_date
+                       ), 2) AS closing_balance
+                FROM changed c
+                JOIN account_daily_balances d
+                  ON d.account_id = c.account_id AND d.balance_date >= c.first_day
+            )
+            UPDATE account_daily_balances SET closing_balance = r.closing_balance
+            FROM running r
+            WHERE account_daily_balances.account_id = r.account_id
+              AND account_daily_balances.balance_date = r.balance_date
+            """
+        )
+        conn.execute("DELETE FROM staged_daily_changes")
 
     def to_dict(self) -> object:
         data = super().to_dict()
@@ -29,6 +198,190 @@ class Account(BaseModel):
 class JournalEntry(BaseModel):
     table_name: Optional[str] = "journal_entries"
 
+    def get_lines(self) -> List["JournalEntryLine"]:
+        return JournalEntryLine.find_all(
+            "journal_entry_id = ? ORDER BY line_number", (self.id,)
+        )
+
+    @classmethod
+    def list_page(
+        cls,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        start_date: Optional[Union[str, date]] = None,
+        end_date: Optional[Union[str, date]] = None,
+        account_id: Optional[int] = None,
+        created_by: Optional[str] = None,
+        include_lines: bool = False,
+    ) -> Dict[str, Any]:
+        """One page of entries as ``to_dict`` output, newest first, and the
+        cursor of the next
+
+        Pages are keyed on (entry_date, id) rather than an offset, so each
+        one is a single range scan of the status, creator or date index
+        however deep it is. The account filter probes the covering
+        (account_id, journal_entry_id) line index, and the lines of the
+        whole page are loaded with one query.
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        if status:
+            conditions.append("e.status = ?")
+            params.append(status)
+        if created_by:
+            conditions.append("e.created_by = ?")
+            params.append(created_by)
+        if start_date:
+            conditions.append("e.entry_date >= ?")
+            params.append(iso_day(start_date))
+        if end_date:
+            # entry_date may carry a time, so bound by the next day
+            next_day = date.fromisoformat(iso_day(end_date)) + timedelta(days=1)
+            conditions.append("e.entry_date < ?")
+            params.append(next_day.isoformat())
+        if account_id is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM journal_entry_lines l "
+                "WHERE l.account_id = ? AND l.journal_entry_id = e.id)"
+            )
+            params.append(account_id)
+        if cursor:
+            conditions.append("(e.entry_date, e.id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        query = "SELECT e.* FROM journal_entries e"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY e.entry_date DESC, e.id DESC LIMIT ?"
+        rows = cls.db_manager.fetch_all(query, tuple(params) + (limit + 1,))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["entry_date"], rows[-1]["id"])
+        entries = [cls(**row).to_dict(include_lines=include_lines) for row in rows]
+        if include_lines:
+            by_id = {entry["id"]: entry for entry in entries}
+            lines = cls.db_manager.fetch_all(
+                "SELECT * FROM journal_entry_lines "
+                "WHERE journal_entry_id IN (SELECT value FROM json_each(?)) "
+                "ORDER BY journal_entry_id, line_number",
+                (json.dumps(list(by_id)),),
+            )
+            for line in lines:
+                by_id[line["journal_entry_id"]]["lines"].append(
+                    JournalEntryLine(**line).to_dict()
+                )
+        return {"journal_entries": entries, "next_cursor": next_cursor}
+
+    def validate_entry(self) -> Tuple[bool, str]:
+        """Check the entry has lines, one-sided amounts and balances"""
+        lines = self.get_lines()
+        if not lines:
+            return (False, "Journal entry must have at least one line")
+        total_debit = Decimal("0")
+        total_credit = Decimal("0")
+        for line in lines:
+            debit = Decimal(str(line.debit_amount or 0))
+            credit = Decimal(str(line.credit_amount or 0))
+            if (debit > 0) == (credit > 0) or debit < 0 or credit < 0:
+                return (
+                    False,
+                    f"Line {line.line_number}: exactly one of debit or credit "
+                    f"must be a positive amount",
+                )
+            total_debit += debit
+            total_credit += credit
+        if total_debit != total_credit:
+            return (
+                False,
+                f"Debits ({total_debit}) do not equal credits ({total_credit})",
+            )
+        return (True, "")
+
+    def post_entry(self, posted_by: str) -> object:
+        """Post the entry to its accounts
+
+        Account balances, the entry status and the ``ledger_postings`` event
+        are written in one transaction, which first flips the stored status
+        so that concurrent posts of the same entry apply it only once.
+        Raises ValueError if the entry is already posted, does not balance
+        or is dated in a closed period.
+        """
+        is_valid, message = self.validate_entry()
+        if not is_valid:
+            raise ValueError(message)
+        lines = self.get_lines()
+        day = iso_day(self.entry_date)
+        with self.db_manager.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE journal_entries SET status = 'posted' "
+                "WHERE id = ? AND status IS NOT 'posted'",
+                (self.id,),
+            )
+            if cursor.rowcount == 0:
+                raise ValueError("Journal entry is already posted")
+            closed = FinancialPeriod.latest_closed(conn)
+            if closed and day <= iso_day(closed["end_date"]):
+                raise ValueError(
+                    f"Entry date {day} is on or before the end of closed "
+                    f"period {closed['name']}"
+                )
+            changes: Dict[int, Decimal] = {}
+            movements: Dict[int, Tuple[Decimal, Decimal]] = {}
+            for line in lines:
+                account = conn.execute(
+                    "SELECT account_type FROM accounts WHERE id = ?",
+                    (line.account_id,),
+                ).fetchone()
+                if account is None:
+                    raise ValueError(f"Line {line.line_number}: Account not found")
+                debit = Decimal(str(line.debit_amount or 0))
+                credit = Decimal(str(line.credit_amount or 0))
+                change = debit - credit
+                if account["account_type"] not in DEBIT_NORMAL_TYPES:
+                    change = -change
+                changes[line.account_id] = (
+                    changes.get(line.account_id, Decimal("0")) + change
+                )
+                debits, credits = movements.get(
+                    line.account_id, (Decimal("0"), Decimal("0"))
+                )
+                movements[line.account_id] = (debits + debit, credits + credit)
+            for account_id, change in changes.items():
+                conn.execute(
+                    "UPDATE accounts SET "
+                    "current_balance = ROUND(current_balance + ?, 2), "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (float(change), account_id),
+                )
+                Account.record_daily_change(conn, account_id, day, change)
+            FinancialPeriod.record_movements(conn, day, movements)
+            self.status = "posted"
+            self.posted_by = posted_by
+            self.posting_date = datetime.utcnow().date().isoformat()
+            self.save()
+            add_outbox_event(
+                conn,
+                Queues.LEDGER_POSTINGS,
+                {
+                    "event": "journal_entry_posted",
+                    "journal_entry_id": self.id,
+                    "entry_number": self.entry_number,
+                    "posting_date": self.posting_date,
+                    "posted_by": posted_by,
+                    "currency": self.currency,
+                    "lines": [
+                        {
+                            "account_id": line.account_id,
+                            "debit_amount": str(line.debit_amount or 0),
+                            "credit_amount": str(line.credit_amount or 0),
+                        }
+                        for line in lines
+                    ],
+                },
+            )
+        return self
+
     def to_dict(self, include_lines: object = False) -> object:
         data = super().to_dict()
         data["total_debit"] = str(data.get("total_debit", 0))
@@ -71,6 +424,101 @@ class Reconciliation(BaseModel):
 class FinancialPeriod(BaseModel):
     table_name: Optional[str] = "financial_periods"
 
+    @staticmethod
+    def record_movements(
+        conn: sqlite3.Connection,
+        day: str,
+        movements: Dict[int, Tuple[Decimal, Decimal]],
+    ) -> None:
+        """Add posted (debit, credit) totals per account to the rollups of
+        every period containing ``day``"""
+        periods = conn.execute(
+            "SELECT id FROM financial_periods WHERE start_date <= ? AND end_date >= ?",
+            (day, day),
+        ).fetchall()
+        conn.executemany(
+            "INSERT INTO account_period_totals "
+            "(period_id, account_id, debit_total, credit_total) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (period_id, account_id) DO UPDATE SET "
+            "debit_total = ROUND(debit_total + excluded.debit_total, 2), "
+            "credit_total = ROUND(credit_total + excluded.credit_total, 2)",
+            [
+                (period["id"], account_id, float(debit), float(credit))
+                for period in periods
+                for account_id, (debit, credit) in movements.items()
+            ],
+        )
+
+    @staticmethod
+    def latest_closed(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        """The closed period ending last, if any
+
+        Closing snapshots every balance as of ``end_date``, so nothing dated
+        on or before it may be posted afterwards, even in an earlier period
+        left open.
+        """
+        return conn.execute(
+            "SELECT name, end_date FROM financial_periods WHERE status = 'closed' "
+            "ORDER BY end_date DESC LIMIT 1"
+        ).fetchone()
+
+    def close(self, closed_by: str) -> object:
+        """Close the period and snapshot every account's closing balance
+
+        The snapshot holds the non-zero balances as of ``end_date``. A
+        closed period is immutable: entries dated on or before its end can no
+        longer be posted and its rollup is never rebuilt. Raises ValueError if the
+        period is already closed.
+        """
+        closed_at = datetime.utcnow().isoformat()
+        with self.db_manager.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE financial_periods SET status = 'closed', closed_at = ?, "
+                "closed_by = ? WHERE id = ? AND status != 'closed'",
+                (closed_at, closed_by, self.id),
+            )
+            if cursor.rowcount == 0:
+                raise ValueError("Financial period is already closed")
+            conn.execute(
+                f"""
+                INSERT INTO period_balance_snapshots
+                    (period_id, account_id, closing_balance)
+                SELECT ?, id, balance FROM (
+                    SELECT a.id, {BALANCE_AS_OF_SQL} AS balance FROM accounts a
+                ) WHERE balance != 0
+                """,
+                (self.id, iso_day(self.end_date)),
+            )
+        self.status = "closed"
+        self.closed_at = closed_at
+        self.closed_by = closed_by
+        return self
+
+    def rebuild_totals(self) -> object:
+        """Recompute this period's rollup from the posted journal lines"""
+        if getattr(self, "status", None) == "closed":
+            raise ValueError("Financial period is closed")
+        with self.db_manager.transaction() as conn:
+            conn.execute(
+                "DELETE FROM account_period_totals WHERE period_id = ?", (self.id,)
+            )
+            conn.execute(
+                """
+                INSERT INTO account_period_totals
+                    (period_id, account_id, debit_total, credit_total)
+                SELECT ?, l.account_id,
+                       ROUND(TOTAL(l.debit_amount), 2),
+                       ROUND(TOTAL(l.credit_amount), 2)
+                FROM journal_entry_lines l
+                JOIN journal_entries e ON e.id = l.journal_entry_id
+                WHERE e.status = 'posted'
+                  AND DATE(e.entry_date) BETWEEN ? AND ?
+                GROUP BY l.account_id
+                """,
+                (self.id, iso_day(self.start_date), iso_day(self.end_date)),
+            )
+        return self
+
     def to_dict(self) -> object:
         return super().to_dict()
 
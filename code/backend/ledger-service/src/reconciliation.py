@@ -0,0 +1,351 @@
+"""
+Reconciliation matching engine
+Matches bank statement lines against the posted journal lines of the
+reconciled account. Both sides are loaded once and matched in passes that
+each only see what the earlier ones left:
+
+1. exact: hash join on (amount, date, reference)
+2. sweep: amount within the tolerance and date within the window, found
+   by bisecting amount buckets sorted by date
+3. groups: several journal lines summing exactly to one statement line, or
+   several statement lines to one journal line, searched over the nearest
+   unmatched candidates with a bounded subset size
+
+Tolerance differences and ambiguous picks come back as suspects for review
+instead of matches.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from database.manager import DatabaseManager
+from models.user import DEBIT_NORMAL_TYPES, iso_day, to_cents
+
+# Unmatched lines within the date window considered for a group match
+MAX_GROUP_CANDIDATES = 24
+
+
+@dataclass
+class Line:
+    """One side of a match: signed amount in cents, day as a date ordinal"""
+
+    id: Any
+    day: int
+    amount: int
+    reference: str = ""
+
+
+def _reference(value: Any) -> str:
+    return "".join(str(value or "").split()).upper()
+
+
+def statement_lines(rows: Sequence[Dict[str, Any]]) -> List[Line]:
+    """Statement lines from request rows; raises ValueError on a bad row"""
+    lines = []
+    for number, row in enumerate(rows, 1):
+        try:
+            day = date.fromisoformat(iso_day(row["date"])).toordinal()
+            amount = to_cents(row["amount"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Statement line {number}: {e}")
+        lines.append(
+            Line(row.get("id", number), day, amount, _reference(row.get("reference")))
+        )
+    return lines
+
+
+def load_book_lines(
+    db_manager: DatabaseManager,
+    account_id: int,
+    through_date: Any,
+    since_date: Optional[Any] = None,
+) -> List[Line]:
+    """Posted, not yet matched journal lines of the account in one query
+
+    Amounts are signed from the account's side: for a bank (asset) account
+    a debit is money in, like a positive statement amount.
+    """
+    query = """
+        SELECT l.id, DATE(e.entry_date) AS day, e.reference_number,
+               l.debit_amount, l.credit_amount, a.account_type
+        FROM journal_entry_lines l
+        JOIN journal_entries e ON e.id = l.journal_entry_id
+        JOIN accounts a ON a.id = l.account_id
+        WHERE l.account_id = ? AND e.status = 'posted'
+          AND DATE(e.entry_date) <= ?
+          AND NOT EXISTS (
+              SELECT 1 FROM reconciliation_matches m
+              WHERE m.journal_entry_line_id = l.id
+          )
+    """
+    params: Tuple = (account_id, iso_day(through_date))
+    if since_date is not None:
+        query += " AND DATE(e.entry_date) >= ?"
+        params += (iso_day(since_date),)
+    lines = []
+    for row in db_manager.fetch_all(query, params):
+        amount = round(((row["debit_amount"] or 0) - (row["credit_amount"] or 0)) * 100)
+        if row["account_type"] not in DEBIT_NORMAL_TYPES:
+            amount = -amount
+        lines.append(
+            Line(
+                row["id"],
+                date.fromisoformat(row["day"]).toordinal(),
+                amount,
+                _reference(row["reference_number"]),
+            )
+        )
+    return lines
+
+
+def _match(
+    statement: Sequence[Line], book: Sequence[Line], match_type: str, **extra: Any
+) -> Dict[str, Any]:
+    return {
+        "statement_line_ids": [line.id for line in statement],
+        "journal_line_ids": [line.id for line in book],
+        "match_type": match_type,
+        **extra,
+    }
+
+
+def _exact(
+    statement: List[Line], book: List[Line], matched: List[Dict[str, Any]]
+) -> Tuple[List[Line], List[Line]]:
+    index: Dict[Tuple[int, int, str], deque] = defaultdict(deque)
+    for line in book:
+        index[(line.amount, line.day, line.reference)].append(line)
+    left = []
+    for line in statement:
+        bucket = index.get((line.amount, line.day, line.reference))
+        if bucket:
+            matched.append(_match([line], [bucket.popleft()], "exact"))
+        else:
+            left.append(line)
+    return left, [line for bucket in index.values() for line in bucket]
+
+
+def _sweep(
+    statement: List[Line],
+    book: List[Line],
+    tolerance: int,
+    window: int,
+    matched: List[Dict[str, Any]],
+    suspect: List[Dict[str, Any]],
+) -> Tuple[List[Line], List[Line]]:
+    buckets: Dict[int, List[Line]] = defaultdict(list)
+    for line in sorted(book, key=lambda line: line.day):
+        buckets[line.amount].append(line)
+    amounts = sorted(buckets)
+    days = {amount: [line.day for line in buckets[amount]] for amount in amounts}
+    taken: set = set()
+    left = []
+    for line in sorted(statement, key=lambda line: (line.amount, line.day)):
+        scored = []
+        lo = bisect_left(amounts, line.amount - tolerance)
+        hi = bisect_right(amounts, line.amount + tolerance)
+        for amount in amounts[lo:hi]:
+            bucket = buckets[amount]
+            first = bisect_left(days[amount], line.day - window)
+            last = bisect_right(days[amount], line.day + window)
+            for position in range(first, last):
+                candidate = bucket[position]
+                if id(candidate) in taken:
+                    continue
+                score = (
+                    abs(candidate.amount - line.amount),
+                    candidate.reference != line.reference,
+                    abs(candidate.day - line.day),
+                )
+                scored.append((score, position, candidate))
+        if not scored:
+            left.append(line)
+            continue
+        scored.sort(key=lambda item: item[:2])
+        score, _, best = scored[0]
+        taken.add(id(best))
+        difference, _, days_apart = score
+        details = {
+            "amount_difference": str(Decimal(best.amount - line.amount) / 100),
+            "days_apart": days_apart,
+        }
+        if difference:
+            suspect.append(_match([line], [best], "tolerance", **details))
+        elif len(scored) > 1 and scored[1][0] == score:
+            suspect.append(_match([line], [best], "ambiguous", **details))
+        else:
+            matched.append(_match([line], [best], "date_window", **details))
+    return left, [line for line in book if id(line) not in taken]
+
+
+def _groups(
+    targets: List[Line],
+    parts: List[Line],
+    window: int,
+    max_size: int,
+    match_type: str,
+    matched: List[Dict[str, Any]],
+    parts_are_statement: bool,
+) -> Tuple[List[Line], List[Line]]:
+    """Match each target to 2..max_size parts summing exactly to it
+
+    Untaken parts are kept in per-day buckets, and candidates are collected
+    walking outward from the target's day until ``MAX_GROUP_CANDIDATES``
+    are found, so a target only looks at the days nearest to it.
+    """
+    by_day: Dict[int, Dict[int, Line]] = defaultdict(dict)
+    for part in sorted(parts, key=lambda line: line.day):
+        if part.amount:
+            by_day[part.day][id(part)] = part
+    taken: set = set()
+    left = []
+    for target in sorted(targets, key=lambda line: -abs(line.amount)):
+        candidates = list(
+            islice(_nearest_parts(by_day, target, window), MAX_GROUP_CANDIDATES)
+        )
+        group = _subset(candidates, target.amount, max_size)
+        if group is None:
+            left.append(target)
+            continue
+        for part in group:
+            taken.add(id(part))
+            del by_day[part.day][id(part)]
+        if parts_are_statement:
+            matched.append(_match(group, [target], match_type))
+        else:
+            matched.append(_match([target], group, match_type))
+    return left, [part for part in parts if id(part) not in taken]
+
+
+def _nearest_parts(
+    by_day: Dict[int, Dict[int, Line]], target: Line, window: int
+) -> Iterator[Line]:
+    """Untaken parts that could belong to the target's group, nearest day
+    first, earlier day first on ties"""
+    for offset in range(window + 1):
+        days = (target.day - offset, target.day + offset) if offset else (target.day,)
+        for day in days:
+            for part in by_day.get(day, {}).values():
+                if (part.amount > 0) == (target.amount > 0) and abs(part.amount) < abs(
+                    target.amount
+                ):
+                    yield part
+
+
+def _subset(
+    candidates: List[Line], amount: int, max_size: int
+) -> Optional[Tuple[Line, ...]]:
+    """Smallest group of 2..max_size candidates summing to ``amount``"""
+    for size in range(2, max_size + 1):
+        group = _subset_of_size(candidates, amount, size)
+        if group is not None:
+            return group
+    return None
+
+
+def _subset_of_size(
+    candidates: List[Line], amount: int, size: int
+) -> Optional[Tuple[Line, ...]]:
+    """``size`` candidates summing to ``amount``: a hash two-sum, extended
+    one fixed element per extra member"""
+    if size == 2:
+        seen: Dict[int, Line] = {}
+        for line in candidates:
+            other = seen.get(amount - line.amount)
+            if other is not None:
+                return (other, line)
+            seen.setdefault(line.amount, line)
+        return None
+    for position, line in enumerate(candidates):
+        rest = _subset_of_size(
+            candidates[position + 1 :], amount - line.amount, size - 1
+        )
+        if rest is not None:
+            return (line,) + rest
+    return None
+
+
+def match_lines(
+    statement: Iterable[Line],
+    book: Iterable[Line],
+    amount_tolerance: int = 0,
+    date_window_days: int = 3,
+    max_group_size: int = 3,
+) -> Dict[str, Any]:
+    """Match statement lines to journal lines
+
+    ``amount_tolerance`` is in cents. Returns the matched and suspect
+    groups and the ids left unmatched on each side.
+    """
+    matched: List[Dict[str, Any]] = []
+    suspect: List[Dict[str, Any]] = []
+    all_statement, all_book = list(statement), list(book)
+    statement, book = _exact(all_statement, all_book, matched)
+    statement, book = _sweep(
+        statement, book, amount_tolerance, date_window_days, matched, suspect
+    )
+    if max_group_size >= 2:
+        statement, book = _groups(
+            statement,
+            book,
+            date_window_days,
+            max_group_size,
+            "many_to_one",
+            matched,
+            parts_are_statement=False,
+        )
+        book, statement = _groups(
+            book,
+            statement,
+            date_window_days,
+            max_group_size,
+            "one_to_many",
+            matched,
+            parts_are_statement=True,
+        )
+    left = {id(line) for line in statement + book}
+    return {
+        "matched": matched,
+        "suspect": suspect,
+        "unmatched_statement_line_ids": [
+            line.id for line in all_statement if id(line) in left
+        ],
+        "unmatched_journal_line_ids": [
+            line.id for line in all_book if id(line) in left
+        ],
+    }
+
+
+def save_matches(
+    db_manager: DatabaseManager,
+    reconciliation_id: int,
+    matched: List[Dict[str, Any]],
+) -> None:
+    """Record matched groups so their journal lines are not matched again"""
+    rows = []
+    for group_id, match in enumerate(matched, 1):
+        for line_id in match["statement_line_ids"]:
+            rows.append(
+                (reconciliation_id, group_id, str(line_id), None, match["match_type"])
+            )
+        for line_id in match["journal_line_ids"]:
+            rows.append(
+                (reconciliation_id, group_id, None, line_id, match["match_type"])
+            )
+    with db_manager.transaction() as conn:
+        offset = conn.execute(
+            "SELECT COALESCE(MAX(group_id), 0) FROM reconciliation_matches "
+            "WHERE reconciliation_id = ?",
+            (reconciliation_id,),
+        ).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO reconciliation_matches (reconciliation_id, group_id, "
+            "statement_line_id, journal_entry_line_id, match_type) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(r[0], r[1] + offset) + r[2:] for r in rows],
+        )
@@ -0,0 +1,461 @@
+"""
+Ledger financial reports
+The trial balance and balance sheet are single aggregation queries over the
+accounts and their daily balance checkpoints. Account rows, per-type
+subtotals and totals come back from SQL in output order and are streamed to
+the client as JSON while the cursor is read, so no report is assembled in
+memory. The income statement reads the per-period account rollups.
+
+Reports of a closed financial period are rendered once, from the balance
+snapshot taken at close, and kept in ``period_report_cache``. A closed
+period cannot change, so the cached payloads are never invalidated.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from database.manager import DatabaseManager
+from models.user import BALANCE_AS_OF_SQL, DEBIT_NORMAL_TYPES, FinancialPeriod, iso_day
+
+_DEBIT_NORMAL = ", ".join(f"'{t}'" for t in DEBIT_NORMAL_TYPES)
+
+# Balance of account ``a`` in the close snapshot of the period bound to the ``?``
+SNAPSHOT_BALANCE_SQL = """ROUND(COALESCE((
+    SELECT s.closing_balance FROM period_balance_snapshots s
+    WHERE s.period_id = ? AND s.account_id = a.id
+), 0), 2)"""
+
+
+def _trial_balance_sql(balance_sql: str) -> str:
+    # level 0: account rows, 1: subtotal per account type, 2: grand total.
+    # Account rows are encoded to JSON by SQLite; amounts are rendered as text.
+    return f"""
+WITH balances AS MATERIALIZED (
+    SELECT a.account_code, a.name, a.account_type,
+           {balance_sql} AS balance
+    FROM accounts a
+    WHERE a.is_active = 1 AND a.currency = ?
+),
+sided AS MATERIALIZED (
+    SELECT account_code, name, account_type,
+           CASE WHEN account_type IN ({_DEBIT_NORMAL})
+                THEN MAX(balance, 0.0) ELSE MAX(-balance, 0.0) END AS debit_balance,
+           CASE WHEN account_type IN ({_DEBIT_NORMAL})
+                THEN MAX(-balance, 0.0) ELSE MAX(balance, 0.0) END AS credit_balance
+    FROM balances
+    WHERE balance != 0
+)
+SELECT 0 AS level, account_code, account_type,
+       json_object(
+           'account_code', account_code,
+           'account_name', name,
+           'account_type', account_type,
+           'debit_balance', CAST(debit_balance AS TEXT),
+           'credit_balance', CAST(credit_balance AS TEXT)
+       ) AS item,
+       NULL AS debits, NULL AS credits
+FROM sided
+UNION ALL
+SELECT 1, NULL, account_type, NULL,
+       CAST(ROUND(SUM(debit_balance), 2) AS TEXT),
+       CAST(ROUND(SUM(credit_balance), 2) AS TEXT)
+FROM sided GROUP BY account_type
+UNION ALL
+SELECT 2, NULL, NULL, NULL,
+       CAST(ROUND(TOTAL(debit_balance), 2) AS TEXT),
+       CAST(ROUND(TOTAL(credit_balance), 2) AS TEXT)
+FROM sided
+ORDER BY level, account_code, account_type
+"""
+
+
+TRIAL_BALANCE_SQL = _trial_balance_sql(BALANCE_AS_OF_SQL)
+SNAPSHOT_TRIAL_BALANCE_SQL = _trial_balance_sql(SNAPSHOT_BALANCE_SQL)
+
+BALANCE_SHEET_SECTIONS = (
+    ("asset", "assets"),
+    ("liability", "liabilities"),
+    ("equity", "equity"),
+)
+
+
+def _balance_sheet_sql(balance_sql: str) -> str:
+    # Rows come ordered by section; each section's subtotal (level 1)
+    # follows its account rows (level 0)
+    return f"""
+WITH balances AS MATERIALIZED (
+    SELECT a.account_code, a.name, a.account_type,
+           CASE a.account_type WHEN 'asset' THEN 0
+                WHEN 'liability' THEN 1 ELSE 2 END AS section,
+           {balance_sql} AS balance
+    FROM accounts a
+    WHERE a.is_active = 1 AND a.currency = ?
+      AND a.account_type IN ('asset', 'liability', 'equity')
+)
+SELECT section, 0 AS level, account_code,
+       json_object(
+           'account_code', account_code,
+           'account_name', name,
+           'balance', CAST(balance AS TEXT)
+       ) AS item,
+       NULL AS total
+FROM balances WHERE balance != 0
+UNION ALL
+SELECT section, 1, NULL, NULL, CAST(ROUND(SUM(balance), 2) AS TEXT)
+FROM balances WHERE balance != 0 GROUP BY section
+ORDER BY section, level, account_code
+"""
+
+
+BALANCE_SHEET_SQL = _balance_sheet_sql(BALANCE_AS_OF_SQL)
+SNAPSHOT_BALANCE_SHEET_SQL = _balance_sheet_sql(SNAPSHOT_BALANCE_SQL)
+
+
+def _chunks(
+    db_manager: DatabaseManager, sql: str, params: Tuple, chunk_size: int = 1000
+) -> Iterator[List[Any]]:
+    """Yield result rows in chunks as they are read from the cursor"""
+    with db_manager.get_connection() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _head(**fields: Any) -> str:
+    """Opening of a JSON object holding ``fields``, ready for more keys"""
+    return json.dumps(fields)[:-1] + ", "
+
+
+def stream_trial_balance(
+    db_manager: DatabaseManager,
+    as_of_date: Union[date, datetime],
+    currency: str,
+    period_id: Optional[int] = None,
+) -> Iterator[str]:
+    """Trial balance as JSON text chunks
+
+    With ``period_id`` the balances come from that closed period's snapshot.
+    """
+    sql, params = TRIAL_BALANCE_SQL, (iso_day(as_of_date), currency)
+    if period_id is not None:
+        sql, params = SNAPSHOT_TRIAL_BALANCE_SQL, (period_id, currency)
+    yield _head(
+        report_type="trial_balance",
+        as_of_date=as_of_date.isoformat(),
+        currency=currency,
+    ) + '"accounts": ['
+    separator = ""
+    subtotals = {}
+    total_debits = total_credits = "0.0"
+    for chunk in _chunks(db_manager, sql, params):
+        items = [row["item"] for row in chunk if row["level"] == 0]
+        if items:
+            yield separator + ", ".join(items)
+            separator = ", "
+        for row in chunk:
+            if row["level"] == 1:
+                subtotals[row["account_type"]] = {
+                    "debit_balance": row["debits"],
+                    "credit_balance": row["credits"],
+                }
+            elif row["level"] == 2:
+                total_debits, total_credits = row["debits"], row["credits"]
+    difference = Decimal(total_debits) - Decimal(total_credits)
+    yield "], " + json.dumps(
+        {
+            "subtotals": subtotals,
+            "totals": {
+                "total_debits": total_debits,
+                "total_credits": total_credits,
+                "difference": str(difference),
+            },
+            "is_balanced": difference == 0,
+        }
+    )[1:]
+
+
+def stream_balance_sheet(
+    db_manager: DatabaseManager,
+    as_of_date: Union[date, datetime],
+    currency: str,
+    period_id: Optional[int] = None,
+) -> Iterator[str]:
+    """Balance sheet as JSON text chunks
+
+    With ``period_id`` the balances come from that closed period's snapshot.
+    """
+    sql, params = BALANCE_SHEET_SQL, (iso_day(as_of_date), currency)
+    if period_id is not None:
+        sql, params = SNAPSHOT_BALANCE_SHEET_SQL, (period_id, currency)
+    totals = ["0.0"] * len(BALANCE_SHEET_SECTIONS)
+    section = 0
+    separator = ""
+
+    def close_and_open_next() -> str:
+        nonlocal section, separator
+        text = f'], "total": {json.dumps(totals[section])}}}, '
+        section += 1
+        separator = ""
+        if section < len(BALANCE_SHEET_SECTIONS):
+            text += f'"{BALANCE_SHEET_SECTIONS[section][1]}": {{"accounts": ['
+        return text
+
+    yield _head(
+        report_type="balance_sheet",
+        as_of_date=as_of_date.isoformat(),
+        currency=currency,
+    ) + f'"{BALANCE_SHEET_SECTIONS[0][1]}": {{"accounts": ['
+    for chunk in _chunks(db_manager, sql, params):
+        parts = []
+        for row in chunk:
+            while row["section"] > section:
+                parts.append(close_and_open_next())
+            if row["level"] == 0:
+                parts.append(separator + row["item"])
+                separator = ", "
+            else:
+                totals[section] = row["total"]
+        yield "".join(parts)
+    while section < len(BALANCE_SHEET_SECTIONS):
+        yield close_and_open_next()
+    assets, liabilities, equity = (Decimal(total) for total in totals)
+    yield json.dumps(
+        {
+            "total_liabilities_and_equity": str(liabilities + equity),
+            "is_balanced": assets == liabilities + equity,
+        }
+    )[1:]
+
+
+def consolidated_trial_balance(
+    db_manager: DatabaseManager,
+    fx_rates: Any,
+    as_of_date: Union[date, datetime],
+    reporting_currency: str,
+) -> Dict[str, Any]:
+    """Trial balance of accounts in every currency, in ``reporting_currency``
+
+    Balances come from one query; each currency's balances are converted
+    with one vectorized ``FxRateCache.convert`` call at the as-of rate.
+    Raises LookupError if a currency has no rate for the date.
+    """
+    rows = db_manager.fetch_all(
+        f"SELECT a.account_code, a.name, a.account_type, a.currency, "
+        f"{BALANCE_AS_OF_SQL} AS balance FROM accounts a "
+        f"WHERE a.is_active = 1 ORDER BY a.account_code",
+        (iso_day(as_of_date),),
+    )
+    rows = [row for row in rows if row["balance"] != 0]
+    balances = np.array([row["balance"] for row in rows], dtype=np.float64)
+    currencies = np.array([row["currency"] for row in rows], dtype=object)
+    converted = np.zeros(len(rows))
+    for currency in set(currencies):
+        mask = currencies == currency
+        converted[mask] = fx_rates.convert(
+            balances[mask], currency, reporting_currency, as_of_date
+        )
+    debit_normal = np.array(
+        [row["account_type"] in DEBIT_NORMAL_TYPES for row in rows], dtype=bool
+    )
+    signed = np.where(debit_normal, converted, -converted)
+    debits = np.round(np.maximum(signed, 0.0), 2)
+    credits = np.round(np.maximum(-signed, 0.0), 2)
+
+    accounts = []
+    subtotals: Dict[str, Dict[str, float]] = {}
+    for row, debit, credit in zip(rows, debits.tolist(), credits.tolist()):
+        accounts.append(
+            {
+                "account_code": row["account_code"],
+                "account_name": row["name"],
+                "account_type": row["account_type"],
+                "currency": row["currency"],
+                "balance": str(row["balance"]),
+                "debit_balance": str(debit),
+                "credit_balance": str(credit),
+            }
+        )
+        subtotal = subtotals.setdefault(
+            row["account_type"], {"debit_balance": 0.0, "credit_balance": 0.0}
+        )
+        subtotal["debit_balance"] += debit
+        subtotal["credit_balance"] += credit
+    total_debits = round(float(debits.sum()), 2)
+    total_credits = round(float(credits.sum()), 2)
+    difference = Decimal(str(total_debits)) - Decimal(str(total_credits))
+    return {
+        "report_type": "trial_balance",
+        "as_of_date": as_of_date.isoformat(),
+        "reporting_currency": reporting_currency,
+        "accounts": accounts,
+        "subtotals": {
+            account_type: {key: str(round(value, 2)) for key, value in totals.items()}
+            for account_type, totals in sorted(subtotals.items())
+        },
+        "totals": {
+            "total_debits": str(total_debits),
+            "total_credits": str(total_credits),
+            "difference": str(difference),
+        },
+        "is_balanced": difference == 0,
+    }
+
+
+# Net amount per revenue/expense account from the period rollups
+INCOME_STATEMENT_SQL = """
+SELECT t.period_id, a.account_type, a.account_code, a.name,
+       ROUND(CASE a.account_type WHEN 'revenue'
+                  THEN t.credit_total - t.debit_total
+                  ELSE t.debit_total - t.credit_total END, 2) AS amount
+FROM account_period_totals t
+JOIN accounts a ON a.id = t.account_id
+WHERE t.period_id IN (?, ?) AND a.currency = ?
+  AND a.account_type IN ('revenue', 'expense')
+ORDER BY a.account_code
+"""
+
+INCOME_STATEMENT_SECTIONS = (("revenue", "revenue"), ("expense", "expenses"))
+
+
+def _period_info(period: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: period.get(key)
+        for key in ("id", "name", "period_type", "start_date", "end_date")
+    }
+
+
+def income_statement(
+    db_manager: DatabaseManager,
+    period: Dict[str, Any],
+    compare_period: Optional[Dict[str, Any]] = None,
+    currency: str = "USD",
+) -> Dict[str, Any]:
+    """Income statement for a financial period, optionally beside another
+
+    Reads the ``account_period_totals`` rollup rows of the period(s), one
+    row per account with activity, instead of the journal lines.
+    """
+    compare_id = compare_period["id"] if compare_period else None
+    rows = db_manager.fetch_all(
+        INCOME_STATEMENT_SQL, (period["id"], compare_id, currency)
+    )
+    sections: Dict[str, Dict[str, Dict[str, Any]]] = {
+        account_type: {} for account_type, _ in INCOME_STATEMENT_SECTIONS
+    }
+    for row in rows:
+        line = sections[row["account_type"]].setdefault(
+            row["account_code"],
+            {
+                "account_code": row["account_code"],
+                "account_name": row["name"],
+                "amount": Decimal("0.0"),
+                "compare_amount": Decimal("0.0"),
+            },
+        )
+        key = "amount" if row["period_id"] == period["id"] else "compare_amount"
+        line[key] = Decimal(str(row["amount"]))
+
+    report: Dict[str, Any] = {
+        "report_type": "income_statement",
+        "currency": currency,
+        "period": _period_info(period),
+    }
+    if compare_period:
+        report["compare_period"] = _period_info(compare_period)
+    totals = {}
+    for account_type, key in INCOME_STATEMENT_SECTIONS:
+        accounts = []
+        total = compare_total = Decimal("0.0")
+        for line in sections[account_type].values():
+            total += line["amount"]
+            compare_total += line["compare_amount"]
+            item = {
+                "account_code": line["account_code"],
+                "account_name": line["account_name"],
+                "amount": str(line["amount"]),
+            }
+            if compare_period:
+                item["compare_amount"] = str(line["compare_amount"])
+                item["change"] = str(line["amount"] - line["compare_amount"])
+            accounts.append(item)
+        report[key] = {"accounts": accounts, "total": str(total)}
+        if compare_period:
+            report[key]["compare_total"] = str(compare_total)
+        totals[account_type] = (total, compare_total)
+    net_income = totals["revenue"][0] - totals["expense"][0]
+    report["net_income"] = str(net_income)
+    if compare_period:
+        compare_net_income = totals["revenue"][1] - totals["expense"][1]
+        report["compare_net_income"] = str(compare_net_income)
+        report["net_income_change"] = str(net_income - compare_net_income)
+    return report
+
+
+PERIOD_REPORT_TYPES = ("trial_balance", "balance_sheet", "income_statement")
+
+
+def render_period_report(
+    db_manager: DatabaseManager,
+    period: Dict[str, Any],
+    report_type: str,
+    currency: str,
+) -> str:
+    """JSON payload of a closed period's report, from its close snapshot"""
+    if report_type == "income_statement":
+        return json.dumps(income_statement(db_manager, period, currency=currency))
+    stream = (
+        stream_trial_balance if report_type == "trial_balance" else stream_balance_sheet
+    )
+    as_of_date = date.fromisoformat(iso_day(period["end_date"]))
+    return "".join(stream(db_manager, as_of_date, currency, period_id=period["id"]))
+
+
+def closed_period_report(
+    db_manager: DatabaseManager,
+    period: Dict[str, Any],
+    report_type: str,
+    currency: str,
+) -> str:
+    """Cached JSON payload of a closed period's report, rendered on first use"""
+    row = db_manager.fetch_one(
+        "SELECT payload FROM period_report_cache "
+        "WHERE period_id = ? AND report_type = ? AND currency = ?",
+        (period["id"], report_type, currency),
+    )
+    if row:
+        return row["payload"]
+    payload = render_period_report(db_manager, period, report_type, currency)
+    db_manager.execute_query(
+        "INSERT OR IGNORE INTO period_report_cache "
+        "(period_id, report_type, currency, payload) VALUES (?, ?, ?, ?)",
+        (period["id"], report_type, currency, payload),
+    )
+    return payload
+
+
+def close_period(
+    db_manager: DatabaseManager, period: FinancialPeriod, closed_by: str
+) -> FinancialPeriod:
+    """Close ``period`` and cache its reports for every account currency
+
+    The snapshot, the status change and the rendered payloads commit
+    together, so the cache matches the ledger as it stood at close.
+    """
+    with db_manager.transaction() as conn:
+        period.close(closed_by)
+        currencies = conn.execute(
+            "SELECT DISTINCT currency FROM accounts ORDER BY currency"
+        ).fetchall()
+        for row in currencies:
+            for report_type in PERIOD_REPORT_TYPES:
+                closed_period_report(
+                    db_manager, period.to_dict(), report_type, row["currency"]
+                )
+    return period
@@ -9,6 +9,9 @@ from models.user import Account, JournalEntry, JournalEntryLine
 
 ledger_bp = Blueprint("ledger", __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 
 def require_user_id(f: object) -> object:
     """Decorator to extract user_id from request headers"""
@@ -164,34 +167,28 @@ def update_account(account_id: object) -> object:
 @ledger_bp.route("/journal-entries", methods=["GET"])
 @require_user_id
 def get_journal_entries() -> object:
-    """Get journal entries for user"""
+    """Get a page of the user's journal entries, newest first
+
+    Pass the returned ``next_cursor`` as ``cursor`` for the following page.
+    """
+    include_lines = request.args.get("include_lines", "false").lower() == "true"
+    account_id = request.args.get("account_id")
     try:
-        status = request.args.get("status")
-        start_date = request.args.get("start_date")
-        end_date = request.args.get("end_date")
-        where_clause = "user_id = ?"
-        params = [request.user_id]
-        if status:
-            where_clause += " AND status = ?"
-            params.append(status)
-        if start_date:
-            where_clause += " AND entry_date >= ?"
-            params.append(start_date)
-        if end_date:
-            where_clause += " AND entry_date <= ?"
-            params.append(end_date)
-        entries = JournalEntry.find_all(
-            where_clause + " ORDER BY entry_date DESC, entry_number DESC", tuple(params)
-        )
-        return (
-            jsonify(
-                {
-                    "journal_entries": [entry.to_dict() for entry in entries],
-                    "total": len(entries),
-                }
-            ),
-            200,
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        page = JournalEntry.list_page(
+            limit=max(1, min(limit, MAX_PAGE_SIZE)),
+            cursor=request.args.get("cursor"),
+            status=request.args.get("status"),
+            start_date=request.args.get("start_date"),
+            end_date=request.args.get("end_date"),
+            account_id=int(account_id) if account_id else None,
+            created_by=request.user_id,
+            include_lines=include_lines,
         )
+        page["count"] = len(page["journal_entries"])
+        return (jsonify(page), 200)
+    except ValueError as e:
+        return (jsonify({"error": str(e)}), 400)
     except Exception as e:
         return (
             jsonify({"error": "Failed to get journal entries", "details": str(e)}),
@@ -304,10 +301,10 @@ def post_journal_entry(entry_id: object) -> object:
             return (jsonify({"error": "Journal entry not found"}), 404)
         if entry.status != "draft":
             return (jsonify({"error": "Only draft entries can be posted"}), 400)
-        entry.status = "posted"
-        entry.posted_by = request.user_id
-        entry.posted_at = datetime.utcnow().isoformat()
-        entry.save()
+        try:
+            entry.post_entry(request.user_id)
+        except ValueError as e:
+            return (jsonify({"error": str(e)}), 400)
         return (
             jsonify(
                 {
@@ -324,36 +321,6 @@ def post_journal_entry(entry_id: object) -> object:
         )
 
 
-@ledger_bp.route("/reports/trial-balance", methods=["GET"])
-@require_user_id
-def get_trial_balance() -> object:
-    """Generate trial balance report (simulated)"""
-    return (
-        jsonify({"error": "Report generation is handled by the core logic in main.py"}),
-        501,
-    )
-
-
-@ledger_bp.route("/reports/balance-sheet", methods=["GET"])
-@require_user_id
-def get_balance_sheet() -> object:
-    """Generate balance sheet report (simulated)"""
-    return (
-        jsonify({"error": "Report generation is handled by the core logic in main.py"}),
-        501,
-    )
-
-
-@ledger_bp.route("/reports/income-statement", methods=["GET"])
-@require_user_id
-def get_income_statement() -> object:
-    """Generate income statement report (simulated)"""
-    return (
-        jsonify({"error": "Report generation is handled by the core logic in main.py"}),
-        501,
-    )
-
-
 @ledger_bp.route("/accounts/initialize", methods=["POST"])
 @require_user_id
 def initialize_accounts() -> object:
@@ -23,6 +23,7 @@ sys.path.append(os.path.join(BASE_DIR, "..", "..", "shared"))
 from audit.audit_logger import AuditEventType, AuditSeverity, audit_action, audit_logger
 from database.manager import initialize_database
 from middleware.auth import require_auth, require_permission
+from middleware.idempotency import IdempotencyStore, idempotent
 
 # -------------------------------------------------------------------------
 # Imports
@@ -77,6 +78,7 @@ CORS(
         "TPP-Signature-Certificate",
         "PSU-ID",
         "Consent-ID",
+        "Idempotency-Key",
     ],
 )
 
@@ -89,6 +91,7 @@ DB_PATH = os.environ.get(
 )
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 db_manager, migration_manager = initialize_database(DB_PATH)
+app.extensions["idempotency_store"] = IdempotencyStore(db_manager)
 
 # Security Components
 KEY_DIR = os.environ.get("KEY_DIR", os.path.join(BASE_DIR, "keys"))
@@ -559,6 +562,7 @@ def update_consent_authorisation(consent_id: str, authorisation_id: str) -> obje
     "payment_initiation_requested",
     severity=AuditSeverity.CRITICAL,
 )
+@idempotent(client_id=lambda: g.tpp_id)
 def initiate_payment() -> object:
     """Initiate SEPA Credit Transfer (Payment Initiation Service)"""
     data = request.validated_data
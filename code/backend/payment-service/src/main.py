@@ -11,15 +11,22 @@ sys.path.insert(
 from datetime import datetime, timezone
 
 from database.manager import BaseModel, initialize_database
+from database.outbox import OutboxRelay
 from flask import Flask, jsonify, send_from_directory
 from flask_cors import CORS
+from middleware.idempotency import IdempotencyStore
 from routes.user import payment_bp
+from scheduler import RecurringPaymentScheduler
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), "static"))
 app.config["SECRET_KEY"] = os.environ.get(
     "SECRET_KEY", "nexafi-default-secret-change-in-production"
 )
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization", "X-User-ID"])
+CORS(
+    app,
+    origins="*",
+    allow_headers=["Content-Type", "Authorization", "X-User-ID", "Idempotency-Key"],
+)
 app.register_blueprint(payment_bp, url_prefix="/api/v1")
 db_path = os.path.join(os.path.dirname(__file__), "database", "app.db")
 os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -29,12 +36,28 @@ PAYMENT_MIGRATIONS = {
     "001_create_payment_tables": {
         "description": "Create payment_methods, transactions, wallets, and recurring_payments tables",
         "sql": "\n        CREATE TABLE IF NOT EXISTS payment_methods (\n            id TEXT PRIMARY KEY,\n            user_id TEXT NOT NULL,\n            type TEXT NOT NULL,\n            provider TEXT NOT NULL,\n            external_id TEXT,\n            details TEXT,\n            is_default INTEGER DEFAULT 0,\n            is_active INTEGER DEFAULT 1,\n            is_verified INTEGER DEFAULT 0,\n            verification_status TEXT DEFAULT 'pending',\n            last_used_at TEXT,\n            expires_at TEXT,\n            created_at TEXT,\n            updated_at TEXT\n        );\n\n        CREATE TABLE IF NOT EXISTS transactions (\n            id TEXT PRIMARY KEY,\n            user_id TEXT NOT NULL,\n            payment_method_id TEXT,\n            transaction_type TEXT NOT NULL,\n            amount REAL NOT NULL,\n            currency TEXT DEFAULT 'USD',\n            description TEXT,\n            reference TEXT,\n            status TEXT NOT NULL,\n            external_transaction_id TEXT,\n            provider_response TEXT,\n            fees REAL DEFAULT 0.0,\n            net_amount REAL NOT NULL,\n            failure_reason TEXT,\n            metadata TEXT,\n            processed_at TEXT,\n            settled_at TEXT,\n            created_at TEXT,\n            updated_at TEXT\n        );\n\n        CREATE TABLE IF NOT EXISTS wallets (\n            id TEXT PRIMARY KEY,\n            user_id TEXT NOT NULL,\n            currency TEXT NOT NULL,\n            balance REAL DEFAULT 0.0,\n            available_balance REAL DEFAULT 0.0,\n            pending_balance REAL DEFAULT 0.0,\n            reserved_balance REAL DEFAULT 0.0,\n            is_active INTEGER DEFAULT 1,\n            created_at TEXT,\n            updated_at TEXT\n        );\n\n        CREATE TABLE IF NOT EXISTS wallet_balance_history (\n            id TEXT PRIMARY KEY,\n            wallet_id TEXT NOT NULL,\n            transaction_id TEXT,\n            change_type TEXT NOT NULL,\n            amount REAL NOT NULL,\n            balance_before REAL NOT NULL,\n            balance_after REAL NOT NULL,\n            description TEXT,\n            created_at TEXT\n        );\n\n        CREATE TABLE IF NOT EXISTS recurring_payments (\n            id TEXT PRIMARY KEY,\n            user_id TEXT NOT NULL,\n            payment_method_id TEXT NOT NULL,\n            amount REAL NOT NULL,\n            currency TEXT DEFAULT 'USD',\n            frequency TEXT NOT NULL,\n            description TEXT,\n            start_date TEXT NOT NULL,\n            end_date TEXT,\n            next_payment_date TEXT NOT NULL,\n            total_payments INTEGER,\n            payments_made INTEGER DEFAULT 0,\n            status TEXT DEFAULT 'active',\n            metadata TEXT,\n            created_at TEXT,\n            updated_at TEXT\n        );\n        ",
-    }
+    },
+    "002_store_wallet_amounts_in_minor_units": {
+        "description": "Store wallet balances and history amounts as integer minor units",
+        "sql": "\n        CREATE TABLE wallets_minor_units (\n            id TEXT PRIMARY KEY,\n            user_id TEXT NOT NULL,\n            currency TEXT NOT NULL,\n            balance INTEGER NOT NULL DEFAULT 0,\n            available_balance INTEGER NOT NULL DEFAULT 0,\n            pending_balance INTEGER NOT NULL DEFAULT 0,\n            reserved_balance INTEGER NOT NULL DEFAULT 0,\n            is_active INTEGER DEFAULT 1,\n            created_at TEXT,\n            updated_at TEXT\n        );\n\n        INSERT INTO wallets_minor_units\n        SELECT id, user_id, currency,\n               CAST(ROUND(COALESCE(balance, 0) * scale) AS INTEGER),\n               CAST(ROUND(COALESCE(available_balance, 0) * scale) AS INTEGER),\n               CAST(ROUND(COALESCE(pending_balance, 0) * scale) AS INTEGER),\n               CAST(ROUND(COALESCE(reserved_balance, 0) * scale) AS INTEGER),\n               is_active, created_at, updated_at\n        FROM (SELECT *, CASE WHEN currency IN ('BIF', 'CLP', 'JPY', 'KRW', 'VND', 'XAF', 'XOF') THEN 1\n                     WHEN currency IN ('BHD', 'JOD', 'KWD', 'OMR', 'TND') THEN 1000\n                     ELSE 100 END AS scale FROM wallets);\n\n        CREATE TABLE wallet_balance_history_minor_units (\n            id TEXT PRIMARY KEY,\n            wallet_id TEXT NOT NULL,\n            transaction_id TEXT,\n            change_type TEXT NOT NULL,\n            amount INTEGER NOT NULL,\n            balance_before INTEGER NOT NULL,\n            balance_after INTEGER NOT NULL,\n            description TEXT,\n            created_at TEXT\n        );\n\n        INSERT INTO wallet_balance_history_minor_units\n        SELECT h.id, h.wallet_id, h.transaction_id, h.change_type,\n               CAST(ROUND(h.amount * COALESCE(s.scale, 100)) AS INTEGER),\n               CAST(ROUND(h.balance_before * COALESCE(s.scale, 100)) AS INTEGER),\n               CAST(ROUND(h.balance_after * COALESCE(s.scale, 100)) AS INTEGER),\n               h.description, h.created_at\n        FROM wallet_balance_history h\n        LEFT JOIN (\n            SELECT w.id, CASE WHEN w.currency IN ('BIF', 'CLP', 'JPY', 'KRW', 'VND', 'XAF', 'XOF') THEN 1\n                     WHEN w.currency IN ('BHD', 'JOD', 'KWD', 'OMR', 'TND') THEN 1000\n                     ELSE 100 END AS scale FROM wallets w\n        ) s ON s.id = h.wallet_id;\n\n        DROP TABLE wallet_balance_history;\n        ALTER TABLE wallet_balance_history_minor_units RENAME TO wallet_balance_history;\n        DROP TABLE wallets;\n        ALTER TABLE wallets_minor_units RENAME TO wallets;\n\n        CREATE UNIQUE INDEX IF NOT EXISTS idx_wallets_user_currency ON wallets(user_id, currency);\n        CREATE INDEX IF NOT EXISTS idx_wallet_history_wallet ON wallet_balance_history(wallet_id, created_at);\n        ",
+    },
+    "003_index_due_recurring_payments": {
+        "description": "Index active recurring payments by next payment date",
+        "sql": "\n        CREATE INDEX IF NOT EXISTS idx_recurring_payments_due ON recurring_payments(status, next_payment_date);\n        ",
+    },
 }
 for version, migration in PAYMENT_MIGRATIONS.items():
     migration_manager.apply_migration(
         version, migration["description"], migration["sql"]
     )
+outbox_relay = OutboxRelay(db_manager)
+if os.environ.get("OUTBOX_RELAY_ENABLED", "true").lower() == "true":
+    outbox_relay.start()
+app.extensions["idempotency_store"] = IdempotencyStore(db_manager)
+recurring_payment_scheduler = RecurringPaymentScheduler(db_manager)
+app.extensions["recurring_payment_scheduler"] = recurring_payment_scheduler
+if os.environ.get("RECURRING_SCHEDULER_ENABLED", "true").lower() == "true":
+    recurring_payment_scheduler.start()
 
 
 @app.route("/api/v1/health", methods=["GET"])
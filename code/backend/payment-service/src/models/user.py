@@ -7,6 +7,7 @@ from typing import Optional
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "shared"))
 from database.manager import BaseModel
+from wallets import from_minor_units
 
 
 class PaymentMethod(BaseModel):
@@ -54,21 +55,25 @@ class Wallet(BaseModel):
 
     def to_dict(self) -> object:
         data = super().to_dict()
-        data["balance"] = str(data.get("balance", 0))
-        data["available_balance"] = str(data.get("available_balance", 0))
-        data["pending_balance"] = str(data.get("pending_balance", 0))
-        data["reserved_balance"] = str(data.get("reserved_balance", 0))
+        currency = data.get("currency", "USD")
+        for field in (
+            "balance",
+            "available_balance",
+            "pending_balance",
+            "reserved_balance",
+        ):
+            data[field] = str(from_minor_units(data.get(field), currency))
         return data
 
 
 class WalletBalanceHistory(BaseModel):
     table_name: Optional[str] = "wallet_balance_history"
 
-    def to_dict(self) -> object:
+    def to_dict(self, currency: str = "USD") -> object:
+        """Amounts are minor units of the wallet's ``currency``"""
         data = super().to_dict()
-        data["amount"] = str(data.get("amount", 0))
-        data["balance_before"] = str(data.get("balance_before", 0))
-        data["balance_after"] = str(data.get("balance_after", 0))
+        for field in ("amount", "balance_before", "balance_after"):
+            data[field] = str(from_minor_units(data.get(field), currency))
         return data
 
 
@@ -0,0 +1,155 @@
+"""
+Payment transaction path
+Creating a transaction prices its fees by payment method, moves the
+user's wallet, and writes the transaction row, the payment method's last
+use and the ``transaction_created`` event in one database transaction.
+The HTTP route and the recurring payment scheduler both go through
+``record_transaction``.
+"""
+
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+
+from database.manager import DatabaseManager
+from database.outbox import add_outbox_event
+from utils.message_queue import Queues
+from wallets import (
+    apply_wallet_change,
+    currency_quantum,
+    get_or_create_wallet,
+    to_minor_units,
+)
+
+FEE_STRUCTURES = {
+    "card": {"percentage": Decimal("0.029"), "fixed": Decimal("0.30")},
+    "bank_account": {"percentage": Decimal("0.008"), "fixed": Decimal("0.00")},
+    "digital_wallet": {"percentage": Decimal("0.025"), "fixed": Decimal("0.00")},
+}
+
+
+def calculate_fees(
+    amount: Decimal, payment_method_type: str, processor_name: object = "default"
+) -> Decimal:
+    """Calculate transaction fees based on payment method and processor (simulated)"""
+    fee_structure = FEE_STRUCTURES.get(payment_method_type, FEE_STRUCTURES["card"])
+    percentage_fee = amount * fee_structure["percentage"]
+    total_fee = percentage_fee + fee_structure["fixed"]
+    return total_fee.quantize(Decimal("0.01"))
+
+
+def record_transaction(
+    db_manager: DatabaseManager,
+    user_id: str,
+    transaction_type: str,
+    amount: Any,
+    currency: str = "USD",
+    payment_method_id: Optional[str] = None,
+    description: Optional[str] = None,
+    reference: Optional[str] = None,
+    metadata: Any = None,
+) -> Dict[str, Any]:
+    """Create a transaction and apply it to the user's wallet
+
+    Payments credit the wallet with the amount net of fees, withdrawals
+    debit the full amount; other types are recorded as pending. Joins the
+    caller's open transaction, if any. Returns the transaction row; raises
+    ValueError for an invalid amount or payment method, and
+    InsufficientFundsError if a withdrawal would overdraw the wallet.
+    """
+    try:
+        amount = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {amount!r}")
+    if amount <= 0:
+        raise ValueError("Amount must be greater than 0")
+    to_minor_units(amount, currency)
+    payment_method = None
+    if payment_method_id:
+        payment_method = db_manager.fetch_one(
+            "SELECT id, type, provider FROM payment_methods "
+            "WHERE id = ? AND user_id = ? AND is_active = 1",
+            (payment_method_id, user_id),
+        )
+        if not payment_method:
+            raise ValueError("Invalid payment method")
+    fees = Decimal("0")
+    if payment_method:
+        fees = calculate_fees(
+            amount, payment_method["type"], payment_method["provider"]
+        ).quantize(currency_quantum(currency))
+    net_amount = amount - fees
+    now = datetime.utcnow().isoformat()
+    transaction = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "payment_method_id": payment_method_id,
+        "transaction_type": transaction_type,
+        "amount": float(amount),
+        "currency": currency,
+        "description": description,
+        "reference": reference,
+        "status": "pending",
+        "fees": float(fees),
+        "net_amount": float(net_amount),
+        "metadata": (
+            metadata
+            if metadata is None or isinstance(metadata, str)
+            else json.dumps(metadata)
+        ),
+        "created_at": now,
+        "updated_at": now,
+    }
+    wallet_change = None
+    if transaction_type == "payment":
+        wallet_change = (net_amount, "credit", f"Payment received: {description}")
+    elif transaction_type == "withdrawal":
+        wallet_change = (amount, "debit", f"Withdrawal: {description}")
+    if wallet_change:
+        wallet = get_or_create_wallet(db_manager, user_id, currency)
+        transaction.update(
+            status="completed",
+            external_transaction_id=f"ext_{uuid.uuid4().hex[:12]}",
+            processed_at=now,
+            settled_at=now,
+        )
+    # The wallet update, the transaction row and its event commit together;
+    # the wallet UPDATE comes first so the write lock is taken before any read
+    with db_manager.transaction() as conn:
+        if wallet_change:
+            change_amount, change_type, change_description = wallet_change
+            apply_wallet_change(
+                db_manager,
+                wallet["id"],
+                to_minor_units(change_amount, currency),
+                change_type,
+                change_description,
+                transaction["id"],
+            )
+        if payment_method:
+            conn.execute(
+                "UPDATE payment_methods SET last_used_at = ? WHERE id = ?",
+                (now, payment_method["id"]),
+            )
+        conn.execute(
+            f"INSERT INTO transactions ({', '.join(transaction)}) "
+            f"VALUES ({', '.join('?' for _ in transaction)})",
+            tuple(transaction.values()),
+        )
+        add_outbox_event(
+            conn,
+            Queues.PAYMENT_PROCESSING,
+            {
+                "event": "transaction_created",
+                "transaction_id": transaction["id"],
+                "user_id": user_id,
+                "transaction_type": transaction_type,
+                "status": transaction["status"],
+                "amount": transaction["amount"],
+                "net_amount": transaction["net_amount"],
+                "currency": currency,
+            },
+        )
+    return transaction
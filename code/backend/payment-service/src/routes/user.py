@@ -1,10 +1,9 @@
 import uuid
 from datetime import datetime
-from decimal import Decimal
 from functools import wraps
-from typing import Optional
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from middleware.idempotency import idempotent
 from models.user import (
     PaymentMethod,
     RecurringPayment,
@@ -12,6 +11,9 @@ from models.user import (
     Wallet,
     WalletBalanceHistory,
 )
+from payments import record_transaction
+from scheduler import occurrence
+from wallets import get_or_create_wallet
 
 payment_bp = Blueprint("payment", __name__)
 
@@ -30,79 +32,6 @@ def require_user_id(f: object) -> object:
     return decorated_function
 
 
-def calculate_fees(
-    amount: Decimal, payment_method_type: str, processor_name: object = "default"
-) -> Decimal:
-    """Calculate transaction fees based on payment method and processor (simulated)"""
-    fee_structures = {
-        "card": {"percentage": Decimal("0.029"), "fixed": Decimal("0.30")},
-        "bank_account": {"percentage": Decimal("0.008"), "fixed": Decimal("0.00")},
-        "digital_wallet": {"percentage": Decimal("0.025"), "fixed": Decimal("0.00")},
-    }
-    fee_structure = fee_structures.get(payment_method_type, fee_structures["card"])
-    percentage_fee = amount * fee_structure["percentage"]
-    total_fee = percentage_fee + fee_structure["fixed"]
-    return total_fee.quantize(Decimal("0.01"))
-
-
-def create_or_update_wallet(user_id: str, currency: object = "USD") -> Wallet:
-    """Create or get existing wallet for user and currency (simulated with custom ORM)"""
-    wallet = Wallet.find_one("user_id = ? AND currency = ?", (user_id, currency))
-    if not wallet:
-        wallet = Wallet(
-            id=str(uuid.uuid4()),
-            user_id=user_id,
-            currency=currency,
-            balance=0.0,
-            available_balance=0.0,
-            pending_balance=0.0,
-            reserved_balance=0.0,
-            is_active=True,
-            created_at=datetime.utcnow().isoformat(),
-            updated_at=datetime.utcnow().isoformat(),
-        )
-        wallet.save()
-    return wallet
-
-
-def update_wallet_balance(
-    wallet: Wallet,
-    amount: Decimal,
-    change_type: str,
-    description: str,
-    transaction_id: Optional[str] = None,
-) -> object:
-    """Update wallet balance and create history record (simulated with custom ORM)"""
-    amount_float = float(amount)
-    balance_before = wallet.balance
-    if change_type == "credit":
-        wallet.balance += amount_float
-        wallet.available_balance += amount_float
-    elif change_type == "debit":
-        wallet.balance -= amount_float
-        wallet.available_balance -= amount_float
-    elif change_type == "hold":
-        wallet.available_balance -= amount_float
-        wallet.reserved_balance += amount_float
-    elif change_type == "release":
-        wallet.available_balance += amount_float
-        wallet.reserved_balance -= amount_float
-    wallet.updated_at = datetime.utcnow().isoformat()
-    wallet.save()
-    history = WalletBalanceHistory(
-        id=str(uuid.uuid4()),
-        wallet_id=wallet.id,
-        transaction_id=transaction_id,
-        change_type=change_type,
-        amount=amount_float,
-        balance_before=balance_before,
-        balance_after=wallet.balance,
-        description=description,
-        created_at=datetime.utcnow().isoformat(),
-    )
-    history.save()
-
-
 @payment_bp.route("/payment-methods", methods=["GET"])
 @require_user_id
 def get_payment_methods() -> object:
@@ -313,6 +242,7 @@ def get_transactions() -> object:
 
 @payment_bp.route("/transactions", methods=["POST"])
 @require_user_id
+@idempotent()
 def create_transaction() -> object:
     """Create new transaction"""
     try:
@@ -321,76 +251,26 @@ def create_transaction() -> object:
         for field in required_fields:
             if not data.get(field):
                 return (jsonify({"error": f"{field} is required"}), 400)
-        amount = Decimal(str(data["amount"]))
-        if amount <= 0:
-            return (jsonify({"error": "Amount must be greater than 0"}), 400)
-        payment_method = None
-        if data.get("payment_method_id"):
-            payment_method = PaymentMethod.find_one(
-                "id = ? AND user_id = ? AND is_active = 1",
-                (data["payment_method_id"], request.user_id),
+        try:
+            transaction = record_transaction(
+                Transaction.db_manager,
+                request.user_id,
+                data["transaction_type"],
+                data["amount"],
+                data.get("currency", "USD"),
+                payment_method_id=data.get("payment_method_id"),
+                description=data.get("description"),
+                reference=data.get("reference"),
+                metadata=data.get("metadata"),
             )
-            if not payment_method:
-                return (jsonify({"error": "Invalid payment method"}), 400)
-        fees = Decimal("0")
-        if payment_method:
-            fees = calculate_fees(amount, payment_method.type, payment_method.provider)
-        net_amount = amount - fees
-        transaction = Transaction(
-            id=str(uuid.uuid4()),
-            user_id=request.user_id,
-            payment_method_id=data.get("payment_method_id"),
-            transaction_type=data["transaction_type"],
-            amount=float(amount),
-            currency=data.get("currency", "USD"),
-            description=data.get("description"),
-            reference=data.get("reference"),
-            status="pending",
-            fees=float(fees),
-            net_amount=float(net_amount),
-            metadata=data.get("metadata"),
-            created_at=datetime.utcnow().isoformat(),
-            updated_at=datetime.utcnow().isoformat(),
-        )
-        if data["transaction_type"] == "payment":
-            transaction.status = "completed"
-            transaction.external_transaction_id = f"ext_{uuid.uuid4().hex[:12]}"
-            transaction.processed_at = datetime.utcnow().isoformat()
-            transaction.settled_at = datetime.utcnow().isoformat()
-            wallet = create_or_update_wallet(request.user_id, transaction.currency)
-            update_wallet_balance(
-                wallet,
-                net_amount,
-                "credit",
-                f"Payment received: {transaction.description}",
-                transaction.id,
-            )
-        elif data["transaction_type"] == "withdrawal":
-            wallet = create_or_update_wallet(request.user_id, transaction.currency)
-            if wallet.available_balance < float(amount):
-                return (jsonify({"error": "Insufficient balance"}), 400)
-            transaction.status = "completed"
-            transaction.external_transaction_id = f"ext_{uuid.uuid4().hex[:12]}"
-            transaction.processed_at = datetime.utcnow().isoformat()
-            transaction.settled_at = datetime.utcnow().isoformat()
-            update_wallet_balance(
-                wallet,
-                amount,
-                "debit",
-                f"Withdrawal: {transaction.description}",
-                transaction.id,
-            )
-        else:
-            pass
-        if payment_method:
-            payment_method.last_used_at = datetime.utcnow().isoformat()
-            payment_method.save()
-        transaction.save()
+        except ValueError as e:
+            # Includes InsufficientFundsError for overdrawing withdrawals
+            return (jsonify({"error": str(e)}), 400)
         return (
             jsonify(
                 {
                     "message": "Transaction created successfully",
-                    "transaction": transaction.to_dict(),
+                    "transaction": Transaction(**transaction).to_dict(),
                 }
             ),
             201,
@@ -446,7 +326,11 @@ def get_wallet_by_currency(currency: object) -> object:
             (request.user_id, currency.upper()),
         )
         if not wallet:
-            wallet = create_or_update_wallet(request.user_id, currency.upper())
+            wallet = Wallet(
+                **get_or_create_wallet(
+                    Wallet.db_manager, request.user_id, currency.upper()
+                )
+            )
         return (jsonify({"wallet": wallet.to_dict()}), 200)
     except Exception as e:
         return (jsonify({"error": "Failed to get wallet", "details": str(e)}), 500)
@@ -470,7 +354,7 @@ def get_wallet_history(currency: object) -> object:
             jsonify(
                 {
                     "wallet": wallet.to_dict(),
-                    "history": [record.to_dict() for record in history],
+                    "history": [record.to_dict(wallet.currency) for record in history],
                     "total": len(history),
                 }
             ),
@@ -525,8 +409,12 @@ def create_recurring_payment() -> object:
         )
         if not payment_method:
             return (jsonify({"error": "Invalid payment method"}), 400)
+        try:
+            # Stored in the scheduler's normalized form (UTC, no offset)
+            next_payment_date = occurrence(data["start_date"], data["frequency"], 0)
+        except ValueError as e:
+            return (jsonify({"error": str(e)}), 400)
         start_date = data["start_date"]
-        next_payment_date = start_date
         recurring_payment = RecurringPayment(
             id=str(uuid.uuid4()),
             user_id=request.user_id,
@@ -546,6 +434,9 @@ def create_recurring_payment() -> object:
             updated_at=datetime.utcnow().isoformat(),
         )
         recurring_payment.save()
+        scheduler = current_app.extensions.get("recurring_payment_scheduler")
+        if scheduler and recurring_payment.status == "active":
+            scheduler.add(recurring_payment.id, next_payment_date)
         return (
             jsonify(
                 {
@@ -0,0 +1,373 @@
+"""
+Recurring payment scheduler
+Active schedules due within the next ``horizon`` are held in a min-heap
+keyed by due time in epoch milliseconds; schedules further out stay in the
+database, indexed on (status, next_payment_date), and are pulled in as the
+horizon moves, so memory follows the near-term load rather than the number
+of schedules. A worker thread sleeps until the earliest due time, pops what
+is due and executes it in batches: one database transaction per batch,
+with a savepoint per payment.
+
+Each payment goes through ``record_transaction`` in the same transaction
+as a compare-and-set advance of ``next_payment_date``, so it commits only
+if the schedule still has the due date it was queued with: an occurrence is
+charged once whether it is retried, raced by a second scheduler or rerun
+after a restart. Occurrences missed during downtime are overdue when the
+scheduler starts and run once each, oldest first.
+"""
+
+import calendar
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database.manager import DatabaseManager
+from payments import record_transaction
+
+logger = logging.getLogger(__name__)
+
+# (months, days) between occurrences
+FREQUENCIES = {
+    "daily": (0, 1),
+    "weekly": (0, 7),
+    "biweekly": (0, 14),
+    "monthly": (1, 0),
+    "quarterly": (3, 0),
+    "yearly": (12, 0),
+}
+
+# Delay before a payment that failed for a transient reason is retried
+RETRY_DELAY_MS = 60_000
+
+
+def _parse(value: str) -> datetime:
+    """Naive UTC datetime of an ISO date or datetime"""
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _format(value: datetime, date_only: bool) -> str:
+    if date_only:
+        return value.date().isoformat()
+    return value.isoformat(timespec="milliseconds")
+
+
+def to_epoch_ms(value: str) -> int:
+    """Epoch milliseconds of an ISO date or datetime (UTC if naive)"""
+    parsed = _parse(value)
+    return calendar.timegm(parsed.timetuple()) * 1000 + parsed.microsecond // 1000
+
+
+def from_epoch_ms(value: int) -> str:
+    """Naive UTC ISO datetime of epoch milliseconds"""
+    return _format(
+        datetime(1970, 1, 1) + timedelta(milliseconds=value), date_only=False
+    )
+
+
+def occurrence(start: str, frequency: str, index: int) -> str:
+    """Due date of the ``index``-th occurrence of a schedule
+
+    Monthly steps keep the start's day of month, clamped to short months.
+    Date-only starts give dates; others give UTC datetimes to the
+    millisecond. Raises ValueError for an unknown frequency or bad start.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency: {frequency}")
+    months, days = FREQUENCIES[frequency]
+    first = _parse(start)
+    if months:
+        month = first.month - 1 + months * index
+        year = first.year + month // 12
+        month = month % 12 + 1
+        day = min(first.day, calendar.monthrange(year, month)[1])
+        due = first.replace(year=year, month=month, day=day)
+    else:
+        due = first + timedelta(days=days * index)
+    return _format(due, date_only=len(str(start)) == 10)
+
+
+def next_occurrence(start: str, frequency: str, current: str) -> str:
+    """The occurrence following ``current``"""
+    months, days = FREQUENCIES[frequency]
+    first, due = _parse(start), _parse(current)
+    if months:
+        index = ((due.year - first.year) * 12 + due.month - first.month) // months
+    else:
+        index = (due - first).days // days
+    return occurrence(start, frequency, index + 1)
+
+
+class RecurringPaymentScheduler:
+    """Executes recurring payments as they fall due"""
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        batch_size: Optional[int] = None,
+        horizon_seconds: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db_manager = db_manager
+        self.batch_size = batch_size or int(os.getenv("RECURRING_BATCH_SIZE", "200"))
+        if horizon_seconds is None:
+            horizon_seconds = int(os.getenv("RECURRING_HORIZON_SECONDS", "300"))
+        self.horizon_ms = horizon_seconds * 1000
+        # How often the thread reloads, so schedules written by other
+        # processes are picked up within this delay
+        self.poll_ms = min(
+            int(float(os.getenv("RECURRING_POLL_SECONDS", "5")) * 1000),
+            self.horizon_ms // 2,
+        )
+        self.clock = clock
+        self.running = False
+        self.worker_thread: Optional[threading.Thread] = None
+        self._heap: List[Tuple[int, str]] = []
+        # Due time each queued schedule was pushed with; older heap entries
+        # for the same schedule are stale and skipped when popped
+        self._queued: Dict[str, int] = {}
+        self._loaded_until_ms: Optional[int] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.stats = {
+            "executed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "batches": 0,
+            "failures": 0,
+        }
+
+    def _now_ms(self) -> int:
+        return int(self.clock() * 1000)
+
+    def _push(self, schedule_id: str, due_ms: int) -> None:
+        """Queue a schedule if it falls inside the loaded horizon"""
+        if self._loaded_until_ms is None or due_ms >= self._loaded_until_ms:
+            return
+        self._queued[schedule_id] = due_ms
+        heapq.heappush(self._heap, (due_ms, schedule_id))
+
+    def load(self, now_ms: Optional[int] = None) -> int:
+        """Queue active schedules due before the end of the horizon
+
+        Every load reads all active schedules due before the horizon,
+        overdue ones included, so rows written by other processes are
+        picked up; schedules already queued are left as they are. Returns
+        the number of schedules read.
+        """
+        if now_ms is None:
+            now_ms = self._now_ms()
+        until_ms = now_ms + self.horizon_ms
+        # Epoch milliseconds computed by SQLite, which is much faster than
+        # parsing a million ISO strings in Python
+        rows = self.db_manager.fetch_all(
+            "SELECT id, CAST(ROUND((julianday(next_payment_date) - 2440587.5) "
+            "* 86400000) AS INTEGER) AS due_ms FROM recurring_payments "
+            "WHERE status = 'active' AND next_payment_date < ?",
+            (from_epoch_ms(until_ms),),
+        )
+        with self._lock:
+            self._loaded_until_ms = max(until_ms, self._loaded_until_ms or 0)
+            fresh = [
+                (row["due_ms"], row["id"])
+                for row in rows
+                if row["id"] not in self._queued
+            ]
+            if fresh:
+                self._queued.update(
+                    (schedule_id, due_ms) for due_ms, schedule_id in fresh
+                )
+                self._heap.extend(fresh)
+                heapq.heapify(self._heap)
+        return len(rows)
+
+    def add(self, schedule_id: str, next_payment_date: str) -> None:
+        """Queue a new or changed schedule without waiting for the next load"""
+        with self._lock:
+            self._push(schedule_id, to_epoch_ms(next_payment_date))
+        self._wake.set()
+
+    def _pop_due(self, now_ms: int) -> List[Tuple[int, str]]:
+        batch: List[Tuple[int, str]] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_ms:
+                due_ms, schedule_id = heapq.heappop(self._heap)
+                if self._queued.get(schedule_id) != due_ms:
+                    continue
+                del self._queued[schedule_id]
+                batch.append((due_ms, schedule_id))
+                if len(batch) == self.batch_size:
+                    break
+        return batch
+
+    def run_due(self, now_ms: Optional[int] = None) -> int:
+        """Execute every queued payment due by now; returns how many ran"""
+        executed = 0
+        while True:
+            batch = self._pop_due(self._now_ms() if now_ms is None else now_ms)
+            if not batch:
+                return executed
+            executed += self._execute_batch(batch)
+
+    def _execute_batch(self, batch: List[Tuple[int, str]]) -> int:
+        rows = {
+            row["id"]: row
+            for row in self.db_manager.fetch_all(
+                "SELECT * FROM recurring_payments "
+                "WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps([schedule_id for _, schedule_id in batch]),),
+            )
+        }
+        executed, skipped, failed = 0, 0, 0
+        requeue: List[Tuple[str, int]] = []
+        with self.db_manager.transaction() as conn:
+            for due_ms, schedule_id in batch:
+                row = rows.get(schedule_id)
+                # The heap key is when to run, which is later than the
+                # stored due date for retries; the stored date only matters
+                # for being due at all (the advance below checks it exactly)
+                if (
+                    row is None
+                    or row["status"] != "active"
+                    or to_epoch_ms(row["next_payment_date"]) > due_ms
+                ):
+                    skipped += 1
+                    continue
+                conn.execute("SAVEPOINT recurring_payment")
+                try:
+                    advanced = self._advance(conn, row)
+                    if advanced is None:
+                        skipped += 1
+                        conn.execute("RELEASE recurring_payment")
+                        continue
+                    record_transaction(
+                        self.db_manager,
+                        row["user_id"],
+                        "payment",
+                        row["amount"],
+                        row["currency"] or "USD",
+                        payment_method_id=row["payment_method_id"],
+                        description=row["description"],
+                        reference=schedule_id,
+                        metadata={
+                            "recurring_payment_id": schedule_id,
+                            "scheduled_for": row["next_payment_date"],
+                        },
+                    )
+                    conn.execute("RELEASE recurring_payment")
+                except ValueError as e:
+                    # The schedule itself is invalid (e.g. its payment
+                    # method was removed); retrying would fail the same way
+                    conn.execute("ROLLBACK TO recurring_payment")
+                    conn.execute("RELEASE recurring_payment")
+                    conn.execute(
+                        "UPDATE recurring_payments SET status = 'failed', "
+                        "updated_at = ? WHERE id = ?",
+                        (datetime.utcnow().isoformat(), schedule_id),
+                    )
+                    logger.error(f"Recurring payment {schedule_id} failed: {e}")
+                    failed += 1
+                    continue
+                except Exception as e:
+                    conn.execute("ROLLBACK TO recurring_payment")
+                    conn.execute("RELEASE recurring_payment")
+                    logger.error(f"Recurring payment {schedule_id} will retry: {e}")
+                    requeue.append((schedule_id, self._now_ms() + RETRY_DELAY_MS))
+                    failed += 1
+                    continue
+                executed += 1
+                next_payment_date, status = advanced
+                if status == "active":
+                    requeue.append((schedule_id, to_epoch_ms(next_payment_date)))
+        with self._lock:
+            for schedule_id, due_ms in requeue:
+                self._push(schedule_id, due_ms)
+        self.stats["batches"] += 1
+        self.stats["executed"] += executed
+        self.stats["skipped"] += skipped
+        self.stats["failed"] += failed
+        return executed
+
+    def _advance(self, conn: Any, row: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """Move the schedule past its current occurrence if no one else has
+
+        Returns the new next_payment_date and status, or None if the
+        schedule changed since it was read.
+        """
+        next_payment_date = next_occurrence(
+            row["start_date"], row["frequency"], row["next_payment_date"]
+        )
+        payments_made = (row["payments_made"] or 0) + 1
+        finished = (
+            row["total_payments"] and payments_made >= row["total_payments"]
+        ) or (row["end_date"] and _parse(next_payment_date) > _parse(row["end_date"]))
+        status = "completed" if finished else "active"
+        cursor = conn.execute(
+            "UPDATE recurring_payments SET next_payment_date = ?, "
+            "payments_made = payments_made + 1, status = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'active' AND next_payment_date = ?",
+            (
+                next_payment_date,
+                status,
+                datetime.utcnow().isoformat(),
+                row["id"],
+                row["next_payment_date"],
+            ),
+        )
+        if cursor.rowcount != 1:
+            return None
+        return next_payment_date, status
+
+    def start(self) -> object:
+        """Start the scheduler thread"""
+        self.running = True
+        self.worker_thread = threading.Thread(target=self._run, daemon=True)
+        self.worker_thread.start()
+
+    def stop(self, timeout: float = 30.0) -> object:
+        """Stop the scheduler thread; queued payments stay in the database"""
+        self.running = False
+        self._wake.set()
+        if self.worker_thread:
+            self.worker_thread.join(timeout)
+
+    def _run(self) -> object:
+        next_load_ms = 0
+        while self.running:
+            self._wake.clear()
+            try:
+                if self._now_ms() >= next_load_ms:
+                    self.load()
+                    next_load_ms = self._now_ms() + self.poll_ms
+                self.run_due()
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.error(f"Recurring payment scheduler failed, retrying: {e}")
+                self._wake.wait(1.0)
+                continue
+            with self._lock:
+                head_ms = self._heap[0][0] if self._heap else None
+            wait_ms = next_load_ms - self._now_ms()
+            if head_ms is not None:
+                wait_ms = min(wait_ms, head_ms - self._now_ms())
+            if wait_ms > 0:
+                self._wake.wait(wait_ms / 1000)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue size and execution counters"""
+        with self._lock:
+            queued = len(self._queued)
+            next_due = from_epoch_ms(self._heap[0][0]) if self._heap else None
+        return {
+            "queued": queued,
+            "next_due": next_due,
+            "worker_alive": bool(self.worker_thread and self.worker_thread.is_alive()),
+            **self.stats,
+        }
@@ -0,0 +1,158 @@
+"""
+Wallet balances in integer minor units
+Balances and history amounts are stored as integer counts of the currency's
+minor unit (cents for USD, yen for JPY), so repeated changes never drift.
+Each change is one conditional UPDATE that applies the delta in SQL and
+refuses to take any balance below zero, written with its history row in one
+transaction: concurrent debits of a hot wallet queue on the write lock
+instead of overwriting each other from stale reads.
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+
+from database.manager import DatabaseManager
+
+# Currencies whose minor unit is not a hundredth (ISO 4217 exponents)
+MINOR_UNIT_EXPONENTS = {
+    "BIF": 0,
+    "CLP": 0,
+    "JPY": 0,
+    "KRW": 0,
+    "VND": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "BHD": 3,
+    "JOD": 3,
+    "KWD": 3,
+    "OMR": 3,
+    "TND": 3,
+}
+
+# Sign applied to the amount for (balance, available, reserved) per change
+CHANGE_DELTAS = {
+    "credit": (1, 1, 0),
+    "debit": (-1, -1, 0),
+    "hold": (0, -1, 1),
+    "release": (0, 1, -1),
+}
+
+
+class InsufficientFundsError(ValueError):
+    """The change would take a wallet balance below zero"""
+
+
+def currency_quantum(currency: str) -> Decimal:
+    """Smallest amount of ``currency``, e.g. Decimal("0.01")"""
+    return Decimal(1).scaleb(-MINOR_UNIT_EXPONENTS.get(currency.upper(), 2))
+
+
+def to_minor_units(amount: Any, currency: str) -> int:
+    """Amount in integer minor units; raises ValueError if it is not a
+    whole number of them"""
+    try:
+        value = Decimal(str(amount).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {amount!r}")
+    quantum = currency_quantum(currency)
+    if not value.is_finite() or value % quantum:
+        raise ValueError(f"Invalid {currency} amount {value}")
+    return int(value / quantum)
+
+
+def from_minor_units(units: Optional[int], currency: str) -> Decimal:
+    """Decimal amount of a minor-unit count"""
+    quantum = currency_quantum(currency)
+    return (Decimal(int(units or 0)) * quantum).quantize(quantum)
+
+
+def get_or_create_wallet(
+    db_manager: DatabaseManager, user_id: str, currency: str = "USD"
+) -> Dict[str, Any]:
+    """The user's wallet in ``currency``, created empty on first use
+
+    The insert is conditional on no wallet existing, and the unique
+    (user_id, currency) index makes concurrent first uses that race past
+    that check insert nothing, so each user ends up with one wallet.
+    """
+    now = datetime.utcnow().isoformat()
+    db_manager.execute_query(
+        "INSERT OR IGNORE INTO wallets "
+        "(id, user_id, currency, created_at, updated_at) "
+        "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS "
+        "(SELECT 1 FROM wallets WHERE user_id = ? AND currency = ?)",
+        (str(uuid.uuid4()), user_id, currency, now, now, user_id, currency),
+    )
+    return db_manager.fetch_one(
+        "SELECT * FROM wallets WHERE user_id = ? AND currency = ? "
+        "ORDER BY created_at LIMIT 1",
+        (user_id, currency),
+    )
+
+
+def apply_wallet_change(
+    db_manager: DatabaseManager,
+    wallet_id: str,
+    amount: int,
+    change_type: str,
+    description: str,
+    transaction_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Apply a change of ``amount`` minor units and record its history row
+
+    Joins the caller's open transaction, if any. Returns the history row;
+    raises InsufficientFundsError, leaving the wallet untouched, if the
+    change would make a balance negative.
+    """
+    if change_type not in CHANGE_DELTAS:
+        raise ValueError(f"Unknown wallet change type: {change_type}")
+    if amount < 0:
+        raise ValueError("Wallet change amounts must not be negative")
+    balance, available, reserved = (
+        sign * amount for sign in CHANGE_DELTAS[change_type]
+    )
+    now = datetime.utcnow().isoformat()
+    with db_manager.transaction() as conn:
+        row = conn.execute(
+            """
+            UPDATE wallets SET
+                balance = balance + ?,
+                available_balance = available_balance + ?,
+                reserved_balance = reserved_balance + ?,
+                updated_at = ?
+            WHERE id = ? AND balance + ? >= 0
+              AND available_balance + ? >= 0 AND reserved_balance + ? >= 0
+            RETURNING balance
+            """,
+            (
+                balance,
+                available,
+                reserved,
+                now,
+                wallet_id,
+                balance,
+                available,
+                reserved,
+            ),
+        ).fetchone()
+        if row is None:
+            raise InsufficientFundsError("Insufficient balance")
+        history = {
+            "id": str(uuid.uuid4()),
+            "wallet_id": wallet_id,
+            "transaction_id": transaction_id,
+            "change_type": change_type,
+            "amount": amount,
+            "balance_before": row["balance"] - balance,
+            "balance_after": row["balance"],
+            "description": description,
+            "created_at": now,
+        }
+        conn.execute(
+            f"INSERT INTO wallet_balance_history ({', '.join(history)}) "
+            f"VALUES ({', '.join('?' for _ in history)})",
+            tuple(history.values()),
+        )
+    return history
@@ -0,0 +1,424 @@
+"""
+Compressed audit archive for NexaFi
+Compacts closed daily audit JSONL files into zstd block files with a sidecar
+index, so time-range, user and event-type lookups only decompress the
+blocks that can match
+"""
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = ".jsonl.zst"
+INDEX_SUFFIX = ".idx.json"
+
+
+def _day_of(file_name: str) -> Optional[date]:
+    """Date of an ``audit_YYYY-MM-DD...`` file, or None for other files"""
+    if not file_name.startswith("audit_"):
+        return None
+    try:
+        return date.fromisoformat(file_name[6:16])
+    except ValueError:
+        return None
+
+
+def _epoch(timestamp: str) -> float:
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class AuditArchive:
+    """Block-compressed, indexed storage for closed audit days
+
+    ``compact_day`` turns ``audit_<day>.jsonl`` into ``audit_<day>.jsonl.zst``
+    (one zstd frame per block of ``block_size`` events) plus
+    ``audit_<day>.idx.json``. The index records each block's byte offset,
+    length, time span and sequence span, and maps user ids and event types
+    to the blocks containing them.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        block_size: int = 2000,
+        compression_level: int = 10,
+    ) -> None:
+        self.log_dir = log_dir
+        self.block_size = block_size
+        self.compression_level = compression_level
+        self._indexes: Dict[date, Dict[str, Any]] = {}
+        # Live days: first sequence in the file, and (bytes indexed,
+        # line sequences, line offsets) built incrementally as it grows
+        self._live_first: Dict[date, int] = {}
+        self._live_lines: Dict[date, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, day: date, suffix: str) -> str:
+        return os.path.join(self.log_dir, f"audit_{day.isoformat()}{suffix}")
+
+    def archived_days(self) -> List[date]:
+        if not os.path.isdir(self.log_dir):
+            return []
+        return sorted(
+            _day_of(name)
+            for name in os.listdir(self.log_dir)
+            if name.endswith(INDEX_SUFFIX) and _day_of(name)
+        )
+
+    def live_days(self) -> List[date]:
+        """Days still stored as plain JSONL (not yet archived)"""
+        if not os.path.isdir(self.log_dir):
+            return []
+        days = {
+            _day_of(name)
+            for name in os.listdir(self.log_dir)
+            if name.endswith(".jsonl")
+        }
+        days.discard(None)
+        return sorted(days - set(self.archived_days()))
+
+    def compact_closed_days(self, today: Optional[date] = None) -> List[date]:
+        """Compact every daily file older than ``today``; returns the days done"""
+        today = today or datetime.now().date()
+        compacted = []
+        for day in self.live_days():
+            if day < today:
+                self.compact_day(day)
+                compacted.append(day)
+        return compacted
+
+    def compact_day(self, day: date, remove_source: bool = True) -> Dict[str, Any]:
+        """Compress one closed day into blocks and write its index"""
+        source = self._path(day, ".jsonl")
+        compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        blocks: List[Dict[str, Any]] = []
+        users: Dict[str, List[int]] = {}
+        event_types: Dict[str, List[int]] = {}
+        archive_tmp = self._path(day, ARCHIVE_SUFFIX) + ".tmp"
+        offset = 0
+        with open(source, "rb") as src, open(archive_tmp, "wb") as out:
+            lines: List[bytes] = []
+            for line in src:
+                if line.strip():
+                    lines.append(line)
+                if len(lines) >= self.block_size:
+                    offset = self._write_block(
+                        compressor, out, lines, offset, blocks, users, event_types
+                    )
+                    lines = []
+            if lines:
+                offset = self._write_block(
+                    compressor, out, lines, offset, blocks, users, event_types
+                )
+        index = {
+            "day": day.isoformat(),
+            "event_count": sum(b["count"] for b in blocks),
+            "source_bytes": os.path.getsize(source),
+            "archive_bytes": offset,
+            "blocks": blocks,
+            "user_ids": users,
+            "event_types": event_types,
+        }
+        index_tmp = self._path(day, INDEX_SUFFIX) + ".tmp"
+        with open(index_tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(archive_tmp, self._path(day, ARCHIVE_SUFFIX))
+        os.replace(index_tmp, self._path(day, INDEX_SUFFIX))
+        with self._lock:
+            self._indexes[day] = index
+        if remove_source:
+            os.remove(source)
+        logger.info(
+            f"Compacted audit day {day}: {index['event_count']} events, "
+            f"{index['source_bytes']} -> {index['archive_bytes']} bytes"
+        )
+        return index
+
+    @staticmethod
+    def _write_block(
+        compressor: zstandard.ZstdCompressor,
+        out: object,
+        lines: List[bytes],
+        offset: int,
+        blocks: List[Dict[str, Any]],
+        users: Dict[str, List[int]],
+        event_types: Dict[str, List[int]],
+    ) -> int:
+        block_number = len(blocks)
+        times = []
+        sequences = []
+        for line in lines:
+            event = json.loads(line)
+            times.append(_epoch(event["timestamp"]))
+            if event.get("sequence") is not None:
+                sequences.append(event["sequence"])
+            for key, table in (
+                (event.get("user_id"), users),
+                (event.get("event_type"), event_types),
+            ):
+                if key is not None:
+                    blocks_for_key = table.setdefault(str(key), [])
+                    if not blocks_for_key or blocks_for_key[-1] != block_number:
+                        blocks_for_key.append(block_number)
+        frame = compressor.compress(b"".join(lines))
+        out.write(frame)
+        blocks.append(
+            {
+                "offset": offset,
+                "length": len(frame),
+                "count": len(lines),
+                "first_ts": min(times),
+                "last_ts": max(times),
+                "first_sequence": min(sequences) if sequences else None,
+                "last_sequence": max(sequences) if sequences else None,
+            }
+        )
+        return offset + len(frame)
+
+    def load_index(self, day: date) -> Dict[str, Any]:
+        with self._lock:
+            index = self._indexes.get(day)
+        if index is None:
+            with open(self._path(day, INDEX_SUFFIX)) as f:
+                index = json.load(f)
+            with self._lock:
+                self._indexes[day] = index
+        return index
+
+    def _read_blocks(
+        self, day: date, block_numbers: List[int], needles: tuple = ()
+    ) -> Iterator[Dict]:
+        """Decompress the given blocks; lines lacking any needle are skipped
+        before JSON decoding"""
+        index = self.load_index(day)
+        decompressor = zstandard.ZstdDecompressor()
+        with open(self._path(day, ARCHIVE_SUFFIX), "rb") as f:
+            for number in block_numbers:
+                block = index["blocks"][number]
+                f.seek(block["offset"])
+                data = decompressor.decompress(f.read(block["length"]))
+                for line in data.splitlines():
+                    if all(needle in line for needle in needles):
+                        yield json.loads(line)
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        include_live: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield archived events matching every given filter
+
+        ``start``/``end`` bound the event timestamp (inclusive). Only blocks
+        whose time span and user/event-type entries can match are read.
+        Days that have not been compacted yet are scanned when
+        ``include_live`` is set.
+        """
+        start_ts = start.timestamp() if start else float("-inf")
+        end_ts = end.timestamp() if end else float("inf")
+        # Daily files are cut on local time while events carry UTC, so keep
+        # a day of slack when choosing files.
+        first_day = (start - timedelta(days=1)).date() if start else date.min
+        last_day = (end + timedelta(days=1)).date() if end else date.max
+
+        def matches(event: Dict[str, Any]) -> bool:
+            if user_id is not None and event.get("user_id") != user_id:
+                return False
+            if event_type is not None and event.get("event_type") != event_type:
+                return False
+            return start_ts <= _epoch(event["timestamp"]) <= end_ts
+
+        # A matching line must contain the JSON-encoded filter values.
+        needles = tuple(
+            json.dumps(value).encode()
+            for value in (user_id, event_type)
+            if value is not None
+        )
+        for day in self.archived_days():
+            if not first_day <= day <= last_day:
+                continue
+            index = self.load_index(day)
+            candidates = [
+                number
+                for number, block in enumerate(index["blocks"])
+                if block["last_ts"] >= start_ts and block["first_ts"] <= end_ts
+            ]
+            for key, table in ((user_id, "user_ids"), (event_type, "event_types")):
+                if key is not None:
+                    allowed = set(index[table].get(str(key), ()))
+                    candidates = [n for n in candidates if n in allowed]
+            for event in self._read_blocks(day, candidates, needles):
+                if matches(event):
+                    yield event
+
+        if include_live:
+            for day in self.live_days():
+                if first_day <= day <= last_day:
+                    with open(self._path(day, ".jsonl")) as f:
+                        for line in f:
+                            if line.strip():
+                                event = json.loads(line)
+                                if matches(event):
+                                    yield event
+
+    def events_by_sequence(self, first: int, last: int) -> List[Dict[str, Any]]:
+        """Archived events with sequence numbers ``first``..``last``"""
+        events = []
+        for day in self.archived_days():
+            index = self.load_index(day)
+            numbers = [
+                number
+                for number, block in enumerate(index["blocks"])
+                if block["first_sequence"] is not None
+                and block["last_sequence"] >= first
+                and block["first_sequence"] <= last
+            ]
+            events.extend(
+                event
+                for event in self._read_blocks(day, numbers)
+                if first <= event.get("sequence", -1) <= last
+            )
+        return events
+
+    def _live_first_sequence(self, day: date) -> Optional[int]:
+        first = self._live_first.get(day)
+        if first is None:
+            with open(self._path(day, ".jsonl"), "rb") as f:
+                line = f.readline()
+            if not line.endswith(b"\n"):
+                return None
+            first = json.loads(line).get("sequence", -1)
+            self._live_first[day] = first
+        return first
+
+    def _live_last_sequence(self, day: date) -> Optional[int]:
+        """Sequence of the last complete line, read from the file's tail"""
+        with open(self._path(day, ".jsonl"), "rb") as f:
+            start = max(f.seek(0, os.SEEK_END) - 65536, 0)
+            f.seek(start)
+            lines = f.read().split(b"\n")
+        # Past the start of the file the first piece may be a partial line
+        if len(lines) < (3 if start else 2) or not lines[-2].strip():
+            return None
+        return json.loads(lines[-2]).get("sequence", -1)
+
+    def _live_line_index(self, day: date) -> tuple:
+        """Sequence and byte offset of every complete line in a live day,
+        parsing only the lines appended since the previous call"""
+        path = self._path(day, ".jsonl")
+        cached = self._live_lines.get(day)
+        if cached is not None and os.path.getsize(path) >= cached[0]:
+            try:
+                return self._index_lines(day, *cached)
+            except ValueError:
+                pass  # rewritten since it was indexed; start over
+        return self._index_lines(day, 0, [], [])
+
+    def _index_lines(
+        self, day: date, indexed: int, sequences: List[int], offsets: List[int]
+    ) -> tuple:
+        with open(self._path(day, ".jsonl"), "rb") as f:
+            f.seek(indexed)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    sequences.append(json.loads(line).get("sequence", -1))
+                    offsets.append(indexed)
+                indexed += len(line)
+        self._live_lines[day] = (indexed, sequences, offsets)
+        return sequences, offsets
+
+    def live_events_by_sequence(self, first: int, last: int) -> List[Dict[str, Any]]:
+        """Live (not yet archived) events with sequence numbers ``first``..``last``
+
+        Sequence numbers grow across daily files, so each day's first
+        sequence bounds which files can match, and only those are indexed.
+        Within a file, lines are located through the sequence index and
+        only the matching ones are decoded.
+        """
+        events: List[Dict[str, Any]] = []
+        with self._lock:
+            days = self.live_days()
+            for stale in set(self._live_lines) - set(days):
+                del self._live_lines[stale]
+                self._live_first.pop(stale, None)
+            starts = [self._live_first_sequence(day) for day in days]
+            for position, day in enumerate(days):
+                if starts[position] is not None and starts[position] > last:
+                    break
+                following = [s for s in starts[position + 1 :] if s is not None]
+                if following and following[0] <= first:
+                    continue
+                if not following and day not in self._live_lines:
+                    ending = self._live_last_sequence(day)
+                    if ending is not None and ending < first:
+                        continue
+                found = self._live_day_events(day, first, last)
+                if found is None:
+                    # The file was rewritten under the index; rebuild it
+                    self._live_lines.pop(day, None)
+                    self._live_first.pop(day, None)
+                    found = self._live_day_events(day, first, last) or []
+                events.extend(found)
+        return events
+
+    def _live_day_events(
+        self, day: date, first: int, last: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        sequences, offsets = self._live_line_index(day)
+        events = []
+        with open(self._path(day, ".jsonl"), "rb") as f:
+            line = bisect_left(sequences, first)
+            for offset, sequence in zip(offsets[line:], sequences[line:]):
+                if sequence > last:
+                    break
+                f.seek(offset)
+                try:
+                    event = json.loads(f.readline())
+                except ValueError:
+                    return None
+                if event.get("sequence", -1) != sequence:
+                    return None
+                events.append(event)
+        return events
+
+
+def main() -> None:
+    """Compaction job: ``python -m shared.audit.archive --log-dir <dir>``"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact closed audit log days")
+    parser.add_argument(
+        "--log-dir",
+        default=os.environ.get(
+            "AUDIT_LOG_DIR", os.path.join(os.path.expanduser("~"), "logs", "audit")
+        ),
+    )
+    parser.add_argument("--block-size", type=int, default=2000)
+    parser.add_argument("--level", type=int, default=10)
+    args = parser.parse_args()
+    archive = AuditArchive(args.log_dir, args.block_size, args.level)
+    for day in archive.compact_closed_days():
+        index = archive.load_index(day)
+        print(
+            f"{day}: {index['event_count']} events, "
+            f"{index['source_bytes']} -> {index['archive_bytes']} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
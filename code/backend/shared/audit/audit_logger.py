@@ -6,17 +6,26 @@ Implements immutable audit trails for financial transactions and system events
 import hashlib
 import json
 import logging
+import os
 import queue
 import threading
 import time
 import uuid
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+from .archive import AuditArchive
+from .integrity import SegmentedHashChain
 
 logger = logging.getLogger(__name__)
 
+# Queued by stop_worker() to wake the worker without waiting for a timeout
+_STOP = object()
+# Upper bound for "every sequence from here on" range reads
+_MAX_SEQUENCE = 2**62
+
 
 class AuditEventType(Enum):
     """Types of audit events"""
@@ -82,93 +91,552 @@ class AuditEvent:
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert audit event to dictionary"""
-        data = asdict(self)
+        # Shallow copy: dataclasses.asdict deep-copies every nested value and
+        # dominated the cost of storing an event.
+        data = dict(self.__dict__)
         data["event_type"] = self.event_type.value
         data["severity"] = self.severity.value
         data["timestamp"] = self.timestamp.isoformat()
         return data
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AuditEvent":
+        """Rebuild an event from ``to_dict`` output"""
+        values = dict(data)
+        values["event_type"] = AuditEventType(values["event_type"])
+        values["severity"] = AuditSeverity(values["severity"])
+        values["timestamp"] = datetime.fromisoformat(values["timestamp"])
+        return cls(**values)
+
     def calculate_hash(self) -> str:
         """Calculate hash of audit event for integrity verification"""
-        canonical_data = {
-            "event_id": self.event_id,
-            "event_type": self.event_type.value,
-            "timestamp": self.timestamp.isoformat(),
-            "user_id": self.user_id,
-            "action": self.action,
-            "details": json.dumps(self.details, sort_keys=True),
-            "success": self.success,
-        }
-        canonical_string = json.dumps(canonical_data, sort_keys=True)
-        return hashlib.sha256(canonical_string.encode()).hexdigest()
+        return compute_event_hash(
+            {
+                "event_id": self.event_id,
+                "event_type": self.event_type.value,
+                "timestamp": self.timestamp.isoformat(),
+                "user_id": self.user_id,
+                "action": self.action,
+                "details": self.details,
+                "success": self.success,
+            }
+        )
 
 
-class AuditLogger:
-    """Audit logging system with integrity verification"""
+def compute_event_hash(event_data: Dict[str, Any]) -> str:
+    """Recompute an event hash from its stored form (file line or DB row)"""
+    details = event_data.get("details") or {}
+    if isinstance(details, str):
+        details = json.loads(details)
+    canonical_data = {
+        "event_id": event_data["event_id"],
+        "event_type": event_data["event_type"],
+        "timestamp": event_data["timestamp"],
+        "user_id": event_data.get("user_id"),
+        "action": event_data["action"],
+        "details": json.dumps(details, sort_keys=True),
+        "success": bool(event_data["success"]),
+    }
+    canonical_string = json.dumps(canonical_data, sort_keys=True)
+    return hashlib.sha256(canonical_string.encode()).hexdigest()
+
+
+class DatabaseAuditBackend:
+    """Audit storage backend writing to the ``audit_log`` table"""
+
+    INSERT_SQL = (
+        "INSERT INTO audit_log (event_id, event_type, user_id, resource_type, "
+        "resource_id, action, details, ip_address, user_agent, success, "
+        "error_message, event_hash, chain_hash, previous_hash, sequence, "
+        "timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    SEGMENT_SQL = (
+        "INSERT INTO audit_segments (segment_index, first_sequence, event_count, "
+        "merkle_root, previous_hash, segment_hash) VALUES (?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, db_manager: object) -> None:
+        self.db_manager = db_manager
+
+    @staticmethod
+    def _row(event_data: Dict[str, Any]) -> tuple:
+        return (
+            event_data["event_id"],
+            event_data["event_type"],
+            event_data.get("user_id"),
+            event_data.get("resource_type"),
+            event_data.get("resource_id"),
+            event_data["action"],
+            json.dumps(event_data.get("details") or {}),
+            event_data.get("ip_address"),
+            event_data.get("user_agent"),
+            event_data["success"],
+            event_data.get("error_message"),
+            event_data["event_hash"],
+            event_data["chain_hash"],
+            event_data.get("previous_hash"),
+            event_data.get("sequence"),
+            event_data.get("timestamp"),
+        )
+
+    def store(self, event_data: Dict[str, Any]) -> object:
+        self.store_many([event_data])
+
+    def store_many(self, events: List[Dict[str, Any]]) -> object:
+        """Insert a batch of audit events in one transaction"""
+        with self.db_manager.transaction() as conn:
+            conn.executemany(self.INSERT_SQL, [self._row(e) for e in events])
+
+    def store_segments(self, segments: List[Dict[str, Any]]) -> object:
+        with self.db_manager.transaction() as conn:
+            conn.executemany(
+                self.SEGMENT_SQL,
+                [
+                    (
+                        s["index"],
+                        s["first_sequence"],
+                        s["event_count"],
+                        s["merkle_root"],
+                        s["previous_hash"],
+                        s["segment_hash"],
+                    )
+                    for s in segments
+                ],
+            )
 
-    def __init__(self, storage_backend: object = None) -> None:
+    def load_segments(self) -> List[Dict[str, Any]]:
+        return self.db_manager.fetch_all(
+            'SELECT segment_index AS "index", first_sequence, event_count, '
+            "merkle_root, previous_hash, segment_hash FROM audit_segments "
+            "ORDER BY segment_index"
+        )
+
+    def load_events(self, first: int, last: int) -> List[Dict[str, Any]]:
+        return self.db_manager.fetch_all(
+            "SELECT * FROM audit_log WHERE sequence BETWEEN ? AND ? "
+            "ORDER BY sequence",
+            (first, last),
+        )
+
+
+class AuditLogger:
+    """Audit logging system with integrity verification
+
+    The background worker drains the queue in batches of up to
+    ``batch_size`` events or whatever arrived within ``batch_window_ms``.
+    Each batch is written with a single ``write`` to the day's JSONL file,
+    which stays open until midnight (optionally followed by ``fsync``), or
+    handed to ``storage_backend.store_many`` when the backend supports it.
+
+    Events are numbered and grouped into Merkle segments of ``segment_size``
+    events (see ``SegmentedHashChain``). An event's ``chain_hash`` links it
+    to the hash of the last sealed segment rather than to the previous
+    event; sealed segments are persisted next to the events.
+
+    ``log_event`` never waits on audit I/O. The queue holds at most
+    ``queue_size`` events; when it is full the ``overflow_policy`` applies:
+    ``"spill"`` appends the event to a local journal that the worker
+    replays once it catches up, ``"block"`` waits up to
+    ``block_timeout_ms`` for room and then drops the event. The worker is
+    restarted if it dies; see ``get_stats`` for the counters.
+    """
+
+    SEGMENTS_FILE = "chain_segments.jsonl"
+    SPILL_FILE = "spill_journal.jsonl"
+    OVERFLOW_POLICIES = ("spill", "block")
+
+    def __init__(
+        self,
+        storage_backend: object = None,
+        batch_size: Optional[int] = None,
+        batch_window_ms: Optional[float] = None,
+        fsync: Optional[bool] = None,
+        log_dir: Optional[str] = None,
+        segment_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        overflow_policy: Optional[str] = None,
+        block_timeout_ms: Optional[float] = None,
+    ) -> None:
         self.storage_backend = storage_backend
-        self.event_queue = queue.Queue()
+        self.batch_size = batch_size or int(os.environ.get("AUDIT_BATCH_SIZE", 500))
+        if batch_window_ms is None:
+            batch_window_ms = float(os.environ.get("AUDIT_BATCH_WINDOW_MS", 50))
+        self.batch_window = batch_window_ms / 1000
+        if fsync is None:
+            fsync = os.environ.get("AUDIT_FSYNC", "false").lower() == "true"
+        self.fsync = fsync
+        self.log_dir = log_dir or os.environ.get(
+            "AUDIT_LOG_DIR", os.path.join(os.path.expanduser("~"), "logs", "audit")
+        )
+        self.chain = SegmentedHashChain(
+            segment_size or int(os.environ.get("AUDIT_SEGMENT_SIZE", 1024))
+        )
+        self.queue_size = queue_size or int(os.environ.get("AUDIT_QUEUE_SIZE", 10000))
+        self.overflow_policy = overflow_policy or os.environ.get(
+            "AUDIT_OVERFLOW_POLICY", "spill"
+        )
+        if self.overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {self.overflow_policy}")
+        if block_timeout_ms is None:
+            block_timeout_ms = float(os.environ.get("AUDIT_BLOCK_TIMEOUT_MS", 5))
+        self.block_timeout = block_timeout_ms / 1000
+        self.event_queue = queue.Queue(maxsize=self.queue_size)
         self.worker_thread = None
         self.running = False
-        self.previous_hash = None
+        self._file = None
+        self._file_date = None
+        self._spill_file = None
+        self._spill_lock = threading.Lock()
+        self._spill_backlog = 0
+        self._spill_unsynced = 0
+        self._worker_lock = threading.Lock()
+        self.stats = {"dropped": 0, "spilled": 0, "replayed": 0, "worker_restarts": 0}
+        self.archive = AuditArchive(self.log_dir)
+        self._load_segments()
+        self._recover_spill_journal()
         self.start_worker()
 
     def start_worker(self) -> object:
         """Start background worker thread for processing audit events"""
         self.running = True
-        self.worker_thread = threading.Thread(target=self._process_events, daemon=True)
+        self.worker_thread = threading.Thread(target=self._run_worker, daemon=True)
         self.worker_thread.start()
 
+    def _run_worker(self) -> object:
+        """Supervise the worker loop, restarting it after unexpected errors"""
+        while True:
+            try:
+                self._process_events()
+                return
+            except Exception as e:
+                self.stats["worker_restarts"] += 1
+                logger.error(f"Audit worker crashed, restarting: {e}")
+                time.sleep(0.1)
+
+    def _ensure_worker(self) -> object:
+        """Restart the worker thread if it is no longer alive"""
+        if self.running and not self.worker_thread.is_alive():
+            with self._worker_lock:
+                if not self.worker_thread.is_alive():
+                    self.stats["worker_restarts"] += 1
+                    logger.error("Audit worker thread died, restarting")
+                    self.start_worker()
+
     def stop_worker(self) -> object:
-        """Stop background worker thread"""
+        """Stop background worker thread after draining queued events"""
         self.running = False
         if self.worker_thread:
+            self.event_queue.put(_STOP)
             self.worker_thread.join()
+        if self._spill_backlog:
+            self._replay_spilled()
+        sealed = self.chain.seal()
+        if sealed:
+            self._store_segments([sealed.to_dict()])
+        self._close_file()
+
+    def flush(self) -> object:
+        """Block until every queued and spilled event has been stored"""
+        self.event_queue.join()
+        while self._spill_backlog and self.worker_thread.is_alive():
+            time.sleep(0.01)
+        self.event_queue.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and overflow counters"""
+        return {
+            "queue_depth": self.event_queue.qsize(),
+            "queue_capacity": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "spill_backlog": self._spill_backlog,
+            "worker_alive": bool(self.worker_thread and self.worker_thread.is_alive()),
+            **self.stats,
+        }
+
+    def _enqueue(self, event: AuditEvent) -> object:
+        """Hand an event to the worker without waiting on audit I/O"""
+        self._ensure_worker()
+        try:
+            self.event_queue.put_nowait(event)
+            return
+        except queue.Full:
+            pass
+        if self.overflow_policy == "spill":
+            self._spill(event)
+            return
+        try:
+            self.event_queue.put(event, timeout=self.block_timeout)
+        except queue.Full:
+            with self._spill_lock:
+                self.stats["dropped"] += 1
+
+    def _spill(self, event: AuditEvent) -> object:
+        """Append an event the queue had no room for to the spill journal
+
+        Each event is flushed to the OS as it is written. The journal is
+        fsynced every ``batch_size`` events, and by the worker after each
+        batch it stores, so a burst of spills costs one fsync per batch.
+        """
+        line = json.dumps(event.to_dict()) + "\n"
+        with self._spill_lock:
+            try:
+                if self._spill_file is None:
+                    os.makedirs(self.log_dir, exist_ok=True)
+                    self._spill_file = open(
+                        os.path.join(self.log_dir, self.SPILL_FILE), "a"
+                    )
+                self._spill_file.write(line)
+                self._spill_file.flush()
+                self._spill_backlog += 1
+                self._spill_unsynced += 1
+                self.stats["spilled"] += 1
+                if self._spill_unsynced >= self.batch_size:
+                    self._sync_spill_file()
+            except OSError as e:
+                self.stats["dropped"] += 1
+                logger.error(f"Audit spill journal unavailable: {e}")
+
+    def _sync_spill_file(self) -> object:
+        """fsync spilled events not yet on disk; call with the spill lock"""
+        if self._spill_file is not None and self._spill_unsynced:
+            os.fsync(self._spill_file.fileno())
+        self._spill_unsynced = 0
+
+    def _recover_spill_journal(self) -> object:
+        """Pick up events spilled by a previous process"""
+        for name in (self.SPILL_FILE, self.SPILL_FILE + ".replay"):
+            path = os.path.join(self.log_dir, name)
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._spill_backlog += sum(1 for line in f if line.strip())
+
+    def _replay_spilled(self) -> object:
+        """Store spilled events once the queue has room again"""
+        replay_path = os.path.join(self.log_dir, self.SPILL_FILE + ".replay")
+        with self._spill_lock:
+            if self._spill_file is not None:
+                self._sync_spill_file()
+                self._spill_file.close()
+                self._spill_file = None
+            journal = os.path.join(self.log_dir, self.SPILL_FILE)
+            if not os.path.exists(replay_path) and os.path.exists(journal):
+                os.replace(journal, replay_path)
+        if not os.path.exists(replay_path):
+            return
+        with open(replay_path) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        for start in range(0, len(events), self.batch_size):
+            chunk = events[start : start + self.batch_size]
+            try:
+                self._store_batch([AuditEvent.from_dict(e) for e in chunk])
+            except Exception:
+                # Keep only what has not been stored for the next attempt.
+                with open(replay_path, "w") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in events[start:]))
+                raise
+            self.stats["replayed"] += len(chunk)
+            with self._spill_lock:
+                self._spill_backlog -= len(chunk)
+        os.remove(replay_path)
 
     def _process_events(self) -> object:
         """Background worker to process audit events"""
-        while self.running:
+        while self.running or not self.event_queue.empty():
+            if self._spill_backlog and self.event_queue.qsize() < self.queue_size // 2:
+                try:
+                    self._replay_spilled()
+                except Exception as e:
+                    logger.error(f"Error replaying spilled audit events: {e}")
+                    time.sleep(0.1)
             try:
-                event = self.event_queue.get(timeout=1)
-                self._store_event(event)
-                self.event_queue.task_done()
+                batch = self._next_batch()
             except queue.Empty:
                 continue
+            events = [event for event in batch if event is not _STOP]
+            try:
+                if events:
+                    self._store_batch(events)
             except Exception as e:
-                logger.info(f"Error processing audit event: {e}")
+                # Journal the batch so it is replayed once storage recovers
+                logger.error(f"Error storing audit events, spilling them: {e}")
+                for event in events:
+                    self._spill(event)
+            finally:
+                for _ in batch:
+                    self.event_queue.task_done()
+            if self._spill_unsynced:
+                with self._spill_lock:
+                    try:
+                        self._sync_spill_file()
+                    except OSError as e:
+                        logger.error(f"Audit spill journal unavailable: {e}")
+
+    def _next_batch(self) -> List[AuditEvent]:
+        """Collect events until the batch is full or the window closes"""
+        batch = [self.event_queue.get(timeout=1)]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.event_queue.get(timeout=remaining))
+                else:
+                    batch.append(self.event_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
 
-    def _store_event(self, event: AuditEvent) -> object:
-        """Store audit event with integrity chain"""
+    def _chain(self, event: AuditEvent, sealed: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Number an event, anchor it to the chain and return its stored form"""
         event_hash = event.calculate_hash()
-        if self.previous_hash:
-            chain_hash = hashlib.sha256(
-                (self.previous_hash + event_hash).encode()
-            ).hexdigest()
-        else:
-            chain_hash = event_hash
+        anchor = self.chain.head
+        sequence, segment = self.chain.append(event_hash)
+        if segment:
+            sealed.append(segment.to_dict())
         event_data = event.to_dict()
+        event_data["sequence"] = sequence
         event_data["event_hash"] = event_hash
-        event_data["chain_hash"] = chain_hash
-        event_data["previous_hash"] = self.previous_hash
-        if self.storage_backend:
-            self.storage_backend.store(event_data)
+        event_data["chain_hash"] = (
+            hashlib.sha256((anchor + event_hash).encode()).hexdigest()
+            if anchor
+            else event_hash
+        )
+        event_data["previous_hash"] = anchor
+        return event_data
+
+    def _store_event(self, event: AuditEvent) -> object:
+        """Store audit event with integrity chain"""
+        self._store_batch([event])
+
+    def _store_batch(self, events: List[AuditEvent]) -> object:
+        """Store a batch of audit events with one backend or file write"""
+        checkpoint = self.chain.checkpoint()
+        sealed: List[Dict[str, Any]] = []
+        batch = [self._chain(event, sealed) for event in events]
+        try:
+            if self.storage_backend is None:
+                self._write_lines(batch)
+            elif hasattr(self.storage_backend, "store_many"):
+                self.storage_backend.store_many(batch)
+            else:
+                for event_data in batch:
+                    self.storage_backend.store(event_data)
+            if sealed:
+                self._store_segments(sealed)
+        except Exception:
+            # Nothing was persisted, so the chain must not advance past the
+            # last stored event.
+            self.chain.rollback(checkpoint)
+            raise
+
+    def _store_segments(self, segments: List[Dict[str, Any]]) -> object:
+        if self.storage_backend is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(os.path.join(self.log_dir, self.SEGMENTS_FILE), "a") as f:
+                f.write("".join(json.dumps(s) + "\n" for s in segments))
+        elif hasattr(self.storage_backend, "store_segments"):
+            self.storage_backend.store_segments(segments)
+
+    def _load_segments(self) -> object:
+        """Resume the chain from segments and events a previous process stored
+
+        Events stored after the last sealed segment are reloaded into the
+        open segment, so numbering continues after the highest stored
+        sequence even if that process stopped without sealing.
+        """
+        if self.storage_backend is None:
+            path = os.path.join(self.log_dir, self.SEGMENTS_FILE)
+            segments = []
+            if os.path.exists(path):
+                with open(path) as f:
+                    segments = [json.loads(line) for line in f if line.strip()]
+        elif hasattr(self.storage_backend, "load_segments"):
+            segments = self.storage_backend.load_segments()
         else:
-            self._write_to_file(event_data)
-        self.previous_hash = chain_hash
+            return
+        last = max(segments, key=lambda s: s["index"], default=None)
+        first_open = last["first_sequence"] + last["event_count"] if last else 0
+        sealed = self.chain.load(
+            segments, self._event_hashes(first_open, _MAX_SEQUENCE)
+        )
+        if sealed:
+            self._store_segments([segment.to_dict() for segment in sealed])
+
+    def _load_events(self, first: int, last: int) -> List[Dict[str, Any]]:
+        """Stored events with sequence numbers ``first``..``last``"""
+        if self.storage_backend is not None:
+            return self.storage_backend.load_events(first, last)
+        if self._file is not None:
+            self._file.flush()
+        events = self.archive.events_by_sequence(first, last)
+        events.extend(self.archive.live_events_by_sequence(first, last))
+        events.sort(key=lambda e: e["sequence"])
+        return events
+
+    def _event_hashes(self, first: int, last: int) -> List[str]:
+        return [compute_event_hash(e) for e in self._load_events(first, last)]
+
+    def verify_range(self, start: int, end: int, workers: int = 1) -> Dict[str, Any]:
+        """Verify stored events ``start``..``end`` by sequence number
+
+        Only the segments overlapping the range are read and re-hashed.
+        """
+        return self.chain.verify_range(start, end, self._event_hashes, workers)
+
+    def compact_archive(self) -> List[Any]:
+        """Compress every closed day's audit file into the indexed archive"""
+        return self.archive.compact_closed_days()
+
+    def search_events(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        user_id: Optional[str] = None,
+        event_type: Optional[AuditEventType] = None,
+    ) -> List[Dict[str, Any]]:
+        """Find file-stored audit events by time range, user and event type"""
+        if self._file is not None:
+            self._file.flush()
+        return list(
+            self.archive.query(
+                start,
+                end,
+                user_id=user_id,
+                event_type=event_type.value if event_type else None,
+            )
+        )
+
+    def prove_event(self, sequence: int) -> Dict[str, Any]:
+        """Merkle inclusion proof for one stored event"""
+        segment = self.chain.segment_for(sequence)
+        if segment is None:
+            raise ValueError("Event is not in a sealed segment yet")
+        hashes = self._event_hashes(segment.first_sequence, segment.last_sequence)
+        return self.chain.prove(sequence, hashes)
 
     def _write_to_file(self, event_data: Dict[str, Any]) -> object:
         """Write audit event to file"""
-        import os
+        self._write_lines([event_data])
 
-        log_dir = os.environ.get(
-            "AUDIT_LOG_DIR", os.path.join(os.path.expanduser("~"), "logs", "audit")
-        )
-        os.makedirs(log_dir, exist_ok=True)
+    def _write_lines(self, batch: List[Dict[str, Any]]) -> object:
+        """Append a batch to the day's audit file with a single write"""
         date_str = datetime.now().strftime("%Y-%m-%d")
-        log_file = os.path.join(log_dir, f"audit_{date_str}.jsonl")
-        with open(log_file, "a") as f:
-            f.write(json.dumps(event_data) + "\n")
+        if date_str != self._file_date:
+            self._close_file()
+            os.makedirs(self.log_dir, exist_ok=True)
+            log_file = os.path.join(self.log_dir, f"audit_{date_str}.jsonl")
+            self._file = open(log_file, "a")
+            self._file_date = date_str
+        self._file.write("".join(json.dumps(e) + "\n" for e in batch))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _close_file(self) -> object:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_date = None
 
     def log_event(
         self,
@@ -208,7 +676,7 @@ class AuditLogger:
             error_message=error_message,
             correlation_id=correlation_id,
         )
-        self.event_queue.put(event)
+        self._enqueue(event)
 
     def log_user_action(
         self,
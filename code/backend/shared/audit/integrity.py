@@ -0,0 +1,278 @@
+"""
+Segmented, verifiable hash chain for NexaFi audit events
+Groups audit events into fixed-size segments with a Merkle root per segment
+and chains the segment roots, so integrity checks and inclusion proofs only
+touch the segments involved
+"""
+
+import hashlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Domain separation prefixes keep a leaf from being reinterpreted as an
+# internal node (second-preimage protection).
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+# A proof step is (sibling hash, sibling is on the left)
+ProofStep = Tuple[str, bool]
+
+
+def _leaf(event_hash: str) -> bytes:
+    return hashlib.sha256(_LEAF_PREFIX + bytes.fromhex(event_hash)).digest()
+
+
+def _parent(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level: List[bytes]) -> List[bytes]:
+    # An unpaired last node is promoted unchanged instead of being hashed
+    # with itself, so a tree cannot be forged by duplicating its last leaf.
+    parents = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(event_hashes: List[str]) -> str:
+    """Merkle root of a list of hex event hashes"""
+    if not event_hashes:
+        raise ValueError("Cannot build a Merkle tree without events")
+    level = [_leaf(h) for h in event_hashes]
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(event_hashes: List[str], index: int) -> List[ProofStep]:
+    """Inclusion proof for the event at ``index``: O(log n) sibling hashes"""
+    if not 0 <= index < len(event_hashes):
+        raise IndexError("Event index outside of the segment")
+    proof = []
+    level = [_leaf(h) for h in event_hashes]
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling].hex(), sibling < index))
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_proof(event_hash: str, proof: List[ProofStep], root: str) -> bool:
+    """Check an inclusion proof against a Merkle root"""
+    node = _leaf(event_hash)
+    for sibling_hex, sibling_is_left in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = _parent(sibling, node) if sibling_is_left else _parent(node, sibling)
+    return node.hex() == root
+
+
+def segment_hash(previous_hash: Optional[str], root: str) -> str:
+    """Link a segment's Merkle root to the previous segment"""
+    return hashlib.sha256(((previous_hash or "") + root).encode()).hexdigest()
+
+
+def _segment_matches(job: Tuple[List[str], str]) -> bool:
+    event_hashes, root = job
+    return bool(event_hashes) and merkle_root(event_hashes) == root
+
+
+@dataclass
+class AuditSegment:
+    """A sealed run of consecutive audit events"""
+
+    index: int
+    first_sequence: int
+    event_count: int
+    merkle_root: str
+    previous_hash: Optional[str]
+    segment_hash: str
+
+    @property
+    def last_sequence(self) -> int:
+        return self.first_sequence + self.event_count - 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SegmentedHashChain:
+    """Hash chain over audit events, sealed into Merkle segments
+
+    Every event gets a sequence number. Once ``segment_size`` events have
+    been appended the open segment is sealed: its Merkle root is computed
+    and linked to the previous segment's hash. Events only depend on the
+    hash of the last sealed segment (their anchor), not on each other.
+    """
+
+    def __init__(self, segment_size: int = 1024) -> None:
+        if segment_size < 1:
+            raise ValueError("segment_size must be positive")
+        self.segment_size = segment_size
+        self.segments: List[AuditSegment] = []
+        self._first_sequences: List[int] = []
+        self._open_hashes: List[str] = []
+        self.next_sequence = 0
+
+    @property
+    def head(self) -> Optional[str]:
+        """Hash of the last sealed segment"""
+        return self.segments[-1].segment_hash if self.segments else None
+
+    @property
+    def open_first_sequence(self) -> int:
+        return self.next_sequence - len(self._open_hashes)
+
+    def append(self, event_hash: str) -> Tuple[int, Optional[AuditSegment]]:
+        """Add an event; returns its sequence and the segment it sealed, if any"""
+        sequence = self.next_sequence
+        self._open_hashes.append(event_hash)
+        self.next_sequence += 1
+        sealed = None
+        if len(self._open_hashes) >= self.segment_size:
+            sealed = self.seal()
+        return sequence, sealed
+
+    def seal(self) -> Optional[AuditSegment]:
+        """Seal the open segment, even if it is not full"""
+        if not self._open_hashes:
+            return None
+        root = merkle_root(self._open_hashes)
+        segment = AuditSegment(
+            index=len(self.segments),
+            first_sequence=self.open_first_sequence,
+            event_count=len(self._open_hashes),
+            merkle_root=root,
+            previous_hash=self.head,
+            segment_hash=segment_hash(self.head, root),
+        )
+        self._add_segment(segment)
+        self._open_hashes = []
+        return segment
+
+    def _add_segment(self, segment: AuditSegment) -> None:
+        self.segments.append(segment)
+        self._first_sequences.append(segment.first_sequence)
+
+    def checkpoint(self) -> Tuple[int, int, List[str]]:
+        """Position that ``rollback`` can return to"""
+        return self.next_sequence, len(self.segments), list(self._open_hashes)
+
+    def rollback(self, checkpoint: Tuple[int, int, List[str]]) -> None:
+        """Forget events appended after ``checkpoint`` (e.g. a failed write)"""
+        next_sequence, segment_count, open_hashes = checkpoint
+        del self.segments[segment_count:]
+        del self._first_sequences[segment_count:]
+        self._open_hashes = open_hashes
+        self.next_sequence = next_sequence
+
+    def load(
+        self,
+        segments: Iterable[Dict[str, Any]],
+        open_event_hashes: Iterable[str] = (),
+    ) -> List[AuditSegment]:
+        """Restore the chain persisted by a previous process
+
+        ``open_event_hashes`` are the stored events after the last sealed
+        segment, in sequence order; a process that stopped without sealing
+        leaves them behind. They are appended again, sealing any segment
+        they fill, and the segments sealed that way are returned so they
+        can be persisted.
+        """
+        self.segments = []
+        self._first_sequences = []
+        self._open_hashes = []
+        for row in sorted(segments, key=lambda r: r["index"]):
+            self._add_segment(AuditSegment(**row))
+        self.next_sequence = self.segments[-1].last_sequence + 1 if self.segments else 0
+        sealed = []
+        for event_hash in open_event_hashes:
+            _, segment = self.append(event_hash)
+            if segment:
+                sealed.append(segment)
+        return sealed
+
+    def segment_for(self, sequence: int) -> Optional[AuditSegment]:
+        """Sealed segment containing ``sequence``, or None if still open"""
+        position = bisect_right(self._first_sequences, sequence) - 1
+        if position < 0 or sequence >= self.open_first_sequence:
+            return None
+        return self.segments[position]
+
+    def verify_chain(self) -> bool:
+        """Check the links between sealed segments (one hash per segment)"""
+        previous = None
+        for segment in self.segments:
+            if segment.previous_hash != previous:
+                return False
+            if segment.segment_hash != segment_hash(previous, segment.merkle_root):
+                return False
+            previous = segment.segment_hash
+        return True
+
+    def verify_range(
+        self,
+        start: int,
+        end: int,
+        load_event_hashes: Callable[[int, int], List[str]],
+        workers: int = 1,
+    ) -> Dict[str, Any]:
+        """Verify events ``start``..``end`` (inclusive) by sequence number
+
+        ``load_event_hashes(first, last)`` must return the event hashes for
+        that sequence range, recomputed from the stored events. Only the
+        segments overlapping the range are loaded; with ``workers`` > 1
+        they are verified in parallel processes.
+        """
+        first = bisect_right(self._first_sequences, start) - 1
+        last = bisect_right(self._first_sequences, end) - 1
+        touched = self.segments[max(first, 0) : last + 1]
+        jobs = [
+            (load_event_hashes(s.first_sequence, s.last_sequence), s.merkle_root)
+            for s in touched
+        ]
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_segment_matches, jobs, chunksize=8))
+        else:
+            results = [_segment_matches(job) for job in jobs]
+        failed = [s.index for s, ok in zip(touched, results) if not ok]
+        open_ok = True
+        if end >= self.open_first_sequence and self._open_hashes:
+            loaded = load_event_hashes(self.open_first_sequence, self.next_sequence - 1)
+            open_ok = loaded == self._open_hashes
+        links_ok = all(
+            s.segment_hash == segment_hash(s.previous_hash, s.merkle_root)
+            and (
+                s.index == 0
+                or s.previous_hash == self.segments[s.index - 1].segment_hash
+            )
+            for s in touched
+        )
+        return {
+            "valid": not failed and open_ok and links_ok,
+            "verified_segments": len(touched),
+            "failed_segments": failed,
+            "open_segment_valid": open_ok,
+            "links_valid": links_ok,
+        }
+
+    def prove(self, sequence: int, segment_event_hashes: List[str]) -> Dict[str, Any]:
+        """Inclusion proof for one event within its sealed segment"""
+        segment = self.segment_for(sequence)
+        if segment is None:
+            raise ValueError("Event is not in a sealed segment yet")
+        if len(segment_event_hashes) != segment.event_count:
+            raise ValueError("Segment event hashes do not match the segment size")
+        return {
+            "sequence": sequence,
+            "segment": segment.index,
+            "merkle_root": segment.merkle_root,
+            "proof": merkle_proof(
+                segment_event_hashes, sequence - segment.first_sequence
+            ),
+        }
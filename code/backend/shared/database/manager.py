@@ -21,6 +21,8 @@ class DatabaseManager:
         self.pool_size = pool_size
         self.connections = []
         self.lock = threading.Lock()
+        # Connection of the transaction open on the current thread, if any
+        self._local = threading.local()
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self._initialize_pool()
 
@@ -40,7 +42,11 @@ class DatabaseManager:
 
     @contextmanager
     def get_connection(self) -> object:
-        """Get connection from pool"""
+        """Get connection from pool (or the thread's open transaction)"""
+        current = getattr(self._local, "transaction", None)
+        if current is not None:
+            yield current
+            return
         conn = None
         try:
             with self.lock:
@@ -59,15 +65,32 @@ class DatabaseManager:
 
     @contextmanager
     def transaction(self) -> object:
-        """Database transaction context manager"""
+        """Database transaction context manager
+
+        Queries made through this manager on the same thread while the
+        transaction is open (e.g. ``BaseModel.save``) join it, and so do
+        nested ``transaction()`` blocks.
+        """
+        current = getattr(self._local, "transaction", None)
+        if current is not None:
+            yield current
+            return
         with self.get_connection() as conn:
             try:
                 conn.execute("BEGIN")
+                self._local.transaction = conn
                 yield conn
                 conn.commit()
             except Exception:
                 conn.rollback()
                 raise
+            finally:
+                self._local.transaction = None
+
+    def _commit(self, conn: sqlite3.Connection) -> None:
+        """Commit unless ``conn`` belongs to an open transaction"""
+        if getattr(self._local, "transaction", None) is not conn:
+            conn.commit()
 
     def execute_query(self, query: str, params: Tuple = ()) -> object:
         """Execute query (SELECT or DML). Returns cursor for DML, rows list for SELECT."""
@@ -76,7 +99,7 @@ class DatabaseManager:
             q = query.strip().upper()
             if q.startswith("SELECT") or q.startswith("WITH"):
                 return cursor.fetchall()
-            conn.commit()
+            self._commit(conn)
             return cursor
 
     def fetch_all(self, query: str, params: Tuple = ()) -> List[Dict[str, Any]]:
@@ -97,14 +120,14 @@ class DatabaseManager:
         """Execute INSERT/UPDATE/DELETE query"""
         with self.get_connection() as conn:
             cursor = conn.execute(query, params)
-            conn.commit()
+            self._commit(conn)
             return cursor.rowcount
 
     def execute_insert(self, query: str, params: Tuple = ()) -> int:
         """Execute INSERT query and return last row ID"""
         with self.get_connection() as conn:
             cursor = conn.execute(query, params)
-            conn.commit()
+            self._commit(conn)
             return cursor.lastrowid
 
     def close_all_connections(self) -> object:
@@ -185,13 +208,20 @@ class BaseModel:
         """Set database manager for all models"""
         cls.db_manager = db_manager
 
+    @classmethod
+    def _from_row(cls, row: object) -> object:
+        """Model for a row read from the table"""
+        record = cls(**dict(row))
+        record._persisted = True
+        return record
+
     @classmethod
     def find_by_id(cls, id_value: object) -> object:
         """Find record by ID"""
         query = f"SELECT * FROM {cls.table_name} WHERE id = ?"
         rows = cls.db_manager.execute_query(query, (id_value,))
         if rows:
-            return cls(**dict(rows[0]))
+            return cls._from_row(rows[0])
         return None
 
     @classmethod
@@ -201,7 +231,7 @@ class BaseModel:
         if where_clause:
             query += f" WHERE {where_clause}"
         rows = cls.db_manager.execute_query(query, params)
-        return [cls(**dict(row)) for row in rows]
+        return [cls._from_row(row) for row in rows]
 
     @classmethod
     def find_one(cls, where_clause: str, params: Tuple = ()) -> object:
@@ -209,29 +239,39 @@ class BaseModel:
         query = f"SELECT * FROM {cls.table_name} WHERE {where_clause} LIMIT 1"
         rows = cls.db_manager.execute_query(query, params)
         if rows:
-            return cls(**dict(rows[0]))
+            return cls._from_row(rows[0])
         return None
 
+    def _fields(self) -> list:
+        return [k for k in self.__dict__.keys() if not k.startswith("_")]
+
     def save(self) -> object:
-        """Save record to database"""
-        if hasattr(self, "id") and self.id:
+        """Save record to database
+
+        Records loaded with ``find_*`` or saved before are updated. New
+        records are inserted, keeping an id the caller generated (uuid).
+        Updating a row that was deleted in the meantime changes nothing.
+        """
+        if getattr(self, "_persisted", False):
             return self._update()
-        else:
-            return self._insert()
+        return self._insert(with_id=bool(getattr(self, "id", None)))
 
-    def _insert(self) -> object:
+    def _insert(self, with_id: bool = False) -> object:
         """Insert new record"""
-        fields = [k for k in self.__dict__.keys() if k != "id"]
+        fields = [k for k in self._fields() if with_id or k != "id"]
         values = [getattr(self, k) for k in fields]
         placeholders = ", ".join(["?" for _ in fields])
         field_names = ", ".join(fields)
         query = f"INSERT INTO {self.table_name} ({field_names}) VALUES ({placeholders})"
-        self.id = self.db_manager.execute_insert(query, tuple(values))
+        row_id = self.db_manager.execute_insert(query, tuple(values))
+        if not with_id:
+            self.id = row_id
+        self._persisted = True
         return self
 
     def _update(self) -> object:
         """Update existing record"""
-        fields = [k for k in self.__dict__.keys() if k != "id"]
+        fields = [k for k in self._fields() if k != "id"]
         values = [getattr(self, k) for k in fields]
         set_clause = ", ".join([f"{field} = ?" for field in fields])
         query = f"UPDATE {self.table_name} SET {set_clause} WHERE id = ?"
@@ -263,6 +303,18 @@ INITIAL_MIGRATIONS = {
         "description": "Create audit log table",
         "sql": "\n        CREATE TABLE IF NOT EXISTS audit_log (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            event_id TEXT UNIQUE NOT NULL,\n            event_type TEXT NOT NULL,\n            user_id TEXT,\n            resource_type TEXT,\n            resource_id TEXT,\n            action TEXT NOT NULL,\n            details TEXT,\n            ip_address TEXT,\n            user_agent TEXT,\n            success BOOLEAN NOT NULL,\n            error_message TEXT,\n            event_hash TEXT NOT NULL,\n            chain_hash TEXT NOT NULL,\n            previous_hash TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n\n        CREATE INDEX IF NOT EXISTS idx_audit_log_event_type ON audit_log(event_type);\n        CREATE INDEX IF NOT EXISTS idx_audit_log_user_id ON audit_log(user_id);\n        CREATE INDEX IF NOT EXISTS idx_audit_log_created_at ON audit_log(created_at);\n        ",
     },
+    "004_create_audit_segments_table": {
+        "description": "Add audit event sequence numbers and Merkle segments",
+        "sql": "\n        ALTER TABLE audit_log ADD COLUMN sequence INTEGER;\n        ALTER TABLE audit_log ADD COLUMN timestamp TEXT;\n\n        CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_log_sequence ON audit_log(sequence);\n\n        CREATE TABLE IF NOT EXISTS audit_segments (\n            segment_index INTEGER PRIMARY KEY,\n            first_sequence INTEGER NOT NULL,\n            event_count INTEGER NOT NULL,\n            merkle_root TEXT NOT NULL,\n            previous_hash TEXT,\n            segment_hash TEXT NOT NULL,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n        ",
+    },
+    "005_create_outbox_table": {
+        "description": "Create transactional outbox table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS outbox (\n            id INTEGER PRIMARY KEY AUTOINCREMENT,\n            queue TEXT NOT NULL,\n            payload TEXT NOT NULL,\n            attempts INTEGER NOT NULL DEFAULT 0,\n            last_error TEXT,\n            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n        );\n        ",
+    },
+    "006_create_idempotency_keys_table": {
+        "description": "Create idempotency key table",
+        "sql": "\n        CREATE TABLE IF NOT EXISTS idempotency_keys (\n            key BLOB PRIMARY KEY,\n            fingerprint BLOB NOT NULL,\n            status_code INTEGER,\n            response TEXT,\n            created_at REAL NOT NULL\n        ) WITHOUT ROWID;\n        ",
+    },
 }
 
 
@@ -0,0 +1,178 @@
+"""
+Transactional outbox for NexaFi
+Events are written to the ``outbox`` table in the same transaction as the
+rows they describe and relayed to the message queue in batches by a
+background thread, so requests never wait on the broker and a committed
+write is never left without its event
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from .manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def add_outbox_event(
+    conn: sqlite3.Connection, queue_name: str, payload: Dict[str, Any]
+) -> str:
+    """Record an event for ``queue_name`` inside the caller's transaction
+
+    ``conn`` is the connection yielded by ``DatabaseManager.transaction()``;
+    the event is only relayed if that transaction commits. Delivery is
+    at-least-once, so the payload gets an ``event_id`` consumers can
+    deduplicate on. Returns the event id.
+    """
+    event = dict(payload)
+    event.setdefault("event_id", str(uuid.uuid4()))
+    conn.execute(
+        "INSERT INTO outbox (queue, payload) VALUES (?, ?)",
+        (queue_name, json.dumps(event, default=str)),
+    )
+    return event["event_id"]
+
+
+class OutboxRelay:
+    """Background publisher draining the ``outbox`` table
+
+    Each pass reads up to ``batch_size`` events in insertion order,
+    publishes them per queue with ``MessageQueue.publish_batch``, waits for
+    publisher confirms and deletes the confirmed rows in one transaction.
+    Nacked rows stay in the outbox with ``attempts``/``last_error`` updated
+    and are retried on the next pass; broker errors back off exponentially.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        mq: Optional[object] = None,
+        batch_size: Optional[int] = None,
+        poll_interval_ms: Optional[int] = None,
+        confirm_timeout: float = 10.0,
+    ) -> None:
+        self.db_manager = db_manager
+        if mq is None:
+            try:
+                from ..utils.message_queue import MessageQueue
+            except ImportError:
+                from utils.message_queue import MessageQueue
+            mq = MessageQueue(publisher_confirms=True)
+        self.mq = mq
+        self.batch_size = batch_size or int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+        if poll_interval_ms is None:
+            poll_interval_ms = int(os.getenv("OUTBOX_POLL_INTERVAL_MS", "200"))
+        self.poll_interval = poll_interval_ms / 1000
+        self.confirm_timeout = confirm_timeout
+        self.running = False
+        self.worker_thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._declared: set = set()
+        self.stats = {"published": 0, "nacked": 0, "batches": 0, "failures": 0}
+
+    def relay_once(self) -> int:
+        """Publish one batch of pending events; returns how many were confirmed"""
+        rows = self.db_manager.fetch_all(
+            "SELECT id, queue, payload FROM outbox ORDER BY id LIMIT ?",
+            (self.batch_size,),
+        )
+        if not rows:
+            return 0
+        by_queue: Dict[str, list] = {}
+        for row in rows:
+            row["message"] = json.loads(row["payload"])
+            by_queue.setdefault(row["queue"], []).append(row)
+        for queue_name, queued in by_queue.items():
+            if queue_name not in self._declared:
+                self.mq.declare_queue(queue_name)
+                self._declared.add(queue_name)
+            self.mq.publish_batch(queue_name, (row["message"] for row in queued))
+        nacked = Counter(self.mq.wait_for_confirms(timeout=self.confirm_timeout))
+
+        confirmed, rejected = [], []
+        for row in rows:
+            key = (row["queue"], json.dumps(row["message"]).encode())
+            if nacked[key]:
+                nacked[key] -= 1
+                rejected.append((row["id"],))
+            else:
+                confirmed.append((row["id"],))
+        with self.db_manager.transaction() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", confirmed)
+            conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, "
+                "last_error = 'nacked by broker' WHERE id = ?",
+                rejected,
+            )
+        self.stats["batches"] += 1
+        self.stats["published"] += len(confirmed)
+        self.stats["nacked"] += len(rejected)
+        return len(confirmed)
+
+    def start(self) -> object:
+        """Start the relay thread"""
+        self.running = True
+        self.worker_thread = threading.Thread(target=self._run, daemon=True)
+        self.worker_thread.start()
+
+    def notify(self) -> object:
+        """Wake the relay now instead of at the next poll"""
+        self._wake.set()
+
+    def stop(self, timeout: float = 30.0) -> object:
+        """Stop the relay after a final drain of the outbox"""
+        self.running = False
+        self._wake.set()
+        if self.worker_thread:
+            self.worker_thread.join(timeout)
+
+    def _run(self) -> object:
+        backoff = self.poll_interval
+        while self.running:
+            self._wake.clear()
+            try:
+                relayed = self.relay_once()
+                backoff = self.poll_interval
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.error(f"Outbox relay failed, retrying in {backoff:.1f}s: {e}")
+                self._reset_connection()
+                self._wake.wait(backoff)
+                backoff = min(max(backoff, 0.1) * 2, MAX_BACKOFF_SECONDS)
+                continue
+            if relayed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+        try:
+            while self.relay_once() == self.batch_size:
+                pass
+        except Exception as e:
+            logger.error(f"Outbox relay could not drain before stopping: {e}")
+        self._reset_connection()
+
+    def _reset_connection(self) -> object:
+        """Drop this thread's broker connection so the next pass reconnects"""
+        self._declared.clear()
+        try:
+            self.mq.disconnect()
+        except Exception:
+            pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Outbox backlog and relay counters"""
+        backlog = self.db_manager.fetch_one(
+            "SELECT COUNT(*) AS pending, MIN(created_at) AS oldest FROM outbox"
+        )
+        return {
+            "pending": backlog["pending"],
+            "oldest_pending": backlog["oldest"],
+            "worker_alive": bool(self.worker_thread and self.worker_thread.is_alive()),
+            **self.stats,
+        }
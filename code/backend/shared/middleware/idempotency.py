@@ -0,0 +1,329 @@
+"""
+Idempotency-Key support for payment creation endpoints
+A request carrying an ``Idempotency-Key`` header claims the key in the
+``idempotency_keys`` table before it runs and stores its final response
+there afterwards, so a retry replays the stored response instead of
+charging again. Keys are scoped to the client and endpoint and kept as
+16-byte digests next to a 16-byte fingerprint of the request body. Recent
+responses are also held in an in-process LRU, and duplicates that arrive
+while the first request is still running wait for its response.
+
+A claim without a response is a lease: if its worker dies, the key can be
+taken over once ``lease_seconds`` have passed. Expired keys are purged
+every ``purge_interval`` seconds by the next request that claims a key.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import current_app, jsonify, make_response, request
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# Polling interval while another process holds the key
+_POLL_SECONDS = 0.05
+
+StoredResponse = Tuple[int, str]
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used with a different request"""
+
+
+class IdempotencyKeyInProgress(Exception):
+    """The first request with the key did not finish in time"""
+
+
+def _digest(value: bytes) -> bytes:
+    return hashlib.sha256(value).digest()[:16]
+
+
+class IdempotencyStore:
+    """Claims keys and stores final responses, with an LRU in front"""
+
+    def __init__(
+        self,
+        db_manager: object,
+        ttl_seconds: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        wait_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        purge_interval: Optional[float] = None,
+    ) -> None:
+        self.db_manager = db_manager
+        self.ttl_seconds = ttl_seconds or int(
+            os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")
+        )
+        self.cache_size = cache_size or int(
+            os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")
+        )
+        self.wait_seconds = wait_seconds or float(
+            os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30")
+        )
+        self.lease_seconds = lease_seconds or float(
+            os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60")
+        )
+        self.purge_interval = purge_interval or float(
+            os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600")
+        )
+        self._next_purge = time.monotonic() + self.purge_interval
+        self._cache: "OrderedDict[bytes, Tuple[bytes, int, str, float]]" = OrderedDict()
+        self._inflight: Dict[bytes, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scoped_key(scope: str, key: str) -> bytes:
+        """Digest of a client's key for one endpoint"""
+        return _digest(f"{scope}\n{key}".encode())
+
+    def _cached(self, key: bytes) -> Optional[Tuple[bytes, int, str]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[:3]
+
+    def _remember(
+        self, key: bytes, fingerprint: bytes, status: int, body: str, created: float
+    ) -> None:
+        with self._lock:
+            self._cache[key] = (fingerprint, status, body, created + self.ttl_seconds)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _release(self, key: bytes) -> None:
+        with self._lock:
+            waiter = self._inflight.pop(key, None)
+        if waiter:
+            waiter.set()
+
+    def begin(self, key: bytes, fingerprint: bytes) -> Optional[StoredResponse]:
+        """Claim ``key`` for a request, or get the response stored for it
+
+        Returns None if the caller now holds the key and must run the
+        request, then call ``complete`` or ``abandon``. Returns the stored
+        (status, body) for a replay. Raises IdempotencyKeyReused if the key
+        came with a different request, and IdempotencyKeyInProgress if the
+        request holding it does not finish within ``wait_seconds``.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            with self._lock:
+                cached = self._cached(key)
+                waiter = None if cached else self._inflight.get(key)
+                if cached is None and waiter is None:
+                    self._inflight[key] = threading.Event()
+            if cached:
+                return self._replay(cached, fingerprint)
+            if waiter is not None:
+                # A duplicate in this process: wait for it to finish
+                if not waiter.wait(max(deadline - time.monotonic(), 0)):
+                    raise IdempotencyKeyInProgress()
+                continue
+            self._maybe_purge()
+            try:
+                row = self._claim(key, fingerprint)
+            except Exception:
+                self._release(key)
+                raise
+            if row is None:
+                return None
+            self._release(key)
+            if row["status_code"] is not None:
+                self._remember(
+                    key,
+                    row["fingerprint"],
+                    row["status_code"],
+                    row["response"],
+                    row["created_at"],
+                )
+                return self._replay(
+                    (row["fingerprint"], row["status_code"], row["response"]),
+                    fingerprint,
+                )
+            # Held by another process; its response will land in the table
+            if row["fingerprint"] != fingerprint:
+                raise IdempotencyKeyReused()
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInProgress()
+            time.sleep(_POLL_SECONDS)
+
+    def _claim(self, key: bytes, fingerprint: bytes) -> Optional[Dict]:
+        """Insert the claim row, taking over an expired key or a lapsed
+        lease; returns the existing row if someone else holds the key"""
+        now = time.time()
+        with self.db_manager.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO idempotency_keys (key, fingerprint, created_at) "
+                "VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "fingerprint = excluded.fingerprint, status_code = NULL, "
+                "response = NULL, created_at = excluded.created_at "
+                "WHERE idempotency_keys.created_at < ? OR ("
+                "idempotency_keys.status_code IS NULL "
+                "AND idempotency_keys.created_at < ?)",
+                (
+                    key,
+                    fingerprint,
+                    now,
+                    now - self.ttl_seconds,
+                    now - self.lease_seconds,
+                ),
+            )
+            if cursor.rowcount == 1:
+                return None
+            return conn.execute(
+                "SELECT fingerprint, status_code, response, created_at "
+                "FROM idempotency_keys WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+    @staticmethod
+    def _replay(stored: Tuple[bytes, int, str], fingerprint: bytes) -> StoredResponse:
+        stored_fingerprint, status, body = stored
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        return status, body
+
+    def complete(self, key: bytes, fingerprint: bytes, status: int, body: str) -> None:
+        """Store the final response of a claimed key and wake any waiters"""
+        try:
+            self.db_manager.execute_query(
+                "UPDATE idempotency_keys SET status_code = ?, response = ? "
+                "WHERE key = ? AND status_code IS NULL",
+                (status, body, key),
+            )
+            self._remember(key, fingerprint, status, body, time.time())
+        finally:
+            self._release(key)
+
+    def abandon(self, key: bytes) -> None:
+        """Give up a claimed key so the request can be retried"""
+        try:
+            self.db_manager.execute_query(
+                "DELETE FROM idempotency_keys WHERE key = ? AND status_code IS NULL",
+                (key,),
+            )
+        finally:
+            self._release(key)
+
+    def _maybe_purge(self) -> None:
+        """Purge expired keys if ``purge_interval`` has passed"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        try:
+            self.purge()
+        except Exception as e:
+            logger.error(f"Failed to purge idempotency keys: {e}")
+
+    def purge(self) -> int:
+        """Delete expired keys; returns how many were removed"""
+        return self.db_manager.execute_update(
+            "DELETE FROM idempotency_keys WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+
+
+def request_fingerprint() -> bytes:
+    """Digest of the request body, insensitive to JSON key order and spacing"""
+    body = request.get_json(silent=True)
+    if body is None:
+        return _digest(request.get_data())
+    return _digest(json.dumps(body, sort_keys=True, separators=(",", ":")).encode())
+
+
+def idempotent(client_id: Optional[Callable[[], str]] = None) -> Callable:
+    """Make a route safe to retry with an ``Idempotency-Key`` header
+
+    Uses the store in ``current_app.extensions["idempotency_store"]``.
+    ``client_id`` names the caller the key belongs to (the X-User-ID header
+    by default). Responses below 500 are stored and replayed; server errors
+    release the key so the client can retry. Requests without the header
+    run as before.
+    """
+
+    def decorator(f: Callable) -> Callable:
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            store = current_app.extensions.get("idempotency_store")
+            if not key or store is None:
+                return f(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return (
+                    jsonify(
+                        {
+                            "error": f"{IDEMPOTENCY_HEADER} must be at most "
+                            f"{MAX_KEY_LENGTH} characters"
+                        }
+                    ),
+                    400,
+                )
+            caller = client_id() if client_id else request.headers.get("X-User-ID")
+            scoped = store.scoped_key(f"{caller}\n{request.method} {request.path}", key)
+            fingerprint = request_fingerprint()
+            try:
+                stored = store.begin(scoped, fingerprint)
+            except IdempotencyKeyReused:
+                return (
+                    jsonify(
+                        {
+                            "error": f"{IDEMPOTENCY_HEADER} was already used "
+                            "with a different request"
+                        }
+                    ),
+                    422,
+                )
+            except IdempotencyKeyInProgress:
+                return (
+                    jsonify(
+                        {
+                            "error": "A request with this "
+                            f"{IDEMPOTENCY_HEADER} is still in progress"
+                        }
+                    ),
+                    409,
+                )
+            if stored is not None:
+                status, body = stored
+                response = current_app.response_class(
+                    body, status=status, mimetype="application/json"
+                )
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                store.abandon(scoped)
+                raise
+            if response.status_code >= 500:
+                store.abandon(scoped)
+            else:
+                store.complete(
+                    scoped,
+                    fingerprint,
+                    response.status_code,
+                    response.get_data(as_text=True),
+                )
+            return response
+
+        return decorated_function
+
+    return decorator
@@ -3,18 +3,32 @@ Structured logging system for NexaFi
 Implements comprehensive logging with correlation IDs and security event tracking
 """
 
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
+import re
 import sys
 import threading
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from flask import g, has_request_context, request
 from pythonjsonlogger import jsonlogger
 
 
+def resolve_service_metadata() -> Dict[str, str]:
+    """Service fields stamped on every log record"""
+    return {
+        "service": os.environ.get("SERVICE_NAME", "unknown"),
+        "version": os.environ.get("SERVICE_VERSION", "1.0.0"),
+        "environment": os.environ.get("ENVIRONMENT", "development"),
+    }
+
+
 class CorrelationIdFilter(logging.Filter):
     """Add correlation ID to log records"""
 
@@ -25,6 +39,8 @@ class CorrelationIdFilter(logging.Filter):
             if not correlation_id:
                 correlation_id = str(uuid.uuid4())
                 g.correlation_id = correlation_id
+            record.request_id = getattr(g, "request_id", None)
+            record.session_id = getattr(g, "session_id", None)
         if not correlation_id:
             correlation_id = getattr(
                 threading.current_thread(), "correlation_id", str(uuid.uuid4())
@@ -33,10 +49,52 @@ class CorrelationIdFilter(logging.Filter):
         return True
 
 
+# All redaction rules compiled into one alternation so a message is scanned
+# once. Group 1/2 capture a credential key and its separator; a bare match
+# without them is a candidate card number, masked only if it passes Luhn.
+_REDACTION_PATTERN = re.compile(
+    r"(?i)\b([a-z_]*(?:password|passwd|secret|token|api[_-]?key)|pwd|cvv|authorization)"
+    r"(\s*[=:]\s*)(?:bearer\s+)?[^\s,;&]+"
+    r"|\b\d(?:[ -]?\d){12,18}\b"
+)
+
+
+def _luhn_valid(number: str) -> bool:
+    digits = [int(c) for c in number if c.isdigit()]
+    checksum = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return checksum % 10 == 0
+
+
+def _redact(match: re.Match) -> str:
+    if match.group(1):
+        return f"{match.group(1)}{match.group(2)}[REDACTED]"
+    if not _luhn_valid(match.group(0)):
+        # Order ids, timestamps and amounts: not a card number
+        return match.group(0)
+    return "[REDACTED]"
+
+
+def redact_message(message: str) -> str:
+    """Mask credentials and card numbers in a log message"""
+    return _REDACTION_PATTERN.sub(_redact, message)
+
+
 class SecurityFilter(logging.Filter):
     """Filter for security-related log events"""
 
     def filter(self, record: object) -> object:
+        if not isinstance(record.msg, dict):
+            message = record.getMessage()
+            redacted = redact_message(message)
+            if redacted != message:
+                record.msg = redacted
+                record.args = None
         if has_request_context():
             record.ip_address = request.environ.get(
                 "HTTP_X_FORWARDED_FOR", request.remote_addr
@@ -51,33 +109,326 @@ class SecurityFilter(logging.Filter):
         return True
 
 
+class _RecordFilterChain(logging.Filter):
+    """Run a chain of filters once per record across several handlers
+
+    Handler filters also see records propagated from child loggers, which
+    logger filters do not. The chain's verdict is stored on the record so
+    the other handlers it reaches reuse it instead of re-running the
+    filters (and sampling or deduplicating the same record twice).
+    """
+
+    def __init__(self, *filters: logging.Filter) -> None:
+        super().__init__()
+        self.filters_chain = filters
+        self._mark = f"_nexafi_filtered_{id(self)}"
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        verdict = record.__dict__.get(self._mark)
+        if verdict is None:
+            verdict = all(f.filter(record) for f in self.filters_chain)
+            setattr(record, self._mark, verdict)
+        return verdict
+
+
 class NexaFiFormatter(jsonlogger.JsonFormatter):
-    """Custom JSON formatter for NexaFi logs"""
+    """Custom JSON formatter for NexaFi logs
+
+    Service metadata is resolved once when the formatter is created rather
+    than read from the environment for every record.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        service_metadata: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        if service_metadata is None:
+            service_metadata = resolve_service_metadata()
+        self.service_metadata = service_metadata
 
     def add_fields(
         self, log_record: object, record: object, message_dict: object
     ) -> object:
         super().add_fields(log_record, record, message_dict)
-        log_record["timestamp"] = datetime.now(timezone.utc).isoformat()
-        log_record["service"] = os.environ.get("SERVICE_NAME", "unknown")
-        log_record["version"] = os.environ.get("SERVICE_VERSION", "1.0.0")
-        if has_request_context():
-            log_record["request_id"] = getattr(g, "request_id", None)
-            log_record["session_id"] = getattr(g, "session_id", None)
+        # Records may be formatted on the listener thread, so use the time the
+        # record was created and the request fields captured by the filters.
+        log_record["timestamp"] = datetime.fromtimestamp(
+            record.created, timezone.utc
+        ).isoformat()
+        log_record.update(self.service_metadata)
+        if hasattr(record, "request_id"):
+            log_record["request_id"] = record.request_id
+            log_record["session_id"] = getattr(record, "session_id", None)
         if "level" not in log_record:
             log_record["level"] = record.levelname
 
 
-class LoggerManager:
-    """Centralized logger management for NexaFi"""
+class LogSamplingFilter(logging.Filter):
+    """Sample chatty INFO/DEBUG records and collapse repeated warnings
+
+    Records below WARNING are kept at the rate configured for the longest
+    matching logger-name prefix in ``sample_rates`` (``default_rate`` when
+    none matches). WARNING and above are never sampled: the first record of
+    each logger/level/message template is always kept, and further copies
+    within ``dedup_window`` seconds are suppressed. The next copy let through
+    after the window carries ``repeated`` and a "(repeated N times)" suffix.
 
-    def __init__(self) -> None:
+    When ``emit`` is set, suppressed copies are also reported without a
+    later copy: once a window has expired, the next record through the
+    filter triggers a summary record for it, and ``flush_summaries`` emits
+    the remaining ones (at shutdown).
+    """
+
+    def __init__(
+        self,
+        default_rate: float = 1.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+        dedup_window: float = 0.0,
+        max_templates: int = 10000,
+    ) -> None:
+        super().__init__()
+        self._lock = threading.Lock()
+        self.max_templates = max_templates
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+        self._credit: Dict[str, float] = {}
+        self._next_sweep = 0.0
+        self.emit: Optional[Callable[[logging.LogRecord], None]] = None
+        self.sampled_out = 0
+        self.suppressed = 0
+        self.configure(default_rate, sample_rates, dedup_window)
+
+    def configure(
+        self,
+        default_rate: float = 1.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+        dedup_window: float = 0.0,
+    ) -> None:
+        with self._lock:
+            self.default_rate = default_rate
+            self.sample_rates = dict(sample_rates or {})
+            self.dedup_window = dedup_window
+            self._rates: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        """Sampling rate of a logger, resolved once per logger name"""
+        rate = self._rates.get(name)
+        if rate is None:
+            rate, matched = self.default_rate, -1
+            for prefix, value in self.sample_rates.items():
+                if name == prefix or name.startswith(prefix + "."):
+                    if len(prefix) > matched:
+                        rate, matched = value, len(prefix)
+            self._rates[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.__dict__.get("_dedup_summary"):
+            return True
+        if self.emit is not None and record.created >= self._next_sweep:
+            self._emit_summaries(record.created)
+        if record.levelno < logging.WARNING:
+            return self._sample(record)
+        if self.dedup_window <= 0:
+            return True
+        template = record.msg if isinstance(record.msg, str) else repr(record.msg)
+        key = (record.name, record.levelno, template)
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and record.created - entry[0] < self.dedup_window:
+                entry[1] += 1
+                entry[2] = record
+                self.suppressed += 1
+                return False
+            repeated = entry[1] if entry is not None else 0
+            if entry is None and len(self._seen) >= self.max_templates:
+                self._evict(record.created)
+            self._seen[key] = [record.created, 0, None]
+        if repeated:
+            record.repeated = repeated
+            if isinstance(record.msg, str):
+                record.msg = f"{record.getMessage()} (repeated {repeated} times)"
+                record.args = None
+        return True
+
+    def _sample(self, record: logging.LogRecord) -> bool:
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        # Deterministic sampling: accumulate the rate and keep a record each
+        # time the credit reaches one, so exactly ``rate`` of records pass.
+        with self._lock:
+            credit = self._credit.get(record.name, 0.0) + rate
+            if credit < 1.0 - 1e-9:
+                self._credit[record.name] = credit
+                self.sampled_out += 1
+                return False
+            self._credit[record.name] = credit - 1.0
+        return True
+
+    def summaries(self, now: Optional[float] = None) -> List[logging.LogRecord]:
+        """Take the "(repeated N times)" records of suppressed copies
+
+        Only windows expired by ``now`` are taken; all of them when ``now``
+        is None. Each summary is a copy of the last suppressed record.
+        """
+        taken = []
+        with self._lock:
+            for key, entry in list(self._seen.items()):
+                if entry[1] and (now is None or now - entry[0] >= self.dedup_window):
+                    taken.append((entry[1], entry[2]))
+                    del self._seen[key]
+        records = []
+        for repeated, last in taken:
+            record = logging.makeLogRecord(
+                {k: v for k, v in last.__dict__.items() if not k.startswith("_")}
+            )
+            record.msg = f"{last.getMessage()} (repeated {repeated} times)"
+            record.args = None
+            record.repeated = repeated
+            record._dedup_summary = True
+            records.append(record)
+        return records
+
+    def flush_summaries(self) -> int:
+        """Emit the summaries of every pending window; returns how many"""
+        records = self.summaries()
+        if self.emit is not None:
+            for record in records:
+                self.emit(record)
+        return len(records)
+
+    def _emit_summaries(self, now: float) -> None:
+        self._next_sweep = now + max(self.dedup_window, 1.0)
+        if self.dedup_window > 0:
+            for record in self.summaries(now):
+                self.emit(record)
+
+    def _evict(self, now: float) -> None:
+        expired = [k for k, v in self._seen.items() if now - v[0] >= self.dedup_window]
+        for key in expired:
+            del self._seen[key]
+        if len(self._seen) >= self.max_templates:
+            self._seen.clear()
+
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse ``LOG_SAMPLE_RATES`` of the form ``requests=0.1,financial=1``"""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Freeze a copy of the record so it can be formatted later on another
+        thread; other handlers still see the original args and exc_info"""
+        record = copy.copy(record)
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """Queue listener whose stop() drains a full queue and flushes its handlers"""
+
+    def enqueue_sentinel(self) -> None:
+        # The stock implementation uses put_nowait, which fails on a full
+        # bounded queue; wait for room so every queued record gets written.
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        super().stop()
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except (OSError, ValueError):
+                # The stream may already be closed at interpreter exit;
+                # logging.shutdown() ignores the same errors.
+                pass
+
+
+class LoggerManager:
+    """Centralized logger management for NexaFi
+
+    By default handlers run on a background ``QueueListener``: request
+    threads only enqueue records into a bounded queue and never wait on
+    file I/O. When the queue is full the record is dropped and counted
+    (see ``dropped_records``). Set ``LOG_ASYNC=false`` to attach the
+    handlers synchronously instead.
+
+    The correlation and security filters run once per record on the calling
+    thread: on the queue handler in async mode, and through a shared
+    ``_RecordFilterChain`` on the root and security handlers in sync mode,
+    so records from plain ``logging.getLogger`` loggers are covered too.
+
+    A ``LogSamplingFilter`` runs first on everything except the security
+    logger. It is off by default and configured per service through the
+    constructor, ``configure_sampling`` or ``LOG_SAMPLE_RATE``,
+    ``LOG_SAMPLE_RATES`` and ``LOG_DEDUP_WINDOW``.
+    """
+
+    def __init__(
+        self,
+        log_dir: Optional[str] = None,
+        async_logging: Optional[bool] = None,
+        queue_size: Optional[int] = None,
+        default_sample_rate: Optional[float] = None,
+        sample_rates: Optional[Dict[str, float]] = None,
+        dedup_window: Optional[float] = None,
+    ) -> None:
         self.loggers = {}
+        self.log_dir = log_dir or os.environ.get(
+            "LOG_DIR", os.path.join(os.getcwd(), "logs")
+        )
+        if async_logging is None:
+            async_logging = os.environ.get("LOG_ASYNC", "true").lower() == "true"
+        self.async_logging = async_logging
+        self.queue_size = queue_size or int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+        self._pipelines: list = []
+        self._filters = (CorrelationIdFilter(), SecurityFilter())
+        if default_sample_rate is None:
+            default_sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+        if sample_rates is None:
+            sample_rates = _parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+        if dedup_window is None:
+            dedup_window = float(os.environ.get("LOG_DEDUP_WINDOW", 0))
+        self.sampling_filter = LogSamplingFilter(
+            default_sample_rate, sample_rates, dedup_window
+        )
+        self.sampling_filter.emit = self._emit_summary
+        self.service_metadata = resolve_service_metadata()
         self.setup_root_logger()
+        atexit.register(self.shutdown)
 
     def setup_root_logger(self) -> object:
         """Setup root logger configuration"""
-        log_dir = os.path.join(os.getcwd(), "logs")
+        self.shutdown()
+        log_dir = self.log_dir
         os.makedirs(log_dir, exist_ok=True)
         root_logger = logging.getLogger()
         root_logger.setLevel(logging.INFO)
@@ -86,42 +437,120 @@ class LoggerManager:
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
         console_formatter = NexaFiFormatter(
-            "%(timestamp)s %(level)s %(name)s %(correlation_id)s %(message)s"
+            "%(timestamp)s %(level)s %(name)s %(correlation_id)s %(message)s",
+            service_metadata=self.service_metadata,
         )
         console_handler.setFormatter(console_formatter)
-        console_handler.addFilter(CorrelationIdFilter())
-        console_handler.addFilter(SecurityFilter())
         file_handler = logging.FileHandler(f"{log_dir}/nexafi.log")
         file_handler.setLevel(logging.INFO)
         file_formatter = NexaFiFormatter(
-            "%(timestamp)s %(level)s %(name)s %(correlation_id)s %(message)s %(ip_address)s %(user_id)s"
+            "%(timestamp)s %(level)s %(name)s %(correlation_id)s %(message)s %(ip_address)s %(user_id)s",
+            service_metadata=self.service_metadata,
         )
         file_handler.setFormatter(file_formatter)
-        file_handler.addFilter(CorrelationIdFilter())
-        file_handler.addFilter(SecurityFilter())
         error_handler = logging.FileHandler(f"{log_dir}/error.log")
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(file_formatter)
-        error_handler.addFilter(CorrelationIdFilter())
-        error_handler.addFilter(SecurityFilter())
         security_handler = logging.FileHandler(f"{log_dir}/security.log")
         security_handler.setLevel(logging.WARNING)
         security_handler.setFormatter(file_formatter)
-        security_handler.addFilter(CorrelationIdFilter())
-        security_handler.addFilter(SecurityFilter())
-        root_logger.addHandler(console_handler)
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(error_handler)
         security_logger = logging.getLogger("security")
-        security_logger.addHandler(security_handler)
+        for handler in security_logger.handlers[:]:
+            security_logger.removeHandler(handler)
+        if self.async_logging:
+            root_logger.addHandler(
+                self._start_queue(
+                    console_handler, file_handler, error_handler, sampled=True
+                )
+            )
+            security_logger.addHandler(self._start_queue(security_handler))
+        else:
+            root_chain = _RecordFilterChain(self.sampling_filter, *self._filters)
+            for handler in (console_handler, file_handler, error_handler):
+                handler.addFilter(root_chain)
+                root_logger.addHandler(handler)
+            security_handler.addFilter(_RecordFilterChain(*self._filters))
+            security_logger.addHandler(security_handler)
         security_logger.setLevel(logging.WARNING)
         security_logger.propagate = False
 
+    def _start_queue(
+        self, *handlers: logging.Handler, sampled: bool = False
+    ) -> logging.Handler:
+        """Put handlers behind a bounded queue drained by a listener thread"""
+        log_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        # Filters read the Flask request context, so they must run on the
+        # calling thread before the record is handed to the listener.
+        if sampled:
+            queue_handler.addFilter(self.sampling_filter)
+        for log_filter in self._filters:
+            queue_handler.addFilter(log_filter)
+        listener = FlushingQueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        self._pipelines.append((queue_handler, listener))
+        return queue_handler
+
+    @property
+    def dropped_records(self) -> int:
+        """Number of records dropped because a log queue was full"""
+        return sum(queue_handler.dropped for queue_handler, _ in self._pipelines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and drop counters of the async pipeline"""
+        return {
+            "async": self.async_logging,
+            "queue_size": self.queue_size,
+            "queue_depth": sum(
+                queue_handler.queue.qsize() for queue_handler, _ in self._pipelines
+            ),
+            "dropped_records": self.dropped_records,
+            "sampled_out": self.sampling_filter.sampled_out,
+            "suppressed_duplicates": self.sampling_filter.suppressed,
+        }
+
+    def configure_sampling(
+        self,
+        default_rate: float = 1.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+        dedup_window: float = 0.0,
+    ) -> None:
+        """Set this service's INFO/DEBUG sampling rates and dedup window"""
+        self.sampling_filter.configure(default_rate, sample_rates, dedup_window)
+
+    @staticmethod
+    def _emit_summary(record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+    def shutdown(self) -> None:
+        """Report pending duplicate counts, drain the log queues, flush and
+        close handlers, stop listeners"""
+        if self._pipelines or not self.async_logging:
+            self.sampling_filter.flush_summaries()
+        pipelines, self._pipelines = self._pipelines, []
+        for queue_handler, listener in pipelines:
+            listener.stop()
+            if queue_handler.dropped:
+                notice = logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": f"Dropped {queue_handler.dropped} log records because the log queue was full",
+                    }
+                )
+                for handler in listener.handlers:
+                    if notice.levelno >= handler.level:
+                        handler.handle(notice)
+            for handler in listener.handlers:
+                handler.close()
+
     def get_logger(self, name: str) -> logging.Logger:
         """Get or create a logger with the specified name"""
         if name not in self.loggers:
-            logger = logging.getLogger(name)
-            self.loggers[name] = logger
+            self.loggers[name] = logging.getLogger(name)
         return self.loggers[name]
 
     def log_request_start(self, logger: logging.Logger) -> object:
@@ -238,6 +667,15 @@ def get_logger(name: str) -> logging.Logger:
     return logger_manager.get_logger(name)
 
 
+def configure_log_sampling(
+    default_rate: float = 1.0,
+    sample_rates: Optional[Dict[str, float]] = None,
+    dedup_window: float = 0.0,
+) -> None:
+    """Configure log sampling and duplicate suppression for this service"""
+    logger_manager.configure_sampling(default_rate, sample_rates, dedup_window)
+
+
 def log_security_event(
     event_type: str, message: str, details: Optional[Dict[str, Any]] = None
 ) -> object:
@@ -1,20 +1,26 @@
+import atexit
 import base64
+import hashlib
 import json
 import logging
+import math
 import os
 import secrets
 import threading
 import time
-from collections import defaultdict, deque
+import weakref
+from collections import OrderedDict, defaultdict, deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import pyotp
 from cryptography.fernet import Fernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 logger = logging.getLogger(__name__)
@@ -69,10 +75,61 @@ class SecurityEvent:
     location: Optional[str] = None
 
 
+_KDF_SALT = b"nexafi_salt_2024"
+_KDF_ITERATIONS = 100000
+
+# Process-wide registry of PBKDF2 outputs keyed by a digest of (password, salt)
+# so that building another RobustEncryption never re-runs the slow KDF.
+_derived_key_registry: Dict[bytes, bytes] = {}
+_derived_key_lock = threading.Lock()
+
+
+def derive_key(password: bytes, salt: bytes = _KDF_SALT) -> bytes:
+    """Derive a 32-byte key with PBKDF2, memoized for the life of the process"""
+    cache_key = hashlib.sha256(len(salt).to_bytes(4, "big") + salt + password).digest()
+    with _derived_key_lock:
+        cached_key = _derived_key_registry.get(cache_key)
+    if cached_key is not None:
+        return cached_key
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=_KDF_ITERATIONS,
+        backend=default_backend(),
+    )
+    key = kdf.derive(password)
+    with _derived_key_lock:
+        return _derived_key_registry.setdefault(cache_key, key)
+
+
+def clear_derived_key_cache() -> None:
+    """Forget every memoized key (e.g. after a master key has been revoked)"""
+    with _derived_key_lock:
+        _derived_key_registry.clear()
+
+
 class RobustEncryption:
-    """Robust encryption utilities for sensitive data"""
+    """Robust encryption utilities for sensitive data
+
+    Single values use the original ``encrypt_sensitive_data`` format. Batches
+    of fields should go through ``encrypt_many``/``decrypt_many``, which skip
+    the extra base64 layer and by default use AES-GCM tokens of the form
+    ``v<key_version>.<base64(nonce | timestamp | ciphertext)>``. Tokens
+    sealed under an older key version stay readable as long as that key is
+    passed in ``retired_keys``.
+    """
 
-    def __init__(self, master_key: Optional[str] = None) -> None:
+    BULK_CIPHERS = ("aesgcm", "fernet")
+    _NONCE_SIZE = 12
+    _TIMESTAMP_SIZE = 8
+
+    def __init__(
+        self,
+        master_key: Optional[str] = None,
+        key_version: Optional[int] = None,
+        retired_keys: Optional[Dict[int, str]] = None,
+    ) -> None:
         if master_key:
             self.master_key = master_key.encode()
         else:
@@ -80,15 +137,37 @@ class RobustEncryption:
                 "MASTER_ENCRYPTION_KEY", "default-key-change-in-production"
             ).encode()
 
-        kdf = PBKDF2HMAC(
+        derived = derive_key(self.master_key)
+        key = base64.urlsafe_b64encode(derived)
+        self.fernet = Fernet(key)
+
+        self.key_version = int(
+            key_version
+            if key_version is not None
+            else os.environ.get("ENCRYPTION_KEY_VERSION", 1)
+        )
+        self._aead_keys: Dict[int, AESGCM] = {
+            self.key_version: self._build_aead(derived, self.key_version)
+        }
+        for version, retired_key in (retired_keys or {}).items():
+            if int(version) == self.key_version:
+                continue
+            self._aead_keys[int(version)] = self._build_aead(
+                derive_key(retired_key.encode()), int(version)
+            )
+
+    @staticmethod
+    def _build_aead(derived_key: bytes, version: int) -> AESGCM:
+        """Build the AES-GCM cipher for a key version from its PBKDF2 output"""
+        # Use a dedicated subkey so the Fernet and AES-GCM keys never coincide.
+        subkey = HKDF(
             algorithm=hashes.SHA256(),
             length=32,
-            salt=b"nexafi_salt_2024",
-            iterations=100000,
+            salt=None,
+            info=f"nexafi-bulk-aesgcm-v{version}".encode(),
             backend=default_backend(),
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(self.master_key))
-        self.fernet = Fernet(key)
+        ).derive(derived_key)
+        return AESGCM(subkey)
 
     def encrypt_sensitive_data(self, data: str) -> str:
         """Encrypt sensitive data with timestamp"""
@@ -114,18 +193,444 @@ class RobustEncryption:
             logger.error(f"Decryption failed: {str(e)}")
             raise ValueError("Invalid or expired encrypted data")
 
+    def encrypt_many(self, values: Iterable[str], cipher: str = "aesgcm") -> List[str]:
+        """Encrypt a batch of values, sharing key setup and timestamp"""
+        if cipher not in self.BULK_CIPHERS:
+            raise ValueError(f"Unsupported bulk cipher: {cipher}")
+        values = [value.encode() for value in values]
+        if cipher == "fernet":
+            now = int(time.time())
+            return [
+                self.fernet.encrypt_at_time(value, now).decode() for value in values
+            ]
+
+        aead = self._aead_keys[self.key_version]
+        prefix = f"v{self.key_version}."
+        header_timestamp = int(time.time()).to_bytes(self._TIMESTAMP_SIZE, "big")
+        nonces = os.urandom(self._NONCE_SIZE * len(values))
+        tokens: List[str] = []
+        for i, value in enumerate(values):
+            nonce = nonces[i * self._NONCE_SIZE : (i + 1) * self._NONCE_SIZE]
+            sealed = aead.encrypt(nonce, value, header_timestamp)
+            tokens.append(
+                prefix
+                + base64.urlsafe_b64encode(nonce + header_timestamp + sealed).decode()
+            )
+        return tokens
+
+    def decrypt_many(
+        self, tokens: Iterable[str], max_age_seconds: Optional[int] = None
+    ) -> List[str]:
+        """Decrypt a batch produced by encrypt_many (or encrypt_sensitive_data)"""
+        now = int(time.time())
+        results: List[str] = []
+        try:
+            for token in tokens:
+                results.append(self._decrypt_token(token, now, max_age_seconds))
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Bulk decryption failed: {str(e)}")
+            raise ValueError("Invalid or expired encrypted data")
+        return results
+
+    def _decrypt_token(
+        self, token: str, now: int, max_age_seconds: Optional[int]
+    ) -> str:
+        """Decrypt one bulk token, dispatching on its format"""
+        if token.startswith("v"):
+            version_str, _, payload = token.partition(".")
+            aead = self._aead_keys.get(int(version_str[1:]))
+            if aead is None:
+                raise ValueError(f"Unknown encryption key version: {version_str}")
+            raw = base64.urlsafe_b64decode(payload.encode())
+            nonce = raw[: self._NONCE_SIZE]
+            header_timestamp = raw[
+                self._NONCE_SIZE : self._NONCE_SIZE + self._TIMESTAMP_SIZE
+            ]
+            sealed = raw[self._NONCE_SIZE + self._TIMESTAMP_SIZE :]
+            data = aead.decrypt(nonce, sealed, header_timestamp).decode()
+            timestamp = int.from_bytes(header_timestamp, "big")
+        elif token.startswith("gAAAAA"):
+            data = self.fernet.decrypt(token.encode()).decode()
+            # Fernet tokens carry their own timestamp right after the version byte
+            timestamp = int.from_bytes(
+                base64.urlsafe_b64decode(token.encode())[1:9], "big"
+            )
+        else:
+            decoded = base64.urlsafe_b64decode(token.encode())
+            timestamp_str, data = self.fernet.decrypt(decoded).decode().split(":", 1)
+            timestamp = int(timestamp_str)
+
+        if max_age_seconds is not None and now - timestamp >= max_age_seconds:
+            raise ValueError("Encrypted data has exceeded maximum age")
+        return data
+
+
+@dataclass
+class ActivitySnapshot:
+    """Sliding-window view of a user's activity right after an event"""
+
+    event_count: int
+    amount_total: float
+    impossible_travel: bool = False
+    travel_speed_kmh: Optional[float] = None
+
+
+class _UserActivity:
+    """Per-user ring buffer of (timestamp, amount, geo cell) plus known devices"""
+
+    __slots__ = ("events", "amount_total", "last_event", "devices", "ips")
+
+    def __init__(self, max_events: int) -> None:
+        self.events: deque = deque(maxlen=max_events)
+        self.amount_total = 0.0
+        self.last_event: Optional[Tuple[float, Optional[Tuple[int, int]]]] = None
+        self.devices: set = set()
+        self.ips: set = set()
+
+
+class UserActivityIndex:
+    """In-memory sliding-window index of recent user activity
+
+    Each user keeps a bounded ring buffer of recent events with a running
+    amount total, so velocity counts, amount sums and impossible-travel checks
+    cost O(1) amortized per event and never touch the database. When a Redis
+    client is supplied, events and known devices/IPs are mirrored there and a
+    user that is not yet in local memory is hydrated from Redis, which lets
+    several service instances share the same history.
+
+    At most ``max_users`` users are kept; the least recently used one is
+    dropped first. Lookups of an unknown user do not add an entry.
+    """
+
+    EARTH_RADIUS_KM = 6371.0
+
+    def __init__(
+        self,
+        window_seconds: int = 60,
+        max_events: int = 256,
+        cell_size_degrees: float = 0.5,
+        max_travel_speed_kmh: float = 900.0,
+        retention_seconds: int = 86400,
+        redis_client: object = None,
+        key_prefix: str = "nexafi:fraud:",
+        max_users: int = 100_000,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self.cell_size_degrees = cell_size_degrees
+        self.max_travel_speed_kmh = max_travel_speed_kmh
+        self.retention_seconds = retention_seconds
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserActivity]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Two cells further apart than this can be reached "instantly" because
+        # the true positions may sit anywhere inside their cells.
+        self._cell_tolerance_km = self._haversine_km(
+            0.0, 0.0, cell_size_degrees, cell_size_degrees
+        )
+
+    def geo_cell(self, location: object) -> Optional[Tuple[int, int]]:
+        """Map a location (dict, "lat,lon" string or pair) to a coarse grid cell"""
+        if location is None:
+            return None
+        try:
+            if isinstance(location, dict):
+                lat = location.get("lat", location.get("latitude"))
+                lon = location.get("lon", location.get("longitude"))
+            elif isinstance(location, str):
+                lat, lon = location.split(",", 1)
+            else:
+                lat, lon = location
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return None
+        return (
+            int(lat // self.cell_size_degrees),
+            int(lon // self.cell_size_degrees),
+        )
+
+    def record_event(
+        self,
+        user_id: str,
+        amount: float = 0.0,
+        location: object = None,
+        timestamp: Optional[float] = None,
+    ) -> ActivitySnapshot:
+        """Add an event and return the user's window statistics including it"""
+        now = time.time() if timestamp is None else timestamp
+        cell = self.geo_cell(location)
+        with self._lock:
+            activity = self._get_activity(user_id)
+            impossible, speed = self._travel_check(activity, cell, now)
+            self._evict(activity, now)
+            if len(activity.events) == activity.events.maxlen:
+                activity.amount_total -= activity.events.popleft()[1]
+            activity.events.append((now, float(amount), cell))
+            activity.amount_total += float(amount)
+            if cell is not None:
+                activity.last_event = (now, cell)
+            snapshot = ActivitySnapshot(
+                event_count=len(activity.events),
+                amount_total=activity.amount_total,
+                impossible_travel=impossible,
+                travel_speed_kmh=speed,
+            )
+        self._mirror_event(user_id, now, amount, cell)
+        return snapshot
+
+    def velocity(self, user_id: str, now: Optional[float] = None) -> int:
+        """Number of events the user produced in the current window"""
+        return self.window_stats(user_id, now).event_count
+
+    def window_stats(
+        self, user_id: str, now: Optional[float] = None
+    ) -> ActivitySnapshot:
+        """Event count and amount total for the current window"""
+        now = time.time() if now is None else now
+        with self._lock:
+            activity = self._get_activity(user_id, create=False)
+            if activity is None:
+                return ActivitySnapshot(event_count=0, amount_total=0.0)
+            self._evict(activity, now)
+            return ActivitySnapshot(
+                event_count=len(activity.events), amount_total=activity.amount_total
+            )
+
+    def check_travel(
+        self, user_id: str, location: object, now: Optional[float] = None
+    ) -> bool:
+        """Whether reaching ``location`` from the last known cell is impossible"""
+        now = time.time() if now is None else now
+        with self._lock:
+            activity = self._get_activity(user_id, create=False)
+            if activity is None:
+                return False
+            return self._travel_check(activity, self.geo_cell(location), now)[0]
+
+    def remember_login(
+        self, user_id: str, ip_address: Optional[str], device_fingerprint: Optional[str]
+    ) -> Tuple[bool, bool]:
+        """Mark an IP/device as known; returns which of the two were new"""
+        with self._lock:
+            activity = self._get_activity(user_id)
+            new_ip = bool(ip_address) and ip_address not in activity.ips
+            new_device = (
+                bool(device_fingerprint) and device_fingerprint not in activity.devices
+            )
+            if new_ip:
+                activity.ips.add(ip_address)
+            if new_device:
+                activity.devices.add(device_fingerprint)
+        if self.redis_client is not None and (new_ip or new_device):
+            try:
+                pipe = self.redis_client.pipeline()
+                if new_ip:
+                    pipe.sadd(f"{self.key_prefix}ips:{user_id}", ip_address)
+                if new_device:
+                    pipe.sadd(f"{self.key_prefix}devices:{user_id}", device_fingerprint)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Failed to mirror known login to Redis: {e}")
+        return new_ip, new_device
+
+    def is_known_login(
+        self, user_id: str, ip_address: Optional[str], device_fingerprint: Optional[str]
+    ) -> Tuple[bool, bool]:
+        """Return (ip_known, device_known) for a user"""
+        with self._lock:
+            activity = self._get_activity(user_id, create=False)
+            if activity is None:
+                return (False, False)
+            return (
+                ip_address in activity.ips,
+                device_fingerprint in activity.devices,
+            )
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Bulk-load rows of (user_id, kind, ...) in timestamp order
+
+        ``kind`` is ``transaction`` (with ``timestamp``, ``amount`` and
+        ``location``), ``ip`` or ``device`` (with ``value``). Returns the
+        number of rows applied.
+        """
+        loaded = 0
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            for row in rows:
+                activity = self._users.get(row["user_id"])
+                if activity is None:
+                    activity = _UserActivity(self.max_events)
+                    self._add_user(row["user_id"], activity)
+                kind = row["kind"]
+                if kind == "ip":
+                    activity.ips.add(row["value"])
+                elif kind == "device":
+                    activity.devices.add(row["value"])
+                elif kind == "transaction" and row["timestamp"] >= cutoff:
+                    cell = self.geo_cell(row.get("location"))
+                    if len(activity.events) == activity.events.maxlen:
+                        activity.amount_total -= activity.events.popleft()[1]
+                    amount = float(row.get("amount") or 0.0)
+                    activity.events.append((row["timestamp"], amount, cell))
+                    activity.amount_total += amount
+                    if cell is not None:
+                        activity.last_event = (row["timestamp"], cell)
+                else:
+                    continue
+                loaded += 1
+        return loaded
+
+    def clear(self) -> None:
+        """Drop all in-memory state"""
+        with self._lock:
+            self._users.clear()
+
+    def _get_activity(
+        self, user_id: str, create: bool = True
+    ) -> Optional[_UserActivity]:
+        """Return the user's state, hydrating it from Redis on a local miss
+
+        Without ``create``, a user with no local or Redis state is not added
+        and None is returned.
+        """
+        activity = self._users.get(user_id)
+        if activity is not None:
+            self._users.move_to_end(user_id)
+            return activity
+        activity = _UserActivity(self.max_events)
+        if self.redis_client is not None:
+            self._hydrate(user_id, activity)
+        if not create and not (activity.events or activity.ips or activity.devices):
+            return None
+        self._add_user(user_id, activity)
+        return activity
+
+    def _add_user(self, user_id: str, activity: _UserActivity) -> None:
+        self._users[user_id] = activity
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def _evict(self, activity: _UserActivity, now: float) -> None:
+        cutoff = now - self.window_seconds
+        events = activity.events
+        while events and events[0][0] <= cutoff:
+            activity.amount_total -= events.popleft()[1]
+        if not events:
+            activity.amount_total = 0.0
+
+    def _travel_check(
+        self,
+        activity: _UserActivity,
+        cell: Optional[Tuple[int, int]],
+        now: float,
+    ) -> Tuple[bool, Optional[float]]:
+        if cell is None or activity.last_event is None:
+            return (False, None)
+        last_time, last_cell = activity.last_event
+        if last_cell == cell or now - last_time > self.retention_seconds:
+            return (False, None)
+        size = self.cell_size_degrees
+        distance = self._haversine_km(
+            (last_cell[0] + 0.5) * size,
+            (last_cell[1] + 0.5) * size,
+            (cell[0] + 0.5) * size,
+            (cell[1] + 0.5) * size,
+        )
+        distance = max(distance - self._cell_tolerance_km, 0.0)
+        if distance == 0.0:
+            return (False, 0.0)
+        elapsed_hours = max(now - last_time, 1.0) / 3600.0
+        speed = distance / elapsed_hours
+        return (speed > self.max_travel_speed_kmh, speed)
+
+    @classmethod
+    def _haversine_km(cls, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        d_phi = phi2 - phi1
+        d_lambda = math.radians(lon2 - lon1)
+        a = (
+            math.sin(d_phi / 2) ** 2
+            + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+        )
+        return 2 * cls.EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+    def _mirror_event(
+        self,
+        user_id: str,
+        timestamp: float,
+        amount: float,
+        cell: Optional[Tuple[int, int]],
+    ) -> None:
+        if self.redis_client is None:
+            return
+        key = f"{self.key_prefix}events:{user_id}"
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.rpush(key, json.dumps([timestamp, float(amount), cell]))
+            pipe.ltrim(key, -self.max_events, -1)
+            pipe.expire(key, self.retention_seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to mirror activity event to Redis: {e}")
+
+    def _hydrate(self, user_id: str, activity: _UserActivity) -> None:
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.lrange(f"{self.key_prefix}events:{user_id}", 0, -1)
+            pipe.smembers(f"{self.key_prefix}ips:{user_id}")
+            pipe.smembers(f"{self.key_prefix}devices:{user_id}")
+            events, ips, devices = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to hydrate activity from Redis: {e}")
+            return
+        for raw in events or []:
+            timestamp, amount, cell = json.loads(raw)
+            cell = tuple(cell) if cell is not None else None
+            activity.events.append((timestamp, amount, cell))
+            activity.amount_total += amount
+            if cell is not None:
+                activity.last_event = (timestamp, cell)
+        activity.ips.update(ips or ())
+        activity.devices.update(devices or ())
+
+
+def _flush_patterns_at_exit(engine_ref: "weakref.ref") -> None:
+    engine = engine_ref()
+    if engine is not None:
+        engine.flush_patterns()
+
 
 class FraudDetectionEngine:
-    """Engine for detecting fraudulent activities"""
+    """Engine for detecting fraudulent activities
 
-    def __init__(self, db_manager: object) -> None:
+    Pattern rows are buffered and written in batches: once
+    ``PATTERN_FLUSH_SIZE`` rows are pending, when the oldest pending row is
+    ``PATTERN_FLUSH_SECONDS`` old at the next enqueue, and at exit.
+    """
+
+    PATTERN_FLUSH_SIZE = 200
+    PATTERN_FLUSH_SECONDS = float(os.environ.get("FRAUD_PATTERN_FLUSH_SECONDS", 5))
+
+    def __init__(
+        self, db_manager: object, activity_index: Optional[UserActivityIndex] = None
+    ) -> None:
         self.db_manager = db_manager
         self.risk_thresholds = {
             "velocity": 10,  # transactions per minute
             "amount": 10000.0,  # single transaction limit
             "location": True,  # check for impossible travel
         }
+        self.activity_index = activity_index or UserActivityIndex()
+        self._pending_patterns: List[Tuple[str, str, str]] = []
+        self._pending_since = 0.0
+        self._pending_lock = threading.Lock()
         self._initialize_fraud_tables()
+        self.rebuild_activity_index()
+        atexit.register(_flush_patterns_at_exit, weakref.ref(self))
 
     def _initialize_fraud_tables(self) -> object:
         """Initialize fraud detection tables"""
@@ -154,26 +659,112 @@ class FraudDetectionEngine:
             "CREATE INDEX IF NOT EXISTS idx_fraud_alerts_user_id ON fraud_alerts(user_id)",
             "CREATE INDEX IF NOT EXISTS idx_fraud_alerts_status ON fraud_alerts(status)",
             "CREATE INDEX IF NOT EXISTS idx_transaction_patterns_user_id ON transaction_patterns(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_transaction_patterns_type_updated "
+            "ON transaction_patterns(pattern_type, last_updated)",
         ]
         for statement in statements:
             self.db_manager.execute_query(statement)
 
+    def rebuild_activity_index(self) -> int:
+        """Reload the activity index from transaction_patterns in one query"""
+        query = """
+        SELECT user_id, pattern_type, pattern_data
+        FROM transaction_patterns
+        WHERE pattern_type IN ('ip', 'device')
+           OR (pattern_type = 'transaction' AND last_updated >= datetime('now', ?))
+        ORDER BY id
+        """
+        try:
+            rows = self.db_manager.fetch_all(
+                query, (f"-{self.activity_index.retention_seconds} seconds",)
+            )
+            return self.activity_index.load(self._pattern_rows(rows or []))
+        except (TypeError, AttributeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _pattern_rows(rows: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        for row in rows:
+            if row["pattern_type"] == "transaction":
+                event = json.loads(row["pattern_data"])
+                yield {
+                    "user_id": row["user_id"],
+                    "kind": "transaction",
+                    "timestamp": float(event["timestamp"]),
+                    "amount": event.get("amount"),
+                    "location": event.get("location"),
+                }
+            else:
+                yield {
+                    "user_id": row["user_id"],
+                    "kind": row["pattern_type"],
+                    "value": row["pattern_data"],
+                }
+
+    def _queue_pattern(self, user_id: str, pattern_type: str, data: str) -> None:
+        """Buffer a pattern row; rows are written in batches off the hot path"""
+        now = time.monotonic()
+        with self._pending_lock:
+            if not self._pending_patterns:
+                self._pending_since = now
+            self._pending_patterns.append((user_id, pattern_type, data))
+            should_flush = (
+                len(self._pending_patterns) >= self.PATTERN_FLUSH_SIZE
+                or now - self._pending_since >= self.PATTERN_FLUSH_SECONDS
+            )
+        if should_flush:
+            self.flush_patterns()
+
+    def flush_patterns(self) -> int:
+        """Persist buffered pattern rows with a single executemany"""
+        with self._pending_lock:
+            pending, self._pending_patterns = self._pending_patterns, []
+        if not pending:
+            return 0
+        try:
+            with self.db_manager.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO transaction_patterns (user_id, pattern_type, pattern_data) "
+                    "VALUES (?, ?, ?)",
+                    pending,
+                )
+        except Exception as e:
+            logger.error(f"Failed to persist fraud patterns: {e}")
+            return 0
+        return len(pending)
+
+    def _record_transaction(
+        self, user_id: str, amount: float, location: object
+    ) -> ActivitySnapshot:
+        now = time.time()
+        snapshot = self.activity_index.record_event(user_id, amount, location, now)
+        self._queue_pattern(
+            user_id,
+            "transaction",
+            json.dumps({"timestamp": now, "amount": amount, "location": location}),
+        )
+        return snapshot
+
     def analyze_transaction(
         self, user_id: str, transaction_data: Dict[str, Any]
     ) -> float:
         """Analyze transaction for fraud risk"""
         risk_score = 0.0
+        amount = float(transaction_data.get("amount", 0))
+        snapshot = self._record_transaction(
+            user_id, amount, transaction_data.get("location")
+        )
 
         # Velocity check
-        if self._check_velocity(user_id):
+        if snapshot.event_count > self.risk_thresholds["velocity"]:
             risk_score += 0.4
 
         # Amount check
-        if float(transaction_data.get("amount", 0)) > self.risk_thresholds["amount"]:
+        if amount > self.risk_thresholds["amount"]:
             risk_score += 0.3
 
         # Location check
-        if self._check_location_anomaly(user_id, transaction_data.get("location")):
+        if self.risk_thresholds["location"] and snapshot.impossible_travel:
             risk_score += 0.5
 
         if risk_score >= 0.7:
@@ -185,15 +776,15 @@ class FraudDetectionEngine:
 
     def _check_velocity(self, user_id: str) -> bool:
         """Check transaction velocity for user"""
-        # Implementation placeholder
-        return False
+        return self.activity_index.velocity(user_id) > self.risk_thresholds["velocity"]
 
     def _check_location_anomaly(
         self, user_id: str, current_location: Optional[str]
     ) -> bool:
         """Check for impossible travel or suspicious location"""
-        # Implementation placeholder
-        return False
+        if not self.risk_thresholds["location"]:
+            return False
+        return self.activity_index.check_travel(user_id, current_location)
 
     def _create_fraud_alert(
         self, user_id: str, alert_type: str, risk_score: float, details: Dict[str, Any]
@@ -231,34 +822,35 @@ class FraudDetectionEngine:
         risk_score = 0.0
         risk_factors: list = []
 
-        try:
-            known_devices = self.db_manager.fetch_all(
-                "SELECT device_fingerprint FROM transaction_patterns WHERE user_id = ? AND pattern_type = 'device'",
-                (user_id,),
-            )
-            known_fps = {row["device_fingerprint"] for row in (known_devices or [])}
-        except (TypeError, AttributeError):
-            known_fps = set()
+        ip_known, device_known = self.activity_index.is_known_login(
+            user_id, ip_address, device_fingerprint
+        )
 
-        if not known_fps or device_fingerprint not in known_fps:
+        if not device_known:
             risk_score += 30.0
             risk_factors.append("new_device")
 
-        try:
-            known_ips = self.db_manager.fetch_all(
-                "SELECT pattern_data FROM transaction_patterns WHERE user_id = ? AND pattern_type = 'ip'",
-                (user_id,),
-            )
-            known_ip_set = {row["pattern_data"] for row in (known_ips or [])}
-        except (TypeError, AttributeError):
-            known_ip_set = set()
-
-        if not known_ip_set or ip_address not in known_ip_set:
+        if not ip_known:
             risk_score += 20.0
             risk_factors.append("new_ip")
 
         return min(risk_score, 100.0), risk_factors
 
+    def record_trusted_login(
+        self, user_id: str, ip_address: str, device_fingerprint: Optional[str]
+    ) -> None:
+        """Remember the IP and device of a successfully authenticated login"""
+        new_ip, new_device = self.activity_index.remember_login(
+            user_id, ip_address, device_fingerprint
+        )
+        if new_ip:
+            self._queue_pattern(user_id, "ip", ip_address)
+        if new_device:
+            self._queue_pattern(user_id, "device", device_fingerprint)
+        if new_ip or new_device:
+            # Known devices/IPs are rare and valuable; persist them right away
+            self.flush_patterns()
+
     def analyze_transaction_behavior(
         self,
         user_id: str,
@@ -280,16 +872,10 @@ class FraudDetectionEngine:
             risk_score += 30.0
             risk_factors.append("high_risk_merchant")
 
-        try:
-            recent_txns = self.db_manager.fetch_all(
-                "SELECT pattern_data FROM transaction_patterns WHERE user_id = ? AND pattern_type = 'transaction'",
-                (user_id,),
-            )
-            if recent_txns and len(recent_txns) > self.risk_thresholds["velocity"]:
-                risk_score += 30.0
-                risk_factors.append("high_velocity")
-        except (TypeError, AttributeError):
-            pass
+        snapshot = self._record_transaction(user_id, amount, None)
+        if snapshot.event_count > self.risk_thresholds["velocity"]:
+            risk_score += 30.0
+            risk_factors.append("high_velocity")
 
         return min(risk_score, 100.0), risk_factors
 
@@ -0,0 +1,891 @@
+"""
+In-process message broker for NexaFi services
+Stands in for RabbitMQ behind ``MessageQueue`` for tests, local development
+and single-machine load tests. Connections and channels mirror the subset of
+pika's ``BlockingConnection``/``BlockingChannel`` API the services use, and
+the broker follows RabbitMQ semantics for routing, priorities, acks,
+prefetch, publisher confirms and dead-lettering. ``SqliteBroker`` adds
+durability for durable queues and persistent messages.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pika
+from pika.exceptions import ChannelClosedByBroker, ChannelWrongStateError
+
+# Services put shared/ itself on sys.path, where the relative import fails
+try:
+    from ..database.manager import DatabaseManager
+except ImportError:
+    from database.manager import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_TYPES = ("direct", "fanout", "topic")
+
+# BasicProperties fields that survive a round trip through SqliteBroker
+_PROPERTY_FIELDS = (
+    "content_type",
+    "delivery_mode",
+    "priority",
+    "headers",
+    "message_id",
+    "correlation_id",
+    "reply_to",
+    "timestamp",
+    "type",
+)
+
+
+@dataclass
+class _Message:
+    seq: int
+    exchange: str
+    routing_key: str
+    body: bytes
+    properties: pika.BasicProperties
+    redelivered: bool = False
+    persistent: bool = False
+    priority: int = 0
+
+
+@dataclass
+class _Queue:
+    name: str
+    durable: bool
+    arguments: Dict[str, Any]
+    ready: List[Tuple[int, int, _Message]] = field(default_factory=list)
+    consumers: List["_Consumer"] = field(default_factory=list)
+
+    @property
+    def max_priority(self) -> int:
+        return int(self.arguments.get("x-max-priority") or 0)
+
+    def push(self, message: _Message) -> None:
+        # Highest priority first; the publish sequence keeps FIFO order
+        # within a priority and puts requeued messages back in place.
+        heapq.heappush(self.ready, (-message.priority, message.seq, message))
+
+
+@dataclass
+class _Consumer:
+    tag: str
+    queue: str
+    channel: "MemoryChannel"
+    callback: Callable
+    auto_ack: bool
+    prefetch: int
+    unacked: int = 0
+
+    def has_capacity(self) -> bool:
+        return self.auto_ack or not self.prefetch or self.unacked < self.prefetch
+
+
+def _topic_matches(binding: List[str], words: List[str]) -> bool:
+    """AMQP topic matching: ``*`` is one word, ``#`` zero or more words"""
+    if not binding:
+        return not words
+    head, rest = binding[0], binding[1:]
+    if head == "#":
+        return any(_topic_matches(rest, words[i:]) for i in range(len(words) + 1))
+    return bool(words) and head in ("*", words[0]) and _topic_matches(rest, words[1:])
+
+
+class MemoryBroker:
+    """Thread-safe in-memory broker shared by every connection to it"""
+
+    name = "in-memory broker"
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.RLock())
+        self.queues: Dict[str, _Queue] = {}
+        self.exchanges: Dict[str, str] = {}
+        # exchange -> [(queue, routing key)]
+        self.bindings: Dict[str, List[Tuple[str, str]]] = {}
+        self._seq = itertools.count(1)
+        self._consumer_tags = itertools.count(1)
+        self.stats = {"published": 0, "delivered": 0, "acked": 0, "unroutable": 0}
+
+    def connect(self) -> "MemoryConnection":
+        return MemoryConnection(self)
+
+    # Hooks for durable subclasses; called with the broker lock held
+    def _persist_queue(self, queue: _Queue) -> None:
+        pass
+
+    def _delete_queue(self, name: str) -> None:
+        pass
+
+    def _persist_exchange(self, name: str, exchange_type: str) -> None:
+        pass
+
+    def _persist_binding(self, exchange: str, queue: str, routing_key: str) -> None:
+        pass
+
+    def _persist_message(self, queue: _Queue, message: _Message) -> None:
+        pass
+
+    def _forget_message(self, message: _Message) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Make persisted state durable; a no-op in memory"""
+
+    def close(self) -> None:
+        pass
+
+    # Topology
+    def declare_queue(
+        self, name: str, durable: bool, arguments: Optional[Dict[str, Any]]
+    ) -> _Queue:
+        with self._cond:
+            queue = self.queues.get(name)
+            if queue is None:
+                queue = _Queue(name, durable, dict(arguments or {}))
+                self.queues[name] = queue
+                if durable:
+                    self._persist_queue(queue)
+            return queue
+
+    def delete_queue(self, name: str) -> int:
+        with self._cond:
+            queue = self.queues.pop(name, None)
+            if queue is None:
+                return 0
+            for _, _, message in queue.ready:
+                self._forget_message(message)
+            for exchange, bound in self.bindings.items():
+                self.bindings[exchange] = [b for b in bound if b[0] != name]
+            self._delete_queue(name)
+            return len(queue.ready)
+
+    def purge_queue(self, name: str) -> int:
+        with self._cond:
+            queue = self._queue(name)
+            count = len(queue.ready)
+            for _, _, message in queue.ready:
+                self._forget_message(message)
+            queue.ready = []
+            return count
+
+    def declare_exchange(self, name: str, exchange_type: str, durable: bool) -> None:
+        if exchange_type not in EXCHANGE_TYPES:
+            raise ValueError(f"Unsupported exchange type: {exchange_type}")
+        with self._cond:
+            if name not in self.exchanges:
+                self.exchanges[name] = exchange_type
+                self.bindings.setdefault(name, [])
+                if durable:
+                    self._persist_exchange(name, exchange_type)
+
+    def bind_queue(self, queue: str, exchange: str, routing_key: str) -> None:
+        with self._cond:
+            self._queue(queue)
+            if exchange not in self.exchanges:
+                raise ChannelClosedByBroker(
+                    404, f"NOT_FOUND - no exchange '{exchange}'"
+                )
+            if (queue, routing_key) not in self.bindings[exchange]:
+                self.bindings[exchange].append((queue, routing_key))
+                self._persist_binding(exchange, queue, routing_key)
+
+    def _queue(self, name: str) -> _Queue:
+        try:
+            return self.queues[name]
+        except KeyError:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'")
+
+    def _route(self, exchange: str, routing_key: str) -> List[_Queue]:
+        if exchange == "":
+            queue = self.queues.get(routing_key)
+            return [queue] if queue else []
+        exchange_type = self.exchanges.get(exchange)
+        if exchange_type is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+        names = []
+        for queue_name, key in self.bindings[exchange]:
+            if exchange_type == "fanout" or key == routing_key:
+                names.append(queue_name)
+            elif exchange_type == "topic" and _topic_matches(
+                key.split("."), routing_key.split(".")
+            ):
+                names.append(queue_name)
+        return [self.queues[n] for n in dict.fromkeys(names) if n in self.queues]
+
+    # Messages
+    def publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: Optional[pika.BasicProperties],
+        redelivered: bool = False,
+    ) -> int:
+        """Route a message; returns the number of queues it reached"""
+        properties = properties or pika.BasicProperties()
+        with self._cond:
+            targets = self._route(exchange, routing_key)
+            self.stats["published"] += 1
+            if not targets:
+                self.stats["unroutable"] += 1
+                return 0
+            for queue in targets:
+                self._enqueue(
+                    queue, exchange, routing_key, body, properties, redelivered
+                )
+            self._cond.notify_all()
+            return len(targets)
+
+    def _enqueue(
+        self,
+        queue: _Queue,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: pika.BasicProperties,
+        redelivered: bool = False,
+        seq: Optional[int] = None,
+    ) -> _Message:
+        priority = 0
+        if queue.max_priority:
+            priority = min(max(properties.priority or 0, 0), queue.max_priority)
+        message = _Message(
+            seq=seq or next(self._seq),
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=properties,
+            redelivered=redelivered,
+            persistent=queue.durable and properties.delivery_mode == 2,
+            priority=priority,
+        )
+        queue.push(message)
+        if message.persistent:
+            self._persist_message(queue, message)
+        return message
+
+    def _settle(self, queue_name: str, message: _Message, outcome: str) -> None:
+        """Finish a delivery: 'ack', 'requeue' or 'reject' (dead-letter)"""
+        queue = self.queues.get(queue_name)
+        if outcome == "requeue" and queue is not None:
+            message.redelivered = True
+            queue.push(message)
+            return
+        self._forget_message(message)
+        if outcome == "ack":
+            self.stats["acked"] += 1
+        elif queue is not None:
+            self._dead_letter(queue, message)
+
+    def _dead_letter(self, queue: _Queue, message: _Message) -> None:
+        exchange = queue.arguments.get("x-dead-letter-exchange")
+        if exchange is None:
+            return
+        routing_key = queue.arguments.get(
+            "x-dead-letter-routing-key", message.routing_key
+        )
+        headers = dict(message.properties.headers or {})
+        deaths = list(headers.get("x-death") or [])
+        for death in deaths:
+            if death.get("queue") == queue.name and death.get("reason") == "rejected":
+                death["count"] = death.get("count", 1) + 1
+                break
+        else:
+            deaths.insert(
+                0,
+                {
+                    "count": 1,
+                    "reason": "rejected",
+                    "queue": queue.name,
+                    "exchange": message.exchange,
+                    "routing-keys": [message.routing_key],
+                },
+            )
+        headers["x-death"] = deaths
+        properties = pika.BasicProperties(
+            **{name: getattr(message.properties, name) for name in _PROPERTY_FIELDS}
+        )
+        properties.headers = headers
+        try:
+            for target in self._route(exchange, routing_key):
+                self._enqueue(target, exchange, routing_key, message.body, properties)
+        except ChannelClosedByBroker:
+            logger.warning(f"Dead-letter exchange '{exchange}' does not exist")
+
+    def _collect(self, connection: "MemoryConnection") -> List[Tuple]:
+        """Take the callbacks, confirms and deliveries due to a connection"""
+        events = [(callback, ()) for callback in connection._callbacks]
+        connection._callbacks = []
+        for channel in connection.channels:
+            if channel.is_closed:
+                continue
+            if channel._confirm_callback and channel._published > channel._confirmed:
+                channel._confirmed = channel._published
+                frame = pika.frame.Method(
+                    channel.channel_number,
+                    pika.spec.Basic.Ack(delivery_tag=channel._confirmed, multiple=True),
+                )
+                events.append((channel._confirm_callback, (frame,)))
+            progress = True
+            while progress:
+                # One message per consumer per round spreads a queue's
+                # messages round-robin across its consumers.
+                progress = False
+                for consumer in list(channel.consumers.values()):
+                    queue = self.queues.get(consumer.queue)
+                    if queue is None or not queue.ready or not consumer.has_capacity():
+                        continue
+                    _, _, message = heapq.heappop(queue.ready)
+                    tag = channel._next_delivery_tag()
+                    if consumer.auto_ack:
+                        self._settle(queue.name, message, "ack")
+                    else:
+                        consumer.unacked += 1
+                        channel.unacked[tag] = (queue.name, message, consumer)
+                    method = pika.spec.Basic.Deliver(
+                        consumer_tag=consumer.tag,
+                        delivery_tag=tag,
+                        redelivered=message.redelivered,
+                        exchange=message.exchange,
+                        routing_key=message.routing_key,
+                    )
+                    events.append(
+                        (
+                            consumer.callback,
+                            (channel, method, message.properties, message.body),
+                        )
+                    )
+                    self.stats["delivered"] += 1
+                    progress = True
+        return events
+
+    def process_events(
+        self, connection: "MemoryConnection", time_limit: Optional[float]
+    ) -> None:
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        with self._cond:
+            self.flush()
+            events = self._collect(connection)
+            while not events and not connection.is_closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                self.flush()
+                events = self._collect(connection)
+        # Callbacks run outside the lock so they can ack and publish.
+        for callback, args in events:
+            callback(*args)
+
+    def wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+
+class MemoryChannel:
+    """Channel on a ``MemoryBroker``, mirroring pika's ``BlockingChannel``"""
+
+    def __init__(self, connection: "MemoryConnection", channel_number: int) -> None:
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.consumers: Dict[str, _Consumer] = {}
+        # Delivery tag -> (queue name, message, consumer), in delivery order
+        self.unacked: Dict[int, Tuple[str, _Message, _Consumer]] = {}
+        self.prefetch_count = 0
+        self._delivery_tags = itertools.count(1)
+        self._confirm_callback: Optional[Callable] = None
+        self._published = 0
+        self._confirmed = 0
+        self._consuming = False
+        self.is_closed = False
+
+    @property
+    def is_open(self) -> bool:
+        return not self.is_closed
+
+    def _next_delivery_tag(self) -> int:
+        return next(self._delivery_tags)
+
+    def _check_open(self) -> None:
+        if self.is_closed:
+            raise ChannelWrongStateError("Channel is closed.")
+
+    def _fail(self, error: ChannelClosedByBroker) -> None:
+        """Like RabbitMQ, a channel-level error closes the channel"""
+        self.close()
+        raise error
+
+    def close(self) -> None:
+        with self.broker._cond:
+            if self.is_closed:
+                return
+            for tag in list(self.consumers):
+                self.basic_cancel(tag)
+            self.is_closed = True
+            for queue_name, message, _ in self.unacked.values():
+                self.broker._settle(queue_name, message, "requeue")
+            self.unacked.clear()
+            self.broker._cond.notify_all()
+
+    def queue_declare(
+        self,
+        queue: str,
+        passive: bool = False,
+        durable: bool = False,
+        exclusive: bool = False,
+        auto_delete: bool = False,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> object:
+        self._check_open()
+        with self.broker._cond:
+            if passive:
+                try:
+                    declared = self.broker._queue(queue)
+                except ChannelClosedByBroker as e:
+                    self._fail(e)
+            else:
+                declared = self.broker.declare_queue(queue, durable, arguments)
+            return pika.frame.Method(
+                self.channel_number,
+                pika.spec.Queue.DeclareOk(
+                    queue=queue,
+                    message_count=len(declared.ready),
+                    consumer_count=len(declared.consumers),
+                ),
+            )
+
+    def queue_delete(self, queue: str) -> object:
+        self._check_open()
+        return self.broker.delete_queue(queue)
+
+    def queue_purge(self, queue: str) -> object:
+        self._check_open()
+        try:
+            return self.broker.purge_queue(queue)
+        except ChannelClosedByBroker as e:
+            self._fail(e)
+
+    def exchange_declare(
+        self,
+        exchange: str,
+        exchange_type: str = "direct",
+        passive: bool = False,
+        durable: bool = False,
+        auto_delete: bool = False,
+        internal: bool = False,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> object:
+        self._check_open()
+        self.broker.declare_exchange(exchange, exchange_type, durable)
+
+    def queue_bind(
+        self,
+        queue: str,
+        exchange: str,
+        routing_key: Optional[str] = None,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> object:
+        self._check_open()
+        try:
+            self.broker.bind_queue(queue, exchange, routing_key or queue)
+        except ChannelClosedByBroker as e:
+            self._fail(e)
+
+    def basic_qos(
+        self, prefetch_size: int = 0, prefetch_count: int = 0, global_qos: bool = False
+    ) -> object:
+        self._check_open()
+        # As in RabbitMQ, the limit applies to consumers started afterwards.
+        self.prefetch_count = prefetch_count
+
+    def confirm_delivery(self, ack_nack_callback: Callable) -> None:
+        """Enable publisher confirms; acks arrive via process_data_events"""
+        self._check_open()
+        self._confirm_callback = ack_nack_callback
+
+    def basic_publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties: Optional[pika.BasicProperties] = None,
+        mandatory: bool = False,
+    ) -> None:
+        self._check_open()
+        if isinstance(body, str):
+            body = body.encode()
+        with self.broker._cond:
+            try:
+                self.broker.publish(exchange, routing_key, body, properties)
+            except ChannelClosedByBroker as e:
+                self._fail(e)
+            self._published += 1
+
+    def basic_consume(
+        self,
+        queue: str,
+        on_message_callback: Callable,
+        auto_ack: bool = False,
+        exclusive: bool = False,
+        consumer_tag: Optional[str] = None,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        self._check_open()
+        with self.broker._cond:
+            try:
+                declared = self.broker._queue(queue)
+            except ChannelClosedByBroker as e:
+                self._fail(e)
+            tag = consumer_tag or f"ctag{next(self.broker._consumer_tags)}"
+            consumer = _Consumer(
+                tag, queue, self, on_message_callback, auto_ack, self.prefetch_count
+            )
+            self.consumers[tag] = consumer
+            declared.consumers.append(consumer)
+            return tag
+
+    def basic_cancel(self, consumer_tag: str) -> List:
+        with self.broker._cond:
+            consumer = self.consumers.pop(consumer_tag, None)
+            if consumer is not None:
+                queue = self.broker.queues.get(consumer.queue)
+                if queue is not None and consumer in queue.consumers:
+                    queue.consumers.remove(consumer)
+            if not self.consumers:
+                self._consuming = False
+        return []
+
+    def basic_get(
+        self, queue: str, auto_ack: bool = False
+    ) -> Tuple[Optional[object], Optional[pika.BasicProperties], Optional[bytes]]:
+        self._check_open()
+        with self.broker._cond:
+            try:
+                source = self.broker._queue(queue)
+            except ChannelClosedByBroker as e:
+                self._fail(e)
+            if not source.ready:
+                return None, None, None
+            _, _, message = heapq.heappop(source.ready)
+            tag = self._next_delivery_tag()
+            if auto_ack:
+                self.broker._settle(queue, message, "ack")
+            else:
+                getter = _Consumer("", queue, self, None, False, 0)
+                self.unacked[tag] = (queue, message, getter)
+            method = pika.spec.Basic.GetOk(
+                delivery_tag=tag,
+                redelivered=message.redelivered,
+                exchange=message.exchange,
+                routing_key=message.routing_key,
+                message_count=len(source.ready),
+            )
+            return method, message.properties, message.body
+
+    def _settle(self, delivery_tag: int, multiple: bool, outcome: str) -> None:
+        self._check_open()
+        with self.broker._cond:
+            if multiple:
+                tags = [
+                    t for t in self.unacked if not delivery_tag or t <= delivery_tag
+                ]
+            elif delivery_tag in self.unacked:
+                tags = [delivery_tag]
+            else:
+                self._fail(
+                    ChannelClosedByBroker(
+                        406,
+                        f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}",
+                    )
+                )
+            for tag in tags:
+                queue_name, message, consumer = self.unacked.pop(tag)
+                consumer.unacked -= 1
+                self.broker._settle(queue_name, message, outcome)
+            self.broker._cond.notify_all()
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        self._settle(delivery_tag, multiple, "ack")
+
+    def basic_nack(
+        self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True
+    ) -> None:
+        self._settle(delivery_tag, multiple, "requeue" if requeue else "reject")
+
+    def basic_reject(self, delivery_tag: int = 0, requeue: bool = True) -> None:
+        self._settle(delivery_tag, False, "requeue" if requeue else "reject")
+
+    def start_consuming(self) -> None:
+        self._consuming = True
+        while self._consuming and self.consumers and not self.is_closed:
+            self.connection.process_data_events(time_limit=0.1)
+
+    def stop_consuming(self) -> None:
+        for tag in list(self.consumers):
+            self.basic_cancel(tag)
+        self._consuming = False
+        self.broker.wake()
+
+
+class MemoryConnection:
+    """Connection to a ``MemoryBroker``, mirroring pika's ``BlockingConnection``
+
+    Like pika, a connection belongs to one thread: consumer callbacks and
+    publisher confirms run inside ``process_data_events``.
+    """
+
+    def __init__(self, broker: MemoryBroker) -> None:
+        self.broker = broker
+        self.channels: List[MemoryChannel] = []
+        self._callbacks: List[Callable] = []
+        self.is_closed = False
+
+    @property
+    def is_open(self) -> bool:
+        return not self.is_closed
+
+    def channel(self) -> MemoryChannel:
+        if self.is_closed:
+            raise ChannelWrongStateError("Connection is closed.")
+        channel = MemoryChannel(self, len(self.channels) + 1)
+        self.channels.append(channel)
+        return channel
+
+    def process_data_events(self, time_limit: Optional[float] = 0) -> None:
+        self.broker.process_events(self, time_limit)
+
+    def add_callback_threadsafe(self, callback: Callable) -> None:
+        """Run ``callback`` on this connection's thread, waking it if blocked"""
+        with self.broker._cond:
+            self._callbacks.append(callback)
+            self.broker._cond.notify_all()
+
+    def sleep(self, duration: float) -> None:
+        self.process_data_events(time_limit=duration)
+
+    def close(self) -> None:
+        if self.is_closed:
+            return
+        for channel in self.channels:
+            channel.close()
+        with self.broker._cond:
+            self.broker.flush()
+        self.is_closed = True
+
+
+class SqliteBroker(MemoryBroker):
+    """``MemoryBroker`` whose durable state survives restarts
+
+    Durable queues, exchanges and bindings, and persistent messages
+    (``delivery_mode=2``) on durable queues, are stored in sqlite. Message
+    writes are group-committed: pending changes are written in one
+    transaction when ``flush_size`` of them accumulate, when the oldest is
+    ``flush_interval_ms`` old, or whenever a connection processes events.
+    As with RabbitMQ, a publisher confirm is only sent after the commit, so
+    publishers that need durability should enable confirms.
+    """
+
+    name = "sqlite broker"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mq_queues (
+            name TEXT PRIMARY KEY,
+            arguments TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS mq_exchanges (
+            name TEXT PRIMARY KEY,
+            exchange_type TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS mq_bindings (
+            exchange TEXT NOT NULL,
+            queue TEXT NOT NULL,
+            routing_key TEXT NOT NULL,
+            PRIMARY KEY (exchange, queue, routing_key)
+        );
+        CREATE TABLE IF NOT EXISTS mq_messages (
+            seq INTEGER PRIMARY KEY,
+            queue TEXT NOT NULL,
+            exchange TEXT NOT NULL,
+            routing_key TEXT NOT NULL,
+            body BLOB NOT NULL,
+            properties TEXT NOT NULL,
+            redelivered INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_mq_messages_queue ON mq_messages(queue);
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        flush_size: int = 500,
+        flush_interval_ms: float = 50,
+    ) -> None:
+        super().__init__()
+        self.db = DatabaseManager(db_path, pool_size=1)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._inserts: Dict[int, Tuple] = {}
+        self._deletes: List[int] = []
+        self._pending_since: Optional[float] = None
+        with self.db.get_connection() as conn:
+            conn.executescript(self.SCHEMA)
+        self._restore()
+
+    def _restore(self) -> None:
+        for row in self.db.fetch_all("SELECT name, arguments FROM mq_queues"):
+            self.queues[row["name"]] = _Queue(
+                row["name"], True, json.loads(row["arguments"])
+            )
+        for row in self.db.fetch_all("SELECT name, exchange_type FROM mq_exchanges"):
+            self.exchanges[row["name"]] = row["exchange_type"]
+            self.bindings.setdefault(row["name"], [])
+        for row in self.db.fetch_all("SELECT * FROM mq_bindings"):
+            self.bindings.setdefault(row["exchange"], []).append(
+                (row["queue"], row["routing_key"])
+            )
+        last_seq = 0
+        for row in self.db.fetch_all("SELECT * FROM mq_messages ORDER BY seq"):
+            queue = self.queues.get(row["queue"])
+            last_seq = row["seq"]
+            if queue is None:
+                continue
+            properties = pika.BasicProperties(**json.loads(row["properties"]))
+            message = _Message(
+                seq=row["seq"],
+                exchange=row["exchange"],
+                routing_key=row["routing_key"],
+                body=bytes(row["body"]),
+                properties=properties,
+                redelivered=bool(row["redelivered"]),
+                persistent=True,
+                priority=min(max(properties.priority or 0, 0), queue.max_priority),
+            )
+            queue.push(message)
+        self._seq = itertools.count(last_seq + 1)
+        restored = sum(len(q.ready) for q in self.queues.values())
+        if restored:
+            logger.info(
+                f"Restored {restored} persistent messages from {self.db.db_path}"
+            )
+
+    def _persist_queue(self, queue: _Queue) -> None:
+        self.db.execute_update(
+            "INSERT OR REPLACE INTO mq_queues (name, arguments) VALUES (?, ?)",
+            (queue.name, json.dumps(queue.arguments)),
+        )
+
+    def _delete_queue(self, name: str) -> None:
+        self.flush()
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM mq_queues WHERE name = ?", (name,))
+            conn.execute("DELETE FROM mq_bindings WHERE queue = ?", (name,))
+            conn.execute("DELETE FROM mq_messages WHERE queue = ?", (name,))
+
+    def _persist_exchange(self, name: str, exchange_type: str) -> None:
+        self.db.execute_update(
+            "INSERT OR REPLACE INTO mq_exchanges (name, exchange_type) VALUES (?, ?)",
+            (name, exchange_type),
+        )
+
+    def _persist_binding(self, exchange: str, queue: str, routing_key: str) -> None:
+        if (
+            exchange in self.exchanges
+            and queue in self.queues
+            and self.queues[queue].durable
+        ):
+            self.db.execute_update(
+                "INSERT OR IGNORE INTO mq_bindings (exchange, queue, routing_key) "
+                "VALUES (?, ?, ?)",
+                (exchange, queue, routing_key),
+            )
+
+    def _persist_message(self, queue: _Queue, message: _Message) -> None:
+        properties = {
+            name: getattr(message.properties, name)
+            for name in _PROPERTY_FIELDS
+            if getattr(message.properties, name) is not None
+        }
+        self._inserts[message.seq] = (
+            message.seq,
+            queue.name,
+            message.exchange,
+            message.routing_key,
+            message.body,
+            json.dumps(properties),
+            int(message.redelivered),
+        )
+        self._changed()
+
+    def _forget_message(self, message: _Message) -> None:
+        if not message.persistent:
+            return
+        # A message settled before its insert was flushed never hits disk.
+        if self._inserts.pop(message.seq, None) is None:
+            self._deletes.append(message.seq)
+            self._changed()
+
+    def _changed(self) -> None:
+        now = time.monotonic()
+        if self._pending_since is None:
+            self._pending_since = now
+        if (
+            len(self._inserts) + len(self._deletes) >= self.flush_size
+            or now - self._pending_since >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        with self._cond:
+            if not (self._inserts or self._deletes):
+                return
+            with self.db.transaction() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO mq_messages (seq, queue, exchange, "
+                    "routing_key, body, properties, redelivered) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    list(self._inserts.values()),
+                )
+                conn.executemany(
+                    "DELETE FROM mq_messages WHERE seq = ?",
+                    [(seq,) for seq in self._deletes],
+                )
+            self._inserts = {}
+            self._deletes = []
+            self._pending_since = None
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close_all_connections()
+
+
+class MemoryTransport:
+    """``MessageQueue`` transport backed by a ``MemoryBroker``
+
+    Every ``MessageQueue`` sharing the transport (or its broker) sees the
+    same queues, so producers and consumers in one process talk to each
+    other exactly as they would through RabbitMQ.
+    """
+
+    def __init__(self, broker: Optional[MemoryBroker] = None) -> None:
+        self.broker = broker or MemoryBroker()
+        self.name = self.broker.name
+
+    def connect(self) -> MemoryConnection:
+        return self.broker.connect()
+
+    def enable_confirms(
+        self,
+        connection: MemoryConnection,
+        channel: MemoryChannel,
+        on_confirm: Callable,
+        timeout: float,
+    ) -> None:
+        channel.confirm_delivery(on_confirm)
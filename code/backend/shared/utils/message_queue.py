@@ -4,63 +4,230 @@ Shared message queue utilities for NexaFi services
 
 import json
 import logging
-from typing import Any, Callable, Dict, Optional
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import pika
 
-from ..config.infrastructure import InfrastructureConfig
+# Services put shared/ itself on sys.path, where the relative import fails
+try:
+    from ..config.infrastructure import InfrastructureConfig
+except ImportError:
+    from config.infrastructure import InfrastructureConfig
 
 logger = logging.getLogger(__name__)
 
 
-class MessageQueue:
-    """RabbitMQ message queue manager"""
+class ConfirmTracker:
+    """Outstanding publisher confirms of one confirm-mode channel
+
+    The broker numbers messages on a confirm-mode channel 1, 2, 3, ...;
+    ``Basic.Ack``/``Basic.Nack`` frames settle one tag, or every tag up to
+    and including it when ``multiple`` is set.
+    """
 
     def __init__(self) -> None:
-        self.connection = None
-        self.channel = None
+        self._next_tag = 1
+        self._pending: Dict[int, Tuple[str, bytes]] = {}
+        self.acked = 0
+        self.nacked: List[Tuple[str, bytes]] = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(self, routing_key: str, body: bytes) -> int:
+        tag = self._next_tag
+        self._pending[tag] = (routing_key, body)
+        self._next_tag += 1
+        return tag
+
+    def on_confirm(self, frame: object) -> None:
+        method = frame.method
+        if method.multiple:
+            # _pending is in publish order, so settled tags form a prefix.
+            tags = []
+            for tag in self._pending:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag]
+        is_ack = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            entry = self._pending.pop(tag, None)
+            if entry is None:
+                continue
+            if is_ack:
+                self.acked += 1
+            else:
+                self.nacked.append(entry)
+
+
+class PikaTransport:
+    """``MessageQueue`` transport for a RabbitMQ broker (the default)"""
+
+    name = "RabbitMQ"
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        self.config = config or InfrastructureConfig.get_rabbitmq_config()
+
+    def connect(self) -> pika.BlockingConnection:
+        credentials = pika.PlainCredentials(
+            self.config["credentials"]["username"],
+            self.config["credentials"]["password"],
+        )
+        parameters = pika.ConnectionParameters(
+            host=self.config["host"],
+            port=self.config["port"],
+            virtual_host=self.config["virtual_host"],
+            credentials=credentials,
+        )
+        return pika.BlockingConnection(parameters)
+
+    def enable_confirms(
+        self,
+        connection: pika.BlockingConnection,
+        channel: object,
+        on_confirm: Callable,
+        timeout: float,
+    ) -> None:
+        selected = []
+        # BlockingChannel.confirm_delivery() makes every basic_publish wait
+        # for its own ack. Registering on the underlying channel instead
+        # lets acks arrive asynchronously while publishing continues.
+        channel._impl.confirm_delivery(
+            ack_nack_callback=on_confirm, callback=selected.append
+        )
+        deadline = time.monotonic() + timeout
+        while not selected:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Broker did not confirm Confirm.Select")
+            connection.process_data_events(time_limit=0.05)
+
+
+_shared_transports: Dict[str, object] = {}
+
+
+def transport_from_env() -> object:
+    """Transport selected by ``MESSAGE_QUEUE_TRANSPORT``
+
+    ``rabbitmq`` (default), ``memory`` for an in-process broker, or
+    ``sqlite`` for an in-process broker persisted to
+    ``MESSAGE_QUEUE_DB_PATH``. In-process brokers are shared by every
+    ``MessageQueue`` of the process.
+    """
+    kind = os.environ.get("MESSAGE_QUEUE_TRANSPORT", "rabbitmq").lower()
+    if kind == "rabbitmq":
+        return PikaTransport()
+    if kind not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown MESSAGE_QUEUE_TRANSPORT: {kind}")
+    if kind not in _shared_transports:
+        from .memory_broker import MemoryTransport, SqliteBroker
+
+        if kind == "memory":
+            _shared_transports[kind] = MemoryTransport()
+        else:
+            db_path = os.environ.get(
+                "MESSAGE_QUEUE_DB_PATH",
+                os.path.join(os.path.expanduser("~"), "data", "message_queue.db"),
+            )
+            _shared_transports[kind] = MemoryTransport(SqliteBroker(db_path))
+    return _shared_transports[kind]
+
+
+class MessageQueue:
+    """Message queue manager
+
+    Talks to RabbitMQ by default; pass a ``transport`` (or set
+    ``MESSAGE_QUEUE_TRANSPORT``) to use an in-process broker instead.
+    Connections are not thread-safe, so every thread gets its own
+    connection and channel, opened on first use and reused after. With
+    ``publisher_confirms`` the channel is put in confirm mode and acks are
+    tracked asynchronously: publishing never waits for the broker, and
+    ``wait_for_confirms`` settles whatever is still outstanding.
+    """
+
+    def __init__(
+        self,
+        publisher_confirms: Optional[bool] = None,
+        transport: Optional[object] = None,
+    ) -> None:
         self.config = InfrastructureConfig.get_rabbitmq_config()
+        if publisher_confirms is None:
+            publisher_confirms = (
+                os.environ.get("RABBITMQ_PUBLISHER_CONFIRMS", "false").lower() == "true"
+            )
+        self.publisher_confirms = publisher_confirms
+        self.transport = transport or transport_from_env()
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> object:
+        return getattr(self._local, "connection", None)
+
+    @property
+    def channel(self) -> object:
+        return getattr(self._local, "channel", None)
+
+    @property
+    def confirm_tracker(self) -> Optional[ConfirmTracker]:
+        return getattr(self._local, "confirm_tracker", None)
 
     def connect(self) -> object:
-        """Establish connection to RabbitMQ"""
+        """Establish this thread's connection to the broker"""
         try:
-            credentials = pika.PlainCredentials(
-                self.config["credentials"]["username"],
-                self.config["credentials"]["password"],
-            )
-            parameters = pika.ConnectionParameters(
-                host=self.config["host"],
-                port=self.config["port"],
-                virtual_host=self.config["virtual_host"],
-                credentials=credentials,
-            )
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
-            logger.info("Connected to RabbitMQ")
+            self._local.connection = self.transport.connect()
+            self._local.channel = self._local.connection.channel()
+            self._local.confirm_tracker = None
+            if self.publisher_confirms:
+                tracker = ConfirmTracker()
+                self.transport.enable_confirms(
+                    self.connection, self.channel, tracker.on_confirm, timeout=10.0
+                )
+                self._local.confirm_tracker = tracker
+            logger.info(f"Connected to {self.transport.name}")
         except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            logger.error(f"Failed to connect to {self.transport.name}: {e}")
             raise
 
+    def _ensure_channel(self) -> object:
+        if self.channel is None or self.channel.is_closed:
+            self.connect()
+        return self.channel
+
     def disconnect(self) -> object:
-        """Close connection to RabbitMQ"""
+        """Close this thread's connection to the broker"""
         if self.connection and (not self.connection.is_closed):
             self.connection.close()
-            logger.info("Disconnected from RabbitMQ")
+            logger.info(f"Disconnected from {self.transport.name}")
+        self._local.connection = None
+        self._local.channel = None
+        self._local.confirm_tracker = None
 
-    def declare_queue(self, queue_name: str, durable: bool = True) -> object:
-        """Declare a queue"""
-        if not self.channel:
-            self.connect()
-        self.channel.queue_declare(queue=queue_name, durable=durable)
+    def declare_queue(
+        self,
+        queue_name: str,
+        durable: bool = True,
+        arguments: Optional[Dict[str, Any]] = None,
+    ) -> object:
+        """Declare a queue, e.g. with ``{"x-max-priority": 10}`` arguments"""
+        self._ensure_channel().queue_declare(
+            queue=queue_name, durable=durable, arguments=arguments
+        )
         logger.info(f"Declared queue: {queue_name}")
 
     def declare_exchange(
         self, exchange_name: str, exchange_type: str = "direct"
     ) -> object:
         """Declare an exchange"""
-        if not self.channel:
-            self.connect()
-        self.channel.exchange_declare(
+        self._ensure_channel().exchange_declare(
             exchange=exchange_name, exchange_type=exchange_type, durable=True
         )
         logger.info(f"Declared exchange: {exchange_name}")
@@ -71,38 +238,371 @@ class MessageQueue:
         message: Dict[str, Any],
         exchange: str = "",
         routing_key: Optional[str] = None,
+        priority: Optional[int] = None,
     ) -> object:
         """Publish a message to a queue"""
-        if not self.channel:
-            self.connect()
+        self.publish_batch(queue_name, [message], exchange, routing_key, priority)
+
+    def publish_batch(
+        self,
+        queue_name: str,
+        messages: Iterable[Dict[str, Any]],
+        exchange: str = "",
+        routing_key: Optional[str] = None,
+        priority: Optional[int] = None,
+    ) -> int:
+        """Publish several messages on this thread's channel
+
+        ``priority`` only takes effect on queues declared with
+        ``x-max-priority``. Returns the number of messages published. Only
+        metadata (queue, count, size) is logged, never message bodies.
+        """
+        channel = self._ensure_channel()
         routing_key = routing_key or queue_name
-        self.channel.basic_publish(
-            exchange=exchange,
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2, content_type="application/json"
-            ),
+        tracker = self.confirm_tracker
+        properties = pika.BasicProperties(
+            delivery_mode=2, content_type="application/json", priority=priority
         )
-        logger.info(f"Published message to {queue_name}: {message}")
+        count = 0
+        size = 0
+        for message in messages:
+            body = json.dumps(message).encode()
+            channel.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=properties,
+            )
+            if tracker is not None:
+                tracker.track(routing_key, body)
+            count += 1
+            size += len(body)
+        if tracker is not None:
+            # Collect acks that have already arrived without waiting.
+            self.connection.process_data_events(time_limit=0)
+        logger.debug(f"Published {count} messages to {queue_name} ({size} bytes)")
+        return count
 
-    def consume_messages(self, queue_name: str, callback: Callable) -> object:
-        """Consume messages from a queue"""
-        if not self.channel:
-            self.connect()
+    def wait_for_confirms(self, timeout: float = 5.0) -> List[Tuple[str, bytes]]:
+        """Wait until the broker settled this thread's published messages
+
+        Returns the (routing key, body) of every nacked message since the
+        last call so the caller can republish them. Raises ``TimeoutError``
+        if messages are still unconfirmed after ``timeout`` seconds.
+        """
+        tracker = self.confirm_tracker
+        if tracker is None:
+            return []
+        deadline = time.monotonic() + timeout
+        while tracker.pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"{tracker.pending} published messages are still unconfirmed"
+                )
+            self.connection.process_data_events(time_limit=min(remaining, 0.05))
+        nacked, tracker.nacked = tracker.nacked, []
+        if nacked:
+            logger.warning(f"Broker nacked {len(nacked)} published messages")
+        return nacked
+
+    def consume_messages(
+        self, queue_name: str, callback: Callable, **options: Any
+    ) -> object:
+        """Consume messages from a queue, calling ``callback`` for each one
 
-        def wrapper(ch, method, properties, body):
+        Blocks until interrupted; ``options`` are passed to ``QueueConsumer``.
+        """
+        consumer = QueueConsumer(
+            self, queue_name, partial(_call_each, callback), **options
+        )
+        try:
+            consumer.run()
+        except KeyboardInterrupt:
+            consumer.stop()
+
+
+def _call_each(callback: Callable, messages: List[Dict[str, Any]]) -> None:
+    for message in messages:
+        callback(message)
+
+
+def _describe(error: BaseException) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _run_batch(handler: Callable, bodies: List[bytes]) -> List[Optional[str]]:
+    """Decode and handle one batch; runs in a consumer worker
+
+    Returns an error description per message (None if it succeeded). When
+    a batch fails its messages are retried one by one, so a single bad
+    message does not fail its neighbours; handlers must be idempotent.
+    """
+    try:
+        handler([json.loads(body) for body in bodies])
+        return [None] * len(bodies)
+    except Exception as e:
+        if len(bodies) == 1:
+            return [_describe(e)]
+    errors = []
+    for body in bodies:
+        try:
+            handler([json.loads(body)])
+            errors.append(None)
+        except Exception as e:
+            errors.append(_describe(e))
+    return errors
+
+
+class QueueConsumer:
+    """Consumer runtime for one queue
+
+    A single thread owns the connection: it receives up to ``prefetch``
+    unacknowledged messages, groups them into batches of ``batch_size``
+    (waiting at most ``batch_window_ms`` for a batch to fill) and hands the
+    batches to a pool of ``workers`` threads, or processes with
+    ``use_processes``. ``handler`` receives a list of decoded messages.
+
+    Completed deliveries are acknowledged with ``multiple=True`` up to the
+    highest delivery tag whose predecessors are all settled. A message whose
+    handling fails is republished with an ``x-failure-count`` header; after
+    ``max_failures`` attempts it goes to the ``<queue>.dead_letter`` queue.
+    ``stop`` stops taking deliveries, finishes and acks everything already
+    received, then closes the connection.
+
+    Queues in ``CPU_BOUND_QUEUES`` default to one worker process per core;
+    their handlers must be picklable (module-level functions).
+    """
+
+    FAILURE_HEADER = "x-failure-count"
+    ERROR_HEADER = "x-last-error"
+
+    def __init__(
+        self,
+        mq: "MessageQueue",
+        queue_name: str,
+        handler: Callable[[List[Dict[str, Any]]], Any],
+        batch_size: int = 1,
+        batch_window_ms: Optional[float] = None,
+        prefetch: Optional[int] = None,
+        workers: Optional[int] = None,
+        use_processes: Optional[bool] = None,
+        max_failures: Optional[int] = None,
+        dead_letter_queue: Optional[str] = None,
+    ) -> None:
+        cpu_bound = queue_name in CPU_BOUND_QUEUES
+        self.mq = mq
+        self.queue_name = queue_name
+        self.handler = handler
+        self.batch_size = max(1, batch_size)
+        self.batch_window = (
+            batch_window_ms
+            if batch_window_ms is not None
+            else float(os.environ.get("RABBITMQ_BATCH_WINDOW_MS", 50))
+        ) / 1000.0
+        self.workers = workers or ((os.cpu_count() or 1) if cpu_bound else 1)
+        self.use_processes = cpu_bound if use_processes is None else use_processes
+        self.prefetch = prefetch or int(
+            os.environ.get(
+                "RABBITMQ_PREFETCH_COUNT", 2 * self.workers * self.batch_size
+            )
+        )
+        self.max_failures = max_failures or int(
+            os.environ.get("RABBITMQ_MAX_FAILURES", 5)
+        )
+        self.dead_letter_queue = dead_letter_queue or f"{queue_name}.dead_letter"
+        self.stats = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "retried": 0,
+            "dead_lettered": 0,
+            "acks": 0,
+        }
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._received: List[Tuple[int, Any, bytes]] = []
+        self._oldest_received = 0.0
+        self._completed: "queue.Queue" = queue.Queue()
+        self._in_flight = 0
+        # Delivery tag -> settled, in delivery order
+        self._unacked: Dict[int, bool] = {}
+
+    def start(self) -> object:
+        """Run the consumer in a background thread"""
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self.run, name=f"consumer-{self.queue_name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 30.0) -> object:
+        """Stop consuming and drain in-flight messages"""
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue": self.queue_name,
+            "workers": self.workers,
+            "prefetch": self.prefetch,
+            "in_flight": self._in_flight,
+            "buffered": len(self._received),
+            **self.stats,
+        }
+
+    def _new_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=f"{self.queue_name}-worker"
+        )
+
+    def run(self) -> object:
+        """Consume until ``stop`` is called"""
+        channel = self.mq._ensure_channel()
+        channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+        channel.basic_qos(prefetch_count=self.prefetch)
+        consumer_tag = channel.basic_consume(
+            queue=self.queue_name, on_message_callback=self._on_message
+        )
+        logger.info(
+            f"Consuming {self.queue_name} with {self.workers} "
+            f"{'processes' if self.use_processes else 'threads'}, "
+            f"prefetch {self.prefetch}"
+        )
+        executor = self._new_executor()
+        try:
+            while True:
+                if self._stopping.is_set() and consumer_tag is not None:
+                    channel.basic_cancel(consumer_tag)
+                    consumer_tag = None
+                # Returns early on deliveries and on completed batches.
+                self.mq.connection.process_data_events(
+                    time_limit=self.batch_window if self._received else 0.1
+                )
+                executor = self._dispatch(executor)
+                self._settle_completed(channel)
+                if consumer_tag is None and not (self._in_flight or self._received):
+                    break
+        finally:
+            executor.shutdown(wait=True)
+            self.mq.disconnect()
+        logger.info(f"Stopped consuming {self.queue_name}: {self.stats}")
+
+    def _on_message(
+        self, channel: object, method: object, properties: object, body: bytes
+    ) -> None:
+        if not self._received:
+            self._oldest_received = time.monotonic()
+        self._received.append((method.delivery_tag, properties, body))
+        self._unacked[method.delivery_tag] = False
+        self.stats["received"] += 1
+
+    def _dispatch(self, executor: Executor) -> Executor:
+        """Submit full batches, or a partial one once its window has passed"""
+        while self._received:
+            full = len(self._received) >= self.batch_size
+            expired = time.monotonic() - self._oldest_received >= self.batch_window
+            if not (full or expired or self._stopping.is_set()):
+                break
+            batch = self._received[: self.batch_size]
+            del self._received[: self.batch_size]
+            self._oldest_received = time.monotonic()
+            try:
+                future = executor.submit(
+                    _run_batch, self.handler, [body for _, _, body in batch]
+                )
+            except BrokenProcessPool:
+                executor = self._new_executor()
+                future = executor.submit(
+                    _run_batch, self.handler, [body for _, _, body in batch]
+                )
+            self._in_flight += 1
+            future.add_done_callback(
+                partial(self._on_batch_done, self.mq.connection, batch)
+            )
+        return executor
+
+    def _on_batch_done(self, connection: object, batch: List, future: object) -> None:
+        """Runs on a worker thread: queue the result and wake the connection"""
+        self._completed.put((batch, future))
+        try:
+            connection.add_callback_threadsafe(lambda: None)
+        except Exception:
+            pass  # connection already gone; the run loop polls anyway
+
+    def _settle_completed(self, channel: object) -> None:
+        """Runs on the connection thread: pika channels are not thread-safe"""
+        while True:
             try:
-                message = json.loads(body)
-                callback(message)
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+                batch, future = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            self._in_flight -= 1
+            try:
+                errors = future.result()
             except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                # The worker itself died (e.g. a crashed process)
+                errors = [_describe(e)] * len(batch)
+            for (tag, properties, body), error in zip(batch, errors):
+                if error is None:
+                    self.stats["processed"] += 1
+                else:
+                    self._handle_failure(channel, properties, body, error)
+                self._unacked[tag] = True
+        self._ack_settled(channel)
+
+    def _handle_failure(
+        self, channel: object, properties: object, body: bytes, error: str
+    ) -> None:
+        self.stats["failed"] += 1
+        headers = dict(getattr(properties, "headers", None) or {})
+        failures = int(headers.get(self.FAILURE_HEADER, 0)) + 1
+        headers[self.FAILURE_HEADER] = failures
+        headers[self.ERROR_HEADER] = error[:500]
+        if failures >= self.max_failures:
+            target = self.dead_letter_queue
+            self.stats["dead_lettered"] += 1
+            logger.error(
+                f"Dead-lettering message from {self.queue_name} after "
+                f"{failures} failures: {error}"
+            )
+        else:
+            target = self.queue_name
+            self.stats["retried"] += 1
+            logger.warning(
+                f"Message from {self.queue_name} failed ({failures}/"
+                f"{self.max_failures}), requeueing: {error}"
+            )
+        channel.basic_publish(
+            exchange="",
+            routing_key=target,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type="application/json",
+                priority=getattr(properties, "priority", None),
+                headers=headers,
+            ),
+        )
 
-        self.channel.basic_consume(queue=queue_name, on_message_callback=wrapper)
-        logger.info(f"Started consuming from {queue_name}")
-        self.channel.start_consuming()
+    def _ack_settled(self, channel: object) -> None:
+        """Ack the longest settled prefix of deliveries with one frame"""
+        last = None
+        for tag, settled in self._unacked.items():
+            if not settled:
+                break
+            last = tag
+        if last is None:
+            return
+        channel.basic_ack(delivery_tag=last, multiple=True)
+        self.stats["acks"] += 1
+        for tag in list(self._unacked):
+            if tag > last:
+                break
+            del self._unacked[tag]
 
 
 mq = MessageQueue()
@@ -116,6 +616,12 @@ class Queues:
     ANALYTICS_CALCULATION = "analytics_calculation"
     PAYMENT_PROCESSING = "payment_processing"
     AUDIT_LOGGING = "audit_logging"
+    LEDGER_POSTINGS = "ledger_postings"
+    CREDIT_DECISIONS = "credit_decisions"
+
+
+# Handlers for these queues are CPU-bound: consume them with a process per core.
+CPU_BOUND_QUEUES = frozenset({Queues.REPORT_GENERATION, Queues.DOCUMENT_PROCESSING})
 
 
 def publish_task(queue_name: str, task_data: Dict[str, Any]) -> object:
@@ -128,6 +634,15 @@ def publish_task(queue_name: str, task_data: Dict[str, Any]) -> object:
         return False
 
 
+def publish_tasks(queue_name: str, tasks: Iterable[Dict[str, Any]]) -> int:
+    """Publish a batch of tasks to a queue; returns how many were published"""
+    try:
+        return mq.publish_batch(queue_name, tasks)
+    except Exception as e:
+        logger.error(f"Failed to publish tasks to {queue_name}: {e}")
+        return 0
+
+
 def setup_queues() -> object:
     """Setup all required queues"""
     queues = [
@@ -138,11 +653,13 @@ def setup_queues() -> object:
         Queues.ANALYTICS_CALCULATION,
         Queues.PAYMENT_PROCESSING,
         Queues.AUDIT_LOGGING,
+        Queues.LEDGER_POSTINGS,
+        Queues.CREDIT_DECISIONS,
     ]
     try:
         mq.connect()
-        for queue in queues:
-            mq.declare_queue(queue)
+        for queue_name in queues:
+            mq.declare_queue(queue_name)
         logger.info("All queues setup successfully")
     except Exception as e:
         logger.error(f"Failed to setup queues: {e}")
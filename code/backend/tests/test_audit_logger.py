@@ -0,0 +1,520 @@
+"""
+Tests for the audit logging system
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.audit.archive import AuditArchive
+from shared.audit.audit_logger import (
+    AuditEventType,
+    AuditLogger,
+    DatabaseAuditBackend,
+    compute_event_hash,
+)
+from shared.audit.integrity import (
+    SegmentedHashChain,
+    merkle_proof,
+    merkle_root,
+    verify_proof,
+)
+from shared.database.manager import initialize_database
+
+
+class AuditLoggerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.audit_loggers = []
+
+    def tearDown(self):
+        for audit_logger in self.audit_loggers:
+            audit_logger.stop_worker()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_logger(self, **kwargs):
+        kwargs.setdefault("log_dir", self.tmp_dir)
+        audit_logger = AuditLogger(**kwargs)
+        self.audit_loggers.append(audit_logger)
+        return audit_logger
+
+    def log_events(self, audit_logger, count):
+        for i in range(count):
+            audit_logger.log_event(
+                AuditEventType.API_ACCESS, f"GET /api/v1/items/{i}", user_id="u1"
+            )
+
+    def read_file_events(self):
+        events = []
+        for name in sorted(os.listdir(self.tmp_dir)):
+            if name.startswith("audit_") and name.endswith(".jsonl"):
+                with open(os.path.join(self.tmp_dir, name)) as f:
+                    events.extend(json.loads(line) for line in f)
+        return events
+
+
+class TestBatchedAuditWriter(AuditLoggerTestCase):
+
+    def test_events_written_in_order_with_segment_anchors(self):
+        audit_logger = self.make_logger(
+            batch_size=16, batch_window_ms=5, segment_size=32
+        )
+        self.log_events(audit_logger, 100)
+        audit_logger.flush()
+        events = self.read_file_events()
+        self.assertEqual([e["sequence"] for e in events], list(range(100)))
+        self.assertEqual(events[0]["action"], "GET /api/v1/items/0")
+        self.assertIsNone(events[0]["previous_hash"])
+        segments = audit_logger.chain.segments
+        self.assertEqual(len(segments), 3)
+        anchored = events[32]
+        self.assertEqual(anchored["previous_hash"], segments[0].segment_hash)
+        expected = hashlib.sha256(
+            (segments[0].segment_hash + anchored["event_hash"]).encode()
+        ).hexdigest()
+        self.assertEqual(anchored["chain_hash"], expected)
+
+    def test_file_handle_reused_across_batches(self):
+        audit_logger = self.make_logger(batch_size=4, batch_window_ms=1)
+        self.log_events(audit_logger, 4)
+        audit_logger.flush()
+        handle = audit_logger._file
+        self.log_events(audit_logger, 4)
+        audit_logger.flush()
+        self.assertIs(audit_logger._file, handle)
+        self.assertEqual(len(self.read_file_events()), 8)
+
+    def test_rotates_when_day_changes(self):
+        audit_logger = self.make_logger(batch_window_ms=1)
+        self.log_events(audit_logger, 1)
+        audit_logger.flush()
+        audit_logger._file_date = "2000-01-01"
+        old_handle = audit_logger._file
+        self.log_events(audit_logger, 1)
+        audit_logger.flush()
+        self.assertTrue(old_handle.closed)
+        self.assertIsNot(audit_logger._file, old_handle)
+
+    def test_backend_receives_whole_batches(self):
+        backend = Mock(spec=["store", "store_many"])
+        audit_logger = self.make_logger(
+            storage_backend=backend, batch_size=50, batch_window_ms=200
+        )
+        self.log_events(audit_logger, 50)
+        audit_logger.flush()
+        sizes = [len(call.args[0]) for call in backend.store_many.call_args_list]
+        self.assertEqual(sum(sizes), 50)
+        self.assertLess(len(sizes), 50)
+        backend.store.assert_not_called()
+
+    def test_failed_batch_does_not_advance_chain(self):
+        backend = Mock(spec=["store"])
+        backend.store.side_effect = [IOError("disk full")] + [None] * 3
+        audit_logger = self.make_logger(storage_backend=backend, batch_window_ms=1)
+        self.log_events(audit_logger, 3)
+        audit_logger.flush()
+        stored = [call.args[0] for call in backend.store.call_args_list[1:]]
+        self.assertEqual(sorted(e["sequence"] for e in stored), [0, 1, 2])
+        self.assertEqual(len({e["action"] for e in stored}), 3)
+        self.assertEqual(audit_logger.chain.next_sequence, 3)
+
+    def test_failed_batch_spilled_for_replay(self):
+        backend = Mock(spec=["store"])
+        audit_logger = self.make_logger(storage_backend=backend, batch_window_ms=1)
+        with patch.object(audit_logger, "_store_batch", side_effect=IOError("down")):
+            self.log_events(audit_logger, 1)
+            audit_logger.event_queue.join()
+        self.assertEqual(audit_logger.get_stats()["spill_backlog"], 1)
+        audit_logger.flush()
+        self.assertEqual(backend.store.call_count, 1)
+        self.assertEqual(audit_logger.get_stats()["replayed"], 1)
+
+
+class TestDatabaseAuditBackend(AuditLoggerTestCase):
+
+    def test_batch_inserted_into_audit_log(self):
+        db_manager, _ = initialize_database(os.path.join(self.tmp_dir, "audit.db"))
+        audit_logger = self.make_logger(
+            storage_backend=DatabaseAuditBackend(db_manager), batch_window_ms=5
+        )
+        self.log_events(audit_logger, 25)
+        audit_logger.flush()
+        rows = db_manager.fetch_all("SELECT * FROM audit_log ORDER BY id")
+        self.assertEqual(len(rows), 25)
+        self.assertEqual([r["sequence"] for r in rows], list(range(25)))
+        self.assertEqual(rows[0]["event_hash"], compute_event_hash(rows[0]))
+        db_manager.close_all_connections()
+
+    def test_segments_persisted_and_verified(self):
+        db_manager, _ = initialize_database(os.path.join(self.tmp_dir, "audit.db"))
+        backend = DatabaseAuditBackend(db_manager)
+        audit_logger = self.make_logger(
+            storage_backend=backend, batch_window_ms=5, segment_size=10
+        )
+        self.log_events(audit_logger, 25)
+        audit_logger.flush()
+        self.assertEqual(len(backend.load_segments()), 2)
+        self.assertTrue(audit_logger.verify_range(0, 24)["valid"])
+        db_manager.execute_update(
+            "UPDATE audit_log SET action = 'tampered' WHERE sequence = 13"
+        )
+        result = audit_logger.verify_range(0, 24)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["failed_segments"], [1])
+        self.assertTrue(audit_logger.verify_range(0, 9)["valid"])
+        db_manager.close_all_connections()
+
+    def test_unsealed_events_reloaded_after_unclean_restart(self):
+        db_manager, _ = initialize_database(os.path.join(self.tmp_dir, "audit.db"))
+        backend = DatabaseAuditBackend(db_manager)
+        crashed = AuditLogger(
+            storage_backend=backend,
+            log_dir=self.tmp_dir,
+            batch_window_ms=5,
+            segment_size=10,
+        )
+        self.log_events(crashed, 13)
+        crashed.flush()
+        # Stop the worker without stop_worker(), which would seal 10..12
+        crashed.running = False
+        crashed.worker_thread.join()
+        resumed = self.make_logger(
+            storage_backend=backend, batch_window_ms=5, segment_size=10
+        )
+        self.assertEqual(resumed.chain.next_sequence, 13)
+        result = resumed.verify_range(10, 12)
+        self.assertTrue(result["valid"])
+        self.assertTrue(result["open_segment_valid"])
+        self.log_events(resumed, 12)
+        resumed.flush()
+        rows = db_manager.fetch_all("SELECT sequence FROM audit_log ORDER BY sequence")
+        self.assertEqual([r["sequence"] for r in rows], list(range(25)))
+        self.assertEqual(len(backend.load_segments()), 2)
+        self.assertTrue(resumed.verify_range(0, 24)["valid"])
+        db_manager.close_all_connections()
+
+
+class TestSegmentedAuditLog(AuditLoggerTestCase):
+
+    def test_verify_range_and_inclusion_proof(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 30)
+        audit_logger.flush()
+        result = audit_logger.verify_range(9, 20)
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["verified_segments"], 2)
+        proof = audit_logger.prove_event(11)
+        event = self.read_file_events()[11]
+        self.assertTrue(
+            verify_proof(event["event_hash"], proof["proof"], proof["merkle_root"])
+        )
+        self.assertLessEqual(len(proof["proof"]), 3)
+
+    def test_chain_resumes_after_restart(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 12)
+        audit_logger.flush()
+        audit_logger.stop_worker()
+        self.audit_loggers.remove(audit_logger)
+        resumed = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.assertEqual(resumed.chain.next_sequence, 12)
+        self.log_events(resumed, 5)
+        resumed.flush()
+        self.assertEqual(self.read_file_events()[-1]["sequence"], 16)
+        self.assertTrue(resumed.chain.verify_chain())
+        self.assertTrue(resumed.verify_range(0, 16)["valid"])
+
+    def test_verify_range_decodes_only_the_range(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 200)
+        audit_logger.flush()
+        self.assertTrue(audit_logger.verify_range(0, 199)["valid"])
+        with patch("shared.audit.archive.json.loads", side_effect=json.loads) as loads:
+            self.assertTrue(audit_logger.verify_range(100, 109)["valid"])
+        # Two touched segments, each event decoded once
+        self.assertEqual(loads.call_count, 16)
+
+    def test_verify_range_detects_rewritten_live_file(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 20)
+        audit_logger.flush()
+        self.assertTrue(audit_logger.verify_range(0, 19)["valid"])
+        (path,) = [
+            os.path.join(self.tmp_dir, name)
+            for name in os.listdir(self.tmp_dir)
+            if name.startswith("audit_") and name.endswith(".jsonl")
+        ]
+        with open(path) as f:
+            events = [json.loads(line) for line in f]
+        events[3]["action"] = "GET /api/v1/items/3?tampered=1"
+        with open(path, "w") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+        result = audit_logger.verify_range(0, 19)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["failed_segments"], [0])
+
+    def test_restart_reads_only_days_after_last_segment(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 8)
+        audit_logger.flush()
+        audit_logger.stop_worker()
+        self.audit_loggers.remove(audit_logger)
+        (name,) = [n for n in os.listdir(self.tmp_dir) if n.startswith("audit_")]
+        os.rename(
+            os.path.join(self.tmp_dir, name),
+            os.path.join(self.tmp_dir, "audit_2020-01-01.jsonl"),
+        )
+        with patch.object(
+            AuditArchive, "_index_lines", side_effect=AssertionError("scanned")
+        ):
+            resumed = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.assertEqual(resumed.chain.next_sequence, 8)
+        self.log_events(resumed, 3)
+        resumed.flush()
+        self.assertTrue(resumed.verify_range(0, 10)["valid"])
+
+
+class TestAuditBackpressure(AuditLoggerTestCase):
+
+    def stall_worker(self, audit_logger):
+        gate = threading.Event()
+        store_batch = audit_logger._store_batch
+
+        def stalled(events):
+            gate.wait(5)
+            store_batch(events)
+
+        audit_logger._store_batch = stalled
+        return gate
+
+    def test_spill_policy_journals_overflow_and_replays(self):
+        audit_logger = self.make_logger(
+            queue_size=10, batch_size=5, batch_window_ms=1, overflow_policy="spill"
+        )
+        gate = self.stall_worker(audit_logger)
+        start = time.perf_counter()
+        self.log_events(audit_logger, 60)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        stats = audit_logger.get_stats()
+        self.assertGreater(stats["spilled"], 0)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertLessEqual(stats["queue_depth"], 10)
+        gate.set()
+        audit_logger.flush()
+        events = self.read_file_events()
+        self.assertEqual(len(events), 60)
+        self.assertEqual(sorted(e["sequence"] for e in events), list(range(60)))
+        stats = audit_logger.get_stats()
+        self.assertEqual(stats["replayed"], stats["spilled"])
+        self.assertEqual(stats["spill_backlog"], 0)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.tmp_dir, AuditLogger.SPILL_FILE))
+        )
+
+    def test_block_policy_waits_briefly_then_drops(self):
+        audit_logger = self.make_logger(
+            queue_size=5,
+            batch_size=1,
+            batch_window_ms=1,
+            overflow_policy="block",
+            block_timeout_ms=1,
+        )
+        gate = self.stall_worker(audit_logger)
+        start = time.perf_counter()
+        self.log_events(audit_logger, 20)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertGreater(audit_logger.get_stats()["dropped"], 0)
+        gate.set()
+
+    def test_unknown_policy_rejected(self):
+        with self.assertRaises(ValueError):
+            AuditLogger(log_dir=self.tmp_dir, overflow_policy="discard")
+
+    def test_worker_restarted_after_crash(self):
+        audit_logger = self.make_logger(batch_window_ms=1)
+        next_batch = audit_logger._next_batch
+        calls = []
+
+        def crash_once():
+            if not calls:
+                calls.append(1)
+                raise RuntimeError("worker bug")
+            return next_batch()
+
+        audit_logger._next_batch = crash_once
+        self.log_events(audit_logger, 3)
+        audit_logger.flush()
+        self.assertEqual(audit_logger.get_stats()["worker_restarts"], 1)
+        self.assertEqual(len(self.read_file_events()), 3)
+
+    def test_dead_worker_thread_replaced_on_enqueue(self):
+        audit_logger = self.make_logger(batch_window_ms=1)
+        audit_logger.stop_worker()
+        audit_logger.running = True
+        self.log_events(audit_logger, 2)
+        audit_logger.flush()
+        stats = audit_logger.get_stats()
+        self.assertTrue(stats["worker_alive"])
+        self.assertEqual(stats["worker_restarts"], 1)
+        self.assertEqual(len(self.read_file_events()), 2)
+
+    def test_spill_journal_recovered_on_start(self):
+        producer = self.make_logger(queue_size=1, batch_size=1, overflow_policy="spill")
+        gate = self.stall_worker(producer)
+        self.log_events(producer, 5)
+        journal = os.path.join(self.tmp_dir, AuditLogger.SPILL_FILE)
+        with open(journal) as f:
+            spilled = [json.loads(line) for line in f]
+        self.assertTrue(spilled)
+        recovery_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        with open(os.path.join(recovery_dir, AuditLogger.SPILL_FILE), "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in spilled)
+        gate.set()
+        recovered = self.make_logger(log_dir=recovery_dir, batch_window_ms=1)
+        recovered.flush()
+        self.assertEqual(recovered.get_stats()["replayed"], len(spilled))
+
+
+class TestAuditArchive(AuditLoggerTestCase):
+
+    def write_day(self, day, count, start_sequence=0):
+        base = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        path = os.path.join(self.tmp_dir, f"audit_{day.isoformat()}.jsonl")
+        with open(path, "w") as f:
+            for i in range(count):
+                event = {
+                    "event_id": f"{day}-{i}",
+                    "event_type": "api_access" if i % 10 else "user_login",
+                    "timestamp": (base + timedelta(minutes=i)).isoformat(),
+                    "user_id": f"user-{i % 7}",
+                    "action": "GET /api/v1/accounts",
+                    "sequence": start_sequence + i,
+                }
+                f.write(json.dumps(event) + "\n")
+        return path
+
+    def test_compacts_closed_days_only(self):
+        today = date(2026, 3, 10)
+        self.write_day(date(2026, 3, 8), 100)
+        self.write_day(date(2026, 3, 9), 100, start_sequence=100)
+        self.write_day(today, 10, start_sequence=200)
+        archive = AuditArchive(self.tmp_dir, block_size=25)
+        compacted = archive.compact_closed_days(today=today)
+        self.assertEqual(compacted, [date(2026, 3, 8), date(2026, 3, 9)])
+        self.assertEqual(archive.live_days(), [today])
+        index = archive.load_index(date(2026, 3, 8))
+        self.assertEqual(index["event_count"], 100)
+        self.assertEqual(len(index["blocks"]), 4)
+        self.assertLess(index["archive_bytes"], index["source_bytes"])
+
+    def test_query_reads_only_matching_blocks(self):
+        day = date(2026, 3, 8)
+        self.write_day(day, 100)
+        archive = AuditArchive(self.tmp_dir, block_size=25)
+        archive.compact_day(day)
+        start = datetime(2026, 3, 8, 0, 30, tzinfo=timezone.utc)
+        end = datetime(2026, 3, 8, 0, 40, tzinfo=timezone.utc)
+        with patch.object(
+            archive, "_read_blocks", wraps=archive._read_blocks
+        ) as read_blocks:
+            events = list(archive.query(start, end, user_id="user-3"))
+        self.assertEqual(read_blocks.call_args.args[1], [1])
+        self.assertEqual(
+            [e["event_id"] for e in events], ["2026-03-08-31", "2026-03-08-38"]
+        )
+        logins = list(archive.query(event_type="user_login"))
+        self.assertEqual(len(logins), 10)
+
+    def test_query_includes_live_days(self):
+        self.write_day(date(2026, 3, 8), 20)
+        self.write_day(date(2026, 3, 9), 20, start_sequence=20)
+        archive = AuditArchive(self.tmp_dir, block_size=8)
+        archive.compact_day(date(2026, 3, 8))
+        self.assertEqual(len(list(archive.query(user_id="user-0"))), 6)
+        self.assertEqual(len(archive.events_by_sequence(5, 25)), 15)
+
+    def test_logger_verifies_and_searches_archived_events(self):
+        audit_logger = self.make_logger(batch_window_ms=5, segment_size=8)
+        self.log_events(audit_logger, 20)
+        audit_logger.flush()
+        audit_logger.stop_worker()
+        self.audit_loggers.remove(audit_logger)
+        audit_logger.archive.compact_day(datetime.now().date())
+        self.assertTrue(audit_logger.verify_range(0, 19)["valid"])
+        found = audit_logger.search_events(
+            user_id="u1", event_type=AuditEventType.API_ACCESS
+        )
+        self.assertEqual(len(found), 20)
+
+
+class TestIntegrity(unittest.TestCase):
+
+    def hashes(self, count):
+        return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+
+    def test_proofs_for_every_leaf(self):
+        for count in (1, 2, 3, 7, 16, 33):
+            hashes = self.hashes(count)
+            root = merkle_root(hashes)
+            for index, event_hash in enumerate(hashes):
+                proof = merkle_proof(hashes, index)
+                self.assertTrue(verify_proof(event_hash, proof, root))
+            self.assertFalse(verify_proof(self.hashes(count + 1)[-1], proof, root))
+
+    def test_duplicated_last_leaf_changes_root(self):
+        hashes = self.hashes(3)
+        self.assertNotEqual(merkle_root(hashes), merkle_root(hashes + hashes[-1:]))
+
+    def test_verify_range_only_loads_overlapping_segments(self):
+        chain = SegmentedHashChain(segment_size=4)
+        hashes = self.hashes(18)
+        for event_hash in hashes:
+            chain.append(event_hash)
+        loaded = []
+
+        def load(first, last):
+            loaded.append((first, last))
+            return hashes[first : last + 1]
+
+        self.assertTrue(chain.verify_range(5, 9, load)["valid"])
+        self.assertEqual(loaded, [(4, 7), (8, 11)])
+        self.assertTrue(chain.verify_range(0, 17, load)["valid"])
+        self.assertTrue(chain.verify_chain())
+
+    def test_tampered_link_detected(self):
+        chain = SegmentedHashChain(segment_size=2)
+        for event_hash in self.hashes(6):
+            chain.append(event_hash)
+        chain.segments[1].merkle_root = "00" * 32
+        self.assertFalse(chain.verify_chain())
+
+    def test_rollback_restores_open_segment(self):
+        chain = SegmentedHashChain(segment_size=4)
+        hashes = self.hashes(10)
+        for event_hash in hashes[:3]:
+            chain.append(event_hash)
+        checkpoint = chain.checkpoint()
+        for event_hash in hashes[3:]:
+            chain.append(event_hash)
+        chain.rollback(checkpoint)
+        self.assertEqual(chain.next_sequence, 3)
+        self.assertEqual(chain.segments, [])
+        chain.append(hashes[3])
+        self.assertEqual(chain.segments[0].merkle_root, merkle_root(hashes[:4]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests for bulk chart of accounts provisioning
+"""
+
+import os
+import unittest
+
+from tests.test_ledger_balances import LedgerTestCase
+
+from chart import DEFAULT_CHART_OF_ACCOUNTS, chart_template, provision_chart
+from database.manager import initialize_database
+from migrations import LEDGER_MIGRATIONS
+
+
+class TestChartProvisioning(LedgerTestCase):
+
+    def parents(self, db):
+        return {
+            row["account_code"]: row["parent_code"]
+            for row in db.fetch_all(
+                "SELECT a.account_code, p.account_code AS parent_code "
+                "FROM accounts a LEFT JOIN accounts p ON p.id = a.parent_account_id"
+            )
+        }
+
+    def test_provisioning_is_idempotent_and_keeps_existing_accounts(self):
+        created = provision_chart(self.db)
+        self.assertEqual(
+            created,
+            [c for c in DEFAULT_CHART_OF_ACCOUNTS if c not in ("1000", "4000", "5000")],
+        )
+        self.assertEqual(provision_chart(self.db), [])
+        parents = self.parents(self.db)
+        self.assertEqual(parents["1100"], "1000")
+        self.assertEqual(parents["6300"], "6000")
+        self.assertIsNone(parents["2300"])
+        cash = self.db.fetch_one("SELECT * FROM accounts WHERE account_code = '1000'")
+        self.assertEqual((cash["name"], cash["opening_balance"]), ("1000", 100.0))
+        self.assertEqual(
+            self.db.fetch_one("SELECT COUNT(*) AS n FROM accounts")["n"],
+            len(DEFAULT_CHART_OF_ACCOUNTS),
+        )
+
+    def test_parents_resolve_whatever_the_template_order(self):
+        created = provision_chart(
+            self.db,
+            {
+                "9100": {"name": "Child", "type": "expense", "parent": "9000"},
+                "9000": {"name": "Parent", "type": "expense", "is_system": False},
+            },
+        )
+        self.assertEqual(created, ["9100", "9000"])
+        self.assertEqual(self.parents(self.db)["9100"], "9000")
+
+    def test_clone_chart_into_another_ledger(self):
+        provision_chart(self.db)
+        self.db.execute_query(
+            "UPDATE accounts SET currency = 'EUR', description = 'Euro till' "
+            "WHERE account_code = '1200'"
+        )
+        target, migration_manager = initialize_database(
+            os.path.join(self.tmp_dir, "tenant.db")
+        )
+        for version, migration in LEDGER_MIGRATIONS.items():
+            migration_manager.apply_migration(
+                version, migration["description"], migration["sql"]
+            )
+        try:
+            template = chart_template(self.db)
+            self.assertEqual(provision_chart(target, template), list(template))
+            self.assertEqual(chart_template(target), template)
+            self.assertEqual(
+                template["1200"],
+                {
+                    "name": "Savings Account",
+                    "type": "asset",
+                    "subtype": "bank",
+                    "parent": "1000",
+                    "currency": "EUR",
+                    "description": "Euro till",
+                    "is_system": True,
+                },
+            )
+            self.assertEqual(self.parents(target), self.parents(self.db))
+        finally:
+            target.close_all_connections()
+
+
+if __name__ == "__main__":
+    unittest.main()
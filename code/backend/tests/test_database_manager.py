@@ -11,6 +11,7 @@ sys.path.insert(
     0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 )  # backend root
 from shared.database.manager import (
+    BaseModel,
     DatabaseManager,
     MigrationManager,
     initialize_database,
@@ -119,6 +120,41 @@ class TestDatabaseManager(unittest.TestCase):
         )
         self.assertEqual(len(rows), 0)
 
+    def test_queries_on_the_same_thread_join_the_transaction(self):
+        try:
+            with self.db.transaction():
+                self.db.execute_insert(
+                    "INSERT INTO test_table (name, value) VALUES (?, ?)", ("Joined", 1)
+                )
+                with self.db.transaction() as inner:
+                    inner.execute(
+                        "INSERT INTO test_table (name, value) VALUES (?, ?)",
+                        ("Nested", 2),
+                    )
+                raise ValueError("Forced rollback")
+        except ValueError:
+            pass
+        self.assertEqual(self.db.fetch_all("SELECT * FROM test_table"), [])
+
+    def test_model_with_client_generated_id_is_inserted(self):
+        self.db.execute_query("CREATE TABLE notes (id TEXT PRIMARY KEY, body TEXT)")
+
+        class Note(BaseModel):
+            table_name = "notes"
+            db_manager = self.db
+
+        note = Note(id="note-1", body="first").save()
+        note.body = "edited"
+        note.save()
+        self.assertEqual(
+            self.db.fetch_all("SELECT * FROM notes"),
+            [{"id": "note-1", "body": "edited"}],
+        )
+        # A row deleted by someone else is not re-created by a later save
+        self.db.execute_query("DELETE FROM notes")
+        note.save()
+        self.assertEqual(self.db.fetch_all("SELECT * FROM notes"), [])
+
 
 class TestMigrationManager(unittest.TestCase):
 
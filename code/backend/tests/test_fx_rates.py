@@ -0,0 +1,135 @@
+"""
+Tests for the in-memory FX rate cache
+"""
+
+import unittest
+from datetime import date
+
+from tests.test_ledger_balances import LedgerTestCase
+
+from fx import FxRateCache
+from reports import consolidated_trial_balance
+
+
+class TestFxRateCache(LedgerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fx = FxRateCache(self.db)
+        self.fx.upload(
+            [
+                {
+                    "from_currency": "EUR",
+                    "to_currency": "USD",
+                    "rate": 1.10,
+                    "rate_date": "2025-01-01",
+                },
+                {
+                    "from_currency": "EUR",
+                    "to_currency": "USD",
+                    "rate": 1.20,
+                    "rate_date": "2025-02-01",
+                },
+                {
+                    "from_currency": "USD",
+                    "to_currency": "GBP",
+                    "rate": 0.80,
+                    "rate_date": "2025-01-01",
+                },
+            ]
+        )
+
+    def test_rate_as_of_date(self):
+        self.assertEqual(self.fx.rate("EUR", "USD", "2025-01-31"), 1.10)
+        self.assertEqual(self.fx.rate("EUR", "USD", date(2025, 2, 1)), 1.20)
+        self.assertEqual(self.fx.rate("EUR", "USD", "2026-01-01"), 1.20)
+        self.assertEqual(self.fx.rate("USD", "USD", "2020-01-01"), 1.0)
+        with self.assertRaises(LookupError):
+            self.fx.rate("EUR", "USD", "2024-12-31")
+        with self.assertRaises(LookupError):
+            self.fx.rate("EUR", "JPY", "2025-01-31")
+
+    def test_inverse_and_cross_rates(self):
+        self.assertAlmostEqual(self.fx.rate("USD", "EUR", "2025-02-15"), 1 / 1.20)
+        self.assertAlmostEqual(self.fx.rate("EUR", "GBP", "2025-02-15"), 1.20 * 0.80)
+
+    def test_convert_arrays(self):
+        self.assertEqual(
+            self.fx.convert([100, 10.005, -50], "EUR", "USD", "2025-01-15").tolist(),
+            [110.0, 11.01, -55.0],
+        )
+        self.assertEqual(
+            self.fx.convert(
+                [100, 100], "EUR", "USD", ["2025-01-15", "2025-02-15"]
+            ).tolist(),
+            [110.0, 120.0],
+        )
+
+    def test_upload_replaces_same_day_rate_and_refreshes(self):
+        self.assertEqual(self.fx.rate("EUR", "USD", "2025-02-01"), 1.20)
+        stored = self.fx.upload(
+            [
+                {
+                    "from_currency": "EUR",
+                    "to_currency": "USD",
+                    "rate": 1.25,
+                    "rate_date": "2025-02-01",
+                },
+                {
+                    "from_currency": "EUR",
+                    "to_currency": "USD",
+                    "rate": 1.30,
+                    "rate_date": "2025-02-01",
+                },
+            ]
+        )
+        self.assertEqual(stored, 1)
+        self.assertEqual(self.fx.rate("EUR", "USD", "2025-02-01"), 1.30)
+        active = self.db.fetch_all(
+            "SELECT rate FROM exchange_rates WHERE is_active = 1 "
+            "AND from_currency = 'EUR' AND rate_date = '2025-02-01'"
+        )
+        self.assertEqual(active, [{"rate": 1.3}])
+        self.assertEqual(FxRateCache(self.db).rate("EUR", "USD", "2025-02-01"), 1.30)
+
+    def test_rates_stored_by_another_process_are_picked_up(self):
+        self.assertEqual(self.fx.rate("EUR", "USD", "2025-03-01"), 1.20)
+        FxRateCache(self.db).upload(
+            [
+                {
+                    "from_currency": "EUR",
+                    "to_currency": "USD",
+                    "rate": 1.40,
+                    "rate_date": "2025-03-01",
+                }
+            ]
+        )
+        self.fx._next_check = 0
+        self.assertEqual(self.fx.rate("EUR", "USD", "2025-03-01"), 1.40)
+
+    def test_consolidated_trial_balance(self):
+        euro_cash = self.account("1010", "asset")
+        self.db.execute_query(
+            "UPDATE accounts SET currency = 'EUR' WHERE id = ?", (euro_cash.id,)
+        )
+        self.post("2025-01-10", euro_cash, self.revenue, 50.0)
+        report = consolidated_trial_balance(self.db, self.fx, date(2025, 2, 15), "USD")
+        self.assertEqual(
+            [
+                (a["account_code"], a["currency"], a["balance"], a["debit_balance"])
+                for a in report["accounts"]
+            ],
+            [
+                ("1000", "USD", "100.0", "100.0"),
+                ("1010", "EUR", "50.0", "60.0"),
+                ("4000", "USD", "50.0", "0.0"),
+            ],
+        )
+        self.assertEqual(report["totals"]["total_debits"], "160.0")
+        self.assertEqual(report["totals"]["total_credits"], "50.0")
+        with self.assertRaises(LookupError):
+            consolidated_trial_balance(self.db, self.fx, date(2025, 2, 15), "JPY")
+
+
+if __name__ == "__main__":
+    unittest.main()
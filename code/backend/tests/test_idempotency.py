@@ -0,0 +1,168 @@
+"""
+Tests for Idempotency-Key handling
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from flask import Flask, jsonify, request
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.database.manager import initialize_database
+from shared.middleware.idempotency import IdempotencyStore, idempotent
+
+
+class TestIdempotentRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db, _ = initialize_database(os.path.join(self.tmp_dir, "app.db"))
+        self.calls = []
+        self.started = threading.Event()
+        self.delay = 0
+        self.app = self.make_app(IdempotencyStore(self.db, cache_size=2))
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_app(self, store):
+        app = Flask(__name__)
+        app.extensions["idempotency_store"] = store
+
+        @app.route("/payments", methods=["POST"])
+        @idempotent()
+        def create_payment():
+            self.calls.append(request.get_json())
+            self.started.set()
+            time.sleep(self.delay)
+            if request.get_json().get("fail") and len(self.calls) == 1:
+                return jsonify({"error": "processor down"}), 500
+            return jsonify({"payment": len(self.calls)}), 201
+
+        return app
+
+    def post(self, body, key="k1", user="u1", app=None):
+        headers = {"X-User-ID": user}
+        if key:
+            headers["Idempotency-Key"] = key
+        return (
+            (app or self.app)
+            .test_client()
+            .post("/payments", json=body, headers=headers)
+        )
+
+    def test_retries_replay_the_stored_response(self):
+        first = self.post({"amount": 10, "currency": "USD"})
+        retry = self.post({"currency": "USD", "amount": 10})
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.get_json(), {"payment": 1})
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first.headers)
+        self.assertEqual(len(self.calls), 1)
+        # Keys belong to one caller, and requests without one run every time
+        self.assertEqual(
+            self.post({"amount": 10}, user="u2").get_json(), {"payment": 2}
+        )
+        self.post({"amount": 10}, key=None)
+        self.assertEqual(len(self.calls), 3)
+
+    def test_reused_key_with_a_different_request_is_rejected(self):
+        self.post({"amount": 10})
+        response = self.post({"amount": 11})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.post({"amount": 10}, key="x" * 256).status_code, 400)
+
+    def test_server_errors_release_the_key(self):
+        self.assertEqual(self.post({"fail": True}).status_code, 500)
+        retry = self.post({"fail": True})
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", retry.headers)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        self.delay = 0.2
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(self.post({"amount": 5})))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([r.status_code for r in responses], [201] * 5)
+        self.assertEqual({r.get_json()["payment"] for r in responses}, {1})
+
+    def test_processes_share_keys_through_the_table(self):
+        other = self.make_app(IdempotencyStore(self.db))
+        self.delay = 0.2
+        first = threading.Thread(target=lambda: self.post({"amount": 5}))
+        first.start()
+        self.started.wait()
+        # Held by the first process: the second polls until it completes
+        response = self.post({"amount": 5}, app=other)
+        first.join()
+        self.assertEqual(response.get_json(), {"payment": 1})
+        self.assertEqual(len(self.calls), 1)
+        count = self.db.fetch_one("SELECT COUNT(*) AS n FROM idempotency_keys")
+        self.assertEqual(count["n"], 1)
+
+    def test_cache_is_bounded_and_expired_keys_are_reclaimed(self):
+        store = self.app.extensions["idempotency_store"]
+        for key in ("a", "b", "c"):
+            self.post({"amount": 1}, key=key)
+        self.assertEqual(len(store._cache), 2)
+        self.assertEqual(self.post({"amount": 1}, key="a").get_json(), {"payment": 1})
+        self.db.execute_query("UPDATE idempotency_keys SET created_at = 0")
+        self.assertEqual(store.purge(), 3)
+        expired = IdempotencyStore(self.db)
+        self.db.execute_query(
+            "INSERT INTO idempotency_keys (key, fingerprint, status_code, "
+            "response, created_at) VALUES (?, ?, 201, '{}', 0)",
+            (expired.scoped_key("u1", "old"), b"f"),
+        )
+        self.assertIsNone(expired.begin(expired.scoped_key("u1", "old"), b"g"))
+
+    def test_stale_claims_are_taken_over(self):
+        store = IdempotencyStore(self.db, lease_seconds=60)
+        key = store.scoped_key("u1", "crashed")
+        # Claimed by a worker that died before storing a response
+        self.db.execute_query(
+            "INSERT INTO idempotency_keys (key, fingerprint, created_at) "
+            "VALUES (?, ?, ?)",
+            (key, b"f", time.time() - 61),
+        )
+        self.assertIsNone(store.begin(key, b"f"))
+        store.complete(key, b"f", 201, "{}")
+        self.assertEqual(store.begin(key, b"f"), (201, "{}"))
+
+    def test_expired_keys_purged_while_claiming(self):
+        store = IdempotencyStore(self.db, purge_interval=60)
+        self.post({"amount": 1}, key="a", app=self.make_app(store))
+        self.db.execute_query("UPDATE idempotency_keys SET created_at = 0")
+        store.begin(store.scoped_key("u1", "b"), b"f")
+        self.assertEqual(
+            self.db.fetch_one("SELECT COUNT(*) AS n FROM idempotency_keys")["n"], 2
+        )
+        store._next_purge = 0
+        store.begin(store.scoped_key("u1", "c"), b"f")
+        keys = self.db.fetch_all("SELECT key FROM idempotency_keys")
+        self.assertEqual(
+            {row["key"] for row in keys},
+            {store.scoped_key("u1", "b"), store.scoped_key("u1", "c")},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Tests for the bulk journal importer
+"""
+
+import io
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from tests.test_ledger_balances import LedgerTestCase
+
+from importer import JournalImporter, read_rows
+from migrations import LEDGER_MIGRATIONS
+from models.user import Account, FinancialPeriod
+from reports import close_period
+
+CSV_HEADER = (
+    "entry_number,entry_date,description,account_code,debit_amount,credit_amount\n"
+)
+
+
+class TestJournalImport(LedgerTestCase):
+
+    def run_import(self, text, file_format="csv", chunk_size=3):
+        importer = JournalImporter(self.db, "importer", chunk_size=chunk_size)
+        return importer.run(read_rows(io.StringIO(text), file_format))
+
+    def checkpoints(self):
+        return self.db.fetch_all(
+            "SELECT * FROM account_daily_balances ORDER BY account_id, balance_date"
+        )
+
+    def test_csv_import_posts_entries(self):
+        january = FinancialPeriod(
+            name="2025-01", start_date="2025-01-01", end_date="2025-01-31"
+        ).save()
+        summary = self.run_import(
+            CSV_HEADER + "JE-1,2025-01-10,Sale,1000,50.00,\n"
+            "JE-1,2025-01-10,Sale,4000,,50.00\n"
+            "JE-2,2025-01-12,Rent,5000,20,\n"
+            "JE-2,2025-01-12,Rent,1000,,12.5\n"
+            "JE-2,2025-01-12,Rent,1000,,7.5\n"
+        )
+        self.assertEqual(
+            summary,
+            {"rows": 5, "entries": 2, "lines": 5, "rejected_entries": 0, "errors": []},
+        )
+        self.assertEqual(
+            Account.find_by_id(self.cash.id).get_balance(), Decimal("130.0")
+        )
+        self.assertEqual(
+            Account.balances_as_of(date(2025, 1, 11))[self.cash.id], Decimal("150.0")
+        )
+        totals = self.db.fetch_one(
+            "SELECT debit_total, credit_total FROM account_period_totals "
+            "WHERE period_id = ? AND account_id = ?",
+            (january.id, self.cash.id),
+        )
+        self.assertEqual((totals["debit_total"], totals["credit_total"]), (50, 20))
+        self.assertEqual(self.db.fetch_one("SELECT COUNT(*) AS n FROM outbox")["n"], 2)
+        entry = self.db.fetch_one(
+            "SELECT status, total_debit FROM journal_entries WHERE entry_number = 'JE-2'"
+        )
+        self.assertEqual((entry["status"], entry["total_debit"]), ("posted", 20))
+
+    def test_invalid_rows_are_reported_and_their_entries_skipped(self):
+        self.post("2025-01-05", self.cash, self.revenue, 10.0)
+        existing = self.db.fetch_one("SELECT entry_number FROM journal_entries")
+        march = FinancialPeriod(
+            name="2025-03", start_date="2025-03-01", end_date="2025-03-31"
+        ).save()
+        close_period(self.db, march, "controller")
+        summary = self.run_import(
+            CSV_HEADER + "JE-1,2025-04-10,Ok,1000,5,\n"
+            "JE-1,2025-04-10,Ok,4000,,5\n"
+            "JE-2,2025-04-10,Bad code,9999,5,\n"
+            "JE-2,2025-04-10,Bad code,4000,,5\n"
+            "JE-3,2025-04-10,Both sides,1000,5,5\n"
+            "JE-4,2025-04-10,Unbalanced,1000,5,\n"
+            "JE-4,2025-04-10,Unbalanced,4000,,4.99\n"
+            "JE-5,2025-04-10,Precision,1000,5.001,\n"
+            f"{existing['entry_number']},2025-04-10,Dup,1000,5,\n"
+            "JE-6,2025-02-15,Before close,1000,5,\n"
+            "JE-6,2025-02-15,Before close,4000,,5\n",
+            chunk_size=100,
+        )
+        self.assertEqual((summary["entries"], summary["rejected_entries"]), (1, 6))
+        self.assertEqual(
+            [(e["row"], e["entry_number"]) for e in summary["errors"]],
+            [
+                (3, "JE-2"),
+                (5, "JE-3"),
+                (6, "JE-4"),
+                (8, "JE-5"),
+                (9, existing["entry_number"]),
+                (10, "JE-6"),
+            ],
+        )
+        self.assertIn("Debits (5) do not equal credits (4.99)", str(summary["errors"]))
+        self.assertEqual(
+            Account.find_by_id(self.cash.id).get_balance(), Decimal("115.0")
+        )
+
+    def test_bulk_checkpoints_match_backfill(self):
+        self.post("2025-02-01", self.cash, self.revenue, 40.0)
+        rows = [
+            ("JE-1", "2025-03-01", "1000", "4000", "12.34"),
+            ("JE-2", "2025-01-15", "5000", "1000", "3.21"),
+            ("JE-3", "2025-02-01", "1000", "4000", "1.00"),
+            ("JE-4", "2025-01-15", "1000", "4000", "9.99"),
+        ]
+        text = "".join(
+            f'{{"entry_number": "{n}", "entry_date": "{d}", "description": "x", '
+            f'"account_code": "{dr}", "debit_amount": {amount}}}\n'
+            f'{{"entry_number": "{n}", "entry_date": "{d}", "description": "x", '
+            f'"account_code": "{cr}", "credit_amount": "{amount}"}}\n'
+            for n, d, dr, cr, amount in rows
+        )
+        summary = self.run_import(text, "jsonl", chunk_size=2)
+        self.assertEqual(summary["entries"], 4)
+        imported = self.checkpoints()
+        self.db.execute_query("DELETE FROM account_daily_balances")
+        migration = LEDGER_MIGRATIONS["016_create_account_daily_balances_table"]
+        with self.db.get_connection() as conn:
+            conn.executescript(migration["sql"])
+        self.assertEqual(imported, self.checkpoints())
+
+
+if __name__ == "__main__":
+    unittest.main()
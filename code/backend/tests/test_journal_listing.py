@@ -0,0 +1,111 @@
+"""
+Tests for keyset-paginated journal entry listing
+"""
+
+import unittest
+
+from flask import Flask
+from tests.test_ledger_balances import LedgerTestCase
+
+from models.user import JournalEntry, decode_cursor, encode_cursor
+from routes.user import ledger_bp
+
+
+class TestJournalListing(LedgerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        days = ["2025-01-05", "2025-01-05", "2025-01-05", "2025-02-10", "2025-03-15"]
+        self.ids = []
+        for number, day in enumerate(days):
+            credit = self.revenue if number % 2 else self.expense
+            self.ids.append(self.post(day, self.cash, credit, 10.0 + number).id)
+        self.db.execute_query(
+            "UPDATE journal_entries SET created_by = 'u1' WHERE id != ?",
+            (self.ids[1],),
+        )
+
+    def walk(self, **filters):
+        ids, cursor = [], None
+        while True:
+            page = JournalEntry.list_page(limit=2, cursor=cursor, **filters)
+            ids.extend(entry["id"] for entry in page["journal_entries"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_entry_once_newest_first(self):
+        newest_first = [self.ids[4], self.ids[3], self.ids[2], self.ids[1], self.ids[0]]
+        self.assertEqual(self.walk(), newest_first)
+        page = JournalEntry.list_page(limit=5)
+        self.assertIsNone(page["next_cursor"])
+        self.assertNotIn("lines", page["journal_entries"][0])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.walk(start_date="2025-01-05", end_date="2025-02-10"),
+            [self.ids[3], self.ids[2], self.ids[1], self.ids[0]],
+        )
+        self.assertEqual(
+            self.walk(account_id=self.revenue.id), [self.ids[3], self.ids[1]]
+        )
+        self.assertEqual(
+            self.walk(created_by="u1", status="posted"),
+            [self.ids[4], self.ids[3], self.ids[2], self.ids[0]],
+        )
+        self.assertEqual(self.walk(status="draft"), [])
+
+    def test_lines_are_loaded_for_the_page(self):
+        page = JournalEntry.list_page(limit=2, include_lines=True)
+        for entry in page["journal_entries"]:
+            self.assertEqual([line["line_number"] for line in entry["lines"]], [1, 2])
+            self.assertEqual(
+                {line["journal_entry_id"] for line in entry["lines"]}, {entry["id"]}
+            )
+
+    def test_cursor_round_trip_and_rejection(self):
+        self.assertEqual(
+            decode_cursor(encode_cursor("2025-01-05", 7)), ("2025-01-05", 7)
+        )
+        for bad in ("not-a-cursor", encode_cursor("2025-01-05", "7")[:-2], "W10"):
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+
+    def test_blueprint_route(self):
+        app = Flask(__name__)
+        app.register_blueprint(ledger_bp, url_prefix="/api/v1/ledger")
+        client = app.test_client()
+        response = client.get(
+            "/api/v1/ledger/journal-entries?limit=3&include_lines=true",
+            headers={"X-User-ID": "u1"},
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(
+            [entry["id"] for entry in body["journal_entries"]],
+            [self.ids[4], self.ids[3], self.ids[2]],
+        )
+        self.assertEqual(body["count"], 3)
+        self.assertEqual(len(body["journal_entries"][0]["lines"]), 2)
+        self.assertEqual(body["journal_entries"][0]["total_debit"], "14")
+        self.assertEqual(
+            [line["debit_amount"] for line in body["journal_entries"][0]["lines"]],
+            ["14", "0"],
+        )
+        response = client.get(
+            f"/api/v1/ledger/journal-entries?cursor={body['next_cursor']}",
+            headers={"X-User-ID": "u1"},
+        )
+        self.assertEqual(
+            [entry["id"] for entry in response.get_json()["journal_entries"]],
+            [self.ids[0]],
+        )
+        response = client.get(
+            "/api/v1/ledger/journal-entries?cursor=bogus",
+            headers={"X-User-ID": "u1"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
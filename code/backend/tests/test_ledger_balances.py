@@ -0,0 +1,348 @@
+"""
+Tests for the ledger's point-in-time account balances
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "ledger-service", "src"))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+
+from database.manager import BaseModel, initialize_database
+from migrations import LEDGER_MIGRATIONS
+from models.user import Account, FinancialPeriod, JournalEntry, JournalEntryLine
+from reports import (
+    close_period,
+    closed_period_report,
+    income_statement,
+    stream_balance_sheet,
+    stream_trial_balance,
+)
+
+
+class LedgerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db, migration_manager = initialize_database(
+            os.path.join(self.tmp_dir, "ledger.db")
+        )
+        for version, migration in LEDGER_MIGRATIONS.items():
+            migration_manager.apply_migration(
+                version, migration["description"], migration["sql"]
+            )
+        BaseModel.set_db_manager(self.db)
+        self.cash = self.account("1000", "asset", opening_balance=100.0)
+        self.revenue = self.account("4000", "revenue")
+        self.expense = self.account("5000", "expense")
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def account(self, code, account_type, opening_balance=0.0):
+        return Account(
+            account_code=code,
+            name=code,
+            account_type=account_type,
+            currency="USD",
+            opening_balance=opening_balance,
+            current_balance=opening_balance,
+        ).save()
+
+    def post(self, entry_date, debit_account, credit_account, amount):
+        entry = JournalEntry(
+            entry_number=f"JE-{entry_date}-{debit_account.id}-{amount}",
+            description="test",
+            entry_date=entry_date,
+            currency="USD",
+            total_debit=amount,
+            total_credit=amount,
+        ).save()
+        for number, (account, debit, credit) in enumerate(
+            ((debit_account, amount, 0.0), (credit_account, 0.0, amount)), 1
+        ):
+            JournalEntryLine(
+                journal_entry_id=entry.id,
+                account_id=account.id,
+                debit_amount=debit,
+                credit_amount=credit,
+                line_number=number,
+            ).save()
+        return JournalEntry.find_by_id(entry.id).post_entry("tester")
+
+
+class TestAccountBalances(LedgerTestCase):
+
+    def test_balance_as_of_past_dates(self):
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-02-01", self.cash, self.revenue, 25.5)
+        self.post("2025-02-01", self.expense, self.cash, 10.0)
+        cash = Account.find_by_id(self.cash.id)
+        self.assertEqual(cash.get_balance(), Decimal("165.5"))
+        self.assertEqual(cash.get_balance(date(2025, 1, 9)), Decimal("100.0"))
+        self.assertEqual(cash.get_balance(datetime(2025, 1, 10, 8)), Decimal("150.0"))
+        self.assertEqual(cash.get_balance(date(2025, 1, 31)), Decimal("150.0"))
+        self.assertEqual(cash.get_balance(date(2025, 2, 1)), Decimal("165.5"))
+        revenue = Account.find_by_id(self.revenue.id)
+        self.assertEqual(revenue.get_balance(date(2025, 3, 1)), Decimal("75.5"))
+
+    def test_back_dated_posting_carries_forward(self):
+        self.post("2025-03-01", self.cash, self.revenue, 40.0)
+        self.post("2025-01-15", self.cash, self.revenue, 5.0)
+        balances = Account.balances_as_of(date(2025, 2, 1))
+        self.assertEqual(balances[self.cash.id], Decimal("105.0"))
+        balances = Account.balances_as_of(date(2025, 3, 1))
+        self.assertEqual(balances[self.cash.id], Decimal("145.0"))
+        self.assertEqual(balances[self.revenue.id], Decimal("45.0"))
+        self.assertEqual(balances[self.expense.id], Decimal("0.0"))
+
+    def test_posting_twice_is_rejected(self):
+        entry = self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        with self.assertRaises(ValueError):
+            entry.post_entry("tester")
+        self.assertEqual(
+            Account.balances_as_of(date(2025, 1, 10))[self.cash.id], Decimal("150.0")
+        )
+
+    def test_stale_copy_cannot_post_again(self):
+        entry = self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        stale = JournalEntry.find_by_id(entry.id)
+        stale.status = "draft"
+        with self.assertRaises(ValueError):
+            stale.post_entry("other")
+        self.assertEqual(
+            Account.balances_as_of(date(2025, 1, 10))[self.cash.id], Decimal("150.0")
+        )
+        self.assertEqual(JournalEntry.find_by_id(entry.id).posted_by, "tester")
+
+    def test_migration_backfills_checkpoints(self):
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-02-01", self.expense, self.cash, 10.0)
+        before = self.db.fetch_all(
+            "SELECT * FROM account_daily_balances ORDER BY account_id, balance_date"
+        )
+        self.db.execute_query("DELETE FROM account_daily_balances")
+        migration = LEDGER_MIGRATIONS["016_create_account_daily_balances_table"]
+        with self.db.get_connection() as conn:
+            conn.executescript(migration["sql"])
+        after = self.db.fetch_all(
+            "SELECT * FROM account_daily_balances ORDER BY account_id, balance_date"
+        )
+        self.assertEqual(after, before)
+        self.assertEqual(len(after), 4)
+
+
+class TestLedgerReports(LedgerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.loan = self.account("2000", "liability")
+        self.capital = self.account("3000", "equity")
+        self.post("2025-01-05", self.cash, self.capital, 100.0)
+        self.post("2025-01-20", self.cash, self.loan, 300.0)
+        self.post("2025-02-10", self.expense, self.cash, 40.0)
+        self.post("2025-02-11", self.cash, self.revenue, 90.0)
+
+    def report(self, stream, as_of):
+        return json.loads("".join(stream(self.db, as_of, "USD")))
+
+    def test_trial_balance_as_of_past_date(self):
+        report = self.report(stream_trial_balance, date(2025, 1, 31))
+        self.assertEqual(
+            [
+                (a["account_code"], a["debit_balance"], a["credit_balance"])
+                for a in report["accounts"]
+            ],
+            [
+                ("1000", "500.0", "0.0"),
+                ("2000", "0.0", "300.0"),
+                ("3000", "0.0", "100.0"),
+            ],
+        )
+        self.assertEqual(report["subtotals"]["asset"]["debit_balance"], "500.0")
+        # The opening balance of cash has no offsetting entry
+        self.assertEqual(report["totals"]["difference"], "100.0")
+        self.assertFalse(report["is_balanced"])
+
+    def test_trial_balance_totals_by_type(self):
+        report = self.report(stream_trial_balance, datetime(2025, 3, 1))
+        self.assertEqual(report["as_of_date"], "2025-03-01T00:00:00")
+        self.assertEqual(
+            {t: s["debit_balance"] for t, s in report["subtotals"].items()},
+            {
+                "asset": "550.0",
+                "equity": "0.0",
+                "expense": "40.0",
+                "liability": "0.0",
+                "revenue": "0.0",
+            },
+        )
+        self.assertEqual(report["totals"]["total_debits"], "590.0")
+        self.assertEqual(report["totals"]["total_credits"], "490.0")
+
+    def test_balance_sheet_sections(self):
+        report = self.report(stream_balance_sheet, date(2025, 1, 31))
+        self.assertEqual(report["assets"]["total"], "500.0")
+        self.assertEqual(
+            report["liabilities"]["accounts"],
+            [{"account_code": "2000", "account_name": "2000", "balance": "300.0"}],
+        )
+        self.assertEqual(report["total_liabilities_and_equity"], "400.0")
+        empty = self.report(stream_balance_sheet, date(2024, 12, 31))
+        self.assertEqual(empty["liabilities"], {"accounts": [], "total": "0.0"})
+        self.assertEqual(empty["assets"]["total"], "100.0")
+
+
+class TestIncomeStatement(LedgerTestCase):
+
+    def period(self, name, start_date, end_date):
+        return FinancialPeriod(
+            name=name, start_date=start_date, end_date=end_date
+        ).save()
+
+    def totals(self, period):
+        return {
+            row["account_id"]: (row["debit_total"], row["credit_total"])
+            for row in self.db.fetch_all(
+                "SELECT * FROM account_period_totals WHERE period_id = ?",
+                (period.id,),
+            )
+        }
+
+    def test_posting_updates_rollups_of_containing_periods(self):
+        january = self.period("2025-01", "2025-01-01", "2025-01-31")
+        year = self.period("FY2025", "2025-01-01", "2025-12-31")
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-01-31", self.cash, self.revenue, 25.5)
+        self.post("2025-02-01", self.expense, self.cash, 10.0)
+        self.assertEqual(
+            self.totals(january),
+            {self.cash.id: (75.5, 0.0), self.revenue.id: (0.0, 75.5)},
+        )
+        self.assertEqual(self.totals(year)[self.cash.id], (75.5, 10.0))
+        incremental = self.totals(year)
+        year.rebuild_totals()
+        self.assertEqual(self.totals(year), incremental)
+
+    def test_period_created_after_postings_is_rebuilt(self):
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-02-10", self.cash, self.revenue, 20.0)
+        february = self.period("2025-02", "2025-02-01", "2025-02-28")
+        self.assertEqual(self.totals(february), {})
+        february.rebuild_totals()
+        self.assertEqual(self.totals(february)[self.revenue.id], (0.0, 20.0))
+
+    def test_income_statement_with_comparison(self):
+        january = self.period("2025-01", "2025-01-01", "2025-01-31")
+        february = self.period("2025-02", "2025-02-01", "2025-02-28")
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-01-12", self.expense, self.cash, 30.0)
+        self.post("2025-02-10", self.cash, self.revenue, 80.0)
+        report = income_statement(
+            self.db,
+            FinancialPeriod.find_by_id(february.id).to_dict(),
+            FinancialPeriod.find_by_id(january.id).to_dict(),
+        )
+        self.assertEqual(report["period"]["name"], "2025-02")
+        self.assertEqual(
+            report["revenue"]["accounts"],
+            [
+                {
+                    "account_code": "4000",
+                    "account_name": "4000",
+                    "amount": "80.0",
+                    "compare_amount": "50.0",
+                    "change": "30.0",
+                }
+            ],
+        )
+        self.assertEqual(report["expenses"]["total"], "0.0")
+        self.assertEqual(report["expenses"]["compare_total"], "30.0")
+        self.assertEqual(report["net_income"], "80.0")
+        self.assertEqual(report["compare_net_income"], "20.0")
+        self.assertEqual(report["net_income_change"], "60.0")
+        single = income_statement(
+            self.db, FinancialPeriod.find_by_id(january.id).to_dict()
+        )
+        self.assertNotIn("compare_period", single)
+        self.assertEqual(single["net_income"], "20.0")
+
+
+class TestPeriodClose(LedgerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.january = FinancialPeriod(
+            name="2025-01", start_date="2025-01-01", end_date="2025-01-31"
+        ).save()
+        self.post("2025-01-10", self.cash, self.revenue, 50.0)
+        self.post("2025-01-20", self.expense, self.cash, 20.0)
+        self.post("2025-02-05", self.cash, self.revenue, 70.0)
+
+    def close(self):
+        period = FinancialPeriod.find_by_id(self.january.id)
+        return close_period(self.db, period, "controller")
+
+    def cached(self, report_type):
+        return json.loads(
+            closed_period_report(self.db, self.january.to_dict(), report_type, "USD")
+        )
+
+    def test_close_snapshots_balances_at_period_end(self):
+        period = self.close()
+        self.assertEqual(period.status, "closed")
+        snapshot = self.db.fetch_all(
+            "SELECT account_id, closing_balance FROM period_balance_snapshots "
+            "WHERE period_id = ? ORDER BY account_id",
+            (period.id,),
+        )
+        self.assertEqual(
+            [(row["account_id"], row["closing_balance"]) for row in snapshot],
+            [(self.cash.id, 130.0), (self.revenue.id, 50.0), (self.expense.id, 20.0)],
+        )
+        with self.assertRaises(ValueError):
+            self.close()
+
+    def test_closed_period_rejects_postings_and_rebuilds(self):
+        self.close()
+        with self.assertRaises(ValueError):
+            self.post("2025-01-31", self.cash, self.revenue, 1.0)
+        with self.assertRaises(ValueError):
+            # Not in any closed period, but before the latest close
+            self.post("2024-12-31", self.cash, self.revenue, 1.0)
+        with self.assertRaises(ValueError):
+            FinancialPeriod.find_by_id(self.january.id).rebuild_totals()
+        self.post("2025-02-01", self.cash, self.revenue, 1.0)
+
+    def test_closed_period_reports_are_served_from_the_cache(self):
+        self.close()
+        self.assertEqual(
+            self.db.fetch_one("SELECT COUNT(*) AS n FROM period_report_cache")["n"], 3
+        )
+        live = json.loads(
+            "".join(stream_trial_balance(self.db, date(2025, 1, 31), "USD"))
+        )
+        self.assertEqual(self.cached("trial_balance"), live)
+        sheet = self.cached("balance_sheet")
+        self.assertEqual(sheet["as_of_date"], "2025-01-31")
+        self.assertEqual(sheet["assets"]["total"], "130.0")
+        self.assertEqual(self.cached("income_statement")["net_income"], "30.0")
+        # Later changes to the accounts do not reach the frozen payloads
+        self.db.execute_query(
+            "UPDATE accounts SET name = 'Renamed' WHERE id = ?", (self.cash.id,)
+        )
+        self.assertEqual(
+            self.cached("trial_balance")["accounts"][0]["account_name"], "1000"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
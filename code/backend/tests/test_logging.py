@@ -0,0 +1,361 @@
+"""
+Tests for the NexaFi structured logging pipeline
+"""
+
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.nexafi_logging.logger import (
+    LoggerManager,
+    LogSamplingFilter,
+    NonBlockingQueueHandler,
+    redact_message,
+)
+
+
+class LoggerManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.root = logging.getLogger()
+        self.security = logging.getLogger("security")
+        self.saved = (
+            self.root.handlers[:],
+            self.root.filters[:],
+            self.root.level,
+            self.security.handlers[:],
+            self.security.filters[:],
+            self.security.level,
+            self.security.propagate,
+        )
+
+    def tearDown(self):
+        (
+            root_handlers,
+            root_filters,
+            root_level,
+            security_handlers,
+            security_filters,
+            security_level,
+            propagate,
+        ) = self.saved
+        self.root.handlers[:] = root_handlers
+        self.root.filters[:] = root_filters
+        self.root.setLevel(root_level)
+        self.security.handlers[:] = security_handlers
+        self.security.filters[:] = security_filters
+        self.security.setLevel(security_level)
+        self.security.propagate = propagate
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def read_log(self, name):
+        with open(os.path.join(self.log_dir, name)) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class TestAsyncLogging(LoggerManagerTestCase):
+
+    def test_records_written_after_shutdown(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        logger = manager.get_logger("tests.async")
+        for i in range(50):
+            logger.info("event %d", i, extra={"user_id": "u1"})
+        manager.shutdown()
+        records = self.read_log("nexafi.log")
+        self.assertEqual(len(records), 50)
+        self.assertEqual(records[0]["message"], "event 0")
+        self.assertEqual(records[0]["user_id"], "u1")
+        self.assertIn("correlation_id", records[0])
+
+    def test_errors_routed_to_error_log(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        logger = manager.get_logger("tests.async")
+        logger.info("fine")
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logger.exception("failed")
+        manager.shutdown()
+        errors = self.read_log("error.log")
+        self.assertEqual(len(errors), 1)
+        self.assertIn("RuntimeError: boom", errors[0]["exc_info"])
+
+    def test_security_logger_writes_security_log(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        manager.get_logger("security").warning("Security event: LOGIN_FAILURE")
+        manager.shutdown()
+        records = self.read_log("security.log")
+        self.assertEqual(len(records), 1)
+        self.assertEqual(self.read_log("nexafi.log"), [])
+
+    def test_sensitive_values_redacted(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        manager.get_logger("tests.async").info("login password=%s", "hunter2")
+        manager.shutdown()
+        message = self.read_log("nexafi.log")[0]["message"]
+        self.assertEqual(message, "login password=[REDACTED]")
+
+    def test_service_metadata_resolved_at_configure_time(self):
+        with patch.dict(os.environ, {"SERVICE_NAME": "ledger-service"}):
+            manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        with patch.dict(os.environ, {"SERVICE_NAME": "changed"}):
+            manager.get_logger("tests.async").info("hello")
+            manager.shutdown()
+        record = self.read_log("nexafi.log")[0]
+        self.assertEqual(record["service"], "ledger-service")
+        self.assertIn("environment", record)
+
+    def test_full_queue_drops_and_counts(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+        logger = logging.getLogger("tests.drop")
+        logger.propagate = False
+        logger.addHandler(handler)
+        try:
+            for i in range(5):
+                logger.warning("event %d", i)
+        finally:
+            logger.removeHandler(handler)
+            logger.propagate = True
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_queued_copy_leaves_record_for_other_handlers(self):
+        handler = NonBlockingQueueHandler(queue.Queue())
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.getLogger("tests.copy").makeRecord(
+                "tests.copy",
+                logging.ERROR,
+                __file__,
+                1,
+                "failed %s",
+                ("x",),
+                sys.exc_info(),
+            )
+        handler.handle(record)
+        queued = handler.queue.get_nowait()
+        self.assertIsNot(queued, record)
+        self.assertEqual(queued.getMessage(), "failed x")
+        self.assertIsNone(queued.exc_info)
+        self.assertIn("ValueError: boom", queued.exc_text)
+        self.assertEqual(record.args, ("x",))
+        self.assertIsNotNone(record.exc_info)
+
+    def test_shutdown_reports_dropped_records(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        queue_handler, _ = manager._pipelines[0]
+        queue_handler.dropped = 7
+        self.assertEqual(manager.get_stats()["dropped_records"], 7)
+        manager.shutdown()
+        messages = [r["message"] for r in self.read_log("nexafi.log")]
+        self.assertTrue(any("Dropped 7 log records" in m for m in messages))
+
+    def test_shutdown_is_idempotent(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        manager.shutdown()
+        manager.shutdown()
+        self.assertEqual(manager.dropped_records, 0)
+
+
+class TestSyncLogging(LoggerManagerTestCase):
+
+    def test_sync_mode_writes_immediately(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=False)
+        logger = manager.get_logger("tests.sync")
+        logger.info("hello")
+        for handler in self.root.handlers:
+            handler.flush()
+        self.assertEqual(self.read_log("nexafi.log")[0]["message"], "hello")
+        self.assertEqual(manager.get_stats()["queue_depth"], 0)
+        for handler in self.root.handlers + self.security.handlers:
+            handler.close()
+
+    def test_filters_run_once_per_record(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=False)
+        security_filter = manager._filters[1]
+        with patch.object(
+            security_filter, "filter", wraps=security_filter.filter
+        ) as counted:
+            manager.get_logger("tests.sync").error("boom")
+        self.assertEqual(counted.call_count, 1)
+        for handler in self.root.handlers + self.security.handlers:
+            handler.close()
+
+    def test_module_loggers_filtered(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=False)
+        logging.getLogger("tests.sync.module").warning("login password=%s", "hunter2")
+        for handler in self.root.handlers:
+            handler.flush()
+        record = self.read_log("nexafi.log")[0]
+        self.assertEqual(record["message"], "login password=[REDACTED]")
+        self.assertIsNotNone(record["correlation_id"])
+        self.assertEqual(self.read_log("error.log"), [])
+        for handler in self.root.handlers + self.security.handlers:
+            handler.close()
+        manager.shutdown()
+
+
+def make_record(name, level, msg, created, *args):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.created = created
+    return record
+
+
+class TestLogSamplingFilter(unittest.TestCase):
+
+    def test_info_sampled_by_longest_prefix(self):
+        sampler = LogSamplingFilter(
+            default_rate=0.5, sample_rates={"requests": 0.25, "requests.audit": 1.0}
+        )
+        kept = [
+            sampler.filter(make_record("requests", logging.INFO, "hit", i))
+            for i in range(100)
+        ]
+        self.assertEqual(sum(kept), 25)
+        self.assertEqual(sampler.rate_for("requests.audit.x"), 1.0)
+        self.assertEqual(sampler.rate_for("other"), 0.5)
+        self.assertEqual(sampler.sampled_out, 75)
+
+    def test_warnings_never_sampled(self):
+        sampler = LogSamplingFilter(default_rate=0.0)
+        record = make_record("gateway", logging.WARNING, "circuit open", 0)
+        self.assertTrue(sampler.filter(record))
+
+    def test_repeated_warnings_collapsed(self):
+        sampler = LogSamplingFilter(dedup_window=10)
+        results = [
+            sampler.filter(
+                make_record("gateway", logging.WARNING, "rate limit for %s", t, "u1")
+            )
+            for t in (0, 1, 2, 3)
+        ]
+        self.assertEqual(results, [True, False, False, False])
+        later = make_record("gateway", logging.WARNING, "rate limit for %s", 12, "u2")
+        self.assertTrue(sampler.filter(later))
+        self.assertEqual(later.repeated, 3)
+        self.assertEqual(later.getMessage(), "rate limit for u2 (repeated 3 times)")
+
+    def test_expired_windows_reported_without_a_later_copy(self):
+        sampler = LogSamplingFilter(dedup_window=10)
+        emitted = []
+        sampler.emit = emitted.append
+        for t in (0, 1, 2):
+            sampler.filter(
+                make_record("gateway", logging.WARNING, "rate limit for %s", t, "u1")
+            )
+        sampler.filter(make_record("other", logging.INFO, "tick", 5))
+        self.assertEqual(emitted, [])
+        sampler.filter(make_record("other", logging.INFO, "tick", 12))
+        self.assertEqual(
+            [r.getMessage() for r in emitted], ["rate limit for u1 (repeated 2 times)"]
+        )
+        self.assertTrue(sampler.filter(emitted[0]))
+        later = make_record("gateway", logging.WARNING, "rate limit for %s", 13, "u2")
+        self.assertTrue(sampler.filter(later))
+        self.assertFalse(hasattr(later, "repeated"))
+
+    def test_distinct_sources_kept(self):
+        sampler = LogSamplingFilter(dedup_window=10)
+        self.assertTrue(sampler.filter(make_record("a", logging.ERROR, "down", 0)))
+        self.assertTrue(sampler.filter(make_record("b", logging.ERROR, "down", 0)))
+        self.assertTrue(sampler.filter(make_record("a", logging.ERROR, "other", 0)))
+        self.assertFalse(sampler.filter(make_record("a", logging.ERROR, "down", 1)))
+
+    def test_template_table_bounded(self):
+        sampler = LogSamplingFilter(dedup_window=10, max_templates=3)
+        for i in range(10):
+            sampler.filter(make_record("a", logging.ERROR, f"error {i}", i * 20))
+        self.assertLessEqual(len(sampler._seen), 3)
+
+
+class TestLoggerManagerSampling(LoggerManagerTestCase):
+
+    def test_configured_from_environment(self):
+        env = {"LOG_SAMPLE_RATES": "tests.chatty=0.1", "LOG_DEDUP_WINDOW": "30"}
+        with patch.dict(os.environ, env):
+            manager = LoggerManager(log_dir=self.log_dir, async_logging=True)
+        chatty = manager.get_logger("tests.chatty")
+        for i in range(20):
+            chatty.info("tick %d", i)
+            chatty.warning("circuit open")
+        manager.get_logger("security").warning("Security event")
+        manager.get_logger("security").warning("Security event")
+        stats = manager.get_stats()
+        manager.shutdown()
+        messages = [r["message"] for r in self.read_log("nexafi.log")]
+        self.assertEqual(messages.count("circuit open"), 1)
+        self.assertIn("circuit open (repeated 19 times)", messages)
+        self.assertEqual(len(messages), 4)
+        self.assertEqual(len(self.read_log("security.log")), 2)
+        self.assertEqual(stats["sampled_out"], 18)
+        self.assertEqual(stats["suppressed_duplicates"], 19)
+
+    def test_pending_repeats_reported_at_shutdown(self):
+        manager = LoggerManager(
+            log_dir=self.log_dir, async_logging=True, dedup_window=60
+        )
+        logger = manager.get_logger("tests.repeats")
+        for _ in range(4):
+            logger.warning("circuit open")
+        manager.shutdown()
+        messages = [r["message"] for r in self.read_log("nexafi.log")]
+        self.assertEqual(messages, ["circuit open", "circuit open (repeated 3 times)"])
+
+    def test_configure_sampling_per_service(self):
+        manager = LoggerManager(log_dir=self.log_dir, async_logging=False)
+        manager.configure_sampling(default_rate=0.0)
+        logger = manager.get_logger("tests.sync")
+        logger.info("dropped")
+        logger.error("kept")
+        for handler in self.root.handlers:
+            handler.flush()
+        messages = [r["message"] for r in self.read_log("nexafi.log")]
+        self.assertEqual(messages, ["kept"])
+        for handler in self.root.handlers + self.security.handlers:
+            handler.close()
+
+
+class TestRedaction(unittest.TestCase):
+
+    def test_credentials_masked(self):
+        self.assertEqual(
+            redact_message("access_token=abc, api_key: sk_1"),
+            "access_token=[REDACTED], api_key: [REDACTED]",
+        )
+        self.assertEqual(
+            redact_message("Authorization: Bearer abc.def"),
+            "Authorization: [REDACTED]",
+        )
+
+    def test_card_numbers_masked(self):
+        self.assertEqual(
+            redact_message("charged 4111 1111 1111 1111"), "charged [REDACTED]"
+        )
+
+    def test_plain_messages_untouched(self):
+        message = "Transfer of 1234567 USD completed"
+        self.assertEqual(redact_message(message), message)
+
+    def test_long_numbers_failing_luhn_kept(self):
+        message = "order 1700000000123 at 2025-01-01, ref 1234-5678-9012-3456"
+        self.assertEqual(redact_message(message), message)
+        self.assertEqual(
+            redact_message("card 5500-0000-0000-0004 declined"),
+            "card [REDACTED] declined",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+"""
+Tests for the in-process message broker transports
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import pika
+from pika.exceptions import ChannelClosedByBroker
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.utils.memory_broker import MemoryBroker, MemoryTransport, SqliteBroker
+from shared.utils.message_queue import MessageQueue, QueueConsumer
+
+
+class BrokerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = MemoryBroker()
+        self.connection = self.broker.connect()
+        self.channel = self.connection.channel()
+
+    def publish(self, queue, body, **properties):
+        self.channel.basic_publish(
+            "", queue, body, pika.BasicProperties(delivery_mode=2, **properties)
+        )
+
+    def consume(self, queue, channel=None, auto_ack=False):
+        channel = channel or self.channel
+        received = []
+        channel.basic_consume(
+            queue,
+            lambda ch, method, props, body: received.append((method, props, body)),
+            auto_ack=auto_ack,
+        )
+        channel.connection.process_data_events(time_limit=0)
+        return received
+
+
+class TestMemoryBroker(BrokerTestCase):
+
+    def test_default_exchange_routes_by_queue_name(self):
+        self.channel.queue_declare("jobs")
+        self.publish("jobs", b"1")
+        self.publish("missing", b"2")
+        received = self.consume("jobs")
+        self.assertEqual([body for _, _, body in received], [b"1"])
+        self.assertEqual(self.broker.stats["unroutable"], 1)
+
+    def test_direct_fanout_and_topic_exchanges(self):
+        for name in ("a", "b", "c"):
+            self.channel.queue_declare(name)
+        self.channel.exchange_declare("fan", "fanout")
+        self.channel.exchange_declare("events", "topic")
+        self.channel.queue_bind("a", "fan")
+        self.channel.queue_bind("b", "fan")
+        self.channel.queue_bind("c", "events", "payment.#")
+        self.channel.basic_publish("fan", "", b"x")
+        self.channel.basic_publish("events", "payment.card.settled", b"y")
+        self.channel.basic_publish("events", "ledger.posted", b"z")
+        self.assertEqual(self.channel.queue_declare("a").method.message_count, 1)
+        self.assertEqual(self.channel.queue_declare("b").method.message_count, 1)
+        self.assertEqual(self.channel.queue_declare("c").method.message_count, 1)
+        with self.assertRaises(ChannelClosedByBroker):
+            self.channel.basic_publish("nope", "a", b"x")
+        self.assertTrue(self.channel.is_closed)
+
+    def test_priorities_on_priority_queues(self):
+        self.channel.queue_declare("p", arguments={"x-max-priority": 5})
+        self.channel.queue_declare("plain")
+        for body, priority in ((b"low", 1), (b"high", 9), (b"mid", 3), (b"low2", 1)):
+            self.publish("p", body, priority=priority)
+            self.publish("plain", body, priority=priority)
+        bodies = [body for _, _, body in self.consume("p")]
+        self.assertEqual(bodies, [b"high", b"mid", b"low", b"low2"])
+        plain = [body for _, _, body in self.consume("plain")]
+        self.assertEqual(plain, [b"low", b"high", b"mid", b"low2"])
+
+    def test_prefetch_and_multiple_acks(self):
+        self.channel.queue_declare("jobs")
+        for i in range(10):
+            self.publish("jobs", str(i).encode())
+        self.channel.basic_qos(prefetch_count=4)
+        received = self.consume("jobs")
+        self.assertEqual(len(received), 4)
+        self.channel.basic_ack(received[2][0].delivery_tag, multiple=True)
+        self.connection.process_data_events(time_limit=0)
+        self.assertEqual(len(received), 7)
+        self.assertEqual(len(self.channel.unacked), 4)
+        with self.assertRaises(ChannelClosedByBroker):
+            self.channel.basic_ack(999)
+
+    def test_nack_requeues_in_place_and_close_requeues_unacked(self):
+        self.channel.queue_declare("jobs")
+        for i in range(3):
+            self.publish("jobs", str(i).encode())
+        self.channel.basic_qos(prefetch_count=1)
+        received = self.consume("jobs")
+        self.channel.basic_nack(received[0][0].delivery_tag)
+        self.connection.process_data_events(time_limit=0)
+        method, _, body = received[1]
+        self.assertEqual(body, b"0")
+        self.assertTrue(method.redelivered)
+        self.channel.close()
+        other = self.connection.channel()
+        bodies = [body for _, _, body in self.consume("jobs", other, auto_ack=True)]
+        self.assertEqual(bodies, [b"0", b"1", b"2"])
+
+    def test_reject_dead_letters_with_x_death(self):
+        self.channel.queue_declare("dead")
+        self.channel.queue_declare(
+            "jobs",
+            arguments={
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": "dead",
+            },
+        )
+        self.publish("jobs", b"poison")
+        [(method, _, _)] = self.consume("jobs")
+        self.channel.basic_reject(method.delivery_tag, requeue=False)
+        method, properties, body = self.channel.basic_get("dead", auto_ack=True)
+        self.assertEqual(body, b"poison")
+        [death] = properties.headers["x-death"]
+        self.assertEqual((death["queue"], death["reason"]), ("jobs", "rejected"))
+
+    def test_consumer_on_another_thread_is_woken(self):
+        self.channel.queue_declare("jobs")
+        received = []
+        consumer_connection = self.broker.connect()
+
+        def run():
+            channel = consumer_connection.channel()
+            channel.basic_consume(
+                "jobs",
+                lambda ch, method, props, body: (
+                    received.append(body),
+                    ch.stop_consuming(),
+                ),
+                auto_ack=True,
+            )
+            channel.start_consuming()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.05)
+        self.publish("jobs", b"hello")
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, [b"hello"])
+
+
+class TestMessageQueueOnMemoryTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = MemoryTransport()
+
+    def test_publish_confirm_and_consume(self):
+        mq = MessageQueue(publisher_confirms=True, transport=self.transport)
+        mq.declare_queue("audit_logging")
+        self.assertEqual(
+            mq.publish_batch("audit_logging", ({"n": i} for i in range(100))), 100
+        )
+        self.assertEqual(mq.wait_for_confirms(timeout=1), [])
+        self.assertEqual(mq.confirm_tracker.acked, 100)
+
+        handled = []
+        consumer = QueueConsumer(
+            MessageQueue(transport=self.transport),
+            "audit_logging",
+            lambda messages: handled.extend(m["n"] for m in messages),
+            batch_size=25,
+            prefetch=50,
+            workers=2,
+        )
+        consumer.start()
+        deadline = time.monotonic() + 5
+        while consumer.stats["processed"] < 100 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        consumer.stop()
+        self.assertEqual(sorted(handled), list(range(100)))
+        self.assertEqual(self.transport.broker.stats["acked"], 100)
+
+    def test_transport_selected_from_env(self):
+        from shared.utils import message_queue
+
+        os.environ["MESSAGE_QUEUE_TRANSPORT"] = "memory"
+        try:
+            first, second = MessageQueue(), MessageQueue()
+        finally:
+            del os.environ["MESSAGE_QUEUE_TRANSPORT"]
+        self.assertIs(first.transport, second.transport)
+        self.assertIsInstance(first.transport, MemoryTransport)
+        self.assertIsInstance(MessageQueue().transport, message_queue.PikaTransport)
+
+
+class TestSqliteBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "mq.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_persistent_messages_survive_restart(self):
+        broker = SqliteBroker(self.db_path)
+        mq = MessageQueue(publisher_confirms=True, transport=MemoryTransport(broker))
+        mq.declare_queue("payments", arguments={"x-max-priority": 3})
+        mq.declare_queue("scratch", durable=False)
+        mq.publish_batch("payments", [{"n": i} for i in range(5)])
+        mq.publish_message("payments", {"n": "urgent"}, priority=3)
+        mq.publish_message("scratch", {"n": "lost"})
+        mq.wait_for_confirms(timeout=1)
+        method, _, body = mq.channel.basic_get("payments")
+        self.assertEqual(json.loads(body)["n"], "urgent")
+        mq.channel.basic_ack(method.delivery_tag)
+        # An unacked delivery is still owed after a crash
+        mq.channel.basic_get("payments")
+        broker.flush()
+        broker.close()
+
+        restarted = SqliteBroker(self.db_path)
+        self.assertNotIn("scratch", restarted.queues)
+        channel = restarted.connect().channel()
+        bodies = []
+        while True:
+            method, _, body = channel.basic_get("payments", auto_ack=True)
+            if method is None:
+                break
+            bodies.append(json.loads(body)["n"])
+        self.assertEqual(bodies, [0, 1, 2, 3, 4])
+        restarted.close()
+
+    def test_confirms_follow_the_commit(self):
+        broker = SqliteBroker(self.db_path, flush_size=10_000, flush_interval_ms=60_000)
+        connection = broker.connect()
+        channel = connection.channel()
+        channel.queue_declare("jobs", durable=True)
+        confirms = []
+        channel.confirm_delivery(confirms.append)
+        channel.basic_publish("", "jobs", b"{}", pika.BasicProperties(delivery_mode=2))
+
+        def stored():
+            return broker.db.fetch_one("SELECT COUNT(*) AS n FROM mq_messages")["n"]
+
+        self.assertEqual((stored(), confirms), (0, []))
+        connection.process_data_events(time_limit=0)
+        self.assertEqual(stored(), 1)
+        self.assertEqual(confirms[0].method.delivery_tag, 1)
+        broker.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
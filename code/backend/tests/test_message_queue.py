@@ -0,0 +1,372 @@
+"""
+Tests for the RabbitMQ message queue wrapper
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pika
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.utils.message_queue import (
+    CPU_BOUND_QUEUES,
+    ConfirmTracker,
+    MessageQueue,
+    QueueConsumer,
+    Queues,
+)
+
+
+def confirm_frame(delivery_tag, multiple=False, ack=True):
+    method_class = pika.spec.Basic.Ack if ack else pika.spec.Basic.Nack
+    return pika.frame.Method(
+        1, method_class(delivery_tag=delivery_tag, multiple=multiple)
+    )
+
+
+def reject_odd(messages):
+    """Module-level so it can be pickled into worker processes"""
+    if any(m["n"] % 2 for m in messages):
+        raise ValueError("odd")
+
+
+class MessageQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("shared.utils.message_queue.pika.BlockingConnection")
+        self.connection_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.connections = []
+        self.connection_class.side_effect = self._new_connection
+
+    def _new_connection(self, parameters):
+        connection = MagicMock()
+        connection.is_closed = False
+        channel = connection.channel.return_value
+        channel.is_closed = False
+        self.connections.append(connection)
+        return connection
+
+
+class TestPublishing(MessageQueueTestCase):
+
+    def test_connection_is_reused_across_publishes(self):
+        mq = MessageQueue(publisher_confirms=False)
+        mq.publish_message("q", {"n": 1})
+        mq.publish_batch("q", [{"n": 2}, {"n": 3}])
+        self.assertEqual(len(self.connections), 1)
+        channel = mq.channel
+        self.assertEqual(channel.basic_publish.call_count, 3)
+        kwargs = channel.basic_publish.call_args.kwargs
+        self.assertEqual(kwargs["routing_key"], "q")
+        self.assertEqual(json.loads(kwargs["body"]), {"n": 3})
+        self.assertEqual(kwargs["properties"].delivery_mode, 2)
+
+    def test_each_thread_gets_its_own_channel(self):
+        mq = MessageQueue(publisher_confirms=False)
+        mq.publish_message("q", {"n": 1})
+        channels = [mq.channel]
+
+        def publish():
+            mq.publish_message("q", {"n": 2})
+            channels.append(mq.channel)
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(self.connections), 2)
+        self.assertIsNot(channels[0], channels[1])
+
+    def test_closed_channel_is_reopened(self):
+        mq = MessageQueue(publisher_confirms=False)
+        mq.publish_message("q", {"n": 1})
+        mq.channel.is_closed = True
+        mq.publish_message("q", {"n": 2})
+        self.assertEqual(len(self.connections), 2)
+
+    def test_logs_carry_no_message_body(self):
+        mq = MessageQueue(publisher_confirms=False)
+        with self.assertLogs("shared.utils.message_queue", "DEBUG") as logs:
+            mq.publish_batch("q", [{"card": "secret-value"}] * 2)
+        output = "\n".join(logs.output)
+        self.assertIn("Published 2 messages to q", output)
+        self.assertNotIn("secret-value", output)
+
+
+class TestPublisherConfirms(MessageQueueTestCase):
+
+    def _confirming_queue(self):
+        mq = MessageQueue(publisher_confirms=True)
+        callbacks = {}
+
+        def new_connection(parameters):
+            connection = self._new_connection(parameters)
+            impl = connection.channel.return_value._impl
+
+            def confirm_delivery(ack_nack_callback, callback):
+                callbacks["ack"] = ack_nack_callback
+                callback(None)
+
+            impl.confirm_delivery.side_effect = confirm_delivery
+            return connection
+
+        self.connection_class.side_effect = new_connection
+        mq.connect()
+        return mq, callbacks
+
+    def test_publish_does_not_wait_for_acks(self):
+        mq, _ = self._confirming_queue()
+        self.assertEqual(mq.publish_batch("q", [{"n": i} for i in range(5)]), 5)
+        self.assertEqual(mq.confirm_tracker.pending, 5)
+        mq.connection.process_data_events.assert_called_with(time_limit=0)
+
+    def test_multiple_ack_settles_prefix(self):
+        mq, callbacks = self._confirming_queue()
+        mq.publish_batch("q", [{"n": i} for i in range(5)])
+        callbacks["ack"](confirm_frame(3, multiple=True))
+        self.assertEqual(mq.confirm_tracker.acked, 3)
+        self.assertEqual(mq.confirm_tracker.pending, 2)
+
+    def test_wait_for_confirms_returns_nacked_messages(self):
+        mq, callbacks = self._confirming_queue()
+        mq.publish_batch("q", [{"n": i} for i in range(3)])
+        events = iter([confirm_frame(2, ack=False), confirm_frame(3, multiple=True)])
+        mq.connection.process_data_events.side_effect = lambda time_limit: callbacks[
+            "ack"
+        ](next(events))
+        nacked = mq.wait_for_confirms(timeout=1)
+        self.assertEqual(nacked, [("q", json.dumps({"n": 1}).encode())])
+        self.assertEqual(mq.confirm_tracker.acked, 2)
+        self.assertEqual(mq.wait_for_confirms(timeout=1), [])
+
+    def test_wait_for_confirms_times_out(self):
+        mq, _ = self._confirming_queue()
+        mq.publish_message("q", {"n": 1})
+        with self.assertRaises(TimeoutError):
+            mq.wait_for_confirms(timeout=0.05)
+
+    def test_tracker_ignores_unknown_tags(self):
+        tracker = ConfirmTracker()
+        tracker.track("q", b"{}")
+        tracker.on_confirm(confirm_frame(7))
+        self.assertEqual((tracker.acked, tracker.pending), (0, 1))
+
+
+class FakeBroker:
+    """Just enough of a pika connection/channel to drive QueueConsumer"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.unacked = {}
+        self.acks = []
+        self.prefetch = 0
+        self.consumer = None
+        self.next_tag = 1
+        self.callbacks = []
+        self.is_closed = False
+
+    def put(self, queue_name, message, headers=None):
+        with self.lock:
+            self.queues.setdefault(queue_name, []).append(
+                (
+                    pika.BasicProperties(headers=headers),
+                    json.dumps(message).encode(),
+                )
+            )
+
+    # connection
+    def channel(self):
+        return self
+
+    def close(self):
+        self.is_closed = True
+
+    def add_callback_threadsafe(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def process_data_events(self, time_limit=0):
+        with self.lock:
+            callbacks, self.callbacks = self.callbacks, []
+            deliveries = []
+            if self.consumer is not None:
+                queue_name, callback = self.consumer
+                pending = self.queues.get(queue_name, [])
+                while pending and len(self.unacked) < self.prefetch:
+                    properties, body = pending.pop(0)
+                    tag = self.next_tag
+                    self.next_tag += 1
+                    self.unacked[tag] = (queue_name, properties, body)
+                    deliveries.append((callback, tag, properties, body))
+        for callback in callbacks:
+            callback()
+        for callback, tag, properties, body in deliveries:
+            callback(self, SimpleNamespace(delivery_tag=tag), properties, body)
+        if not (callbacks or deliveries):
+            time.sleep(min(time_limit, 0.005))
+
+    # channel
+    def queue_declare(self, queue, durable=True):
+        self.queues.setdefault(queue, [])
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback):
+        self.consumer = (queue, on_message_callback)
+        return "ctag"
+
+    def basic_cancel(self, consumer_tag):
+        self.consumer = None
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        with self.lock:
+            self.queues.setdefault(routing_key, []).append((properties, body))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        with self.lock:
+            self.acks.append((delivery_tag, multiple))
+            settled = [t for t in self.unacked if t <= delivery_tag or not multiple]
+            for tag in settled if multiple else [delivery_tag]:
+                del self.unacked[tag]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+class TestQueueConsumer(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = FakeBroker()
+        patcher = patch(
+            "shared.utils.message_queue.pika.BlockingConnection",
+            return_value=self.broker,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mq = MessageQueue(publisher_confirms=False)
+        self.handled = []
+        self.handled_lock = threading.Lock()
+
+    def handler(self, messages):
+        with self.handled_lock:
+            self.handled.append([m["n"] for m in messages])
+
+    def run_consumer(self, count, **options):
+        for i in range(count):
+            self.broker.put("jobs", {"n": i})
+        consumer = QueueConsumer(self.mq, "jobs", **options)
+        consumer.start()
+        wait_until(
+            lambda: consumer.stats["processed"] + consumer.stats["dead_lettered"]
+            >= count
+            and not self.broker.unacked
+        )
+        consumer.stop()
+        return consumer
+
+    def test_batches_are_acked_with_multiple(self):
+        consumer = self.run_consumer(
+            20, handler=self.handler, batch_size=5, prefetch=10, workers=2
+        )
+        self.assertEqual(self.broker.prefetch, 10)
+        self.assertEqual(
+            sorted(n for batch in self.handled for n in batch), list(range(20))
+        )
+        self.assertTrue(all(len(batch) <= 5 for batch in self.handled))
+        self.assertTrue(all(multiple for _, multiple in self.broker.acks))
+        self.assertLess(len(self.broker.acks), 20)
+        self.assertEqual(consumer.stats["received"], 20)
+
+    def test_prefetch_bounds_unacked_deliveries(self):
+        gate = threading.Event()
+        seen = []
+
+        def slow(messages):
+            seen.append(len(self.broker.unacked))
+            gate.wait(5)
+
+        for i in range(10):
+            self.broker.put("jobs", {"n": i})
+        consumer = QueueConsumer(self.mq, "jobs", slow, prefetch=3, batch_size=1)
+        consumer.start()
+        wait_until(lambda: seen)
+        time.sleep(0.05)
+        self.assertEqual(len(self.broker.unacked), 3)
+        gate.set()
+        wait_until(lambda: consumer.stats["processed"] == 10)
+        consumer.stop()
+
+    def test_failing_message_is_retried_then_dead_lettered(self):
+        def handler(messages):
+            if any(m["n"] == 3 for m in messages):
+                raise ValueError("bad message")
+            self.handler(messages)
+
+        consumer = self.run_consumer(
+            6, handler=handler, batch_size=6, max_failures=3, batch_window_ms=1
+        )
+        self.assertEqual(consumer.stats["processed"], 5)
+        self.assertEqual(consumer.stats["retried"], 2)
+        self.assertEqual(consumer.stats["dead_lettered"], 1)
+        [(properties, body)] = self.broker.queues["jobs.dead_letter"]
+        self.assertEqual(json.loads(body), {"n": 3})
+        self.assertEqual(properties.headers["x-failure-count"], 3)
+        self.assertIn("bad message", properties.headers["x-last-error"])
+
+    def test_stop_drains_received_messages(self):
+        release = threading.Event()
+
+        def handler(messages):
+            release.wait(5)
+            self.handler(messages)
+
+        for i in range(8):
+            self.broker.put("jobs", {"n": i})
+        consumer = QueueConsumer(
+            self.mq, "jobs", handler, prefetch=8, batch_size=4, workers=2
+        )
+        consumer.start()
+        wait_until(lambda: consumer.stats["received"] == 8)
+        stopper = threading.Thread(target=consumer.stop)
+        stopper.start()
+        release.set()
+        stopper.join(5)
+        self.assertEqual(consumer.stats["processed"], 8)
+        self.assertFalse(self.broker.unacked)
+        self.assertTrue(self.broker.is_closed)
+
+    def test_process_pool_workers(self):
+        consumer = self.run_consumer(
+            6, handler=reject_odd, use_processes=True, workers=2, max_failures=1
+        )
+        self.assertEqual(consumer.stats["processed"], 3)
+        self.assertEqual(len(self.broker.queues["jobs.dead_letter"]), 3)
+
+    def test_cpu_bound_queues_default_to_all_cores(self):
+        self.assertIn(Queues.REPORT_GENERATION, CPU_BOUND_QUEUES)
+        consumer = QueueConsumer(self.mq, Queues.DOCUMENT_PROCESSING, print)
+        self.assertTrue(consumer.use_processes)
+        self.assertEqual(consumer.workers, os.cpu_count() or 1)
+        self.assertGreaterEqual(consumer.prefetch, consumer.workers)
+        light = QueueConsumer(self.mq, Queues.EMAIL_NOTIFICATIONS, print)
+        self.assertFalse(light.use_processes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests for the transactional outbox and its relay
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)  # backend root
+
+from shared.database.manager import initialize_database
+from shared.database.outbox import OutboxRelay, add_outbox_event
+from shared.utils.memory_broker import MemoryTransport
+from shared.utils.message_queue import MessageQueue
+
+
+class NackingQueue:
+    """MessageQueue stand-in whose broker nacks one queue"""
+
+    def __init__(self, nacked_queue):
+        self.nacked_queue = nacked_queue
+        self.published = []
+        self.nacked = []
+
+    def declare_queue(self, queue_name, durable=True, arguments=None):
+        pass
+
+    def publish_batch(self, queue_name, messages):
+        for message in messages:
+            self.published.append((queue_name, message))
+            if queue_name == self.nacked_queue:
+                self.nacked.append((queue_name, json.dumps(message).encode()))
+
+    def wait_for_confirms(self, timeout=5.0):
+        nacked, self.nacked = self.nacked, []
+        return nacked
+
+    def disconnect(self):
+        pass
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db, _ = initialize_database(os.path.join(self.tmp_dir, "app.db"))
+        self.db.execute_query("CREATE TABLE payments (id TEXT PRIMARY KEY)")
+        self.transport = MemoryTransport()
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write(self, payment_id, fail=False):
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO payments (id) VALUES (?)", (payment_id,))
+            event_id = add_outbox_event(conn, "payments", {"payment_id": payment_id})
+            if fail:
+                raise ValueError("Forced rollback")
+        return event_id
+
+    def pending(self):
+        return self.db.fetch_one("SELECT COUNT(*) AS n FROM outbox")["n"]
+
+    def drain(self, queue_name):
+        channel = self.transport.broker.connect().channel()
+        messages = []
+        while True:
+            method, _, body = channel.basic_get(queue_name, auto_ack=True)
+            if method is None:
+                return messages
+            messages.append(json.loads(body))
+
+    def test_event_commits_and_rolls_back_with_the_write(self):
+        event_id = self.write("p1")
+        with self.assertRaises(ValueError):
+            self.write("p2", fail=True)
+        [row] = self.db.fetch_all("SELECT queue, payload FROM outbox")
+        self.assertEqual(row["queue"], "payments")
+        self.assertEqual(
+            json.loads(row["payload"]), {"payment_id": "p1", "event_id": event_id}
+        )
+        self.assertEqual(self.db.fetch_all("SELECT id FROM payments"), [{"id": "p1"}])
+
+    def test_relay_publishes_in_order_and_deletes_confirmed_rows(self):
+        for i in range(7):
+            self.write(f"p{i}")
+        mq = MessageQueue(publisher_confirms=True, transport=self.transport)
+        relay = OutboxRelay(self.db, mq=mq, batch_size=5)
+        self.assertEqual(relay.relay_once(), 5)
+        self.assertEqual(relay.relay_once(), 2)
+        self.assertEqual(relay.relay_once(), 0)
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(
+            [m["payment_id"] for m in self.drain("payments")],
+            [f"p{i}" for i in range(7)],
+        )
+
+    def test_nacked_events_stay_in_the_outbox(self):
+        self.write("p1")
+        with self.db.transaction() as conn:
+            add_outbox_event(conn, "ledger", {"entry": 1})
+        relay = OutboxRelay(self.db, mq=NackingQueue("ledger"))
+        self.assertEqual(relay.relay_once(), 1)
+        [row] = self.db.fetch_all("SELECT queue, attempts, last_error FROM outbox")
+        self.assertEqual(
+            (row["queue"], row["attempts"], row["last_error"]),
+            ("ledger", 1, "nacked by broker"),
+        )
+        self.assertEqual(relay.get_stats()["pending"], 1)
+
+    def test_background_relay_drains_on_stop(self):
+        relay = OutboxRelay(
+            self.db,
+            mq=MessageQueue(publisher_confirms=True, transport=self.transport),
+            poll_interval_ms=5,
+        )
+        relay.start()
+        self.write("p1")
+        relay.notify()
+        deadline = time.monotonic() + 5
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.write("p2")
+        relay.stop()
+        self.assertFalse(relay.get_stats()["worker_alive"])
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(
+            [m["payment_id"] for m in self.drain("payments")], ["p1", "p2"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
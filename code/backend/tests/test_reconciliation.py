@@ -0,0 +1,129 @@
+"""
+Tests for the reconciliation matching engine
+"""
+
+import unittest
+from datetime import date
+
+from tests.test_ledger_balances import LedgerTestCase
+
+from reconciliation import (
+    Line,
+    load_book_lines,
+    match_lines,
+    save_matches,
+    statement_lines,
+)
+
+DAY = date(2025, 3, 10).toordinal()
+
+
+class TestMatchLines(unittest.TestCase):
+
+    def test_exact_matches_on_amount_date_and_reference(self):
+        statement = [Line("s1", DAY, 5000, "INV1"), Line("s2", DAY, 5000, "INV2")]
+        book = [Line(2, DAY, 5000, "INV2"), Line(1, DAY, 5000, "INV1")]
+        result = match_lines(statement, book)
+        self.assertEqual(
+            [
+                (m["statement_line_ids"], m["journal_line_ids"])
+                for m in result["matched"]
+            ],
+            [(["s1"], [1]), (["s2"], [2])],
+        )
+        self.assertEqual({m["match_type"] for m in result["matched"]}, {"exact"})
+
+    def test_date_window_and_tolerance(self):
+        statement = [
+            Line("late", DAY + 2, 1999),
+            Line("fee", DAY, 10003),
+            Line("far", DAY + 10, 777),
+        ]
+        book = [Line(1, DAY, 1999), Line(2, DAY, 10000), Line(3, DAY, 777)]
+        result = match_lines(statement, book, amount_tolerance=5)
+        [window] = result["matched"]
+        self.assertEqual(
+            (window["statement_line_ids"], window["match_type"], window["days_apart"]),
+            (["late"], "date_window", 2),
+        )
+        [fee] = result["suspect"]
+        self.assertEqual(
+            (fee["journal_line_ids"], fee["match_type"], fee["amount_difference"]),
+            ([2], "tolerance", "-0.03"),
+        )
+        self.assertEqual(result["unmatched_statement_line_ids"], ["far"])
+        self.assertEqual(result["unmatched_journal_line_ids"], [3])
+
+    def test_equally_good_candidates_are_suspect(self):
+        statement = [Line("s1", DAY, 2500)]
+        book = [Line(1, DAY - 1, 2500), Line(2, DAY + 1, 2500)]
+        result = match_lines(statement, book)
+        self.assertEqual(result["matched"], [])
+        self.assertEqual(result["suspect"][0]["match_type"], "ambiguous")
+
+    def test_group_matches_in_both_directions(self):
+        statement = [
+            Line("deposit", DAY, 6000),
+            Line("part1", DAY, -1500),
+            Line("part2", DAY + 1, -2500),
+        ]
+        book = [
+            Line(1, DAY, 1000),
+            Line(2, DAY - 1, 2000),
+            Line(3, DAY, 3000),
+            Line(4, DAY, 4000),
+            Line(5, DAY, -4000),
+        ]
+        result = match_lines(statement, book)
+        self.assertEqual(
+            [
+                (
+                    m["match_type"],
+                    m["statement_line_ids"],
+                    sorted(m["journal_line_ids"]),
+                )
+                for m in result["matched"]
+            ],
+            [
+                ("many_to_one", ["deposit"], [2, 4]),
+                ("one_to_many", ["part1", "part2"], [5]),
+            ],
+        )
+        self.assertEqual(result["unmatched_journal_line_ids"], [1, 3])
+        no_groups = match_lines(statement, book, max_group_size=1)
+        self.assertEqual(no_groups["matched"], [])
+
+    def test_statement_rows_are_validated(self):
+        lines = statement_lines(
+            [{"date": "2025-03-10", "amount": "-12.50", "reference": " inv 7 "}]
+        )
+        self.assertEqual(lines, [Line(1, DAY, -1250, "INV7")])
+        with self.assertRaises(ValueError):
+            statement_lines([{"date": "2025-03-10", "amount": "1.005"}])
+        with self.assertRaises(ValueError):
+            statement_lines([{"amount": "1"}])
+
+
+class TestReconciliationStore(LedgerTestCase):
+
+    def test_matched_journal_lines_are_not_loaded_again(self):
+        self.post("2025-03-10", self.cash, self.revenue, 50.0)
+        self.post("2025-03-11", self.expense, self.cash, 20.0)
+        book = load_book_lines(self.db, self.cash.id, date(2025, 3, 31))
+        self.assertEqual(sorted(line.amount for line in book), [-2000, 5000])
+        reconciliation_id = self.db.execute_insert(
+            "INSERT INTO reconciliations (account_id, reconciliation_date, "
+            "statement_balance, book_balance, difference) VALUES (?, ?, 0, 0, 0)",
+            (self.cash.id, "2025-03-31"),
+        )
+        result = match_lines(
+            statement_lines([{"id": "b1", "date": "2025-03-10", "amount": 50}]), book
+        )
+        save_matches(self.db, reconciliation_id, result["matched"])
+        [left] = load_book_lines(self.db, self.cash.id, date(2025, 3, 31))
+        self.assertEqual(left.amount, -2000)
+        self.assertEqual(load_book_lines(self.db, self.cash.id, date(2025, 3, 10)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
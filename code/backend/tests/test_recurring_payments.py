@@ -0,0 +1,258 @@
+"""
+Tests for the recurring payment scheduler
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from calendar import timegm
+from datetime import datetime
+
+from tests.test_wallets import WALLET_TABLES
+
+from database.manager import initialize_database
+import scheduler as scheduler_module
+from scheduler import RETRY_DELAY_MS, RecurringPaymentScheduler, occurrence
+
+PAYMENT_TABLES = """
+    CREATE TABLE payment_methods (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        is_active INTEGER DEFAULT 1,
+        last_used_at TEXT
+    );
+    CREATE TABLE transactions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        payment_method_id TEXT,
+        transaction_type TEXT NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD',
+        description TEXT,
+        reference TEXT,
+        status TEXT NOT NULL,
+        external_transaction_id TEXT,
+        fees REAL DEFAULT 0.0,
+        net_amount REAL NOT NULL,
+        metadata TEXT,
+        processed_at TEXT,
+        settled_at TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE recurring_payments (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        payment_method_id TEXT NOT NULL,
+        amount REAL NOT NULL,
+        currency TEXT DEFAULT 'USD',
+        frequency TEXT NOT NULL,
+        description TEXT,
+        start_date TEXT NOT NULL,
+        end_date TEXT,
+        next_payment_date TEXT NOT NULL,
+        total_payments INTEGER,
+        payments_made INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'active',
+        metadata TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )
+"""
+
+
+def epoch(value):
+    return timegm(datetime.fromisoformat(value).timetuple())
+
+
+class TestOccurrences(unittest.TestCase):
+
+    def test_monthly_steps_keep_the_anchor_day(self):
+        self.assertEqual(
+            [occurrence("2025-01-31", "monthly", k) for k in range(4)],
+            ["2025-01-31", "2025-02-28", "2025-03-31", "2025-04-30"],
+        )
+        self.assertEqual(occurrence("2024-02-29", "yearly", 1), "2025-02-28")
+        self.assertEqual(occurrence("2025-01-01", "biweekly", 2), "2025-01-29")
+
+    def test_datetimes_are_normalized_to_utc(self):
+        self.assertEqual(
+            occurrence("2025-03-01T10:00:00+02:00", "quarterly", 1),
+            "2025-06-01T08:00:00.000",
+        )
+        with self.assertRaises(ValueError):
+            occurrence("2025-01-01", "fortnightly", 0)
+        with self.assertRaises(ValueError):
+            occurrence("soon", "daily", 0)
+
+
+class TestRecurringPaymentScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db, _ = initialize_database(os.path.join(self.tmp_dir, "app.db"))
+        for statement in (WALLET_TABLES + ";" + PAYMENT_TABLES).split(";"):
+            self.db.execute_query(statement)
+        self.db.execute_query(
+            "INSERT INTO payment_methods (id, user_id, type, provider) "
+            "VALUES ('pm1', 'u1', 'bank_account', 'ach')"
+        )
+        self.now = epoch("2025-04-15T12:00:00")
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def scheduler(self, **kwargs):
+        kwargs.setdefault("horizon_seconds", 3600)
+        return RecurringPaymentScheduler(self.db, clock=lambda: self.now, **kwargs)
+
+    def schedule(self, schedule_id, start_date, frequency="monthly", **columns):
+        row = {
+            "id": schedule_id,
+            "user_id": "u1",
+            "payment_method_id": "pm1",
+            "amount": 100.0,
+            "frequency": frequency,
+            "start_date": start_date,
+            "next_payment_date": start_date,
+            **columns,
+        }
+        self.db.execute_query(
+            f"INSERT INTO recurring_payments ({', '.join(row)}) "
+            f"VALUES ({', '.join('?' for _ in row)})",
+            tuple(row.values()),
+        )
+
+    def schedule_row(self, schedule_id):
+        return self.db.fetch_one(
+            "SELECT next_payment_date, payments_made, status "
+            "FROM recurring_payments WHERE id = ?",
+            (schedule_id,),
+        )
+
+    def charges(self, schedule_id):
+        return [
+            json.loads(row["metadata"])["scheduled_for"]
+            for row in self.db.fetch_all(
+                "SELECT metadata FROM transactions WHERE reference = ? "
+                "ORDER BY created_at",
+                (schedule_id,),
+            )
+        ]
+
+    def test_missed_runs_execute_once_each_and_advance(self):
+        self.schedule("r1", "2025-01-01")
+        scheduler = self.scheduler()
+        scheduler.load()
+        self.assertEqual(scheduler.run_due(), 4)
+        self.assertEqual(
+            self.charges("r1"),
+            ["2025-01-01", "2025-02-01", "2025-03-01", "2025-04-01"],
+        )
+        self.assertEqual(
+            self.schedule_row("r1"),
+            {"next_payment_date": "2025-05-01", "payments_made": 4, "status": "active"},
+        )
+        # Net of the 0.8% bank fee, credited in cents
+        wallet = self.db.fetch_one("SELECT balance FROM wallets WHERE user_id = 'u1'")
+        self.assertEqual(wallet["balance"], 4 * 9920)
+        self.assertEqual(scheduler.run_due(), 0)
+
+    def test_schedules_complete_after_their_last_payment(self):
+        self.schedule("r1", "2025-01-01", total_payments=2)
+        self.schedule("r2", "2025-04-01", "weekly", end_date="2025-04-10")
+        scheduler = self.scheduler()
+        scheduler.load()
+        self.assertEqual(scheduler.run_due(), 4)
+        self.assertEqual(self.schedule_row("r1")["status"], "completed")
+        self.assertEqual(self.charges("r1"), ["2025-01-01", "2025-02-01"])
+        self.assertEqual(self.schedule_row("r2")["status"], "completed")
+        self.assertEqual(self.charges("r2"), ["2025-04-01", "2025-04-08"])
+
+    def test_dispatch_follows_the_clock_and_the_horizon(self):
+        self.schedule("r1", "2025-04-15T12:30:00.000", "daily")
+        scheduler = self.scheduler(horizon_seconds=600)
+        scheduler.load()
+        self.assertEqual(scheduler.get_stats()["queued"], 0)
+        self.now += 1500
+        scheduler.load()
+        self.assertEqual(scheduler.run_due(), 0)
+        self.now += 300
+        self.assertEqual(scheduler.run_due(), 1)
+        scheduler.add("r2", "2025-04-15T12:34:00.000")
+        self.assertEqual(scheduler.get_stats()["next_due"], "2025-04-15T12:34:00.000")
+        self.assertEqual(
+            self.schedule_row("r1")["next_payment_date"], "2025-04-16T12:30:00.000"
+        )
+
+    def test_restart_and_concurrent_schedulers_do_not_double_charge(self):
+        for i in range(40):
+            self.schedule(f"r{i}", "2025-03-01")
+        first, second = self.scheduler(batch_size=7), self.scheduler(batch_size=5)
+        first.load()
+        second.load()
+        threads = [threading.Thread(target=s.run_due) for s in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(first.stats["executed"] + second.stats["executed"], 80)
+        restarted = self.scheduler()
+        restarted.load()
+        self.assertEqual(restarted.run_due(), 0)
+        count = self.db.fetch_one("SELECT COUNT(*) AS n FROM transactions")["n"]
+        self.assertEqual(count, 80)
+        self.assertEqual(self.charges("r3"), ["2025-03-01", "2025-04-01"])
+
+    def test_transient_failures_are_retried(self):
+        self.schedule("r1", "2025-04-01")
+        scheduler = self.scheduler()
+        scheduler.load()
+        with patch.object(
+            scheduler_module,
+            "record_transaction",
+            side_effect=RuntimeError("processor timeout"),
+        ):
+            self.assertEqual(scheduler.run_due(), 0)
+        self.assertEqual(scheduler.get_stats()["queued"], 1)
+        self.assertEqual(self.schedule_row("r1")["payments_made"], 0)
+        self.now += RETRY_DELAY_MS / 1000
+        self.assertEqual(scheduler.run_due(), 1)
+        self.assertEqual(self.charges("r1"), ["2025-04-01"])
+        self.assertEqual(scheduler.stats["skipped"], 0)
+
+    def test_loads_pick_up_schedules_written_by_other_processes(self):
+        scheduler = self.scheduler()
+        scheduler.load()
+        # Inside the loaded window, inserted without add()
+        self.schedule("r1", "2025-04-15T12:30:00.000", "daily")
+        self.schedule("r2", "2025-04-14", "daily")
+        self.assertEqual(scheduler.load(), 2)
+        self.now += 1800
+        # r2 catches up on the 14th and the 15th
+        self.assertEqual(scheduler.run_due(), 3)
+        self.assertEqual(scheduler.load(), 0)
+
+    def test_invalid_payment_method_fails_the_schedule(self):
+        self.schedule("r1", "2025-04-01", payment_method_id="missing")
+        self.schedule("r2", "2025-04-01")
+        scheduler = self.scheduler()
+        scheduler.load()
+        self.assertEqual(scheduler.run_due(), 1)
+        self.assertEqual(
+            self.schedule_row("r1"),
+            {"next_payment_date": "2025-04-01", "payments_made": 0, "status": "failed"},
+        )
+        self.assertEqual(self.charges("r1"), [])
+        self.assertEqual(scheduler.stats["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,9 +6,11 @@ CircuitBreaker, RobustEncryption, SecurityManager session management
 import json
 import os
 import sys
+import tempfile
 import threading
 import time
 import unittest
+import weakref
 from datetime import datetime, timezone
 from unittest.mock import Mock
 
@@ -25,7 +27,11 @@ from shared.security import (
     SecurityEventType,
     SecurityMonitor,
     ThreatLevel,
+    UserActivityIndex,
+    _flush_patterns_at_exit,
+    derive_key,
 )
+from shared.database.manager import DatabaseManager
 from shared.utils.circuit_breaker import CircuitBreaker, CircuitState
 
 
@@ -132,6 +138,57 @@ class TestRobustEncryption(unittest.TestCase):
             self.enc.decrypt_sensitive_data(tampered)
 
 
+class TestRobustEncryptionBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.enc = RobustEncryption("bulk-master-key")
+
+    def test_key_derivation_is_cached(self):
+        first = derive_key(b"bulk-master-key")
+        self.assertIs(derive_key(b"bulk-master-key"), first)
+        self.assertNotEqual(derive_key(b"bulk-master-key", b"other-salt"), first)
+
+    def test_encrypt_many_round_trip(self):
+        values = [f"field-{i}" for i in range(50)]
+        tokens = self.enc.encrypt_many(values)
+        self.assertTrue(all(token.startswith("v1.") for token in tokens))
+        self.assertEqual(len(set(tokens)), len(values))
+        self.assertEqual(self.enc.decrypt_many(tokens), values)
+
+    def test_fernet_tokens_are_single_encoded(self):
+        tokens = self.enc.encrypt_many(["a", "b"], cipher="fernet")
+        self.assertTrue(all(token.startswith("gAAAAA") for token in tokens))
+        self.assertEqual(self.enc.decrypt_many(tokens), ["a", "b"])
+
+    def test_decrypt_many_reads_legacy_tokens(self):
+        legacy = self.enc.encrypt_sensitive_data("legacy")
+        self.assertEqual(self.enc.decrypt_many([legacy]), ["legacy"])
+
+    def test_rotated_key_still_decrypts_old_tokens(self):
+        tokens = self.enc.encrypt_many(["old"])
+        rotated = RobustEncryption(
+            "rotated-master-key", key_version=2, retired_keys={1: "bulk-master-key"}
+        )
+        self.assertEqual(rotated.decrypt_many(tokens), ["old"])
+        self.assertTrue(rotated.encrypt_many(["new"])[0].startswith("v2."))
+        with self.assertRaises(ValueError):
+            RobustEncryption("rotated-master-key", key_version=2).decrypt_many(tokens)
+
+    def test_tampered_bulk_token_raises(self):
+        token = self.enc.encrypt_many(["data"])[0]
+        with self.assertRaises(ValueError):
+            self.enc.decrypt_many([token[:-4] + "AAAA"])
+
+    def test_max_age_applies_to_bulk_tokens(self):
+        tokens = self.enc.encrypt_many(["data"])
+        with self.assertRaises(ValueError):
+            self.enc.decrypt_many(tokens, max_age_seconds=0)
+
+    def test_unknown_cipher_rejected(self):
+        with self.assertRaises(ValueError):
+            self.enc.encrypt_many(["data"], cipher="rot13")
+
+
 class TestAdvancedEncryptionExtras(unittest.TestCase):
 
     def setUp(self):
@@ -299,5 +356,114 @@ class TestFraudDetectionEngineExtras(unittest.TestCase):
         self.assertEqual(alert_id, 99)
 
 
+class TestUserActivityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = UserActivityIndex(window_seconds=60, max_events=5)
+
+    def test_window_counts_and_sums_evict_old_events(self):
+        self.index.record_event("u1", 10.0, timestamp=1000.0)
+        self.index.record_event("u1", 20.0, timestamp=1030.0)
+        snapshot = self.index.record_event("u1", 5.0, timestamp=1070.0)
+        self.assertEqual(snapshot.event_count, 2)
+        self.assertAlmostEqual(snapshot.amount_total, 25.0)
+        self.assertEqual(self.index.velocity("u1", now=1200.0), 0)
+
+    def test_ring_buffer_is_bounded(self):
+        for i in range(8):
+            snapshot = self.index.record_event("u1", 1.0, timestamp=1000.0 + i)
+        self.assertEqual(snapshot.event_count, 5)
+        self.assertAlmostEqual(snapshot.amount_total, 5.0)
+
+    def test_impossible_travel_detected(self):
+        self.index.record_event("u1", location="51.5,-0.1", timestamp=1000.0)
+        snapshot = self.index.record_event(
+            "u1", location={"lat": 40.7, "lon": -74.0}, timestamp=1600.0
+        )
+        self.assertTrue(snapshot.impossible_travel)
+        self.assertFalse(self.index.check_travel("u1", "40.71,-74.01", now=1700.0))
+
+    def test_plausible_travel_not_flagged(self):
+        self.index.record_event("u1", location="51.5,-0.1", timestamp=1000.0)
+        snapshot = self.index.record_event(
+            "u1", location="48.85,2.35", timestamp=1000.0 + 6 * 3600
+        )
+        self.assertFalse(snapshot.impossible_travel)
+
+    def test_known_logins(self):
+        self.assertEqual(
+            self.index.remember_login("u1", "1.1.1.1", "dev"), (True, True)
+        )
+        self.assertEqual(
+            self.index.remember_login("u1", "1.1.1.1", "dev"), (False, False)
+        )
+        self.assertEqual(
+            self.index.is_known_login("u1", "1.1.1.1", "other"), (True, False)
+        )
+
+    def test_lookups_do_not_add_users(self):
+        self.assertEqual(self.index.velocity("ghost"), 0)
+        self.assertFalse(self.index.check_travel("ghost", "51.5,-0.1"))
+        self.assertEqual(
+            self.index.is_known_login("ghost", "1.1.1.1", "dev"), (False, False)
+        )
+        self.assertEqual(len(self.index._users), 0)
+
+    def test_least_recently_used_user_evicted(self):
+        index = UserActivityIndex(max_users=2)
+        index.remember_login("u1", "1.1.1.1", "dev")
+        index.remember_login("u2", "2.2.2.2", "dev")
+        index.is_known_login("u1", "1.1.1.1", "dev")
+        index.remember_login("u3", "3.3.3.3", "dev")
+        self.assertEqual(list(index._users), ["u1", "u3"])
+
+
+class TestFraudDetectionEngineIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self.db_file.close()
+        self.db = DatabaseManager(self.db_file.name, pool_size=2)
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        os.unlink(self.db_file.name)
+
+    def test_velocity_flag_without_db_reads(self):
+        engine = FraudDetectionEngine(self.db)
+        for _ in range(11):
+            score, factors = engine.analyze_transaction_behavior(
+                "u1", 10.0, "USD", "grocery", "1.2.3.4"
+            )
+        self.assertIn("high_velocity", factors)
+
+    def test_index_rebuilt_from_db_in_new_engine(self):
+        engine = FraudDetectionEngine(self.db)
+        engine.record_trusted_login("u1", "10.0.0.1", "device_a")
+        engine.analyze_transaction("u1", {"amount": 5, "location": "51.5,-0.1"})
+        engine.flush_patterns()
+
+        restarted = FraudDetectionEngine(self.db)
+        score, factors = restarted.analyze_login_behavior(
+            "u1", "10.0.0.1", "Mozilla", "device_a"
+        )
+        self.assertEqual((score, factors), (0.0, []))
+        self.assertEqual(restarted.activity_index.velocity("u1"), 1)
+        self.assertTrue(restarted._check_location_anomaly("u1", "40.7,-74.0"))
+
+    def test_old_patterns_flushed_on_enqueue_and_at_exit(self):
+        engine = FraudDetectionEngine(self.db)
+        engine.PATTERN_FLUSH_SECONDS = 60
+        count = "SELECT COUNT(*) AS n FROM transaction_patterns"
+        engine.analyze_transaction("u1", {"amount": 5})
+        self.assertEqual(self.db.fetch_one(count)["n"], 0)
+        engine._pending_since -= 61
+        engine.analyze_transaction("u1", {"amount": 5})
+        self.assertEqual(self.db.fetch_one(count)["n"], 2)
+        engine.analyze_transaction("u1", {"amount": 5})
+        _flush_patterns_at_exit(weakref.ref(engine))
+        self.assertEqual(self.db.fetch_one(count)["n"], 3)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,187 @@
+"""
+Tests for atomic minor-unit wallet balance updates
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_ROOT, "shared"))
+# Appended so the ledger's same-named models/routes packages keep priority
+sys.path.append(os.path.join(BACKEND_ROOT, "payment-service", "src"))
+
+from database.manager import initialize_database
+from wallets import (
+    InsufficientFundsError,
+    apply_wallet_change,
+    from_minor_units,
+    get_or_create_wallet,
+    to_minor_units,
+)
+
+WALLET_TABLES = """
+    CREATE TABLE wallets (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        balance INTEGER NOT NULL DEFAULT 0,
+        available_balance INTEGER NOT NULL DEFAULT 0,
+        pending_balance INTEGER NOT NULL DEFAULT 0,
+        reserved_balance INTEGER NOT NULL DEFAULT 0,
+        is_active INTEGER DEFAULT 1,
+        created_at TEXT,
+        updated_at TEXT
+    );
+    CREATE UNIQUE INDEX idx_wallets_user_currency ON wallets(user_id, currency);
+    CREATE TABLE wallet_balance_history (
+        id TEXT PRIMARY KEY,
+        wallet_id TEXT NOT NULL,
+        transaction_id TEXT,
+        change_type TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        balance_before INTEGER NOT NULL,
+        balance_after INTEGER NOT NULL,
+        description TEXT,
+        created_at TEXT
+    )
+"""
+
+
+class TestMinorUnits(unittest.TestCase):
+
+    def test_conversions_follow_the_currency_exponent(self):
+        self.assertEqual(to_minor_units("100.10", "USD"), 10010)
+        self.assertEqual(to_minor_units(Decimal("1000"), "JPY"), 1000)
+        self.assertEqual(to_minor_units("1.234", "KWD"), 1234)
+        self.assertEqual(from_minor_units(10010, "USD"), Decimal("100.10"))
+        self.assertEqual(str(from_minor_units(5, "JPY")), "5")
+        for amount, currency in (("1.005", "USD"), ("0.5", "JPY"), ("abc", "USD")):
+            with self.assertRaises(ValueError):
+                to_minor_units(amount, currency)
+
+
+class TestWalletChanges(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db, _ = initialize_database(os.path.join(self.tmp_dir, "app.db"))
+        for statement in WALLET_TABLES.split(";"):
+            self.db.execute_query(statement)
+        self.wallet_id = get_or_create_wallet(self.db, "u1", "USD")["id"]
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def wallet(self):
+        return self.db.fetch_one(
+            "SELECT * FROM wallets WHERE id = ?", (self.wallet_id,)
+        )
+
+    def balances(self):
+        wallet = self.wallet()
+        return (
+            wallet["balance"],
+            wallet["available_balance"],
+            wallet["reserved_balance"],
+        )
+
+    def test_wallet_is_created_once(self):
+        self.assertEqual(
+            get_or_create_wallet(self.db, "u1", "USD")["id"], self.wallet_id
+        )
+        self.assertEqual(self.balances(), (0, 0, 0))
+
+    def test_changes_and_history(self):
+        apply_wallet_change(self.db, self.wallet_id, 10000, "credit", "in", "t1")
+        apply_wallet_change(self.db, self.wallet_id, 2500, "hold", "hold")
+        self.assertEqual(self.balances(), (10000, 7500, 2500))
+        apply_wallet_change(self.db, self.wallet_id, 2500, "release", "release")
+        history = apply_wallet_change(self.db, self.wallet_id, 3001, "debit", "out")
+        self.assertEqual(self.balances(), (6999, 6999, 0))
+        self.assertEqual(
+            (history["balance_before"], history["balance_after"]), (10000, 6999)
+        )
+        rows = self.db.fetch_all(
+            "SELECT change_type, amount, balance_after FROM wallet_balance_history "
+            "ORDER BY created_at, rowid"
+        )
+        self.assertEqual(
+            [tuple(row.values()) for row in rows],
+            [
+                ("credit", 10000, 10000),
+                ("hold", 2500, 10000),
+                ("release", 2500, 10000),
+                ("debit", 3001, 6999),
+            ],
+        )
+
+    def test_overdraw_leaves_wallet_and_history_untouched(self):
+        apply_wallet_change(self.db, self.wallet_id, 500, "credit", "in")
+        apply_wallet_change(self.db, self.wallet_id, 400, "hold", "hold")
+        with self.assertRaises(InsufficientFundsError):
+            apply_wallet_change(self.db, self.wallet_id, 200, "debit", "out")
+        with self.assertRaises(InsufficientFundsError):
+            apply_wallet_change(self.db, self.wallet_id, 401, "release", "release")
+        self.assertEqual(self.balances(), (500, 100, 400))
+        self.assertEqual(
+            self.db.fetch_one("SELECT COUNT(*) AS n FROM wallet_balance_history")["n"],
+            2,
+        )
+
+    def test_change_rolls_back_with_the_callers_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                apply_wallet_change(self.db, self.wallet_id, 500, "credit", "in")
+                raise RuntimeError("transaction row failed")
+        self.assertEqual(self.balances(), (0, 0, 0))
+
+    def run_debits(self, threads, debits, amount):
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(debits):
+                try:
+                    apply_wallet_change(self.db, self.wallet_id, amount, "debit", "d")
+                    result = True
+                except InsufficientFundsError:
+                    result = False
+                with lock:
+                    outcomes.append(result)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_debits_lose_no_updates(self):
+        apply_wallet_change(self.db, self.wallet_id, 100000, "credit", "in")
+        outcomes = self.run_debits(threads=8, debits=25, amount=150)
+        self.assertTrue(all(outcomes))
+        self.assertEqual(self.balances(), (100000 - 200 * 150, 70000, 0))
+        afters = [
+            row["balance_after"]
+            for row in self.db.fetch_all(
+                "SELECT balance_after FROM wallet_balance_history "
+                "WHERE change_type = 'debit'"
+            )
+        ]
+        self.assertEqual(sorted(afters), list(range(70000, 100000, 150)))
+
+    def test_concurrent_debits_never_overdraw(self):
+        apply_wallet_change(self.db, self.wallet_id, 1000, "credit", "in")
+        outcomes = self.run_debits(threads=8, debits=20, amount=10)
+        self.assertEqual(outcomes.count(True), 100)
+        self.assertEqual(self.balances(), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()